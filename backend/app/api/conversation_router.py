@@ -8,11 +8,11 @@ from ..models.conversation_model import (
     MessageCreate, MessageResponse
 )
 from ..services.conversation_service import ConversationService
-from ..services.ai_service import AIService
+from ..services.kv_cache import session_cache
+from .query_router import ai_service
 
 router = APIRouter()
 conversation_service = ConversationService()
-ai_service = AIService()
 
 @router.post("/", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
 def create_conversation(conversation: ConversationCreate, db: Session = Depends(get_db)):
@@ -175,6 +175,11 @@ def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
     db.delete(db_conversation)
     db.commit()
     
+    # Drop any cached model state and context window for the deleted history;
+    # SQLite may hand the ID to the next new conversation
+    session_cache.invalidate(conversation_id)
+    ai_service.conversation_service.forget(conversation_id)
+    
     return None
 
 @router.post("/{conversation_id}/messages", response_model=MessageResponse)
@@ -206,6 +211,10 @@ def add_message(conversation_id: int, message: MessageCreate, db: Session = Depe
     conversation.updated_at = db_message.created_at
     db.commit()
     
+    # History changed outside of a model turn, so cached model state no longer matches it
+    session_cache.invalidate(conversation_id)
+    ai_service.conversation_service.forget(conversation_id)
+    
     return MessageResponse(
         id=db_message.id,
         conversation_id=db_message.conversation_id,
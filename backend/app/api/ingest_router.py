@@ -0,0 +1,73 @@
+"""
+Router for log-file ingestion and summarization
+"""
+import os
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+from ..services.log_ingest import LOG_FORMATS, LogIngestor, LogTooLarge, enrich_ips, summary_prompt
+from .query_router import ai_service, inference_executor
+from .ipinfo_router import ipinfo_service
+from .threat_intel_router import threat_intel_service
+
+router = APIRouter()
+
+@router.post("/logs")
+async def ingest_logs(request: Request, format: str = "auto", question: Optional[str] = None,
+                      enrich: bool = True, summarize: bool = True, top: int = 10):
+    """
+    Parse an uploaded syslog or nginx/Apache access log and summarize what looks suspicious
+
+    The request body is the raw log file (optionally gzip-compressed), read and
+    parsed chunk by chunk so multi-GB uploads need bounded memory. LOG_INGEST_MAX_BYTES
+    applies both to the upload and to the log data after decompression. The response
+    is NDJSON: an {"aggregates": ...} line, an {"enrichment": ...} line with
+    IPinfo and threat-feed details for the most interesting IPs, then the
+    model's summary as {"text": ...} chunks. Only the aggregates reach the model.
+    """
+    if format not in LOG_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown log format {format!r}, expected one of {', '.join(LOG_FORMATS)}")
+    max_bytes = int(os.getenv("LOG_INGEST_MAX_BYTES", str(10 * 2**30)))
+    ingestor = LogIngestor(format, max_keys=int(os.getenv("LOG_INGEST_MAX_KEYS", "100000")),
+                           max_events=int(os.getenv("LOG_ANALYTICS_MAX_EVENTS", "10000000")),
+                           max_bytes=max_bytes)
+
+    # Parse off the event loop so other requests are served during a large upload
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        if ingestor.bytes_read + len(chunk) > max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"Log uploads are limited to {max_bytes} bytes")
+        try:
+            await asyncio.to_thread(ingestor.feed, chunk)
+        except LogTooLarge as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    aggregates = await asyncio.to_thread(ingestor.finish, top)
+    if not aggregates["events"]:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=f"No {'' if format == 'auto' else format + ' '}log lines recognized "
+                                   f"in {aggregates['input']['lines']} lines")
+
+    async def results() -> AsyncIterator[str]:
+        yield json.dumps({"aggregates": aggregates}) + "\n"
+        enrichment = {}
+        if enrich:
+            try:
+                enrichment = await enrich_ips(aggregates, ipinfo_service, threat_intel_service,
+                                              limit=int(os.getenv("LOG_INGEST_ENRICH_IPS", "20")))
+            except Exception as e:
+                yield json.dumps({"error": f"Error enriching IPs: {str(e)}"}) + "\n"
+            yield json.dumps({"enrichment": enrichment}) + "\n"
+        if summarize:
+            try:
+                prompt = summary_prompt(aggregates, enrichment, question)
+                async for chunk in inference_executor.stream_request(ai_service.submit_query, prompt):
+                    yield json.dumps({"text": chunk}) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": f"Error in stream generation: {str(e)}"}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,70 @@
+"""
+Router for the offline IOC reputation plugin
+"""
+from fastapi import APIRouter, HTTPException, status
+from typing import Any, List, Optional
+from pydantic import BaseModel
+from ..services.ioc_reputation import IOCReputationService
+from ..services.ioc_extractor import IOC_TYPES, extract_iocs, group_iocs
+
+router = APIRouter()
+ioc_reputation_service = IOCReputationService()
+
+class IOCCheckRequest(BaseModel):
+    iocs: List[Any]
+
+class IOCExtractRequest(BaseModel):
+    text: str
+    types: Optional[List[str]] = None
+    max_offsets: int = 100
+
+@router.post("/extract")
+def extract(request: IOCExtractRequest):
+    """
+    Extract IPs, CIDRs, domains, URLs, emails and hashes from free text such as a pasted log
+    """
+    unknown = set(request.types or ()) - set(IOC_TYPES)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown IOC types {', '.join(sorted(unknown))}, expected some of {', '.join(IOC_TYPES)}"
+        )
+    iocs = extract_iocs(request.text, request.types, request.max_offsets)
+    return {"iocs": iocs, "groups": group_iocs(iocs)}
+
+@router.post("/check")
+def check_iocs(request: IOCCheckRequest):
+    """
+    Check file hashes and domains against the offline IOC blocklists
+    """
+    if not ioc_reputation_service.loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No IOC database is loaded; build one with scripts/build_ioc_database.py"
+        )
+    return {"results": ioc_reputation_service.check_many(request.iocs)}
+
+@router.get("/check/{ioc}")
+def check_ioc(ioc: str):
+    """
+    Check one file hash or domain against the offline IOC blocklists
+    """
+    if not ioc_reputation_service.loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No IOC database is loaded; build one with scripts/build_ioc_database.py"
+        )
+    try:
+        return ioc_reputation_service.check(ioc)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{ioc} is not an MD5/SHA1/SHA256 hash or domain"
+        )
+
+@router.get("/stats")
+def ioc_stats():
+    """
+    Report the IOC database's size, memory footprint and lookup counters
+    """
+    return ioc_reputation_service.get_stats()
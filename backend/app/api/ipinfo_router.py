@@ -1,16 +1,29 @@
 """
 Router for IPinfo API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+import json
+import codecs
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Dict, Any, Optional
-from pydantic import BaseModel
+from typing import Dict, Any, AsyncIterator, List, Optional
+from pydantic import BaseModel, ValidationError
 from ..database.database import get_db
-from ..services.ipinfo_service import IPInfoService
+from ..services.ipinfo_service import IPInfoService, normalize_ips
+from ..services.ioc_extractor import IOCExtractor, IP_TYPES
 
 router = APIRouter()
 ipinfo_service = IPInfoService()
 
+IPINFO_ENDPOINTS = ("basic", "geo", "asn")
+
+# Longest line accepted in an NDJSON upload (one address or {"ip": ...} object)
+# and in a text upload (a log line)
+BULK_MAX_LINE_BYTES = 4096
+BULK_MAX_TEXT_LINE_BYTES = 1 << 20
+
 class IPInfoRequest(BaseModel):
     ip: Optional[str] = None
     endpoint: str = "basic"  # Default to basic endpoint
@@ -20,12 +33,16 @@ class IPInfoResponse(BaseModel):
     data: Optional[Dict[str, Any]] = None
     message: str
 
+class IPInfoBulkRequest(BaseModel):
+    ips: List[Any]
+    endpoint: str = "basic"
+
 @router.post("/lookup", response_model=IPInfoResponse)
-def lookup_ip(request: IPInfoRequest, db: Session = Depends(get_db)):
+async def lookup_ip(request: IPInfoRequest, db: Session = Depends(get_db)):
     """
     Look up information about an IP address using the specified endpoint
     """
-    result = ipinfo_service.get_ip_info(request.ip, request.endpoint)
+    result = await ipinfo_service.fetch_ip_info(request.ip, request.endpoint)
     
     if not result["success"]:
         raise HTTPException(
@@ -34,3 +51,137 @@ def lookup_ip(request: IPInfoRequest, db: Session = Depends(get_db)):
         )
     
     return result
+
+def _ndjson_item(line: str) -> Any:
+    # Lines may be {"ip": ...} objects, JSON strings or bare addresses
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return line
+    if isinstance(item, dict):
+        return item.get("ip", line)
+    return item
+
+def _line_too_long(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                         detail=f"Upload has a line longer than {max_bytes} bytes")
+
+def _too_many(what: str, max_ips: int) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                         detail=f"More than {max_ips} {what} submitted, at most {max_ips} are allowed per request")
+
+async def _read_ndjson(request: Request, max_ips: int) -> List[Any]:
+    # Stop reading as soon as the upload has more lines than could ever be accepted,
+    # or a line longer than any address or {"ip": ...} object
+    items = []
+    partial, partial_bytes = [], 0
+    async for chunk in request.stream():
+        lines = chunk.split(b"\n")
+        if len(lines) > 1:
+            lines[0] = b"".join(partial) + lines[0]
+            partial, partial_bytes = [], 0
+            items += [_ndjson_item(line.decode("utf-8", errors="replace").strip())
+                      for line in lines[:-1] if line.strip()]
+            if len(items) > max_ips:
+                raise _too_many("lines", max_ips)
+        partial.append(lines[-1])
+        partial_bytes += len(lines[-1])
+        if partial_bytes > BULK_MAX_LINE_BYTES:
+            raise _line_too_long(BULK_MAX_LINE_BYTES)
+    line = b"".join(partial)
+    if line.strip():
+        items.append(_ndjson_item(line.decode("utf-8", errors="replace").strip()))
+    if len(items) > max_ips:
+        raise _too_many("lines", max_ips)
+    return items
+
+async def _read_text(request: Request, max_ips: int) -> List[str]:
+    # Free text such as pasted logs: every IP address mentioned, once per mention.
+    # Logs repeat addresses, so the limit is on distinct addresses found so far
+    extractor = IOCExtractor(types=IP_TYPES, max_offsets=0)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    # The extractor buffers text up to the next newline, so lines are capped too
+    line_bytes = 0
+    async for chunk in request.stream():
+        newline = chunk.rfind(b"\n")
+        line_bytes = line_bytes + len(chunk) if newline == -1 else len(chunk) - newline - 1
+        if line_bytes > BULK_MAX_TEXT_LINE_BYTES:
+            raise _line_too_long(BULK_MAX_TEXT_LINE_BYTES)
+        extractor.feed(decoder.decode(chunk))
+        if len(extractor) > max_ips:
+            raise _too_many("unique addresses", max_ips)
+    extractor.feed(decoder.decode(b"", final=True))
+    iocs = extractor.finish()
+    if len(iocs) > max_ips:
+        raise _too_many("unique addresses", max_ips)
+    return [ioc["value"] for ioc in iocs for _ in range(ioc["count"])]
+
+@router.post("/bulk")
+async def bulk_lookup(request: Request, endpoint: str = "basic"):
+    """
+    Look up many IP addresses at once, streaming the results back as NDJSON
+
+    Accepts either a JSON body {"ips": [...], "endpoint": "basic"} or an NDJSON
+    upload (Content-Type application/x-ndjson) with one address, JSON string or
+    {"ip": ...} object per line and the endpoint as a query parameter. A plain
+    text upload (Content-Type text/plain), such as a pasted log, is searched
+    for IPv4 and IPv6 addresses, defanged ones included. Addresses
+    are validated and deduped, then looked up concurrently. Each line of the
+    response is one address's result, invalid items first and the rest in
+    completion order, followed by a {"summary": ...} line.
+
+    At most IPINFO_BULK_MAX_IPS unique addresses are looked up per request.
+    Uploads are checked while they stream in: an NDJSON upload is rejected with
+    413 as soon as it passes that many lines, and a text upload as soon as it
+    mentions that many distinct addresses, without reading the rest. Lines
+    longer than BULK_MAX_LINE_BYTES (NDJSON) or BULK_MAX_TEXT_LINE_BYTES (text)
+    are rejected the same way, so a body without newlines isn't buffered whole.
+    """
+    max_ips = int(os.getenv("IPINFO_BULK_MAX_IPS", "10000"))
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = IPInfoBulkRequest.model_validate(await request.json())
+        except (ValueError, ValidationError) as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        items, endpoint = body.ips, body.endpoint
+    elif request.headers.get("content-type", "").startswith("text/plain"):
+        items = await _read_text(request, max_ips)
+    else:
+        items = await _read_ndjson(request, max_ips)
+
+    if endpoint not in IPINFO_ENDPOINTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown endpoint {endpoint!r}, expected one of {', '.join(IPINFO_ENDPOINTS)}")
+
+    ips, invalid, duplicates = normalize_ips(items)
+    if len(ips) > max_ips:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"{len(ips)} unique addresses submitted, at most {max_ips} are allowed per request")
+
+    async def results() -> AsyncIterator[str]:
+        start = time.perf_counter()
+        for item in invalid:
+            yield json.dumps({"ip": item["ip"], "success": False, "data": None,
+                              "endpoint": endpoint, "message": item["error"]}) + "\n"
+        succeeded = 0
+        async for result in ipinfo_service.bulk_lookup(ips, endpoint):
+            succeeded += result["success"]
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"summary": {
+            "received": len(items),
+            "unique": len(ips),
+            "duplicates": duplicates,
+            "invalid": len(invalid),
+            "succeeded": succeeded,
+            "failed": len(ips) - succeeded,
+            "total_time": round(time.perf_counter() - start, 3)
+        }}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/stats")
+def ipinfo_stats():
+    """
+    Report lookup cache hit/miss/eviction counters and upstream request counts
+    """
+    return ipinfo_service.get_stats()
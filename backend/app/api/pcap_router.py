@@ -0,0 +1,92 @@
+"""
+Router for the offline packet-capture flow summarizer plugin
+"""
+import os
+import json
+import asyncio
+from pathlib import Path
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+from ..services.pcap_flows import FlowSummarizer, enrich_flows, summarize_capture, summary_prompt
+from .query_router import ai_service, inference_executor
+from .ipinfo_router import ipinfo_service
+from .threat_intel_router import threat_intel_service
+
+router = APIRouter()
+
+def _capture_path(name: str) -> Path:
+    """
+    Resolve a capture name inside PCAP_CAPTURE_DIR, refusing paths that leave it
+    """
+    directory = Path(os.getenv("PCAP_CAPTURE_DIR", "data/captures")).resolve()
+    path = (directory / name).resolve()
+    if directory not in path.parents or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Capture {name!r} not found in the capture directory")
+    return path
+
+@router.get("/captures")
+def list_captures():
+    """
+    List the capture files that can be summarized by name
+    """
+    directory = Path(os.getenv("PCAP_CAPTURE_DIR", "data/captures"))
+    if not directory.is_dir():
+        return {"captures": []}
+    return {"captures": [{"name": path.name, "bytes": path.stat().st_size}
+                         for path in sorted(directory.iterdir()) if path.is_file()]}
+
+@router.post("/flows")
+async def summarize_flows(request: Request, file: Optional[str] = None, question: Optional[str] = None,
+                          enrich: bool = True, summarize: bool = True, top: int = 10):
+    """
+    Summarize a pcap or pcapng capture as flows and ask the model what looks suspicious
+
+    The capture is either named with ?file= (a file in PCAP_CAPTURE_DIR, memory-mapped
+    and parsed in place) or uploaded as the request body and parsed chunk by chunk,
+    so captures of several GB need bounded memory. The response is NDJSON: an
+    {"aggregates": ...} line, an {"enrichment": ...} line with IPinfo and threat-feed
+    details for the addresses of the anomalies, top talkers and top flows, then the
+    model's summary as {"text": ...} chunks. Only the aggregates reach the model.
+    """
+    max_flows = int(os.getenv("PCAP_MAX_FLOWS", "200000"))
+    try:
+        if file is not None:
+            aggregates = await asyncio.to_thread(summarize_capture, str(_capture_path(file)), top, max_flows)
+        else:
+            max_bytes = int(os.getenv("PCAP_MAX_BYTES", str(10 * 2**30)))
+            summarizer = FlowSummarizer(max_flows)
+            # Parse off the event loop so other requests are served during a large upload
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                if summarizer.bytes_read + len(chunk) > max_bytes:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                        detail=f"Capture uploads are limited to {max_bytes} bytes")
+                await asyncio.to_thread(summarizer.feed, chunk)
+            aggregates = await asyncio.to_thread(summarizer.finish, top)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if not aggregates["input"]["packets"]:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="The capture holds no packets")
+
+    async def results() -> AsyncIterator[str]:
+        yield json.dumps({"aggregates": aggregates}) + "\n"
+        enrichment = {}
+        if enrich:
+            try:
+                enrichment = await enrich_flows(aggregates, ipinfo_service, threat_intel_service,
+                                                limit=int(os.getenv("PCAP_ENRICH_IPS", "20")))
+            except Exception as e:
+                yield json.dumps({"error": f"Error enriching IPs: {str(e)}"}) + "\n"
+            yield json.dumps({"enrichment": enrichment}) + "\n"
+        if summarize:
+            try:
+                prompt = summary_prompt(aggregates, enrichment, question)
+                async for chunk in inference_executor.stream_request(ai_service.submit_query, prompt):
+                    yield json.dumps({"text": chunk}) + "\n"
+            except Exception as e:
+                yield json.dumps({"error": f"Error in stream generation: {str(e)}"}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
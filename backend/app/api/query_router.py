@@ -8,13 +8,144 @@ from ..models.plugin_model import Plugin
 from ..models.conversation_model import Conversation, Message, QueryWithHistory
 from ..services.ai_service import AIService
 from ..services.conversation_service import ConversationService
+from ..services.inference_executor import InferenceExecutor
+from ..services.ipinfo_step_service import IPInfoStepService
+from ..services.ipinfo_pipeline import IPInfoPipelines
+from ..services.ioc_extractor import IP_TYPES, extract_iocs, first_ip, group_iocs
+from .ipinfo_router import ipinfo_service
+from .threat_intel_router import threat_intel_service
+from .ioc_router import ioc_reputation_service
+import os
 import json
-import asyncio
-import random
 
 router = APIRouter()
 ai_service = AIService()
 conversation_service = ConversationService()
+inference_executor = InferenceExecutor()
+ipinfo_step_service = IPInfoStepService()
+
+def _generate(prompt: str, schema: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Stream a generation for a pipeline LLM node from the shared decode batch
+    """
+    return inference_executor.stream_request(ai_service.submit_query, prompt, schema=schema)
+
+ipinfo_pipelines = IPInfoPipelines(ipinfo_step_service, ipinfo_service, _generate,
+                                   threat_intel=threat_intel_service)
+
+# Plugin that handles each kind of indicator found in a query, in order of preference
+INDICATOR_PLUGINS = [
+    (("ipv4", "ipv6"), "IPinfo"),
+    (("md5", "sha1", "sha256", "domain"), "IOCReputation")
+]
+REPUTATION_TYPES = ("md5", "sha1", "sha256", "domain")
+
+def _plugin_for_indicators(indicators: Dict[str, List[str]], plugins: List[Plugin]) -> Optional[Plugin]:
+    """
+    Pick the plugin for the indicators extracted from a query, if one is installed
+    """
+    by_name = {plugin.name: plugin for plugin in plugins}
+    for types, name in INDICATOR_PLUGINS:
+        if name in by_name and any(indicators.get(ioc_type) for ioc_type in types):
+            return by_name[name]
+    return None
+
+async def _bulk_enrichment_frame(ips: List[str]) -> Dict[str, Any]:
+    """
+    Look up every address a query mentions at once and report them in one step
+    """
+    max_ips = int(os.getenv("QUERY_BULK_MAX_IPS", "50"))
+    results = {}
+    async for result in ipinfo_service.bulk_lookup(ips[:max_ips], "basic"):
+        results[result["ip"]] = result
+
+    lines = []
+    for ip in ips[:max_ips]:
+        result = results[ip]
+        data = result["data"] or {}
+        line = f"- **{ip}**: " + (", ".join(str(data[key]) for key in ("country", "org") if data.get(key)) or
+                                  ("bogon" if data.get("bogon") else result["message"]))
+        if threat_intel_service.loaded:
+            threat = threat_intel_service.match(ip)
+            if threat["verdict"] != "clean":
+                line += f" ⚠️ {threat['verdict']} ({', '.join(match['feed'] for match in threat['matches'])})"
+        lines.append(line)
+    if len(ips) > max_ips:
+        lines.append(f"- ...and {len(ips) - max_ips} more addresses (use /api/ipinfo/bulk for all of them)")
+    return {
+        "text": "\n".join(lines),
+        "reasoning": f"The query mentions {len(ips)} IP addresses, so all of them were looked up together",
+        "step": {
+            "id": 7,
+            "name": "bulk_enrichment",
+            "role": "system"
+        }
+    }
+
+def _reputation_frame(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Report the offline reputation of the hashes and domains a query mentions
+    """
+    lines = []
+    for result in results:
+        if result["verdict"] == "malicious":
+            matched = f" via {result['matched']}" if result["matched"] != result["normalized"] else ""
+            lines.append(f"- **{result['normalized']}** ({result['type']}): malicious{matched}, listed by {', '.join(result['feeds'])}")
+        else:
+            lines.append(f"- **{result['normalized']}** ({result['type']}): not on any blocklist")
+    return {
+        "text": "\n".join(lines),
+        "reasoning": "The query mentions file hashes or domains, so they were checked against the offline blocklists",
+        "step": {
+            "id": 1,
+            "name": "reputation_check",
+            "role": "system"
+        }
+    }
+
+# Step frames reporting the progress of long-input summarization
+CHUNK_SUMMARY_STEP = {"id": 8, "name": "chunk_summaries", "role": "system"}
+MERGE_SUMMARY_STEP = {"id": 9, "name": "merge_summaries", "role": "system"}
+
+async def _long_input_frames(query: str, system_content: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answer a query longer than the context window from map-reduce summaries
+
+    Chunk and merge progress stream as step deltas, each step closing with a
+    final step frame, followed by the answer as {"text"} frames.
+    """
+    tokens = 0
+    merge_levels = 0
+    answering = False
+    async for event in inference_executor.stream(ai_service.summarize_long_input, query, system_content):
+        stage = event.get("stage")
+        if stage == "split":
+            tokens = event["tokens"]
+            yield {"delta": f"The input is about {tokens} tokens; split it into {event['chunks']} chunks\n",
+                   "step": CHUNK_SUMMARY_STEP}
+        elif stage == "map":
+            yield {"delta": f"Summarized chunk {event['done']}/{event['total']}\n", "step": CHUNK_SUMMARY_STEP}
+            if event["done"] == event["total"]:
+                yield {
+                    "text": f"Summarized {event['total']} chunks of the input (about {tokens} tokens)",
+                    "reasoning": "The input is longer than the model's context window, so it was split on paragraph "
+                                 "and line boundaries and the chunks were summarized concurrently",
+                    "step": CHUNK_SUMMARY_STEP
+                }
+        elif stage == "reduce":
+            merge_levels = event["level"]
+            yield {"delta": f"Level {event['level']}: merged group {event['done']}/{event['total']}\n",
+                   "step": MERGE_SUMMARY_STEP}
+        else:
+            if merge_levels and not answering:
+                yield {
+                    "text": f"Merged the chunk summaries in {merge_levels} level{'s' if merge_levels > 1 else ''}",
+                    "reasoning": "The chunk summaries together were still too long for one prompt, "
+                                 "so neighbouring summaries were merged until they fit",
+                    "step": MERGE_SUMMARY_STEP
+                }
+            answering = True
+            yield {"text": event["text"]}
 
 class QueryRequest(BaseModel):
     query: str
@@ -100,7 +231,8 @@ def process_query_with_history(request: QueryWithHistory, db: Session = Depends(
         query=request.query,
         conversation_history=conversation_history,
         plugin_id=request.plugin_id,
-        db=db
+        db=db,
+        conversation_id=request.conversation_id
     )
     
     # Check for errors
@@ -145,6 +277,11 @@ async def stream_response(request: QueryRequest, db: Session = Depends(get_db)):
     """
     print(f"Received streaming request: {request.query}")
     
+    # IPs, domains, hashes and the like mentioned in the query (defanged ones included)
+    iocs = extract_iocs(request.query)
+    indicators = group_iocs(iocs)
+    query_ips = [ioc["value"] for ioc in iocs if ioc["type"] in IP_TYPES]
+    
     # Handle automatic plugin selection if requested
     selected_plugin = None
     if request.auto_select_plugin:
@@ -154,17 +291,20 @@ async def stream_response(request: QueryRequest, db: Session = Depends(get_db)):
         
         # If we have plugins, determine if any should be used
         if available_plugins:
-            # Simple keyword matching for demo purposes
-            # In a real system, you would use a more sophisticated approach
-            # such as embeddings or a classifier model
-            query_lower = request.query.lower()
-            for plugin in available_plugins:
-                keywords = plugin.description.lower().split()
-                # Check if any keywords from the plugin description are in the query
-                if any(keyword in query_lower for keyword in keywords if len(keyword) > 3):
-                    selected_plugin = plugin
-                    print(f"Auto-selected plugin: {plugin.name}")
-                    break
+            # Indicators in the query pick the plugin that can look them up
+            selected_plugin = _plugin_for_indicators(indicators, available_plugins)
+            if selected_plugin:
+                print(f"Auto-selected plugin for the query's indicators: {selected_plugin.name}")
+            else:
+                # Otherwise fall back to simple keyword matching
+                query_lower = request.query.lower()
+                for plugin in available_plugins:
+                    keywords = plugin.description.lower().split()
+                    # Check if any keywords from the plugin description are in the query
+                    if any(keyword in query_lower for keyword in keywords if len(keyword) > 3):
+                        selected_plugin = plugin
+                        print(f"Auto-selected plugin: {plugin.name}")
+                        break
     # Validate plugin_id if provided
     elif request.plugin_id:
         selected_plugin = db.query(Plugin).filter(Plugin.id == request.plugin_id).first()
@@ -178,9 +318,9 @@ async def stream_response(request: QueryRequest, db: Session = Depends(get_db)):
         try:
             print(f"Generating stream for query: {request.query}")
             
-            # Ensure model is loaded
+            # Ensure model is loaded (off the event loop, loading can take a while)
             try:
-                ai_service._load_model()
+                await inference_executor.run(ai_service._load_model)
                 print("Model loaded successfully")
             except Exception as e:
                 print(f"Error loading model: {str(e)}")
@@ -217,390 +357,35 @@ async def stream_response(request: QueryRequest, db: Session = Depends(get_db)):
                 
                 # If it's the IPinfo plugin, execute it and show the process
                 if selected_plugin.name == "IPinfo":
-                    # Step 1: Have the LLM acknowledge the request with reasoning
-                    # Format a prompt for the LLM to make a decision about acknowledging the request
-                    acknowledgment_prompt = f"""You are a cybersecurity assistant helping a user with their query: '{request.query}'
-                    The IPinfo plugin has been selected to help answer this query.
-                    
-                    Provide a brief acknowledgment to the user about using the IPinfo tool.
-                    Your response must be in valid JSON format with two fields:
-                    1. 'reasoning': Explain why you're acknowledging the request
-                    2. 'choice': The actual acknowledgment text to show the user
-                    
-                    Example response format:
-                    {{"reasoning": "The user is asking about IP information, so I should acknowledge that I'll use the IPinfo tool.", "choice": "I'll help you get information about your IP address using the IPinfo tool."}}                    
-                    """
-                    
-                    # Get the LLM's decision for acknowledgment
-                    acknowledgment_response = ai_service.process_query(acknowledgment_prompt)["response"]
-                    
-                    # Extract the JSON from the response
-                    try:
-                        # Find JSON between curly braces
-                        import re
-                        json_match = re.search(r'\{[^\{\}]*"reasoning"[^\{\}]*"choice"[^\{\}]*\}', acknowledgment_response)
-                        if json_match:
-                            acknowledgment_json = json.loads(json_match.group(0))
-                        else:
-                            # Fallback if regex fails
-                            acknowledgment_json = {"reasoning": "Processing your IP information request", "choice": "I'll help you get information about your IP address using the IPinfo tool."}
-                    except Exception as e:
-                        print(f"Error parsing acknowledgment JSON: {e}")
-                        acknowledgment_json = {"reasoning": "Processing your IP information request", "choice": "I'll help you get information about your IP address using the IPinfo tool."}
-                    
-                    # Yield the acknowledgment with both reasoning and choice
-                    yield json.dumps({
-                        "text": acknowledgment_json["choice"],
-                        "reasoning": acknowledgment_json["reasoning"],
-                        "step": {
-                            "id": 1,
-                            "name": "acknowledge",
-                            "role": "system"
-                        }
-                    }) + "\n"
+                    # Run the IPinfo workflow: the LLM steps, the API call and the
+                    # report, each streamed as soon as it is ready
+                    # The first address the query mentions, or None for the caller's own IP
+                    ip_param = first_ip(iocs)
                     
-                    # Step 2: Have the LLM explain tool selection with reasoning
-                    tool_selection_prompt = f"""You are a cybersecurity assistant helping with the query: '{request.query}'
-                    The IPinfo plugin has been selected to retrieve IP information.
+                    # Narration steps may render from templates when the backend is busy
+                    ipinfo_pipeline = ipinfo_pipelines.get(ai_service.get_load())
+                    async for frame in ipinfo_pipeline.run({"query": request.query, "ip": ip_param}):
+                        yield json.dumps(frame) + "\n"
                     
-                    Explain why you're selecting the IPinfo tool for this query.
-                    Your response must be in valid JSON format with two fields:
-                    1. 'reasoning': Explain why the IPinfo tool is appropriate for this query
-                    2. 'choice': The actual explanation to show the user
+                    # A query naming several addresses gets all of them enriched together
+                    if len(query_ips) > 1:
+                        yield json.dumps(await _bulk_enrichment_frame(query_ips)) + "\n"
                     
-                    Example response format:
-                    {{"reasoning": "The user is asking about IP addresses, and IPinfo is designed to provide IP information.", "choice": "I'm selecting the IPinfo tool because it can retrieve detailed information about IP addresses."}}                    
-                    """
-                    
-                    # Get the LLM's decision for tool selection
-                    tool_selection_response = ai_service.process_query(tool_selection_prompt)["response"]
-                    
-                    # Extract the JSON from the response
-                    try:
-                        # Find JSON between curly braces
-                        json_match = re.search(r'\{[^\{\}]*"reasoning"[^\{\}]*"choice"[^\{\}]*\}', tool_selection_response)
-                        if json_match:
-                            tool_selection_json = json.loads(json_match.group(0))
-                        else:
-                            # Fallback if regex fails
-                            tool_selection_json = {"reasoning": "IPinfo is the appropriate tool for IP lookup", "choice": "Selecting the IPinfo tool to retrieve IP information."}
-                    except Exception as e:
-                        print(f"Error parsing tool selection JSON: {e}")
-                        tool_selection_json = {"reasoning": "IPinfo is the appropriate tool for IP lookup", "choice": "Selecting the IPinfo tool to retrieve IP information."}
-                    
-                    # Yield the tool selection with both reasoning and choice
-                    yield json.dumps({
-                        "text": tool_selection_json["choice"],
-                        "reasoning": tool_selection_json["reasoning"],
-                        "step": {
-                            "id": 2,
-                            "name": "tool_selection",
-                            "role": "system"
-                        }
-                    }) + "\n"
-                    
-                    # Step 3: Have the LLM decide which endpoint to use based on the query
-                    # Load the plugin endpoints
-                    endpoints = json.loads(selected_plugin.endpoints) if isinstance(selected_plugin.endpoints, str) else selected_plugin.endpoints
-                    
-                    # Format a prompt for the LLM to decide which endpoint to use
-                    endpoint_prompt = f"""You are a cybersecurity assistant helping with the query: '{request.query}'
-                    The IPinfo plugin has multiple endpoints available:
-                    1. 'basic': General IP information including location, hostname, and organization
-                    2. 'geo': Detailed geolocation data
-                    3. 'asn': Network provider information
-                    
-                    Decide which endpoint is most appropriate for this query.
-                    Your response must be in valid JSON format with three fields:
-                    1. 'reasoning': Explain why you chose this endpoint
-                    2. 'choice': A brief explanation to show the user
-                    3. 'endpoint': The endpoint name (must be exactly 'basic', 'geo', or 'asn')
-                    
-                    Example response format:
-                    {{"reasoning": "The user is asking about their location, so the geo endpoint is most appropriate.", "choice": "Based on your query about location, I'll use the 'geo' endpoint for detailed geolocation data.", "endpoint": "geo"}}                    
-                    """
-                    
-                    # Get the LLM's decision for endpoint selection
-                    endpoint_response = ai_service.process_query(endpoint_prompt)["response"]
-                    
-                    # Extract the JSON from the response
-                    try:
-                        # Find JSON between curly braces
-                        json_match = re.search(r'\{[^\{\}]*"reasoning"[^\{\}]*"choice"[^\{\}]*"endpoint"[^\{\}]*\}', endpoint_response)
-                        if json_match:
-                            endpoint_json = json.loads(json_match.group(0))
-                            endpoint = endpoint_json["endpoint"]
-                            # Validate endpoint
-                            if endpoint not in ["basic", "geo", "asn"]:
-                                endpoint = "basic"  # Default to basic if invalid
-                        else:
-                            # Fallback if regex fails
-                            endpoint = "basic"  # Default endpoint
-                            endpoint_json = {"reasoning": "The basic endpoint provides general IP information", "choice": "Using the 'basic' endpoint to get general IP information.", "endpoint": "basic"}
-                    except Exception as e:
-                        print(f"Error parsing endpoint JSON: {e}")
-                        endpoint = "basic"  # Default endpoint
-                        endpoint_json = {"reasoning": "The basic endpoint provides general IP information", "choice": "Using the 'basic' endpoint to get general IP information.", "endpoint": "basic"}
-                    
-                    # Yield the endpoint selection with reasoning, choice, and the selected endpoint
-                    yield json.dumps({
-                        "text": endpoint_json["choice"],
-                        "reasoning": endpoint_json["reasoning"],
-                        "endpoint": endpoint_json["endpoint"],
-                        "step": {
-                            "id": 3,
-                            "name": "endpoint_selection",
-                            "role": "system"
-                        }
-                    }) + "\n"
-                    
-                    # Step 4: Execution notification
-                    yield json.dumps({
-                        "text": "Executing API call to IPinfo service...",
-                        "reasoning": "Now that we've selected the appropriate endpoint, we need to execute the API call to retrieve the information",
-                        "step": {
-                            "id": 4,
-                            "name": "execution",
-                            "role": "system"
-                        }
-                    }) + "\n"
-                    
-                    # Import the IPinfo service
-                    from ..services.ipinfo_service import IPInfoService
-                    ipinfo_service = IPInfoService()
-                    
-                    # Execute the API call
-                    ip_param = None  # Use the caller's IP
-                    if "ip" in request.query.lower():
-                        # Try to extract an IP from the query if specified
-                        import re
-                        ip_match = re.search(r'\b(?:\d{1,3}\.){3}\d{1,3}\b', request.query)
-                        if ip_match:
-                            ip_param = ip_match.group(0)
-                    
-                    result = ipinfo_service.get_ip_info(ip_param, endpoint)
-                    
-                    # Step 5: Have the LLM format and present the API result
-                    if result["success"]:
-                        # Create a prompt for the LLM to format the API response
-                        format_prompt = f"""You are a cybersecurity assistant helping with the query: '{request.query}'
-                        You've received the following data from the IPinfo {endpoint} endpoint:
-                        
-                        ```json
-                        {json.dumps(result['data'], indent=2)}
-                        ```
-                        
-                        Format this data in a user-friendly way with appropriate emojis and formatting.
-                        Your response must be in valid JSON format with two fields:
-                        1. 'reasoning': Explain how you're formatting the data to make it user-friendly
-                        2. 'choice': The formatted data presentation with emojis and markdown formatting
-                        
-                        Example response format:
-                        {{"reasoning": "I'm formatting the IP data with emojis and clear labels to make it more readable and engaging.", "choice": "I found the following information about your IP address:\n\n📍 **Location**: Washington, District of Columbia, US\n🌐 **IP Address**: 98.204.101.22\n..."}}                    
-                        """
-                        
-                        # Get the LLM's decision for formatting the API response
-                        format_response = ai_service.process_query(format_prompt)["response"]
-                        
-                        # Extract the JSON from the response
-                        try:
-                            # Find JSON between curly braces
-                            json_match = re.search(r'\{[^\{\}]*"reasoning"[^\{\}]*"choice"[^\{\}]*\}', format_response)
-                            if json_match:
-                                format_json = json.loads(json_match.group(0))
-                            else:
-                                # Fallback if regex fails - create a formatted response manually
-                                formatted_data = "I found the following information about your IP address:\n\n"
-                                
-                                if endpoint == "basic" or endpoint == "geo":
-                                    formatted_data += f"📍 **Location**: {result['data'].get('city', 'Unknown')}, {result['data'].get('region', 'Unknown')}, {result['data'].get('country', 'Unknown')}\n"
-                                    formatted_data += f"🌐 **IP Address**: {result['data'].get('ip', 'Unknown')}\n"
-                                    if 'hostname' in result['data'] and result['data']['hostname']:
-                                        formatted_data += f"🖥️ **Hostname**: {result['data'].get('hostname', 'Unknown')}\n"
-                                    if 'loc' in result['data']:
-                                        formatted_data += f"🗺️ **Coordinates**: {result['data'].get('loc', 'Unknown')}\n"
-                                    if 'timezone' in result['data']:
-                                        formatted_data += f"⏰ **Timezone**: {result['data'].get('timezone', 'Unknown')}\n"
-                                    if 'postal' in result['data']:
-                                        formatted_data += f"📮 **Postal Code**: {result['data'].get('postal', 'Unknown')}\n"
-                                
-                                if endpoint == "basic" or endpoint == "asn":
-                                    formatted_data += f"🔌 **Network Provider**: {result['data'].get('org', 'Unknown')}\n"
-                                    if 'asn' in result['data']:
-                                        formatted_data += f"🌐 **ASN**: {result['data'].get('asn', 'Unknown')}\n"
-                                        
-                                format_json = {"reasoning": "Formatting the IP data with emojis and clear labels for readability", "choice": formatted_data}
-                        except Exception as e:
-                            print(f"Error parsing format JSON: {e}")
-                            # Fallback formatting
-                            formatted_data = "I found the following information about your IP address:\n\n"
-                            
-                            if endpoint == "basic" or endpoint == "geo":
-                                formatted_data += f"📍 **Location**: {result['data'].get('city', 'Unknown')}, {result['data'].get('region', 'Unknown')}, {result['data'].get('country', 'Unknown')}\n"
-                                formatted_data += f"🌐 **IP Address**: {result['data'].get('ip', 'Unknown')}\n"
-                                if 'hostname' in result['data'] and result['data']['hostname']:
-                                    formatted_data += f"🖥️ **Hostname**: {result['data'].get('hostname', 'Unknown')}\n"
-                                if 'loc' in result['data']:
-                                    formatted_data += f"🗺️ **Coordinates**: {result['data'].get('loc', 'Unknown')}\n"
-                                if 'timezone' in result['data']:
-                                    formatted_data += f"⏰ **Timezone**: {result['data'].get('timezone', 'Unknown')}\n"
-                                if 'postal' in result['data']:
-                                    formatted_data += f"📮 **Postal Code**: {result['data'].get('postal', 'Unknown')}\n"
-                            
-                            if endpoint == "basic" or endpoint == "asn":
-                                formatted_data += f"🔌 **Network Provider**: {result['data'].get('org', 'Unknown')}\n"
-                                if 'asn' in result['data']:
-                                    formatted_data += f"🌐 **ASN**: {result['data'].get('asn', 'Unknown')}\n"
-                                    
-                            format_json = {"reasoning": "Formatting the IP data with emojis and clear labels for readability", "choice": formatted_data}
-                        
-                        # Yield the formatted API response with reasoning and choice
-                        yield json.dumps({
-                            "text": format_json["choice"],
-                            "reasoning": format_json["reasoning"],
-                            "step": {
-                                "id": 5,
-                                "name": "api_response",
-                                "role": "system"
-                            }
-                        }) + "\n"
-                        
-                        # Step 6: Have the LLM provide a concise summary and analysis
-                        summary_prompt = f"""You are a cybersecurity assistant helping with the query: '{request.query}'
-                        You've retrieved the following data from the IPinfo {endpoint} endpoint:
-                        
-                        ```json
-                        {json.dumps(result['data'], indent=2)}
-                        ```
-                        
-                        Provide a concise summary and analysis of this IP information, including security implications.
-                        Your response must be in valid JSON format with two fields:
-                        1. 'reasoning': Explain how you're interpreting the data and what insights you're providing
-                        2. 'choice': The actual summary and analysis to show the user
-                        
-                        Example response format:
-                        {{"reasoning": "I'm summarizing the key location and ISP details while adding security context about IP visibility.", "choice": "Based on the information I gathered, here's what I can tell you:\n\nYou're currently connecting from Washington, DC with IP 98.204.101.22. Your internet is provided by Comcast. This information is visible to websites you visit."}}                    
-                        """
-                        
-                        # Get the LLM's decision for summarizing the data
-                        summary_response = ai_service.process_query(summary_prompt)["response"]
-                        
-                        # Extract the JSON from the response
-                        try:
-                            # Find JSON between curly braces
-                            json_match = re.search(r'\{[^\{\}]*"reasoning"[^\{\}]*"choice"[^\{\}]*\}', summary_response)
-                            if json_match:
-                                summary_json = json.loads(json_match.group(0))
-                            else:
-                                # Fallback if regex fails - create a summary manually
-                                summary = "Based on the information I gathered, here's what I can tell you:\n\n"
-                                
-                                if endpoint == "basic" or endpoint == "geo":
-                                    ip = result["data"].get("ip", "Unknown")
-                                    city = result["data"].get("city", "Unknown")
-                                    region = result["data"].get("region", "Unknown")
-                                    country = result["data"].get("country", "Unknown")
-                                    
-                                    # Add location insights
-                                    summary += f"You're currently connecting from **{city}, {region}, {country}** "
-                                    summary += f"with the IP address **{ip}**. "
-                                    
-                                    # Add timezone information if available
-                                    if "timezone" in result["data"]:
-                                        timezone = result["data"].get("timezone", "Unknown")
-                                        summary += f"Your local timezone is **{timezone}**. "
-                                        
-                                if endpoint == "basic" or endpoint == "asn":
-                                    # Add ISP information
-                                    org = result["data"].get("org", "Unknown")
-                                    
-                                    # Extract the ISP name from the ASN format (e.g., "AS7922 Comcast Cable Communications, LLC")
-                                    if " " in org and org.startswith("AS"):
-                                        parts = org.split(" ", 1)
-                                        if len(parts) > 1:
-                                            asn_num = parts[0]
-                                            isp_name = parts[1]
-                                            summary += f"Your internet connection is provided by **{isp_name}** "
-                                            summary += f"(ASN: {asn_num}). "
-                                        else:
-                                            summary += f"Your internet service provider is **{org}**. "
-                                    else:
-                                        summary += f"Your internet service provider is **{org}**. "
-                                
-                                # Add a security note
-                                summary += "\n\nThis information is what websites can see when you connect to them. "
-                                summary += "Using a VPN can help mask this information if privacy is a concern."
-                                
-                                summary_json = {"reasoning": "Summarizing the key location and ISP details while adding security context", "choice": summary}
-                        except Exception as e:
-                            print(f"Error parsing summary JSON: {e}")
-                            # Fallback summary
-                            summary = "Based on the information I gathered, here's what I can tell you:\n\n"
-                            
-                            if endpoint == "basic" or endpoint == "geo":
-                                ip = result["data"].get("ip", "Unknown")
-                                city = result["data"].get("city", "Unknown")
-                                region = result["data"].get("region", "Unknown")
-                                country = result["data"].get("country", "Unknown")
-                                
-                                # Add location insights
-                                summary += f"You're currently connecting from **{city}, {region}, {country}** "
-                                summary += f"with the IP address **{ip}**. "
-                                
-                                # Add timezone information if available
-                                if "timezone" in result["data"]:
-                                    timezone = result["data"].get("timezone", "Unknown")
-                                    summary += f"Your local timezone is **{timezone}**. "
-                                    
-                            if endpoint == "basic" or endpoint == "asn":
-                                # Add ISP information
-                                org = result["data"].get("org", "Unknown")
-                                
-                                # Extract the ISP name from the ASN format (e.g., "AS7922 Comcast Cable Communications, LLC")
-                                if " " in org and org.startswith("AS"):
-                                    parts = org.split(" ", 1)
-                                    if len(parts) > 1:
-                                        asn_num = parts[0]
-                                        isp_name = parts[1]
-                                        summary += f"Your internet connection is provided by **{isp_name}** "
-                                        summary += f"(ASN: {asn_num}). "
-                                    else:
-                                        summary += f"Your internet service provider is **{org}**. "
-                                else:
-                                    summary += f"Your internet service provider is **{org}**. "
-                            
-                            # Add a security note
-                            summary += "\n\nThis information is what websites can see when you connect to them. "
-                            summary += "Using a VPN can help mask this information if privacy is a concern."
-                            
-                            summary_json = {"reasoning": "Summarizing the key location and ISP details while adding security context", "choice": summary}
-                        
-                        # Yield the summary with reasoning and choice
-                        yield json.dumps({
-                            "text": summary_json["choice"],
-                            "reasoning": summary_json["reasoning"],
-                            "step": {
-                                "id": 6,
-                                "name": "summary",
-                                "role": "assistant"
-                            }
-                        }) + "\n"
-                        
-                        # Return early since we've handled the response
-                        return
-                    else:
-                        # Handle error case with reasoning
-                        error_message = f"Failed to get IP information from the {endpoint} endpoint: {result['message']}"
-                        yield json.dumps({
-                            "text": error_message,
-                            "reasoning": "The API call to IPinfo failed, so I need to inform the user about the error",
-                            "step": {
-                                "id": 5,
-                                "name": "error",
-                                "role": "system"
-                            }
-                        }) + "\n"
-                        return
+                    # Return early since we've handled the response
+                    return
+                
+                # The IOC reputation plugin checks the query's hashes and domains before the model answers
+                reputation_iocs = [value for ioc_type in REPUTATION_TYPES for value in indicators.get(ioc_type, [])]
+                if selected_plugin.name == "IOCReputation" and reputation_iocs and ioc_reputation_service.loaded:
+                    reputation_frame = _reputation_frame(ioc_reputation_service.check_many(reputation_iocs))
+                    yield json.dumps(reputation_frame) + "\n"
+                    system_content += "\n\nOffline reputation results for the indicators in the query:\n" + reputation_frame["text"]
+            
+            # Queries longer than the context window are answered from summaries of their parts
+            if await inference_executor.run(ai_service.exceeds_context, request.query):
+                async for frame in _long_input_frames(request.query, system_content):
+                    yield json.dumps(frame) + "\n"
+                return
             
             # Format messages for MLX-LM
             messages = [
@@ -608,61 +393,11 @@ async def stream_response(request: QueryRequest, db: Session = Depends(get_db)):
                 {"role": "user", "content": request.query}
             ]
             
-            print("Applying chat template")
-            # Apply chat template
-            try:
-                prompt = ai_service.tokenizer.apply_chat_template(
-                    messages, 
-                    add_generation_prompt=True
-                )
-                print("Chat template applied successfully")
-            except Exception as e:
-                print(f"Error applying chat template: {str(e)}")
-                yield json.dumps({"error": f"Error applying chat template: {str(e)}"}) + "\n"
-                return
-            
-            # Stream the response
-            if ai_service.USE_MLX:
-                from mlx_lm import stream_generate
-                
-                for response in stream_generate(
-                    ai_service.model,
-                    ai_service.tokenizer,
-                    prompt=prompt,
-                    max_tokens=ai_service.max_tokens,
-                    temperature=ai_service.temperature
-                ):
-                    # Yield each chunk as a JSON object
-                    yield json.dumps({"text": response.text}) + "\n"
-                    # Small delay to prevent overwhelming the client
-                    await asyncio.sleep(0.01)
-            else:
-                # Mock streaming response for demo
-                print("Using mock implementation for streaming")
-                cybersecurity_responses = [
-                    "The most common cybersecurity threats include phishing attacks, malware, ransomware, and social engineering. To protect yourself, use strong passwords, enable two-factor authentication, keep software updated, and be cautious of suspicious emails and links.",
-                    "Zero-day vulnerabilities are security flaws that are unknown to the software vendor and don't have patches available. They're particularly dangerous because attackers can exploit them before developers can create and distribute a fix.",
-                    "To secure your home network, change default router passwords, use WPA3 encryption if available, create a guest network for visitors, keep firmware updated, and consider using a VPN for additional privacy.",
-                    "Ransomware is malicious software that encrypts your files and demands payment for the decryption key. The best protection is maintaining regular backups, using security software, keeping systems updated, and training users to recognize phishing attempts.",
-                    "Multi-factor authentication (MFA) adds an essential layer of security by requiring multiple forms of verification before granting access. Even if your password is compromised, attackers would still need access to your secondary authentication method."
-                ]
-                
-                # Simple response for "hi" or greetings
-                if request.query.lower() in ["hi", "hello", "hey"]:
-                    response_text = "Hello! I'm your cybersecurity assistant. How can I help you with your cybersecurity questions today?"
-                else:
-                    response_text = random.choice(cybersecurity_responses)
-                    
-                print(f"Selected response: {response_text[:30]}...")
-                
-                # Stream the response word by word to simulate real-time generation
-                words = response_text.split()
-                for i, word in enumerate(words):
-                    # Add a space before each word except the first one
-                    prefix = " " if i > 0 else ""
-                    yield json.dumps({"text": prefix + word}) + "\n"
-                    # Add random delay to simulate thinking
-                    await asyncio.sleep(0.05)
+            # Stream the response as the decode thread produces it; no worker
+            # thread is held, so concurrent streams only share the decode batch
+            async for chunk in inference_executor.stream_request(ai_service.submit_response, messages):
+                # Yield each chunk as a JSON object
+                yield json.dumps({"text": chunk}) + "\n"
                 
         except Exception as e:
             # Log and yield error message
@@ -675,6 +410,13 @@ async def stream_response(request: QueryRequest, db: Session = Depends(get_db)):
         media_type="application/x-ndjson"
     )
 
+@router.get("/stats")
+def generation_stats():
+    """
+    Report aggregate tokens/sec and time-to-first-token from the generation scheduler
+    """
+    return ai_service.get_generation_stats()
+
 @router.post("/recommend-plugins", response_model=List[PluginRecommendation])
 def recommend_plugins(request: QueryRequest, db: Session = Depends(get_db)):
     """
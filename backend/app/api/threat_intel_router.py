@@ -0,0 +1,47 @@
+"""
+Router for threat-intel feed matching endpoints
+"""
+from fastapi import APIRouter, HTTPException, status
+from typing import Any, Dict, List
+from pydantic import BaseModel
+from ..services.threat_intel import ThreatIntelService
+
+router = APIRouter()
+threat_intel_service = ThreatIntelService()
+
+class ThreatMatchRequest(BaseModel):
+    ips: List[Any]
+
+@router.post("/match")
+def match_ips(request: ThreatMatchRequest):
+    """
+    Check IP addresses against the threat feeds
+    """
+    return {"results": threat_intel_service.match_many(request.ips)}
+
+@router.get("/match/{ip}")
+def match_ip(ip: str):
+    """
+    Check one IP address against the threat feeds
+    """
+    try:
+        return threat_intel_service.match(ip)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{ip} is not a valid IPv4 or IPv6 address"
+        )
+
+@router.post("/reload")
+def reload_feeds() -> Dict[str, Any]:
+    """
+    Reload the threat feeds now instead of waiting for the next change check
+    """
+    return threat_intel_service.reload()
+
+@router.get("/stats")
+def threat_intel_stats():
+    """
+    Report the loaded feeds and prefix counts
+    """
+    return threat_intel_service.get_stats()
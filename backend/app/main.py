@@ -1,12 +1,17 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from .database.database import get_db, init_db
 from .api.plugin_router import router as plugin_router
-from .api.query_router import router as query_router
+from .api.query_router import router as query_router, inference_executor, ai_service
 from .api.conversation_router import router as conversation_router
-from .api.ipinfo_router import router as ipinfo_router
+from .api.ipinfo_router import router as ipinfo_router, ipinfo_service
+from .api.threat_intel_router import router as threat_intel_router
+from .api.ioc_router import router as ioc_router
+from .api.ingest_router import router as ingest_router
+from .api.pcap_router import router as pcap_router
 import uvicorn
 import os
+import asyncio
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -33,10 +38,24 @@ app.include_router(plugin_router, prefix="/api/plugins", tags=["plugins"])
 app.include_router(query_router, prefix="/api/query", tags=["query"])
 app.include_router(conversation_router, prefix="/api/conversations", tags=["conversations"])
 app.include_router(ipinfo_router, prefix="/api/ipinfo", tags=["ipinfo"])
+app.include_router(threat_intel_router, prefix="/api/threatintel", tags=["threatintel"])
+app.include_router(ioc_router, prefix="/api/ioc", tags=["ioc"])
+app.include_router(ingest_router, prefix="/api/ingest", tags=["ingest"])
+app.include_router(pcap_router, prefix="/api/pcap", tags=["pcap"])
 
 @app.on_event("startup")
 async def startup():
     init_db()
+    
+    # Load and warm the model in the background so the first user after a
+    # deploy doesn't pay for it; /ready reports when it is done
+    if os.getenv("MLX_WARMUP_ON_STARTUP", "true").lower() == "true":
+        app.state.warmup_task = asyncio.create_task(inference_executor.run(ai_service.warm_up))
+
+@app.on_event("shutdown")
+async def shutdown():
+    inference_executor.shutdown()
+    await ipinfo_service.aclose()
 
 @app.get("/")
 async def root():
@@ -44,7 +63,20 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "model": ai_service.get_model_status()["status"]}
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe for load balancers: 200 only once the model is loaded and warmed up
+    """
+    model_status = ai_service.get_model_status()
+    if model_status["status"] != "ready":
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=model_status
+        )
+    return {"status": "ready", "model": model_status}
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "8000"))
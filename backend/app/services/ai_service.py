@@ -1,22 +1,17 @@
 import os
+import re
 import json
 import logging
 import time
-import requests
-import random
-from typing import List, Dict, Any, Optional, Iterator, Union
+from collections import deque
+from typing import List, Dict, Any, Optional, Iterator
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from ..models.plugin_model import Plugin
-
-# Try to import MLX libraries, but provide fallbacks if not available
-USE_MLX = False
-try:
-    import mlx.core as mx
-    from mlx_lm import load, generate, stream_generate
-    USE_MLX = True
-except ImportError:
-    logging.warning("MLX libraries not available. Using mock implementation for demo.")
+from .inference_backends import GenerationRequest, create_backend
+from .model_registry import ModelHandle, ModelStatus, model_registry
+from .text_chunker import estimate_tokens, pack, split_semantic
+from .conversation_service import ConversationService
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,87 +19,238 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Instructions for the map and reduce generations of long-input summarization
+SUMMARY_SYSTEM_PROMPT = ("You are a cybersecurity analyst assistant summarizing part of a longer incident report or log. "
+                         "Keep IP addresses, domains, hashes, user names, timestamps and error messages verbatim.")
+CHUNK_SUMMARY_PROMPT = "Summarize part {index} of {total} of a longer input in a few sentences:\n\n{text}"
+MERGE_SUMMARY_PROMPT = "Merge these summaries of consecutive parts of a longer input into one summary:\n\n{text}"
+FINAL_SUMMARY_PROMPT = ("The request below came with an input too long to read at once, so it was summarized part by part.\n\n"
+                        "Request (beginning of the input):\n{request}\n\nSummary of the whole input:\n{text}")
+
+def recommendation_schema(num_plugins: int) -> Dict[str, Any]:
+    """
+    JSON schema for plugin recommendations: at most one entry per plugin,
+    IDs limited to the listed plugins and scores to 0-10
+    """
+    return {
+        "type": "array",
+        "maxItems": num_plugins,
+        "items": {
+            "type": "object",
+            "properties": {
+                "id": {"enum": list(range(1, num_plugins + 1))},
+                "relevance_score": {"enum": list(range(11))}
+            },
+            "required": ["id", "relevance_score"]
+        }
+    }
+
 class AIService:
-    """Service for handling AI interactions with Apple's MLX framework"""
+    """Service for handling AI interactions through a pluggable inference backend (MLX, Ollama or mock)"""
     
     def __init__(self):
         # Get configuration from environment variables
-        self.model_repo = os.getenv("MLX_MODEL_REPO", "mlx-community/Mistral-7B-Instruct-v0.3-4bit")
+        self.max_batch_size = int(os.getenv("MLX_MAX_BATCH_SIZE", "8"))
+        self.backend = create_backend(max_batch_size=self.max_batch_size)
+        if self.backend.name == "ollama":
+            self.model_repo = os.getenv("OLLAMA_MODEL", "llama2")
+        else:
+            self.model_repo = os.getenv("MLX_MODEL_REPO", "mlx-community/Mistral-7B-Instruct-v0.3-4bit")
         self.max_tokens = int(os.getenv("MLX_MAX_TOKENS", "1000"))
         self.temperature = float(os.getenv("MLX_TEMPERATURE", "0.7"))
+        self.quantization = os.getenv("MLX_QUANTIZATION") or None
+        self.model_config = json.loads(os.getenv("MLX_MODEL_CONFIG", "{}"))
+        
+        # Inputs longer than the context window are summarized map-reduce style in
+        # chunks of SUMMARY_CHUNK_TOKENS, each boiled down to SUMMARY_MAX_TOKENS
+        self.context_tokens = int(os.getenv("MLX_CONTEXT_TOKENS", "8192"))
+        self.summary_chunk_tokens = int(os.getenv("SUMMARY_CHUNK_TOKENS", "2000"))
+        self.summary_max_tokens = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
         
-        # Initialize model and tokenizer to None (lazy loading)
-        self.model = None
-        self.tokenizer = None
+        # Conversation history is trimmed to keep prompts within CONTEXT_TOKEN_BUDGET
+        self.context_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", str(self.context_tokens - self.max_tokens)))
+        self.conversation_service = ConversationService()
+        
+        # The model itself is owned by the process-wide registry (lazy loading);
+        # this service only borrows it per request
+        self._status = ModelStatus.NOT_LOADED
+        self._status_message = "Model has not been loaded yet"
         
         # Add USE_MLX as an instance attribute
-        self.USE_MLX = USE_MLX
+        self.USE_MLX = self.backend.name == "mlx"
         
-        logger.info(f"AI Service initialized with MLX model: {self.model_repo}")
+        logger.info(f"AI Service initialized with {self.backend.name} backend, model: {self.model_repo}")
         logger.info(f"Max tokens: {self.max_tokens}, Temperature: {self.temperature}")
     
+    @property
+    def model(self):
+        """The shared model, or None if it is not loaded"""
+        handle = self._peek()
+        return handle.model if handle else None
+    
+    @property
+    def tokenizer(self):
+        """The shared tokenizer, or None if the model is not loaded"""
+        handle = self._peek()
+        return handle.tokenizer if handle else None
+    
+    @property
+    def scheduler(self):
+        """The shared generation scheduler, or None if the model is not loaded or runs out of process"""
+        handle = self._peek()
+        return handle.scheduler if handle else None
+    
+    def _peek(self) -> Optional[ModelHandle]:
+        return model_registry.peek(self.model_repo, self.quantization, self.model_config)
+    
+    def _acquire(self) -> ModelHandle:
+        return model_registry.acquire(self.model_repo, self._create_model, self.quantization, self.model_config)
+    
+    def _borrow(self):
+        return model_registry.borrow(self.model_repo, self._create_model, self.quantization, self.model_config)
+    
+    def _create_model(self, repo: str, quantization: Optional[str], config: Dict[str, Any]) -> ModelHandle:
+        """
+        Load a model through the inference backend for the model registry
+        
+        Args:
+            repo: Model repository or local path
+            quantization: Optional quantization to apply (e.g. "4bit", "8bit")
+            config: Model config overrides
+            
+        Returns:
+            ModelHandle owning the loaded model
+        """
+        try:
+            logger.info(f"Loading model from {repo}...")
+            start_time = time.time()
+            
+            handle = self.backend.load(repo, quantization, config)
+            logger.info(f"Model loaded by the {self.backend.name} backend in {time.time() - start_time:.2f} seconds")
+            return handle
+        except Exception as e:
+            error_msg = f"Error loading model {repo}: {str(e)}"
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+    
     def _load_model(self) -> None:
         """
-        Load the model and tokenizer if not already loaded
+        Make sure the model is loaded in the registry
         """
-        if self.model is None or self.tokenizer is None:
-            try:
-                logger.info(f"Loading model from {self.model_repo}...")
-                start_time = time.time()
-                
-                if USE_MLX:
-                    self.model, self.tokenizer = load(self.model_repo)
-                    load_time = time.time() - start_time
-                    logger.info(f"Model loaded successfully in {load_time:.2f} seconds")
-                else:
-                    # Mock implementation for demo
-                    logger.info("Using mock implementation for demo")
-                    self.model = "mock_model"
-                    self.tokenizer = type('MockTokenizer', (), {
-                        'apply_chat_template': lambda self, messages, add_generation_prompt=False: 
-                            "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-                    })()
-                    time.sleep(1)  # Simulate loading time
-                    load_time = time.time() - start_time
-                    logger.info(f"Mock model loaded in {load_time:.2f} seconds")
-            except Exception as e:
-                error_msg = f"Error loading model {self.model_repo}: {str(e)}"
-                logger.error(error_msg)
-                raise RuntimeError(error_msg)
+        with self._borrow():
+            pass
     
-    def process_query(self, query: str, plugin_id: Optional[int] = None, db: Session = None) -> Dict[str, Any]:
+    def warm_up(self) -> None:
         """
-        Process a user query with the selected plugin using MLX
+        Load the model and run a short dummy generation so the first user request
+        doesn't pay for model load and first-compile latency
+        
+        Requests that arrive meanwhile wait for the same load in the registry
+        instead of triggering their own.
+        """
+        try:
+            self._status = ModelStatus.LOADING
+            self._status_message = f"Loading model {self.model_repo}..."
+            start_time = time.time()
+            with self._borrow() as handle:
+                self._status = ModelStatus.WARMING_UP
+                self._status_message = "Running warm-up generation..."
+                self.backend.submit(handle, [{"role": "user", "content": "hi"}],
+                                    max_tokens=8, temperature=0.0).result()
+            self._status = ModelStatus.READY
+            self._status_message = f"Model loaded and warmed up in {time.time() - start_time:.2f} seconds"
+            logger.info(self._status_message)
+        except Exception as e:
+            self._status = ModelStatus.ERROR
+            self._status_message = f"Error warming up model: {str(e)}"
+            logger.error(self._status_message)
+    
+    def get_model_status(self) -> Dict[str, str]:
+        """
+        Get the current status of the model
+        
+        Returns:
+            Dict with the ModelStatus value and a human readable message
+        """
+        # The model lives in the shared registry, so it may have been unloaded since
+        # warm-up, or loaded on demand by another request without a warm-up. A failed
+        # warm-up stays an error even if the model loaded: the load may have succeeded
+        # while generation is broken, so only a later successful warm-up clears it
+        loaded = self._peek() is not None
+        if self._status == ModelStatus.READY and not loaded:
+            return {"status": ModelStatus.NOT_LOADED.value, "message": "Model was unloaded by the model registry"}
+        if self._status == ModelStatus.NOT_LOADED and loaded:
+            return {"status": ModelStatus.READY.value, "message": "Model was loaded on demand"}
+        return {"status": self._status.value, "message": self._status_message}
+    
+    def get_generation_stats(self) -> Dict[str, Any]:
+        """
+        Get throughput and latency statistics from the generation scheduler
+        
+        Returns:
+            Dict with aggregate tokens/sec, mean time-to-first-token, batch occupancy,
+            the models held by the registry and the tokens saved by context trimming
+        """
+        handle = self._peek()
+        if handle is None:
+            return {"model_loaded": False, "backend": self.backend.name, "registry": model_registry.get_stats(),
+                    "context": self.conversation_service.get_stats()}
+        return {"model_loaded": True, "backend": self.backend.name,
+                **self.backend.get_stats(handle), "registry": model_registry.get_stats(),
+                "context": self.conversation_service.get_stats()}
+    
+    def get_load(self) -> int:
+        """
+        Get the number of generations currently running or waiting on the backend
+        
+        Returns:
+            Active plus queued requests, or 0 if the model isn't loaded yet
+        """
+        handle = self._peek()
+        if handle is None:
+            return 0
+        stats = self.backend.get_stats(handle)
+        return stats.get("active_requests", 0) + stats.get("queued_requests", 0)
+    
+    def process_query(self, query: str, plugin_id: Optional[int] = None, db: Session = None,
+                      schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Process a user query with the selected plugin
         
         Args:
             query: The user's cybersecurity question
             plugin_id: Optional ID of the plugin to use
             db: Database session
+            schema: Optional JSON schema the response must match (constrained decoding)
             
         Returns:
             Dict containing the AI response
         """
-        return self._generate_response(query=query, plugin_id=plugin_id, db=db)
+        return self._generate_response(query=query, plugin_id=plugin_id, db=db, schema=schema)
     
     def process_query_with_history(self, query: str, conversation_history: List[Dict[str, str]], 
-                                  plugin_id: Optional[int] = None, db: Session = None) -> Dict[str, Any]:
+                                  plugin_id: Optional[int] = None, db: Session = None,
+                                  conversation_id: Optional[int] = None) -> Dict[str, Any]:
         """
-        Process a user query with conversation history and selected plugin using MLX
+        Process a user query with conversation history and selected plugin
         
         Args:
             query: The user's cybersecurity question
             conversation_history: List of previous messages in the conversation
             plugin_id: Optional ID of the plugin to use
             db: Database session
+            conversation_id: Optional conversation ID, used to reuse the KV state of earlier turns
             
         Returns:
             Dict containing the AI response
         """
         return self._generate_response(query=query, conversation_history=conversation_history, 
-                                     plugin_id=plugin_id, db=db)
+                                     plugin_id=plugin_id, db=db, conversation_id=conversation_id)
     
     def _generate_response(self, query: str, conversation_history: List[Dict[str, str]] = None,
-                         plugin_id: Optional[int] = None, db: Session = None) -> Dict[str, Any]:
+                         plugin_id: Optional[int] = None, db: Session = None,
+                         conversation_id: Optional[int] = None,
+                         schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Internal method to generate a response with or without conversation history
         
@@ -113,13 +259,16 @@ class AIService:
             conversation_history: Optional list of previous messages in the conversation
             plugin_id: Optional ID of the plugin to use
             db: Database session
+            conversation_id: Optional conversation ID, used to reuse the KV state of earlier turns
+            schema: Optional JSON schema the response must match (constrained decoding)
             
         Returns:
             Dict containing the AI response
         """
+        handle = None
         try:
-            # Ensure model is loaded
-            self._load_model()
+            # Borrow the shared model for the duration of the request
+            handle = self._acquire()
             
             # If a plugin is specified, get its details
             plugin_context = None
@@ -148,17 +297,13 @@ class AIService:
                 """
                 system_content += "\n\n" + plugin_prompt
             
-            # Format messages for MLX-LM
+            # Format messages for the chat model
+            context = None
             if conversation_history:
-                # Start with system message
-                messages = [{"role": "system", "content": system_content}]
-                
-                # Add conversation history
-                messages.extend(conversation_history)
-                
-                # Add current query as user message if not already included
-                if not (conversation_history and conversation_history[-1]["role"] == "user" and conversation_history[-1]["content"] == query):
-                    messages.append({"role": "user", "content": query})
+                # System message, then as many recent turns as fit the context budget, then the query
+                messages, context = self.conversation_service.build_context(
+                    system_content, conversation_history, query, self.count_tokens,
+                    self.context_budget, conversation_id=conversation_id)
             else:
                 # Simple query without history
                 messages = [
@@ -166,41 +311,17 @@ class AIService:
                     {"role": "user", "content": query}
                 ]
             
-            # Apply chat template to format the prompt correctly for the model
-            prompt = self.tokenizer.apply_chat_template(
-                messages, 
-                add_generation_prompt=True
-            )
-            
             logger.info(f"Generating response for query: {query[:50]}...")
             start_time = time.time()
             
-            # Generate the response
-            if USE_MLX:
-                # Generate the response using MLX
-                response_text = generate(
-                    self.model,
-                    self.tokenizer,
-                    prompt=prompt,
-                    max_tokens=self.max_tokens,
-                    temperature=self.temperature,
-                    verbose=False
-                )
-            else:
-                # Mock response generation for demo
-                cybersecurity_responses = [
-                    "The most common cybersecurity threats include phishing attacks, malware, ransomware, and social engineering. To protect yourself, use strong passwords, enable two-factor authentication, keep software updated, and be cautious of suspicious emails and links.",
-                    "Zero-day vulnerabilities are security flaws that are unknown to the software vendor and don't have patches available. They're particularly dangerous because attackers can exploit them before developers can create and distribute a fix.",
-                    "To secure your home network, change default router passwords, use WPA3 encryption if available, create a guest network for visitors, keep firmware updated, and consider using a VPN for additional privacy.",
-                    "Ransomware is malicious software that encrypts your files and demands payment for the decryption key. The best protection is maintaining regular backups, using security software, keeping systems updated, and training users to recognize phishing attempts.",
-                    "Multi-factor authentication (MFA) adds an essential layer of security by requiring multiple forms of verification before granting access. Even if your password is compromised, attackers would still need access to your secondary authentication method."
-                ]
-                response_text = random.choice(cybersecurity_responses)
-                # Simulate generation time
-                time.sleep(2)
+            # Generate the response with the inference backend
+            request = self.backend.submit(handle, messages, self.max_tokens, self.temperature,
+                                          session_id=conversation_id, schema=schema)
+            response_text = request.result()
             
             generation_time = time.time() - start_time
-            logger.info(f"Response generated in {generation_time:.2f} seconds")
+            logger.info(f"Response generated in {generation_time:.2f} seconds "
+                        f"(time to first token: {request.time_to_first_token or 0:.2f}s, {request.num_tokens} tokens)")
             
             # Return the complete response
             return {
@@ -208,20 +329,219 @@ class AIService:
                 "plugin_used": plugin_context["name"] if plugin_context else None,
                 "metadata": {
                     "generation_time": generation_time,
+                    "time_to_first_token": request.time_to_first_token,
+                    "tokens_generated": request.num_tokens,
+                    "tokens_per_second": request.tokens_per_second,
                     "model": self.model_repo,
+                    "backend": self.backend.name,
                     "max_tokens": self.max_tokens,
-                    "temperature": self.temperature
+                    "temperature": self.temperature,
+                    "context": context
                 }
             }
             
         except Exception as e:
-            error_msg = f"Error generating response with MLX: {str(e)}"
+            error_msg = f"Error generating response with {self.backend.name}: {str(e)}"
             logger.error(error_msg)
             return {"error": error_msg}
+        finally:
+            if handle is not None:
+                model_registry.release(handle)
+    
+    def stream_query(self, query: str, schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Stream the response to a single query without plugin context or history
+
+        Args:
+            query: The prompt to respond to
+            schema: Optional JSON schema the response must match (constrained decoding)
+
+        Yields:
+            Chunks of generated text
+        """
+        return self.stream_response(self._query_messages(query), schema=schema)
+    
+    def submit_query(self, query: str, schema: Optional[Dict[str, Any]] = None) -> GenerationRequest:
+        """
+        Start generating the response to a single query without plugin context or history
+
+        Args:
+            query: The prompt to respond to
+            schema: Optional JSON schema the response must match (constrained decoding)
+
+        Returns:
+            The GenerationRequest to stream with InferenceExecutor.stream_request
+        """
+        return self.submit_response(self._query_messages(query), schema=schema)
+    
+    def _query_messages(self, query: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "You are a cybersecurity analyst assistant. Your goal is to provide accurate, helpful information about cybersecurity topics."},
+            {"role": "user", "content": query}
+        ]
+    
+    def submit_response(self, messages: List[Dict[str, str]],
+                        schema: Optional[Dict[str, Any]] = None) -> GenerationRequest:
+        """
+        Start generating the response to a list of chat messages
+
+        Blocks only until the model is loaded and the request is queued. The
+        model stays borrowed until the request retires, so it can't be unloaded
+        mid-stream.
+
+        Args:
+            messages: Chat messages (system, history and user) to respond to
+            schema: Optional JSON schema the response must match (constrained decoding)
+
+        Returns:
+            The GenerationRequest to stream with InferenceExecutor.stream_request
+        """
+        handle = self._acquire()
+        try:
+            request = self.backend.submit(handle, messages, self.max_tokens, self.temperature, schema=schema)
+        except BaseException:
+            model_registry.release(handle)
+            raise
+        request.add_done_callback(lambda: model_registry.release(handle))
+        return request
+    
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the tokens of a text with the loaded model's tokenizer
+
+        Falls back to an estimate when the tokenizer can't encode locally (Ollama,
+        the mock backend) or the model isn't loaded.
+        """
+        tokenizer = self.tokenizer
+        if tokenizer is not None and hasattr(tokenizer, "encode"):
+            return len(tokenizer.encode(text, add_special_tokens=False))
+        return estimate_tokens(text)
+    
+    def exceeds_context(self, text: str) -> bool:
+        """
+        Check whether a query is too long to answer in a single generation
+
+        The query has to leave room for the system prompt and the response
+        within the model's context window.
+        """
+        # Every token is at least one character, so short queries skip the tokenizer
+        budget = self.context_tokens - self.max_tokens - self.summary_chunk_tokens // 4
+        return len(text) > budget and self.count_tokens(text) > budget
+    
+    def summarize_long_input(self, text: str, system_content: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Answer an input longer than the context window by map-reduce summarization
+
+        The input is split on paragraph, line and sentence boundaries into chunks
+        that fit the context, the chunks are summarized concurrently in the shared
+        decode batch (map), and the partial summaries are merged level by level
+        until they fit a single prompt (reduce). The final answer is streamed from
+        that merged summary. This is a blocking generator; run it through the
+        InferenceExecutor when consuming it from async code.
+
+        Args:
+            text: The long query, e.g. a question followed by an incident report or log excerpt
+            system_content: System prompt for the final answer
+
+        Yields:
+            Progress events {"stage": "split", "chunks", "tokens"}, then
+            {"stage": "map" or "reduce", "level", "done", "total"} as each summary
+            completes, then {"text": ...} chunks of the final answer
+        """
+        with self._borrow() as handle:
+            chunks = split_semantic(text, self.summary_chunk_tokens, self.count_tokens)
+            yield {"stage": "split", "chunks": len(chunks), "tokens": self.count_tokens(text)}
+            
+            summaries = yield from self._summarize_all(handle, chunks, CHUNK_SUMMARY_PROMPT, "map", 0)
+            level = 0
+            joined = "\n\n".join(summaries)
+            while len(summaries) > 1 and self.count_tokens(joined) > self.summary_chunk_tokens:
+                # Merge neighbouring summaries in groups that fit one prompt
+                groups = pack(((summary + "\n\n", self.count_tokens(summary)) for summary in summaries),
+                              self.summary_chunk_tokens)
+                if len(groups) >= len(summaries):
+                    break
+                level += 1
+                summaries = yield from self._summarize_all(handle, groups, MERGE_SUMMARY_PROMPT, "reduce", level)
+                joined = "\n\n".join(summaries)
+            
+            # The request is usually stated at the top of the input
+            request_text = chunks[0][:2000]
+            messages = [
+                {"role": "system", "content": system_content or SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": FINAL_SUMMARY_PROMPT.format(request=request_text, text=joined)}
+            ]
+            request = self.backend.submit(handle, messages, self.max_tokens, self.temperature)
+            try:
+                for chunk in request:
+                    yield {"text": chunk}
+            finally:
+                request.cancel()
+    
+    def _summarize_all(self, handle: ModelHandle, texts: List[str], template: str, stage: str,
+                       level: int) -> Iterator[Dict[str, Any]]:
+        """
+        Summarize texts concurrently, keeping up to a batch of generations in flight
+
+        Yields a progress event per finished summary and returns the summaries
+        in input order (use with ``yield from``).
+        """
+        summaries = []
+        pending = deque()
+        remaining = iter(enumerate(texts))
+        try:
+            while True:
+                # Top up the window so the scheduler decodes a full batch
+                while len(pending) < self.max_batch_size:
+                    item = next(remaining, None)
+                    if item is None:
+                        break
+                    index, text = item
+                    messages = [
+                        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                        {"role": "user", "content": template.format(index=index + 1, total=len(texts), text=text)}
+                    ]
+                    pending.append(self.backend.submit(handle, messages, self.summary_max_tokens, 0.0))
+                if not pending:
+                    break
+                summaries.append(pending.popleft().result().strip())
+                yield {"stage": stage, "level": level, "done": len(summaries), "total": len(texts)}
+        finally:
+            # Retire the rest early if the consumer went away
+            for request in pending:
+                request.cancel()
+        return summaries
+    
+    def stream_response(self, messages: List[Dict[str, str]],
+                        schema: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """
+        Stream a response for a list of chat messages, one text chunk at a time
+
+        This is a blocking generator; run it through the InferenceExecutor when
+        consuming it from async code.
+        
+        Args:
+            messages: Chat messages (system, history and user) to respond to
+            schema: Optional JSON schema the response must match (constrained decoding)
+            
+        Yields:
+            Chunks of generated text
+        """
+        # Borrow the shared model until the stream is exhausted
+        with self._borrow() as handle:
+            # Generate with the inference backend and hand chunks over as they arrive
+            request = self.backend.submit(handle, messages, self.max_tokens, self.temperature,
+                                          schema=schema)
+            try:
+                for chunk in request:
+                    yield chunk
+            finally:
+                # Retire the request early if the consumer went away
+                request.cancel()
     
     def get_plugin_recommendations(self, query: str, plugins: List[Plugin]) -> List[Dict[str, Any]]:
         """
-        Recommend plugins that might be helpful for a given query using MLX
+        Recommend plugins that might be helpful for a given query
         
         Args:
             query: The user's cybersecurity question
@@ -233,9 +553,10 @@ class AIService:
         if not plugins:
             return []
         
+        handle = None
         try:
-            # Ensure model is loaded
-            self._load_model()
+            # Borrow the shared model for the duration of the request
+            handle = self._acquire()
             
             # Create system prompt
             system_content = "You are a cybersecurity tool recommendation system. Your task is to rank the relevance of tools for a user query."
@@ -259,32 +580,26 @@ class AIService:
             IMPORTANT: Your response must contain only the JSON array and nothing else.
             """
             
-            # Format messages for MLX-LM
+            # Format messages for the chat model
             messages = [
                 {"role": "system", "content": system_content},
                 {"role": "user", "content": user_content}
             ]
             
-            # Apply chat template to format the prompt correctly for the model
-            prompt = self.tokenizer.apply_chat_template(
-                messages, 
-                add_generation_prompt=True
-            )
-            
             logger.info(f"Generating plugin recommendations for query: {query[:50]}...")
             start_time = time.time()
             
             # Generate the response
-            if USE_MLX:
-                # Generate the response using MLX with lower temperature for more deterministic output
-                response_text = generate(
-                    self.model,
-                    self.tokenizer,
-                    prompt=prompt,
+            if self.backend.name != "mock":
+                # Generate the response with lower temperature for more deterministic output,
+                # constrained to the recommendation schema so it stops once the array closes
+                response_text = self.backend.submit(
+                    handle,
+                    messages,
                     max_tokens=500,  # Shorter response for recommendations
                     temperature=0.3,  # Lower temperature for more deterministic output
-                    verbose=False
-                )
+                    schema=recommendation_schema(len(plugins))
+                ).result()
             else:
                 # Mock plugin recommendations for demo
                 response_text = json.dumps([{"id": 1, "relevance_score": 8}, {"id": 2, "relevance_score": 5}])
@@ -292,35 +607,40 @@ class AIService:
             generation_time = time.time() - start_time
             logger.info(f"Recommendations generated in {generation_time:.2f} seconds")
             
-            # Find JSON array in response
-            import re
-            json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
-            if json_match:
+            # Constrained output is exactly the JSON array
+            try:
+                recommendations = json.loads(response_text)
+            except json.JSONDecodeError:
+                # Unconstrained output: find the JSON array in the response
+                json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
+                if not json_match:
+                    logger.warning(f"No valid JSON array found in response: {response_text[:100]}...")
+                    return []
                 try:
                     recommendations = json.loads(json_match.group(0))
-                    
-                    # Map plugin IDs to actual plugins
-                    result = []
-                    for rec in recommendations:
-                        plugin_id = rec.get("id")
-                        if 1 <= plugin_id <= len(plugins):
-                            plugin = plugins[plugin_id - 1]
-                            result.append({
-                                "id": plugin.id,
-                                "name": plugin.name,
-                                "description": plugin.description,
-                                "relevance_score": rec.get("relevance_score", 0)
-                            })
-                    
-                    # Sort by relevance score (descending)
-                    return sorted(result, key=lambda x: x["relevance_score"], reverse=True)
                 except json.JSONDecodeError as e:
                     logger.error(f"Error parsing JSON from model response: {e}")
                     return []
-            else:
-                logger.warning(f"No valid JSON array found in response: {response_text[:100]}...")
-                return []
+            
+            # Map plugin IDs to actual plugins
+            result = []
+            for rec in recommendations:
+                plugin_id = rec.get("id")
+                if 1 <= plugin_id <= len(plugins):
+                    plugin = plugins[plugin_id - 1]
+                    result.append({
+                        "id": plugin.id,
+                        "name": plugin.name,
+                        "description": plugin.description,
+                        "relevance_score": rec.get("relevance_score", 0)
+                    })
+            
+            # Sort by relevance score (descending)
+            return sorted(result, key=lambda x: x["relevance_score"], reverse=True)
             
         except Exception as e:
             logger.error(f"Error in plugin recommendations: {str(e)}")
             return []
+        finally:
+            if handle is not None:
+                model_registry.release(handle)
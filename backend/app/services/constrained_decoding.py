@@ -0,0 +1,427 @@
+"""
+JSON-schema constrained decoding for the MLX generation engine
+
+A JSONSchemaMatcher is a character-level pushdown automaton for the JSON
+documents a schema allows. JSONLogitsProcessor runs it alongside generation
+and masks every token that would leave the schema, so the model can only
+write valid JSON and is forced to stop as soon as the top-level value closes.
+"""
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+# The logits processor works on MLX arrays; the matcher itself is pure Python
+try:
+    import numpy as np
+    import mlx.core as mx
+except ImportError:
+    mx = None
+
+logger = logging.getLogger(__name__)
+
+# Whitespace allowed between JSON tokens, and how much of it in a row; capping
+# it stops a constrained model from padding its output with blank lines
+JSON_WHITESPACE = " \n\t"
+MAX_WHITESPACE = 2
+
+HEX_DIGITS = "0123456789abcdefABCDEF"
+
+# Results of feeding one character to a node
+_NEXT = 0    # consumed, node continues with a new frame
+_DONE = 1    # consumed, node is complete
+_PUSH = 2    # node moved on and starts a child node, which gets the character
+_REJECT = 3  # character not allowed here
+
+class _Literal:
+    """Fixed text such as '{' or '"reasoning"'"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def start(self) -> int:
+        return 0
+
+    def step(self, pos: int, ch: str) -> tuple:
+        if self.text[pos] != ch:
+            return _REJECT, None, None
+        if pos + 1 == len(self.text):
+            return _DONE, None, None
+        return _NEXT, pos + 1, None
+
+    def can_end(self, pos: int) -> bool:
+        return False
+
+    def finished(self, pos: int) -> bool:
+        return False
+
+class _Choice:
+    """One of several literals, e.g. a string enum or true/false"""
+
+    def __init__(self, options: Sequence[str]):
+        self.options = tuple(options)
+
+    def start(self) -> str:
+        return ""
+
+    def step(self, prefix: str, ch: str) -> tuple:
+        prefix += ch
+        matching = [option for option in self.options if option.startswith(prefix)]
+        if not matching:
+            return _REJECT, None, None
+        if matching == [prefix]:
+            return _DONE, None, None
+        return _NEXT, prefix, None
+
+    def can_end(self, prefix: str) -> bool:
+        # Options like 1 and 10 can end at a prefix that is itself an option
+        return prefix in self.options
+
+    def finished(self, prefix: str) -> bool:
+        return False
+
+class _String:
+    """A JSON string; frame is (phase, hex digits left)"""
+
+    # Phases: expecting the opening quote, inside the string, after a
+    # backslash, inside a \\uXXXX escape
+    OPEN, BODY, ESCAPE, UNICODE = range(4)
+
+    def start(self) -> tuple:
+        return (self.OPEN, 0)
+
+    def step(self, frame: tuple, ch: str) -> tuple:
+        phase, hex_left = frame
+        if phase == self.OPEN:
+            return (_NEXT, (self.BODY, 0), None) if ch == '"' else (_REJECT, None, None)
+        if phase == self.BODY:
+            if ch == '"':
+                return _DONE, None, None
+            if ch == "\\":
+                return _NEXT, (self.ESCAPE, 0), None
+            # Raw control characters are not allowed inside JSON strings
+            return (_REJECT, None, None) if ch < " " else (_NEXT, frame, None)
+        if phase == self.ESCAPE:
+            if ch in '"\\/bfnrt':
+                return _NEXT, (self.BODY, 0), None
+            return (_NEXT, (self.UNICODE, 4), None) if ch == "u" else (_REJECT, None, None)
+        if ch not in HEX_DIGITS:
+            return _REJECT, None, None
+        return _NEXT, (self.BODY, 0) if hex_left == 1 else (self.UNICODE, hex_left - 1), None
+
+    def can_end(self, frame: tuple) -> bool:
+        return False
+
+    def finished(self, frame: tuple) -> bool:
+        return False
+
+class _Number:
+    """A JSON number or integer; it has no terminator, so it ends when the next character can't extend it"""
+
+    # Phases of the number grammar
+    START, MINUS, ZERO, INT, DOT, FRAC, EXP, EXP_SIGN, EXP_DIGITS = range(9)
+
+    def __init__(self, integer: bool):
+        self.integer = integer
+
+    def start(self) -> int:
+        return self.START
+
+    def step(self, phase: int, ch: str) -> tuple:
+        digit = "0" <= ch <= "9"
+        if phase == self.START and ch == "-":
+            return _NEXT, self.MINUS, None
+        if phase in (self.START, self.MINUS) and digit:
+            return _NEXT, self.ZERO if ch == "0" else self.INT, None
+        if phase == self.INT and digit:
+            return _NEXT, self.INT, None
+        if not self.integer:
+            if phase in (self.ZERO, self.INT) and ch == ".":
+                return _NEXT, self.DOT, None
+            if phase in (self.DOT, self.FRAC) and digit:
+                return _NEXT, self.FRAC, None
+            if phase in (self.ZERO, self.INT, self.FRAC) and ch in "eE":
+                return _NEXT, self.EXP, None
+            if phase == self.EXP and ch in "+-":
+                return _NEXT, self.EXP_SIGN, None
+            if phase in (self.EXP, self.EXP_SIGN, self.EXP_DIGITS) and digit:
+                return _NEXT, self.EXP_DIGITS, None
+        return _REJECT, None, None
+
+    def can_end(self, phase: int) -> bool:
+        return phase in (self.ZERO, self.INT, self.FRAC, self.EXP_DIGITS)
+
+    def finished(self, phase: int) -> bool:
+        return False
+
+class _Sequence:
+    """Nodes matched one after another with optional whitespace between them; frame is (index, whitespace run)"""
+
+    def __init__(self, items: List[Any], leading_whitespace: bool = False):
+        self.items = items
+        self.leading_whitespace = leading_whitespace
+
+    def start(self) -> tuple:
+        return (0, 0)
+
+    def step(self, frame: tuple, ch: str) -> tuple:
+        index, whitespace = frame
+        if ch in JSON_WHITESPACE and (index > 0 or self.leading_whitespace):
+            if whitespace < MAX_WHITESPACE:
+                return _NEXT, (index, whitespace + 1), None
+            return _REJECT, None, None
+        return _PUSH, (index + 1, 0), self.items[index]
+
+    def can_end(self, frame: tuple) -> bool:
+        return False
+
+    def finished(self, frame: tuple) -> bool:
+        return frame[0] == len(self.items)
+
+class _Array:
+    """A JSON array of one item schema; frame is (phase, item count, whitespace run)"""
+
+    # Phases: expecting '[', after '[', after an item, after ','
+    OPEN, FIRST, AFTER_ITEM, AFTER_COMMA = range(4)
+
+    def __init__(self, item: Any, min_items: int = 0, max_items: Optional[int] = None):
+        self.item = item
+        self.min_items = min_items
+        self.max_items = max_items
+
+    def start(self) -> tuple:
+        return (self.OPEN, 0, 0)
+
+    def step(self, frame: tuple, ch: str) -> tuple:
+        phase, count, whitespace = frame
+        if phase == self.OPEN:
+            return (_NEXT, (self.FIRST, 0, 0), None) if ch == "[" else (_REJECT, None, None)
+        if ch in JSON_WHITESPACE:
+            if whitespace < MAX_WHITESPACE:
+                return _NEXT, (phase, count, whitespace + 1), None
+            return _REJECT, None, None
+        if phase == self.AFTER_ITEM:
+            if ch == "," and (self.max_items is None or count < self.max_items):
+                return _NEXT, (self.AFTER_COMMA, count, 0), None
+            if ch == "]" and count >= self.min_items:
+                return _DONE, None, None
+            return _REJECT, None, None
+        if phase == self.FIRST and ch == "]":
+            return (_DONE, None, None) if self.min_items == 0 else (_REJECT, None, None)
+        if phase == self.FIRST and self.max_items == 0:
+            return _REJECT, None, None
+        return _PUSH, (self.AFTER_ITEM, count + 1, 0), self.item
+
+    def can_end(self, frame: tuple) -> bool:
+        return False
+
+    def finished(self, frame: tuple) -> bool:
+        return False
+
+def _compile(schema: Dict[str, Any]) -> Any:
+    """
+    Build the matcher node for a (sub)schema
+
+    Supports objects (every property, in declaration order), arrays, strings,
+    integers, numbers, booleans, null and enums of JSON values.
+    """
+    if "enum" in schema:
+        return _Choice([json.dumps(value) for value in schema["enum"]])
+    if "const" in schema:
+        return _Literal(json.dumps(schema["const"]))
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        items = [_Literal("{")]
+        for i, (name, subschema) in enumerate(schema.get("properties", {}).items()):
+            if i > 0:
+                items.append(_Literal(","))
+            items.extend([_Literal(json.dumps(name)), _Literal(":"), _compile(subschema)])
+        items.append(_Literal("}"))
+        return _Sequence(items)
+    if schema_type == "array":
+        return _Array(_compile(schema.get("items", {"type": "string"})),
+                      schema.get("minItems", 0), schema.get("maxItems"))
+    if schema_type == "string":
+        return _String()
+    if schema_type in ("integer", "number"):
+        return _Number(integer=schema_type == "integer")
+    if schema_type == "boolean":
+        return _Choice(["true", "false"])
+    if schema_type == "null":
+        return _Literal("null")
+    raise ValueError(f"Unsupported schema for constrained decoding: {json.dumps(schema)}")
+
+class JSONSchemaMatcher:
+    """
+    Incremental validator for JSON text against a schema
+
+    States are immutable tuples, so one matcher can be shared by any number
+    of concurrent generations and a state can be advanced speculatively to
+    test candidate tokens.
+    """
+
+    def __init__(self, schema: Dict[str, Any]):
+        self.schema = schema
+        self._root = _Sequence([_compile(schema)], leading_whitespace=True)
+
+    def initial_state(self) -> tuple:
+        """State before any text has been generated"""
+        return ((self._root, self._root.start()),)
+
+    def advance(self, state: tuple, text: str) -> Optional[tuple]:
+        """
+        Feed text to the matcher
+
+        Args:
+            state: Current matcher state
+            text: Text to append
+
+        Returns:
+            The new state, or None if the text can't be part of a valid document
+        """
+        for ch in text:
+            state = self._feed(state, ch)
+            if state is None:
+                return None
+        return state
+
+    def is_complete(self, state: tuple) -> bool:
+        """Whether the text so far is a complete document (the top-level value has closed)"""
+        return len(state) == 0
+
+    def _feed(self, stack: tuple, ch: str) -> Optional[tuple]:
+        while stack:
+            node, frame = stack[-1]
+            action, value, child = node.step(frame, ch)
+            if action == _NEXT:
+                return stack[:-1] + ((node, value),)
+            if action == _DONE:
+                return self._pop_finished(stack[:-1])
+            if action == _PUSH:
+                # The child has to take the character
+                stack = stack[:-1] + ((node, value), (child, child.start()))
+                continue
+            if not node.can_end(frame):
+                return None
+            # A number (or enum prefix) ended just before this character; let the parent have it
+            stack = self._pop_finished(stack[:-1])
+        # The document is already complete
+        return None
+
+    @staticmethod
+    def _pop_finished(stack: tuple) -> tuple:
+        while stack and stack[-1][0].finished(stack[-1][1]):
+            stack = stack[:-1]
+        return stack
+
+@lru_cache(maxsize=64)
+def _cached_matcher(schema_json: str) -> JSONSchemaMatcher:
+    return JSONSchemaMatcher(json.loads(schema_json))
+
+def get_matcher(schema: Dict[str, Any]) -> JSONSchemaMatcher:
+    """
+    Get a (shared) matcher for a schema, compiling it once per process
+    """
+    return _cached_matcher(json.dumps(schema, sort_keys=False))
+
+class TokenTexts:
+    """
+    Lazily decoded text of each vocabulary token
+
+    Tokens are decoded after an anchor token so SentencePiece word-boundary
+    spaces are kept. Tokens that decode to an incomplete UTF-8 sequence (byte
+    fallback pieces of emoji and other multi-byte characters) are reported as
+    None; they are only valid inside a JSON string.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self._anchor = tokenizer.encode("a", add_special_tokens=False)[-1:]
+        self._anchor_text = tokenizer.decode(self._anchor)
+        self._texts = {}
+
+    def __getitem__(self, token: int) -> Optional[str]:
+        text = self._texts.get(token, False)
+        if text is False:
+            decoded = self.tokenizer.decode(self._anchor + [token])
+            text = decoded[len(self._anchor_text):] if decoded.startswith(self._anchor_text) else decoded
+            if "�" in text:
+                text = None
+            self._texts[token] = text
+        return text
+
+    def __len__(self) -> int:
+        return len(self.tokenizer.vocab) if hasattr(self.tokenizer, "vocab") else self.tokenizer.vocab_size
+
+class JSONLogitsProcessor:
+    """
+    mlx_lm logits processor that keeps one generation inside a JSON schema
+
+    Candidates are checked in order of likelihood and only the top ones are
+    tested, so the cost per step stays small; the whole vocabulary is only
+    scanned when none of them fit. Once the document is complete only EOS
+    tokens are allowed, which ends generation exactly when the JSON closes.
+    """
+
+    # Most likely tokens tested against the matcher on each step
+    top_k = 64
+
+    def __init__(self, matcher: JSONSchemaMatcher, token_texts: TokenTexts, eos_token_ids: Sequence[int]):
+        self.matcher = matcher
+        self.token_texts = token_texts
+        self.eos_token_ids = list(eos_token_ids)
+        self.state = matcher.initial_state()
+        self._started = False
+
+    def _accepts(self, token: int) -> bool:
+        if token in self.eos_token_ids:
+            return False
+        text = self.token_texts[token]
+        if text is None:
+            # Part of a multi-byte character: only valid inside a string
+            node, frame = self.state[-1]
+            return isinstance(node, _String) and frame[0] == _String.BODY
+        return bool(text) and self.matcher.advance(self.state, text) is not None
+
+    def _advance(self, token: int) -> None:
+        text = self.token_texts[token]
+        if text is None:
+            return
+        state = self.matcher.advance(self.state, text)
+        if state is None:
+            logger.warning(f"Constrained generation left the schema at token {token}")
+            return
+        self.state = state
+
+    def allowed_tokens(self, ranked: Sequence[int]) -> List[int]:
+        """
+        Pick the tokens allowed next
+
+        Args:
+            ranked: Candidate token IDs, most likely first
+
+        Returns:
+            Allowed token IDs
+        """
+        if self.matcher.is_complete(self.state):
+            return self.eos_token_ids
+        allowed = [t for t in ranked[:self.top_k] if self._accepts(t)]
+        if not allowed:
+            allowed = [t for t in range(len(self.token_texts)) if self._accepts(t)]
+        return allowed
+
+    def __call__(self, tokens, logits):
+        # The first call sees the prompt; later calls see the token sampled from our last mask
+        if self._started:
+            self._advance(int(tokens[-1].item()))
+        self._started = True
+
+        vocab_size = logits.shape[-1]
+        k = min(self.top_k, vocab_size)
+        ranked = mx.argpartition(-logits[0], kth=k - 1)[:k]
+        ranked = [int(t) for t in np.array(ranked)[np.argsort(-np.array(logits[0][ranked]))]]
+        allowed = [t for t in self.allowed_tokens(ranked) if t < vocab_size]
+
+        bias = np.full((vocab_size,), -np.inf, dtype=np.float32)
+        bias[allowed] = 0.0
+        return logits + mx.array(bias)[None]
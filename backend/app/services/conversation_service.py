@@ -1,13 +1,193 @@
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
 from datetime import datetime
+import os
 import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# How older turns that don't fit the context budget are handled: dropped, or
+# dropped with a digest of their first lines appended to the system prompt
+CONTEXT_POLICIES = ("drop", "compress")
+# Tokens the chat template adds around each message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Characters of each dropped message kept in the digest
+DIGEST_LINE_CHARS = 160
+# Share of the budget the digest may take
+DIGEST_SHARE = 0.2
+# Token counts and window starts remembered
+TOKEN_COUNT_CACHE_SIZE = 4096
+WINDOW_CACHE_SIZE = 1024
 
 class ConversationService:
     """Service for managing conversation history and context"""
     
-    def __init__(self):
-        """Initialize the conversation service"""
-        pass
+    def __init__(self, policy: str = None, low_watermark: float = None):
+        """
+        Initialize the conversation service
+        
+        Args:
+            policy: How older turns over the context budget are handled ("drop" or "compress")
+            low_watermark: Share of the budget the history is cut back to once it overflows
+        """
+        self.policy = policy or os.getenv("CONTEXT_POLICY", "compress")
+        if self.policy not in CONTEXT_POLICIES:
+            raise ValueError(f"Unknown context policy {self.policy!r}, expected one of {', '.join(CONTEXT_POLICIES)}")
+        self.low_watermark = low_watermark or float(os.getenv("CONTEXT_LOW_WATERMARK", "0.75"))
+        self._token_counts: "OrderedDict[str, int]" = OrderedDict()
+        # conversation ID -> index of the first history message kept last time
+        self._window_starts: "OrderedDict[int, int]" = OrderedDict()
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.tokens_saved = 0
+        # build_context runs on request and inference worker threads at once
+        self._lock = threading.Lock()
+    
+    def _count(self, text: str, count_tokens: Callable[[str], int]) -> int:
+        """
+        Tokens of a message including template overhead, cached since history is re-sent every turn
+        """
+        with self._lock:
+            tokens = self._token_counts.get(text)
+            if tokens is not None:
+                self._token_counts.move_to_end(text)
+                return tokens
+        # Tokenize outside the lock; a concurrent miss on the same text just counts it twice
+        tokens = count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+        with self._lock:
+            self._token_counts[text] = tokens
+            if len(self._token_counts) > TOKEN_COUNT_CACHE_SIZE:
+                self._token_counts.popitem(last=False)
+        return tokens
+    
+    def forget(self, conversation_id: int) -> None:
+        """
+        Drop the remembered window start of a conversation whose history was deleted or edited
+        
+        Args:
+            conversation_id: ID of the conversation
+        """
+        with self._lock:
+            self._window_starts.pop(conversation_id, None)
+    
+    def build_context(self, system_prompt: str, conversation_history: List[Dict[str, str]], query: str,
+                      count_tokens: Callable[[str], int], budget: int,
+                      conversation_id: Optional[int] = None) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Build the messages for a turn, keeping the system prompt and the most recent turns within a token budget
+        
+        When the history no longer fits, it is cut back to low_watermark of the
+        budget, starting at a user message so roles still alternate. The start
+        of the kept window is remembered per conversation and only moves when
+        the history overflows again, so consecutive turns share a prompt prefix
+        and the conversation's KV state keeps being reused in between.
+        
+        Args:
+            system_prompt: System message, including any plugin context
+            conversation_history: Previous messages, oldest first (may end with the query itself)
+            query: The user's new message
+            count_tokens: Token counter of the model's tokenizer
+            budget: Most prompt tokens allowed
+            conversation_id: Optional conversation ID the window start is remembered for
+            
+        Returns:
+            The chat messages and stats: prompt "tokens", "history_tokens", "tokens_saved",
+            "messages_kept", "messages_dropped" and the "policy" applied
+        """
+        history = [message for message in conversation_history if message["role"] != "system"]
+        # The caller may already have stored the query as the last message
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == query:
+            history.pop()
+        
+        fixed = self._count(system_prompt, count_tokens) + self._count(query, count_tokens)
+        sizes = [self._count(message["content"], count_tokens) for message in history]
+        history_tokens = sum(sizes)
+        available = max(budget - fixed, 0)
+        
+        with self._lock:
+            start = self._window_starts.get(conversation_id, 0) if conversation_id is not None else 0
+        if start > len(history) or history_tokens <= available:
+            # The whole history fits (or it shrank): nothing needs to be dropped
+            start = 0
+        if sum(sizes[start:]) > available:
+            # Cut back to the low watermark so the next turns fit without moving the window
+            target = available * self.low_watermark
+            kept = sum(sizes[start:])
+            while start < len(history) and (kept > target or history[start]["role"] != "user"):
+                kept -= sizes[start]
+                start += 1
+        if conversation_id is not None:
+            with self._lock:
+                self._window_starts[conversation_id] = start
+                self._window_starts.move_to_end(conversation_id)
+                if len(self._window_starts) > WINDOW_CACHE_SIZE:
+                    self._window_starts.popitem(last=False)
+        
+        kept_tokens = sum(sizes[start:])
+        system_content = system_prompt
+        if start and self.policy == "compress":
+            digest = self._digest(history[:start], count_tokens,
+                                  min(available - kept_tokens, int(budget * DIGEST_SHARE)))
+            if digest:
+                system_content += "\n\n" + digest
+        
+        messages = [{"role": "system", "content": system_content}]
+        messages += [{"role": message["role"], "content": message["content"]} for message in history[start:]]
+        messages.append({"role": "user", "content": query})
+        
+        tokens = self._count(system_content, count_tokens) + kept_tokens + self._count(query, count_tokens)
+        stats = {
+            "tokens": tokens,
+            "history_tokens": history_tokens,
+            "tokens_saved": max(fixed + history_tokens - tokens, 0),
+            "messages_kept": len(history) - start,
+            "messages_dropped": start,
+            "policy": self.policy if start else None
+        }
+        with self._lock:
+            self.requests += 1
+            if start:
+                self.trimmed_requests += 1
+                self.tokens_saved += stats["tokens_saved"]
+        if start:
+            logger.info(f"Context trimmed to {tokens} tokens: dropped {start} of {len(history)} messages "
+                        f"({self.policy}), saved {stats['tokens_saved']} tokens")
+        return messages, stats
+    
+    def _digest(self, dropped: List[Dict[str, str]], count_tokens: Callable[[str], int], budget: int) -> str:
+        """
+        Compress dropped messages to their first lines, newest first until the budget is spent
+        """
+        header = f"Earlier in this conversation ({len(dropped)} messages not shown):"
+        used = count_tokens(header)
+        lines = []
+        for message in reversed(dropped):
+            text = " ".join(message["content"].split())
+            if len(text) > DIGEST_LINE_CHARS:
+                text = text[:DIGEST_LINE_CHARS].rsplit(" ", 1)[0] + "..."
+            line = f"- {message['role']}: {text}"
+            tokens = count_tokens(line) + 1
+            if used + tokens > budget:
+                break
+            lines.append(line)
+            used += tokens
+        if not lines:
+            return ""
+        return "\n".join([header] + lines[::-1])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report how often the context budget trimmed a conversation and the tokens it saved
+        """
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "requests": self.requests,
+                "trimmed_requests": self.trimmed_requests,
+                "tokens_saved": self.tokens_saved
+            }
     
     def format_conversation_for_llm(self, conversation_history: List[Dict[str, Any]], 
                                    system_prompt: str = None) -> List[Dict[str, str]]:
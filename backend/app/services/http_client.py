@@ -0,0 +1,241 @@
+"""
+Async HTTP client with a shared keep-alive connection pool, for calling external APIs
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# httpx gives a native async client (with HTTP/2 when h2 is installed);
+# without it requests are made through a pooled requests.Session on worker threads
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = HTTPX_AVAILABLE
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+class HTTPResponse:
+    """The parts of a response callers need, whichever library made the request"""
+
+    def __init__(self, status_code: int, headers: Dict[str, str], content: bytes, http_version: str):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.http_version = http_version
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+class _RateLimiter:
+    """Token bucket allowing rate requests per second with bursts of up to burst requests"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class AsyncHTTPClient:
+    """
+    Pooled async HTTP client with per-host connection limits and retries
+
+    Connections are kept alive and shared by every request, so repeated calls
+    to the same API skip the TCP and TLS handshakes. At most
+    max_connections_per_host requests run against one host at a time; the
+    rest wait for a free connection. With rate_limit_per_host set, requests to
+    one host are also spaced to that many per second. Connection errors, timeouts and
+    RETRY_STATUSES are retried with exponential backoff and full jitter.
+
+    Args:
+        timeout: Seconds to wait for a response (read timeout)
+        connect_timeout: Seconds to wait for a connection
+        max_connections_per_host: Concurrent requests (and pooled connections) per host
+        retries: Extra attempts after the first one fails
+        backoff: Base delay in seconds; attempt n waits up to backoff * 2**n
+        max_backoff: Cap on a single retry delay
+        rate_limit_per_host: Requests per second allowed to one host (0 for no limit)
+        rate_burst: Requests that may go out back to back before the rate limit applies
+    """
+
+    def __init__(self, timeout: float = None, connect_timeout: float = None,
+                 max_connections_per_host: int = None, retries: int = None,
+                 backoff: float = None, max_backoff: float = 5.0,
+                 rate_limit_per_host: float = None, rate_burst: int = None):
+        self.timeout = timeout if timeout is not None else float(os.getenv("HTTP_TIMEOUT", "5"))
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+        self.max_connections_per_host = max_connections_per_host or int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+        self.retries = retries if retries is not None else int(os.getenv("HTTP_RETRIES", "2"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("HTTP_BACKOFF", "0.2"))
+        self.max_backoff = max_backoff
+        self.rate_limit_per_host = rate_limit_per_host if rate_limit_per_host is not None else float(os.getenv("HTTP_RATE_LIMIT_PER_HOST", "0"))
+        self.rate_burst = rate_burst or int(os.getenv("HTTP_RATE_BURST", "0")) or max(1, int(self.rate_limit_per_host))
+
+        # Blocking fallback: one session, one pool per host
+        self._session = None
+        if not HTTPX_AVAILABLE:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.max_connections_per_host)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+
+        # The httpx client and the per-host semaphores belong to one event loop
+        self._loop = None
+        self._client = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._rate_limits: Dict[str, _RateLimiter] = {}
+
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+        logger.info(f"HTTP client using {'httpx' if HTTPX_AVAILABLE else 'requests'}"
+                    f"{' with HTTP/2' if HTTP2_AVAILABLE else ''}, "
+                    f"{self.max_connections_per_host} connections per host")
+
+    def _bind(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._discard_client()
+        self._loop = loop
+        self._host_limits = {}
+        self._rate_limits = {}
+        if HTTPX_AVAILABLE:
+            # A client left over from another loop can't be reused
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_keepalive_connections=self.max_connections_per_host * 4,
+                                    max_connections=None)
+            )
+
+    def _discard_client(self) -> None:
+        """
+        Close the httpx client of the loop being left, so its connection pool isn't leaked
+
+        The client can only be closed on its own loop. If that loop has already
+        been closed, its sockets can't be shut down cleanly any more; callers
+        that run a short-lived loop should call aclose() before it ends.
+        """
+        client, loop = self._client, self._loop
+        self._client = None
+        if client is None:
+            return
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            logger.warning("HTTP client rebound after its event loop closed; call aclose() before the loop ends")
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.max_connections_per_host)
+        return limit
+
+    async def _throttle(self, url: str) -> None:
+        if self.rate_limit_per_host <= 0:
+            return
+        host = urlsplit(url).netloc
+        limiter = self._rate_limits.get(host)
+        if limiter is None:
+            limiter = self._rate_limits[host] = _RateLimiter(self.rate_limit_per_host, self.rate_burst)
+        await limiter.acquire()
+
+    async def get(self, url: str, headers: Dict[str, str] = None) -> HTTPResponse:
+        """
+        GET a URL, retrying transient failures
+
+        Args:
+            url: Absolute URL to fetch
+            headers: Optional request headers
+
+        Returns:
+            The response (which may still have a non-2xx status once retries run out)
+
+        Raises:
+            Exception: The last connection error or timeout if every attempt failed
+        """
+        self._bind()
+        for attempt in range(self.retries + 1):
+            self.stats["requests"] += 1
+            try:
+                await self._throttle(url)
+                # Hold a connection slot only while the request is in flight, not during backoff
+                async with self._host_limit(url):
+                    response = await self._send(url, headers)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                delay = self._retry_after(response) or self._delay(attempt)
+                logger.warning(f"GET {url} returned {response.status_code}, retrying in {delay:.2f}s")
+            except Exception as e:
+                if attempt == self.retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._delay(attempt)
+                logger.warning(f"GET {url} failed ({str(e)}), retrying in {delay:.2f}s")
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    async def _send(self, url: str, headers: Optional[Dict[str, str]]) -> HTTPResponse:
+        if HTTPX_AVAILABLE:
+            response = await self._client.get(url, headers=headers)
+            return HTTPResponse(response.status_code, dict(response.headers), response.content, response.http_version)
+
+        response = await asyncio.to_thread(self._session.get, url, headers=headers,
+                                           timeout=(self.connect_timeout, self.timeout))
+        return HTTPResponse(response.status_code, dict(response.headers), response.content, "HTTP/1.1")
+
+    def _delay(self, attempt: int) -> float:
+        # Full jitter keeps clients that failed together from retrying together
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _retry_after(self, response: HTTPResponse) -> Optional[float]:
+        value = response.headers.get("Retry-After") or response.headers.get("retry-after")
+        try:
+            return min(self.max_backoff, float(value)) if value is not None else None
+        except ValueError:
+            return None
+
+    async def aclose(self) -> None:
+        """
+        Close pooled connections
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+        if self._session is not None:
+            self._session.close()
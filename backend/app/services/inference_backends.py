@@ -0,0 +1,883 @@
+"""
+Inference backends used by the AI service
+
+Every backend loads a model into a ModelHandle for the model registry and
+turns chat messages into a GenerationRequest. The MLX and mock backends decode
+in-process through the continuous-batching GenerationScheduler; the Ollama
+backend streams completions from an Ollama server over pooled HTTP connections.
+"""
+import os
+import json
+import logging
+import time
+import queue
+import random
+import asyncio
+import threading
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Iterator, Union
+import requests
+from requests.adapters import HTTPAdapter
+from .constrained_decoding import JSONLogitsProcessor, TokenTexts, get_matcher
+from .kv_cache import PrefixCache, session_cache
+from .model_registry import ModelHandle, ModelRegistry
+
+# Try to import MLX libraries, but provide fallbacks if not available
+USE_MLX = False
+try:
+    import mlx.core as mx
+    import mlx.nn as nn
+    from mlx.utils import tree_flatten
+    from mlx_lm import load
+    from mlx_lm.generate import BatchGenerator
+    from mlx_lm.sample_utils import make_sampler
+    from mlx_lm.models.cache import make_prompt_cache, can_trim_prompt_cache, trim_prompt_cache
+    USE_MLX = True
+except ImportError:
+    logging.warning("MLX libraries not available. Using mock implementation for demo.")
+
+logger = logging.getLogger(__name__)
+
+# Canned answers used by the mock implementation when MLX is not available
+MOCK_CYBERSECURITY_RESPONSES = [
+    "The most common cybersecurity threats include phishing attacks, malware, ransomware, and social engineering. To protect yourself, use strong passwords, enable two-factor authentication, keep software updated, and be cautious of suspicious emails and links.",
+    "Zero-day vulnerabilities are security flaws that are unknown to the software vendor and don't have patches available. They're particularly dangerous because attackers can exploit them before developers can create and distribute a fix.",
+    "To secure your home network, change default router passwords, use WPA3 encryption if available, create a guest network for visitors, keep firmware updated, and consider using a VPN for additional privacy.",
+    "Ransomware is malicious software that encrypts your files and demands payment for the decryption key. The best protection is maintaining regular backups, using security software, keeping systems updated, and training users to recognize phishing attempts.",
+    "Multi-factor authentication (MFA) adds an essential layer of security by requiring multiple forms of verification before granting access. Even if your password is compromised, attackers would still need access to your secondary authentication method."
+]
+
+# Greetings that get a canned hello from the mock implementation
+MOCK_GREETINGS = ["hi", "hello", "hey"]
+
+def _mock_completion(prompt: str) -> str:
+    """
+    Pick a canned completion for a prompt rendered by the mock tokenizer
+    """
+    lines = prompt.strip().splitlines() if isinstance(prompt, str) else []
+    # The mock chat template renders one "role: content" line per message
+    last_message = lines[-1].split(": ", 1)[-1] if lines else ""
+    if last_message.strip().lower() in MOCK_GREETINGS:
+        return "Hello! I'm your cybersecurity assistant. How can I help you with your cybersecurity questions today?"
+    return random.choice(MOCK_CYBERSECURITY_RESPONSES)
+
+class GenerationRequest:
+    """A single generation submitted to an inference backend"""
+
+    _END = object()
+
+    def __init__(self, prompt: Union[str, List[int]], max_tokens: int, temperature: float,
+                 prefix: Union[str, List[int]] = None, session_id: Optional[int] = None,
+                 logits_processors: Optional[List[Any]] = None):
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.prefix = prefix
+        self.session_id = session_id
+        self.logits_processors = logits_processors
+
+        self.submitted_at = time.time()
+        self.first_token_at = None
+        self.finished_at = None
+        self.num_tokens = 0
+        self.error = None
+        self.cancelled = False
+
+        self._parts = []
+        self._chunks = queue.Queue()
+        self._done = threading.Event()
+        # Called from the producing thread after every chunk and when the request retires
+        self._listeners: List[Callable[[], None]] = []
+        self._done_callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        """Seconds between submission and the first generated token"""
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.submitted_at
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Decode rate of this request after its first token"""
+        if self.finished_at is None or self.first_token_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return self.num_tokens / elapsed if elapsed > 0 else None
+
+    def _deliver(self, text: str, now: float) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = now
+        self.num_tokens += 1
+        if text:
+            self._parts.append(text)
+            self._chunks.put(text)
+            self._notify()
+
+    def _finish(self, now: float, error: Exception = None) -> None:
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.finished_at = now
+            self.error = error
+            self._chunks.put(self._END)
+            self._done.set()
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        self._notify()
+        for callback in callbacks:
+            callback()
+
+    def _notify(self) -> None:
+        for listener in tuple(self._listeners):
+            listener()
+
+    def add_done_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Call callback once the request has retired (finished, failed or cancelled)
+
+        The callback runs on the thread that retires the request, or right away
+        if it already has.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._done_callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self) -> None:
+        """Ask the scheduler to retire this request at the next decode step"""
+        self.cancelled = True
+
+    def __iter__(self) -> Iterator[str]:
+        """Block and yield text chunks as the scheduler produces them"""
+        while True:
+            chunk = self._chunks.get()
+            if chunk is self._END:
+                break
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        """Yield text chunks on the event loop as they are produced, without blocking a thread"""
+        return self._stream_async()
+
+    async def _stream_async(self) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wake() -> None:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # The event loop has already shut down; nobody is listening
+                pass
+
+        self._listeners.append(wake)
+        try:
+            while True:
+                try:
+                    chunk = self._chunks.get_nowait()
+                except queue.Empty:
+                    # A chunk arriving now sets the event after this clear runs
+                    ready.clear()
+                    await ready.wait()
+                    continue
+                if chunk is self._END:
+                    break
+                yield chunk
+        finally:
+            self._listeners.remove(wake)
+        if self.error is not None:
+            raise self.error
+
+    def result(self, timeout: float = None) -> str:
+        """Block until the request is retired and return the full text"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for generation to finish")
+        if self.error is not None:
+            raise self.error
+        return "".join(self._parts)
+
+class _MLXBatchEngine:
+    """Decodes admitted requests together with mlx_lm's BatchGenerator"""
+
+    # Prefill chunk size when building prefix snapshots
+    prefill_step_size = 2048
+
+    def __init__(self, model, tokenizer, max_batch_size: int, session_owner: Any = None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.prefix_cache = PrefixCache()
+        self.session_cache = session_cache
+        # Conversation KV state is only valid for the model that produced it
+        self.session_owner = session_owner
+        self.generator = BatchGenerator(
+            model,
+            stop_tokens=[[t] for t in tokenizer.eos_token_ids],
+            completion_batch_size=max_batch_size,
+            prefill_batch_size=max_batch_size
+        )
+        # uid -> request state (request, detokenizer, prompt+generated tokens, session epoch)
+        self._active = {}
+        self._token_texts = None
+
+    @property
+    def token_texts(self) -> TokenTexts:
+        """Decoded vocabulary used by constrained decoding, built on first use"""
+        if self._token_texts is None:
+            self._token_texts = TokenTexts(self.tokenizer)
+        return self._token_texts
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def _encode(self, prompt: Union[str, List[int]]) -> List[int]:
+        if not isinstance(prompt, str):
+            return list(prompt)
+        bos_token = self.tokenizer.bos_token
+        add_special_tokens = bos_token is None or not prompt.startswith(bos_token)
+        return self.tokenizer.encode(prompt, add_special_tokens=add_special_tokens)
+
+    def _prefill(self, tokens: List[int]) -> List[Any]:
+        cache = make_prompt_cache(self.model)
+        for start in range(0, len(tokens), self.prefill_step_size):
+            self.model(mx.array(tokens[start:start + self.prefill_step_size])[None], cache=cache)
+            mx.eval([c.state for c in cache])
+        return cache
+
+    def _resume_session(self, request: GenerationRequest, tokens: List[int], state: Dict[str, Any]) -> tuple:
+        """
+        Reuse a conversation's KV state from its previous turn, if any
+        """
+        state["epoch"], cached_tokens, cache = self.session_cache.checkout(request.session_id, self.session_owner)
+        if cache is None:
+            return None, tokens
+        # Keep the longest common prefix; always leave one token to prefill
+        common = 0
+        limit = min(len(cached_tokens), len(tokens) - 1)
+        while common < limit and cached_tokens[common] == tokens[common]:
+            common += 1
+        stale = len(cached_tokens) - common
+        if common == 0 or (stale and not can_trim_prompt_cache(cache)):
+            return None, tokens
+        if stale:
+            trim_prompt_cache(cache, stale)
+        return cache, tokens[common:]
+
+    def _prepare(self, request: GenerationRequest, state: Dict[str, Any]) -> tuple:
+        """
+        Split a request into a starting KV cache and the tokens left to prefill
+        """
+        tokens = self._encode(request.prompt)
+        state["tokens"] = tokens
+        if request.session_id is not None:
+            cache, remaining = self._resume_session(request, tokens, state)
+            if cache is not None:
+                return cache, remaining
+        if request.prefix is None:
+            return None, tokens
+        prefix = self._encode(request.prefix)
+        # Only reuse the snapshot when the template really renders the prefix
+        # first and there is at least one token left to prefill
+        if len(prefix) >= len(tokens) or tokens[:len(prefix)] != prefix:
+            return None, tokens
+        return self.prefix_cache.fork(prefix, self._prefill), tokens[len(prefix):]
+
+    def admit(self, requests: List[GenerationRequest]) -> None:
+        states = [{"epoch": None} for _ in requests]
+        caches, prompts = zip(*[self._prepare(r, state) for r, state in zip(requests, states)])
+        uids = self.generator.insert(
+            list(prompts),
+            max_tokens=[r.max_tokens for r in requests],
+            caches=list(caches),
+            samplers=[make_sampler(temp=r.temperature) for r in requests],
+            logits_processors=[r.logits_processors or [] for r in requests]
+        )
+        for uid, request, state in zip(uids, requests, states):
+            state["request"] = request
+            state["detokenizer"] = self.tokenizer.detokenizer
+            self._active[uid] = state
+
+    def _store_session(self, state: Dict[str, Any], cache: List[Any]) -> None:
+        """
+        Keep the KV state of a finished conversation turn for the next one
+        """
+        # The cache covers the prompt and however many generated tokens were fed back
+        offset = getattr(cache[0], "offset", None) if cache else None
+        if offset is None or offset > len(state["tokens"]):
+            return
+        self.session_cache.store(state["request"].session_id, state["epoch"],
+                                 state["tokens"][:offset], cache, self.session_owner)
+
+    def step(self) -> List[tuple]:
+        events = []
+        for response in self.generator.next_generated():
+            state = self._active[response.uid]
+            request, detokenizer = state["request"], state["detokenizer"]
+            state["tokens"].append(response.token)
+            if response.finish_reason != "stop":
+                detokenizer.add_token(response.token)
+            finished = response.finish_reason is not None
+            if finished:
+                detokenizer.finalize()
+                del self._active[response.uid]
+                if request.session_id is not None:
+                    self._store_session(state, response.prompt_cache)
+            events.append((request, detokenizer.last_segment, finished))
+        return events
+
+    def remove(self, requests: List[GenerationRequest]) -> None:
+        uids = [uid for uid, state in self._active.items() if state["request"] in requests]
+        self.generator.remove(uids)
+        for uid in uids:
+            del self._active[uid]
+
+class _MockBatchEngine:
+    """Simulates batched decoding by emitting one word per active request per step"""
+
+    # Time one batched decode step takes, independent of batch size
+    step_delay = 0.05
+
+    def __init__(self):
+        # Each entry is [request, remaining words, words emitted]
+        self._active = []
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def admit(self, requests: List[GenerationRequest]) -> None:
+        for request in requests:
+            self._active.append([request, _mock_completion(request.prompt).split(), 0])
+
+    def step(self) -> List[tuple]:
+        time.sleep(self.step_delay)
+        events = []
+        for entry in self._active:
+            request, words, emitted = entry
+            prefix = " " if emitted > 0 else ""
+            entry[2] += 1
+            finished = entry[2] >= len(words) or entry[2] >= request.max_tokens
+            events.append((request, prefix + words[emitted], finished))
+        self._active = [entry for entry in self._active if entry[2] < len(entry[1]) and entry[2] < entry[0].max_tokens]
+        return events
+
+    def remove(self, requests: List[GenerationRequest]) -> None:
+        self._active = [entry for entry in self._active if entry[0] not in requests]
+
+class GenerationScheduler:
+    """
+    Continuous-batching scheduler shared by every generation path
+
+    A single background thread owns the decode batch. Each iteration admits
+    newly submitted requests into the running batch, runs one decode step for
+    all active requests and retires the ones that finished, so concurrent
+    users share decode steps instead of queueing for full sequential decodes.
+    """
+
+    def __init__(self, engine, max_batch_size: int):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._completed_requests = 0
+        self._generated_tokens = 0
+        self._decode_time = 0.0
+        self._total_ttft = 0.0
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: Union[str, List[int]], max_tokens: int, temperature: float,
+               prefix: Union[str, List[int]] = None, session_id: Optional[int] = None,
+               logits_processors: Optional[List[Any]] = None) -> GenerationRequest:
+        """
+        Queue a prompt for generation
+
+        Args:
+            prompt: Chat-templated prompt text or token IDs
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+            prefix: Optional shared leading part of the prompt whose KV state can be reused
+            session_id: Optional conversation ID whose KV state carries over between turns
+            logits_processors: Optional mlx_lm logits processors applied to this request only
+
+        Returns:
+            The GenerationRequest to iterate over or wait on
+        """
+        if self._closed:
+            raise RuntimeError("Generation scheduler has been closed")
+        request = GenerationRequest(prompt, max_tokens, temperature, prefix, session_id, logits_processors)
+        self._pending.put(request)
+        return request
+
+    def close(self) -> None:
+        """
+        Stop the decode thread and fail any request that has not finished
+        """
+        self._closed = True
+        # Wake the thread if it is waiting for work
+        self._pending.put(None)
+
+    def _admit(self) -> None:
+        admitted = []
+        # Block only when there is nothing to decode
+        if len(self.engine) == 0:
+            admitted.append(self._pending.get())
+        while len(self.engine) + len(admitted) < self.max_batch_size:
+            try:
+                admitted.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        for request in admitted:
+            # Requests cancelled while queued retire without being decoded
+            if request is not None and request.cancelled:
+                request._finish(time.time())
+        admitted = [r for r in admitted if r is not None and not r.cancelled]
+        if not admitted:
+            return
+        try:
+            self.engine.admit(admitted)
+        except Exception as e:
+            # Preparing a prompt failed (tokenizing, schema, prefix fork): fail the
+            # requests being admitted and keep decoding the ones already running
+            logger.error(f"Error admitting requests to the decode batch: {str(e)}")
+            try:
+                self.engine.remove(admitted)
+            except Exception:
+                pass
+            for request in admitted:
+                request._finish(time.time(), RuntimeError(f"Generation failed: {str(e)}"))
+            return
+        self._active.update(admitted)
+
+    def _run(self) -> None:
+        self._active = set()
+        while not self._closed:
+            try:
+                self._admit()
+
+                cancelled = [r for r in self._active if r.cancelled]
+                if cancelled:
+                    self.engine.remove(cancelled)
+                    for request in cancelled:
+                        self._active.discard(request)
+                        request._finish(time.time())
+
+                if len(self.engine) == 0:
+                    continue
+
+                start = time.time()
+                events = self.engine.step()
+                now = time.time()
+
+                with self._lock:
+                    self._decode_time += now - start
+                    self._generated_tokens += len(events)
+
+                for request, text, finished in events:
+                    request._deliver(text, now)
+                    if finished:
+                        self._active.discard(request)
+                        request._finish(now)
+                        with self._lock:
+                            self._completed_requests += 1
+                            self._total_ttft += request.time_to_first_token
+            except Exception as e:
+                logger.error(f"Error in generation scheduler: {str(e)}")
+                failed = list(self._active)
+                self.engine.remove(failed)
+                self._active.clear()
+                for request in failed:
+                    request._finish(time.time(), RuntimeError(f"Generation failed: {str(e)}"))
+
+        # Closed: fail whatever is still active or waiting
+        unfinished = list(self._active)
+        while not self._pending.empty():
+            request = self._pending.get_nowait()
+            if request is not None:
+                unfinished.append(request)
+        for request in unfinished:
+            request._finish(time.time(), RuntimeError("Generation scheduler has been closed"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report aggregate throughput and latency for the scheduler
+
+        Returns:
+            Dict with batch occupancy, token throughput and mean time-to-first-token
+        """
+        prefix_cache = getattr(self.engine, "prefix_cache", None)
+        session_cache = getattr(self.engine, "session_cache", None)
+        with self._lock:
+            return {
+                "prefix_cache": prefix_cache.get_stats() if prefix_cache else None,
+                "session_cache": session_cache.get_stats() if session_cache else None,
+                "active_requests": len(self.engine),
+                "queued_requests": self._pending.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "completed_requests": self._completed_requests,
+                "generated_tokens": self._generated_tokens,
+                "tokens_per_second": self._generated_tokens / self._decode_time if self._decode_time > 0 else 0.0,
+                "avg_time_to_first_token": self._total_ttft / self._completed_requests if self._completed_requests else None
+            }
+
+class InferenceBackend:
+    """
+    Interface every inference backend implements
+
+    The AI service only talks to a backend through these methods, so the same
+    prompts, history handling and metadata work whatever runs the model.
+    """
+
+    name = None
+
+    def load(self, repo: str, quantization: Optional[str], config: Dict[str, Any]) -> ModelHandle:
+        """
+        Load a model for the model registry
+
+        Args:
+            repo: Model repository, local path or model name
+            quantization: Optional quantization to apply (e.g. "4bit", "8bit")
+            config: Model config overrides
+
+        Returns:
+            ModelHandle owning the loaded model
+        """
+        raise NotImplementedError
+
+    def submit(self, handle: ModelHandle, messages: List[Dict[str, str]], max_tokens: int,
+               temperature: float, session_id: Optional[int] = None,
+               schema: Optional[Dict[str, Any]] = None) -> GenerationRequest:
+        """
+        Start generating the assistant reply to a chat
+
+        Args:
+            handle: Handle returned by load()
+            messages: Chat messages (system, history and user) to respond to
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+            session_id: Optional conversation ID whose state carries over between turns
+            schema: Optional JSON schema the reply must match; generation stops when the JSON closes
+
+        Returns:
+            The GenerationRequest to iterate over or wait on
+        """
+        raise NotImplementedError
+
+    def get_stats(self, handle: ModelHandle) -> Dict[str, Any]:
+        """
+        Report throughput and latency for a loaded model
+        """
+        raise NotImplementedError
+
+class _ScheduledBackend(InferenceBackend):
+    """Backend that decodes in-process through a GenerationScheduler"""
+
+    # Two different user turns rendered after the system message; the templated
+    # prompt is shared across queries up to the point where these diverge
+    prefix_probes = ("A", "B")
+    # Shared prefixes shorter than this (in template elements) aren't worth a snapshot
+    min_prefix_length = 8
+
+    def __init__(self, max_batch_size: int):
+        self.max_batch_size = max_batch_size
+        self._warned_trivial_prefix = False
+
+    def _system_prefix(self, tokenizer, messages: List[Dict[str, str]]) -> Optional[Union[str, List[int]]]:
+        """
+        Find the part of a chat's templated prompt that is shared across requests
+
+        The system preamble plus plugin context is identical for every query that
+        uses it, so the scheduler reuses its prefilled KV state instead of encoding
+        it again. Rendering the system message on its own isn't enough: templates
+        such as Mistral's inline it into the last [INST] block, so it renders as a
+        bare BOS. Instead the system message is templated with two different user
+        turns and the longest common prefix of the two renders is used, which is
+        exactly the part no query can change.
+
+        Args:
+            tokenizer: Tokenizer of the model that will run the chat
+            messages: Chat messages about to be sent to the model
+
+        Returns:
+            The shared templated prefix (token IDs or text, like the template's
+            output), or None if the chat has no system message or the prefix is trivial
+        """
+        if not messages or messages[0]["role"] != "system":
+            return None
+        first, second = [tokenizer.apply_chat_template([messages[0], {"role": "user", "content": probe}],
+                                                       add_generation_prompt=True)
+                         for probe in self.prefix_probes]
+        common = 0
+        limit = min(len(first), len(second))
+        while common < limit and first[common] == second[common]:
+            common += 1
+        # Leave out the last shared element: a query's first characters could merge into it
+        common -= 1
+        if common < self.min_prefix_length:
+            if not self._warned_trivial_prefix:
+                self._warned_trivial_prefix = True
+                logger.warning(f"The chat template shares only {common} leading elements between prompts "
+                               "with the same system message; prefix KV caching is disabled")
+            return None
+        return first[:common]
+
+    def _logits_processors(self, handle: ModelHandle, schema: Optional[Dict[str, Any]]) -> Optional[List[Any]]:
+        """Logits processors that enforce a schema, or None if the backend can't constrain decoding"""
+        return None
+
+    def submit(self, handle: ModelHandle, messages: List[Dict[str, str]], max_tokens: int,
+               temperature: float, session_id: Optional[int] = None,
+               schema: Optional[Dict[str, Any]] = None) -> GenerationRequest:
+        # Apply chat template to format the prompt correctly for the model
+        prompt = handle.tokenizer.apply_chat_template(
+            messages,
+            add_generation_prompt=True
+        )
+        # Generate in the shared decode batch
+        return handle.scheduler.submit(prompt, max_tokens, temperature,
+                                       prefix=self._system_prefix(handle.tokenizer, messages),
+                                       session_id=session_id,
+                                       logits_processors=self._logits_processors(handle, schema))
+
+    def get_stats(self, handle: ModelHandle) -> Dict[str, Any]:
+        return handle.scheduler.get_stats()
+
+class MLXBackend(_ScheduledBackend):
+    """Runs the model in-process with Apple's MLX framework"""
+
+    name = "mlx"
+
+    def load(self, repo: str, quantization: Optional[str], config: Dict[str, Any]) -> ModelHandle:
+        model, tokenizer, model_config = load(repo, model_config=config, return_config=True)
+        # Pre-quantized checkpoints already carry their quantization
+        if quantization and "quantization" not in model_config:
+            nn.quantize(model, group_size=64, bits=int(quantization.rstrip("bit")))
+        nbytes = sum(v.nbytes for _, v in tree_flatten(model.parameters()))
+        engine = _MLXBatchEngine(model, tokenizer, self.max_batch_size,
+                                 session_owner=ModelRegistry.make_key(repo, quantization, config))
+        # All generation paths share one continuous-batching scheduler per model
+        return ModelHandle(model, tokenizer, GenerationScheduler(engine, self.max_batch_size), nbytes)
+
+    def _logits_processors(self, handle: ModelHandle, schema: Optional[Dict[str, Any]]) -> Optional[List[Any]]:
+        if schema is None:
+            return None
+        # Mask logits against the schema; each request gets its own matcher state
+        return [JSONLogitsProcessor(get_matcher(schema), handle.scheduler.engine.token_texts,
+                                    handle.tokenizer.eos_token_ids)]
+
+class MockBackend(_ScheduledBackend):
+    """Canned responses for demos and for hosts without a model"""
+
+    name = "mock"
+
+    # Simulated model load time in seconds
+    load_delay = 1.0
+
+    def load(self, repo: str, quantization: Optional[str], config: Dict[str, Any]) -> ModelHandle:
+        tokenizer = type('MockTokenizer', (), {
+            'apply_chat_template': lambda self, messages, add_generation_prompt=False:
+                "\n".join([f"{m['role']}: {m['content']}" for m in messages])
+        })()
+        time.sleep(self.load_delay)  # Simulate loading time
+        return ModelHandle("mock_model", tokenizer, GenerationScheduler(_MockBatchEngine(), self.max_batch_size))
+
+class OllamaBackend(InferenceBackend):
+    """
+    Streams completions from an Ollama server
+
+    Requests go through one pooled requests.Session so concurrent generations
+    reuse keep-alive connections instead of opening one per call. The model is
+    pinned in the server's memory with keep_alive when it is loaded and on every
+    request, so it is not swapped out between queries.
+    """
+
+    name = "ollama"
+
+    def __init__(self, host: str = None, keep_alive: str = None, pool_size: int = None, timeout: float = None):
+        self.ollama_host = (host or os.getenv("OLLAMA_HOST", "http://localhost:11434")).rstrip("/")
+        # Ollama durations ("5m", "24h") or seconds; a negative value keeps the model loaded indefinitely
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+        self.pool_size = pool_size or int(os.getenv("OLLAMA_POOL_SIZE", "16"))
+        self.timeout = timeout or float(os.getenv("OLLAMA_TIMEOUT", "300"))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._completed_requests = 0
+        self._generated_tokens = 0
+        self._decode_time = 0.0
+        self._total_ttft = 0.0
+        self._active_requests = 0
+
+    def _keep_alive_value(self) -> Union[str, int]:
+        # Plain numbers are seconds, anything else is passed through as a duration string
+        try:
+            return int(self.keep_alive)
+        except ValueError:
+            return self.keep_alive
+
+    def load(self, repo: str, quantization: Optional[str], config: Dict[str, Any]) -> ModelHandle:
+        response = self.session.get(f"{self.ollama_host}/api/tags", timeout=self.timeout)
+        response.raise_for_status()
+        available = [m.get("name") for m in response.json().get("models", [])]
+        if repo not in available and f"{repo}:latest" not in available:
+            raise RuntimeError(f"Model {repo} is not available on {self.ollama_host} (found: {', '.join(available) or 'none'})")
+
+        # An empty prompt loads the model and pins it in memory
+        response = self.session.post(
+            f"{self.ollama_host}/api/generate",
+            json={"model": repo, "keep_alive": self._keep_alive_value(), "options": config or {}},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return ModelHandle(repo, None)
+
+    def submit(self, handle: ModelHandle, messages: List[Dict[str, str]], max_tokens: int,
+               temperature: float, session_id: Optional[int] = None,
+               schema: Optional[Dict[str, Any]] = None) -> GenerationRequest:
+        payload = {
+            "model": handle.model,
+            "messages": messages,
+            "stream": True,
+            "keep_alive": self._keep_alive_value(),
+            "options": {"temperature": temperature, "num_predict": max_tokens}
+        }
+        if schema is not None:
+            # Ollama constrains decoding to the schema itself
+            payload["format"] = schema
+        return self._start(messages, max_tokens, temperature, "/api/chat", payload)
+
+    def submit_prompt(self, handle: ModelHandle, prompt: str, max_tokens: int, temperature: float,
+                      system: Optional[str] = None, raw: bool = False,
+                      schema: Optional[Dict[str, Any]] = None) -> GenerationRequest:
+        """
+        Start a plain completion of a prompt with /api/generate
+
+        Args:
+            handle: Handle returned by load()
+            prompt: Prompt to complete
+            max_tokens: Maximum number of tokens to generate
+            temperature: Sampling temperature
+            system: Optional system message overriding the Modelfile's
+            raw: Send the prompt as-is, without the model's prompt template
+            schema: Optional JSON schema the completion must match
+
+        Returns:
+            The GenerationRequest to iterate over or wait on
+        """
+        payload = {
+            "model": handle.model,
+            "prompt": prompt,
+            "stream": True,
+            "raw": raw,
+            "keep_alive": self._keep_alive_value(),
+            "options": {"temperature": temperature, "num_predict": max_tokens}
+        }
+        if system is not None:
+            payload["system"] = system
+        if schema is not None:
+            payload["format"] = schema
+        return self._start(prompt, max_tokens, temperature, "/api/generate", payload)
+
+    def _start(self, prompt: Any, max_tokens: int, temperature: float, path: str,
+               payload: Dict[str, Any]) -> GenerationRequest:
+        request = GenerationRequest(prompt, max_tokens, temperature)
+        with self._lock:
+            self._active_requests += 1
+        thread = threading.Thread(target=self._stream, args=(request, path, payload),
+                                  name="ollama-stream", daemon=True)
+        thread.start()
+        return request
+
+    def _stream(self, request: GenerationRequest, path: str, payload: Dict[str, Any]) -> None:
+        """
+        Read a streamed NDJSON completion and hand its chunks to the request
+        """
+        error = None
+        final = {}
+        try:
+            with self.session.post(f"{self.ollama_host}{path}", json=payload,
+                                   stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if request.cancelled:
+                        # Closing the response drops the connection and stops the server generating
+                        break
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise RuntimeError(f"Ollama error: {chunk['error']}")
+                    # /api/chat streams message.content, /api/generate streams response
+                    text = chunk["message"].get("content", "") if "message" in chunk else chunk.get("response", "")
+                    if text:
+                        request._deliver(text, time.time())
+                    # Keep reading to the end of the body so the connection goes back to the pool
+                    if chunk.get("done"):
+                        final = chunk
+        except Exception as e:
+            logger.error(f"Error streaming from Ollama: {str(e)}")
+            error = RuntimeError(f"Generation failed: {str(e)}")
+
+        # Prefer the server's own token count over the number of streamed chunks
+        if final.get("eval_count"):
+            request.num_tokens = final["eval_count"]
+        request._finish(time.time(), error)
+
+        with self._lock:
+            self._active_requests -= 1
+            if error is None and not request.cancelled and request.first_token_at is not None:
+                self._completed_requests += 1
+                self._generated_tokens += request.num_tokens
+                self._decode_time += request.finished_at - request.first_token_at
+                self._total_ttft += request.time_to_first_token
+
+    def get_stats(self, handle: ModelHandle) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prefix_cache": None,
+                "session_cache": None,
+                "active_requests": self._active_requests,
+                "queued_requests": 0,
+                "max_batch_size": self.pool_size,
+                "completed_requests": self._completed_requests,
+                "generated_tokens": self._generated_tokens,
+                "tokens_per_second": self._generated_tokens / self._decode_time if self._decode_time > 0 else 0.0,
+                "avg_time_to_first_token": self._total_ttft / self._completed_requests if self._completed_requests else None
+            }
+
+# Backends selectable with the AI_BACKEND environment variable
+BACKENDS = {
+    MLXBackend.name: MLXBackend,
+    MockBackend.name: MockBackend,
+    OllamaBackend.name: OllamaBackend
+}
+
+def create_backend(name: Optional[str] = None, max_batch_size: int = 8) -> InferenceBackend:
+    """
+    Create the inference backend named by AI_BACKEND
+
+    Args:
+        name: Backend name ("mlx", "ollama" or "mock"); defaults to AI_BACKEND,
+              then to MLX when it is available and the mock otherwise
+        max_batch_size: Decode batch size for in-process backends
+
+    Returns:
+        The configured InferenceBackend
+    """
+    name = (name or os.getenv("AI_BACKEND") or ("mlx" if USE_MLX else "mock")).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown AI backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    if name == "mlx" and not USE_MLX:
+        logger.warning("AI_BACKEND=mlx but MLX is not available. Using mock implementation for demo.")
+        name = "mock"
+    if name == "ollama":
+        return OllamaBackend()
+    return BACKENDS[name](max_batch_size)
@@ -0,0 +1,124 @@
+"""
+Inference executor for running blocking AI generation off the event loop
+"""
+import os
+import asyncio
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a bridged stream
+_END_OF_STREAM = object()
+
+class InferenceExecutor:
+    """Runs AIService generation on worker threads and bridges results back to asyncio"""
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or int(os.getenv("INFERENCE_WORKERS", "4"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="inference"
+        )
+
+        logger.info(f"Inference executor initialized with {self.max_workers} worker threads")
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking call on a worker thread and await its result
+
+        Args:
+            func: The blocking function to call
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The function's return value
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def stream(self, func: Callable[..., Iterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        Drive a blocking iterator on a worker thread and yield its items asynchronously
+
+        Items are handed to the event loop through an asyncio queue as soon as the
+        worker produces them. If the consumer stops early (e.g. the client disconnects),
+        the worker is told to stop at the next item.
+
+        Args:
+            func: Function returning the blocking iterator
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Yields:
+            Items produced by the iterator
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def put(item: Any, error: BaseException = None) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+            except RuntimeError:
+                # The event loop has already shut down; nobody is listening
+                cancelled.set()
+
+        def worker() -> None:
+            try:
+                for item in func(*args, **kwargs):
+                    if cancelled.is_set():
+                        break
+                    put(item)
+            except BaseException as e:
+                put(_END_OF_STREAM, e)
+                return
+            put(_END_OF_STREAM)
+
+        loop.run_in_executor(self._executor, worker)
+
+        try:
+            while True:
+                item, error = await queue.get()
+                if item is _END_OF_STREAM:
+                    if error is not None:
+                        raise error
+                    break
+                yield item
+        finally:
+            cancelled.set()
+
+    async def stream_request(self, submit: Callable[..., Any], *args, **kwargs) -> AsyncIterator[str]:
+        """
+        Start a generation on a worker thread and stream its chunks on the event loop
+
+        Only submit() runs on a worker (it may have to wait for the model to
+        load). The chunks are then handed to the event loop by the thread that
+        decodes them, so a stream holds no worker while it runs and concurrent
+        streams are limited by the decode batch, not by the size of this pool.
+        If the consumer stops early, the generation is cancelled.
+
+        Args:
+            submit: Function returning the GenerationRequest to stream
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Yields:
+            Text chunks as they are generated
+        """
+        request = await self.run(submit, *args, **kwargs)
+        try:
+            async for chunk in request:
+                yield chunk
+        finally:
+            request.cancel()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """
+        Stop accepting new work and release the worker threads
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
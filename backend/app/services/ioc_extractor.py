@@ -0,0 +1,364 @@
+"""
+Single-pass extraction of indicators of compromise from queries and log text
+
+Finds IPv4/IPv6 addresses and CIDRs, domains, URLs, email addresses and
+MD5/SHA1/SHA256 hashes. Defanged forms ("hxxp://", "evil[.]com",
+"user[@]host", "1.2.3[.]4") are recognized and refanged in the results, while
+offsets always point into the original text. Matches are validated (IP
+addresses with ipaddress, domains against known top-level domains) and
+deduped by type and normalized value.
+
+Log text repeats itself, so the input is split into whitespace-separated
+tokens (str.split, in C) and each distinct token is classified once and
+cached: plain addresses, hashes and domains by anchored full matches,
+anything else by the general IOC_PATTERN. A repeated token then costs one
+dictionary lookup, and offsets are only located for tokens holding
+indicators.
+"""
+import re
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+IOC_TYPES = ("url", "email", "ipv4", "ipv6", "cidr", "domain", "md5", "sha1", "sha256")
+IP_TYPES = ("ipv4", "ipv6")
+HASH_TYPES = {32: "md5", 40: "sha1", 64: "sha256"}
+
+# Generic and common sponsored TLDs plus every two-letter country code
+GENERIC_TLDS = frozenset("""
+com net org edu gov mil int info biz name pro aero asia cat coop jobs mobi museum tel travel xxx
+app dev io ai co me tv cc ws xyz top site online club shop store tech space website live life
+cloud digital email link click news blog world today network systems solutions services support
+security agency company group center zone host press fun icu buzz win bid loan work date men
+review stream download trade racing party science cricket accountant faq gdn kim mom lol cyou rest
+onion local lan internal corp home arpa example test invalid localhost
+""".split())
+COUNTRY_TLDS = frozenset("""
+ac ad ae af ag al am ao aq ar as at au aw ax az ba bb bd be bf bg bh bi bj bm bn bo br bs bt bw by bz
+ca cd cf cg ch ci ck cl cm cn cr cu cv cw cx cy cz de dj dk dm do dz ec ee eg er es et eu fi fj fk fm
+fo fr ga gd ge gf gg gh gi gl gm gn gp gq gr gs gt gu gw gy hk hm hn hr ht hu id ie il im in iq ir is
+it je jm jo jp ke kg kh ki km kn kp kr kw ky kz la lb lc li lk lr ls lt lu lv ly ma mc md mg mh mk ml
+mm mn mo mp mq mr ms mt mu mv mw mx my mz na nc ne nf ng ni nl no np nr nu nz om pa pe pf pg ph pk pl
+pm pn pr ps pt pw py qa re ro rs ru rw sa sb sc sd se sg sh si sk sl sm sn so sr ss st su sv sx sy sz
+tc td tf tg th tj tk tl tm tn to tr tt tz ua ug uk us uy uz va vc ve vg vi vn vu wf wz ye yt za zm zw
+""".split())
+KNOWN_TLDS = GENERIC_TLDS | COUNTRY_TLDS
+
+# Country codes that are far more often file extensions or code attributes
+# in log text; names ending in them only count when written defanged
+AMBIGUOUS_TLDS = frozenset("py sh md rs pl so cs js ts ps am in is it at to do no me id as be by ly".split())
+
+_DOT = r"(?:\.|\[\.\]|\(\.\)|\{\.\}|\[dot\]|\(dot\))"
+_OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+_IPV4 = rf"{_OCTET}(?:{_DOT}{_OCTET}){{3}}"
+_LABEL = r"[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?"
+_DOMAIN = rf"(?:{_LABEL}{_DOT})+(?:[a-z]{{2,24}}|xn--[a-z0-9-]{{1,59}})"
+
+IOC_PATTERN = re.compile(rf"""
+    (?P<url>(?<![\w])(?:hxxps?|https?|fxps?|ftps?|sftp)(?:://|\[:\]//|\[://\])[^\s"'<>`]+)
+  | (?P<email>(?<![\w.%+-])[a-z0-9][a-z0-9._%+-]{{0,63}}(?:@|\[@\]|\[at\]|\(at\)){_DOMAIN}(?![\w-]))
+  | (?P<hash>(?<![\w])[a-f0-9]{{32}}(?:[a-f0-9]{{8}}(?:[a-f0-9]{{24}})?)?(?![\w]))
+  | (?P<ipv4>(?<![\w.]){_IPV4}(?:/(?:3[0-2]|[12]?\d))?(?!\w|{_DOT}\d))
+  | (?P<ipv6>(?<![\w:.])(?:[a-f0-9]{{0,4}}:){{2,7}}(?:{_IPV4}|[a-f0-9]{{0,4}})(?:/\d{{1,3}})?(?![\w:]|\.\w))
+  | (?P<domain>(?<![\w@.-]){_DOMAIN}(?![\w-]|{_DOT}\w))
+""", re.IGNORECASE | re.VERBOSE)
+
+# Anchored patterns for the common plain (not defanged) forms of a whole token
+_PLAIN_IPV4 = re.compile(r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)(?:\.(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)){3}(?:/(?:3[0-2]|[12]?\d))?")
+_PLAIN_HASH = re.compile(r"[a-f0-9]{32}(?:[a-f0-9]{8}(?:[a-f0-9]{24})?)?", re.IGNORECASE)
+_PLAIN_DOMAIN = re.compile(r"(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+(?:[a-z]{2,24}|xn--[a-z0-9-]{1,59})", re.IGNORECASE)
+
+# Tokens without any of these can't hold an indicator (IPv6 without "::" has seven colons)
+_HINT = re.compile(rf"\w{_DOT}\w|::|//|@|\[at\]|\(at\)|[a-f0-9]{{32}}", re.IGNORECASE)
+# Pieces of a token that could be an indicator other than a URL
+_PIECE = re.compile(r"[\w.:@%+\-\[\]()]+(?:/\d{1,3}(?![\w.]))?")
+# Plain dotted words, which hold no indicator unless they matched as a whole
+_DOTTED_WORDS = re.compile(r"[\w-]+(?:\.[\w-]+)*")
+# Dotted names, addresses, CIDRs and hashes inside a token with no brackets, "@" or ":"
+_CANDIDATE = re.compile(r"(?<![\w-])[\w-]++(?:\.[\w-]+)+(?:/\d{1,3}(?!\w))?|\b[a-f0-9]{32,64}\b", re.IGNORECASE)
+# Pieces the anchored patterns can't settle: defanged, emails, IPv6, host:port
+_FALLBACK = re.compile(r"[\[(@:]")
+_BRACKETS = "[]()."
+# Characters scanned per slice of a large input
+SCAN_CHUNK = 1 << 22
+# Distinct tokens remembered between chunks before the cache is reset
+TOKEN_CACHE_SIZE = 200000
+
+_REFANG = [
+    ("[.]", "."), ("(.)", "."), ("{.}", "."), ("[dot]", "."), ("(dot)", "."),
+    ("[:]//", "://"), ("[://]", "://"), ("[@]", "@"), ("[at]", "@"), ("(at)", "@")
+]
+_SCHEMES = {"hxxp": "http", "hxxps": "https", "fxp": "ftp", "fxps": "ftps"}
+# Characters that end a sentence rather than a URL
+_URL_TRAILING = ".,;:!?'\")]}>"
+
+def refang(text: str) -> str:
+    """
+    Undo common defanging ("hxxp", "[.]", "[@]" and similar)
+    """
+    lowered = text.lower()
+    for defanged, plain in _REFANG:
+        if defanged in lowered:
+            text = re.sub(re.escape(defanged), plain, text, flags=re.IGNORECASE)
+            lowered = text.lower()
+    scheme, separator, rest = text.partition("://")
+    if separator and scheme.lower() in _SCHEMES:
+        text = f"{_SCHEMES[scheme.lower()]}://{rest}"
+    return text
+
+def _valid_domain(domain: str, defanged: bool) -> bool:
+    tld = domain.rsplit(".", 1)[-1]
+    if tld.startswith("xn--"):
+        return True
+    if tld not in KNOWN_TLDS:
+        return False
+    return defanged or tld not in AMBIGUOUS_TLDS
+
+def _trim_url(url: str) -> str:
+    # Drop sentence punctuation, keeping closing brackets that have an opening partner
+    while url and url[-1] in _URL_TRAILING:
+        closing = url[-1]
+        opening = {")": "(", "]": "[", "}": "{"}.get(closing)
+        if opening and url.count(opening) >= url.count(closing):
+            break
+        url = url[:-1]
+    return url
+
+Hit = Tuple[str, str, int, int, bool]
+
+def _pattern_hits(text: str) -> List[Hit]:
+    """
+    Indicators found by the general pattern, as (type, value, start, end, defanged)
+    """
+    hits = []
+    for match in IOC_PATTERN.finditer(text):
+        kind = match.lastgroup
+        raw = match.group()
+        start = match.start()
+        if kind == "url":
+            hits += _url_hits(_trim_url(raw), start)
+        elif kind == "hash":
+            hits.append((HASH_TYPES[len(raw)], raw.lower(), start, start + len(raw), False))
+        else:
+            hits += _value_hits(kind, raw, start)
+    return hits
+
+def _value_hits(kind: str, raw: str, start: int) -> List[Hit]:
+    value = refang(raw)
+    defanged = value != raw
+    end = start + len(raw)
+    if kind in ("ipv4", "ipv6"):
+        try:
+            if "/" in value:
+                return [("cidr", str(ipaddress.ip_network(value, strict=False)), start, end, defanged)]
+            return [(kind, str(ipaddress.ip_address(value)), start, end, defanged)]
+        except ValueError:
+            return []
+    value = value.lower()
+    if kind == "domain" and _valid_domain(value, defanged):
+        return [("domain", value, start, end, defanged)]
+    if kind == "email" and _valid_domain(value.rsplit("@", 1)[-1], True):
+        return [("email", value, start, end, defanged)]
+    return []
+
+def _url_hits(raw: str, start: int) -> List[Hit]:
+    value = refang(raw)
+    scheme, _, rest = value.partition("://")
+    host_end = len(rest)
+    for separator in "/?#":
+        index = rest.find(separator)
+        if index != -1:
+            host_end = min(host_end, index)
+    authority = rest[:host_end]
+    host = authority.rsplit("@", 1)[-1]
+    if host.startswith("["):
+        host = host[1:].split("]", 1)[0]
+    elif host.count(":") == 1:
+        host = host.split(":", 1)[0]
+    value = f"{scheme.lower()}://{authority.lower()}{rest[host_end:]}"
+    end = start + len(raw)
+    hits = [("url", value, start, end, value != raw)]
+
+    # The host is an indicator in its own right; its offsets are those of the URL
+    try:
+        address = ipaddress.ip_address(host)
+        hits.append((f"ipv{address.version}", str(address), start, end, False))
+    except ValueError:
+        if _PLAIN_DOMAIN.fullmatch(host) and _valid_domain(host.lower(), True):
+            hits.append(("domain", host.lower(), start, end, False))
+    return hits
+
+def classify_token(token: str) -> List[Hit]:
+    """
+    Find the indicators in one whitespace-free token
+
+    Args:
+        token: A token of the input
+
+    Returns:
+        (type, value, start, end, defanged) per indicator, offsets relative to the token
+    """
+    if _PLAIN_IPV4.fullmatch(token) and "/" not in token:
+        # Most common case first: the pattern rules out leading zeros, so the address is already canonical
+        return [("ipv4", token, 0, len(token), False)]
+    if not _HINT.search(token) and token.count(":") < 7:
+        return []
+    if "//" in token:
+        return _pattern_hits(token)
+    if not _FALLBACK.search(token):
+        hits = []
+        for candidate in _CANDIDATE.finditer(token):
+            hits += _plain_hits(candidate.group(), candidate.start(), candidate.end()) or []
+        return hits
+
+    hits = []
+    for piece in _PIECE.finditer(token):
+        text = piece.group()
+        core = text.strip(_BRACKETS)
+        if not core:
+            continue
+        start = piece.start() + text.index(core)
+        plain = _plain_hits(core, start, start + len(core))
+        if plain is not None:
+            hits += plain
+        elif _FALLBACK.search(text):
+            hits += [(kind, value, piece.start() + s, piece.start() + e, defanged)
+                     for kind, value, s, e, defanged in _pattern_hits(text)]
+    return hits
+
+def _plain_hits(core: str, start: int, end: int) -> Optional[List[Hit]]:
+    # Answer for a plain address, CIDR, hash or dotted name; None if core is none of these
+    if _PLAIN_IPV4.fullmatch(core):
+        if "/" in core:
+            return [("cidr", str(ipaddress.ip_network(core, strict=False)), start, end, False)]
+        # The pattern rules out leading zeros, so the address is already canonical
+        return [("ipv4", core, start, end, False)]
+    if _PLAIN_HASH.fullmatch(core):
+        return [(HASH_TYPES[len(core)], core.lower(), start, end, False)]
+    if _PLAIN_DOMAIN.fullmatch(core):
+        return [("domain", core.lower(), start, end, False)] if _valid_domain(core.lower(), False) else []
+    if _DOTTED_WORDS.fullmatch(core):
+        # file.py, logger.info.x, 1.2.3.4.5: dotted, but no indicator inside
+        return []
+    return None
+
+class IOCExtractor:
+    """
+    Incremental extractor for text arriving in chunks
+
+    Text is scanned up to the last newline of what has been fed, so an
+    indicator is never split across chunks; offsets are relative to the start
+    of the whole input.
+
+    Args:
+        types: IOC types to report (defaults to all of IOC_TYPES)
+        max_offsets: Most (start, end) offsets kept per indicator; counts are always complete
+    """
+
+    def __init__(self, types: Iterable[str] = None, max_offsets: int = 100):
+        self.types = frozenset(types or IOC_TYPES)
+        self.max_offsets = max_offsets
+        self._found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._cache: Dict[str, List[Hit]] = {}
+        self._pending = ""
+        self._position = 0
+
+    def __len__(self) -> int:
+        """Number of distinct indicators found so far"""
+        return len(self._found)
+
+    def feed(self, text: str) -> None:
+        """
+        Add more input
+        """
+        self._pending += text
+        cut = self._pending.rfind("\n") + 1
+        start = 0
+        while start < cut:
+            # Scan newline-aligned slices so the token cache is bounded by slice size, not input size
+            end = self._pending.find("\n", min(start + SCAN_CHUNK, cut) - 1) + 1
+            self._scan(self._pending[start:end])
+            start = end
+        self._pending = self._pending[cut:]
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        Scan whatever input is left and return the results
+
+        Returns:
+            One {"type", "value", "count", "offsets", "defanged"} dict per distinct
+            indicator, in order of first appearance; value is normalized
+            (refanged, lowercased except for URL paths, CIDRs in network form)
+        """
+        if self._pending:
+            self._scan(self._pending)
+            self._pending = ""
+        return list(self._found.values())
+
+    def _scan(self, text: str) -> None:
+        if len(self._cache) > TOKEN_CACHE_SIZE:
+            self._cache.clear()
+        cache, types, found, limit = self._cache, self.types, self._found, self.max_offsets
+
+        # Classify each distinct token once, then walk the lines for offsets
+        indicators = set()
+        for token in set(text.split()):
+            hits = cache.get(token)
+            if hits is None:
+                hits = cache[token] = tuple(hit for hit in classify_token(token) if hit[0] in types)
+            if hits:
+                indicators.add(token)
+
+        line_start = self._position
+        for line in text.split("\n"):
+            cursor = 0
+            for token in [token for token in line.split() if token in indicators]:
+                # Find this occurrence as a whole word; earlier words may contain the token
+                index = line.find(token, cursor)
+                while (index > 0 and not line[index - 1].isspace()) or \
+                        (index + len(token) < len(line) and not line[index + len(token)].isspace()):
+                    index = line.find(token, index + 1)
+                cursor = index + len(token)
+
+                for ioc_type, value, start, end, defanged in cache[token]:
+                    entry = found.get((ioc_type, value))
+                    if entry is None:
+                        entry = found[(ioc_type, value)] = {
+                            "type": ioc_type, "value": value, "count": 0, "offsets": [], "defanged": False
+                        }
+                    entry["count"] += 1
+                    entry["defanged"] = entry["defanged"] or defanged
+                    if len(entry["offsets"]) < limit:
+                        entry["offsets"].append((line_start + index + start, line_start + index + end))
+            line_start += len(line) + 1
+        self._position += len(text)
+
+def extract_iocs(text: str, types: Iterable[str] = None, max_offsets: int = 100) -> List[Dict[str, Any]]:
+    """
+    Extract indicators from a piece of text
+
+    Args:
+        text: Query, pasted log or other free text
+        types: IOC types to report (defaults to all of IOC_TYPES)
+        max_offsets: Most (start, end) offsets kept per indicator
+
+    Returns:
+        See IOCExtractor.finish
+    """
+    extractor = IOCExtractor(types, max_offsets)
+    extractor.feed(text)
+    return extractor.finish()
+
+def group_iocs(iocs: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Group extracted indicator values by type, in order of appearance
+    """
+    groups: Dict[str, List[str]] = {}
+    for ioc in iocs:
+        groups.setdefault(ioc["type"], []).append(ioc["value"])
+    return groups
+
+def first_ip(iocs: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    The first IPv4 or IPv6 address among extracted indicators, if any
+    """
+    return next((ioc["value"] for ioc in iocs if ioc["type"] in IP_TYPES), None)
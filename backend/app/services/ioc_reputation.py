@@ -0,0 +1,316 @@
+"""
+Offline reputation lookups for file hashes and domains
+
+Blocklist feeds (one IOC per line, one file per feed) are compiled into a
+single file holding a Bloom filter and a sorted array of fixed-width records.
+Every IOC is reduced to a 16-byte BLAKE2b key of its normalized form; a record
+is the key plus the id of the feed it came from. Lookups test the Bloom filter
+first, so the common "not listed" answer touches a handful of bits, and only
+possible hits are confirmed by binary search over the records. Both live in
+the memory-mapped file, so multi-million-entry feeds cost no Python objects.
+
+File layout (little-endian):
+    header      HEADER: magic, record count, Bloom bits, hash count, feed count, feed table bytes
+    feeds       feed names, newline-separated UTF-8
+    bloom       Bloom bits (bit i is bit i % 8 of byte i // 8)
+    records     sorted (key, feed id) records, RECORD each
+"""
+import io
+import os
+import re
+import math
+import mmap
+import bisect
+import struct
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IOCDB\x00\x01\x00"
+HEADER = struct.Struct("<8sQQIII")
+RECORD = struct.Struct("<16sH")
+KEY_SIZE = 16
+
+HASH_TYPES = {32: "md5", 40: "sha1", 64: "sha256"}
+_HEX = re.compile(r"^[0-9a-f]+$")
+_DOMAIN = re.compile(r"^(?=.{1,253}$)(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,62}$")
+
+def normalize_ioc(value: str) -> Tuple[str, str]:
+    """
+    Classify and normalize a hash or domain
+
+    Hashes are lowercased; domains are lowercased, refanged ("[.]" to ".")
+    and stripped of a trailing dot.
+
+    Args:
+        value: The IOC as written
+
+    Returns:
+        (type, normalized value), with type one of md5, sha1, sha256 or domain
+
+    Raises:
+        ValueError: If the value is neither a hash nor a domain
+    """
+    text = value.strip().lower()
+    if len(text) in HASH_TYPES and _HEX.match(text):
+        return HASH_TYPES[len(text)], text
+    text = text.replace("[.]", ".").replace("(.)", ".").rstrip(".")
+    if _DOMAIN.match(text):
+        return "domain", text
+    raise ValueError(f"Not a hash or domain: {value!r}")
+
+def ioc_key(ioc_type: str, normalized: str) -> bytes:
+    """The 16-byte record key of a normalized IOC"""
+    return hashlib.blake2b(f"{ioc_type}:{normalized}".encode("utf-8"), digest_size=KEY_SIZE).digest()
+
+def bloom_parameters(count: int, false_positive_rate: float) -> Tuple[int, int]:
+    """
+    Size a Bloom filter
+
+    Args:
+        count: Entries it will hold
+        false_positive_rate: Target probability that an unlisted IOC passes the filter
+
+    Returns:
+        (bits, hash count)
+    """
+    bits = max(64, math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2))
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, round(bits / max(count, 1) * math.log(2)))
+    return bits, hashes
+
+def _bit_positions(key: bytes, bits: int, hashes: int) -> List[int]:
+    # Double hashing over the two halves of the (already uniform) key
+    first = int.from_bytes(key[:8], "little")
+    second = int.from_bytes(key[8:], "little") | 1
+    return [(first + i * second) % bits for i in range(hashes)]
+
+def read_feed(source: Union[str, io.TextIOBase]) -> Iterable[bytes]:
+    """
+    Yield the record keys of one feed file, skipping blank lines, # comments and invalid IOCs
+    """
+    handle = open(source, encoding="utf-8", errors="replace") if isinstance(source, str) else source
+    skipped = 0
+    try:
+        for line in handle:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                yield ioc_key(*normalize_ioc(line.split(",", 1)[0]))
+            except ValueError:
+                skipped += 1
+    finally:
+        if handle is not source:
+            handle.close()
+        if skipped:
+            logger.warning(f"Skipped {skipped} invalid IOCs in {getattr(source, 'name', source)}")
+
+def build_database(feeds: Dict[str, Iterable[bytes]], false_positive_rate: float = 0.01) -> bytes:
+    """
+    Compile feeds into the database format
+
+    Args:
+        feeds: Feed name -> record keys (e.g. from read_feed)
+        false_positive_rate: Target Bloom filter false positive rate
+
+    Returns:
+        The database file contents
+    """
+    names = list(feeds)
+    records = [RECORD.pack(key, feed_id) for feed_id, name in enumerate(names) for key in feeds[name]]
+    records.sort()
+    # Drop repeats of a (key, feed) pair; a key listed by several feeds keeps one record per feed
+    records = [record for i, record in enumerate(records) if i == 0 or record != records[i - 1]]
+    distinct = sum(1 for i, record in enumerate(records) if i == 0 or record[:KEY_SIZE] != records[i - 1][:KEY_SIZE])
+
+    bits, hashes = bloom_parameters(distinct, false_positive_rate)
+    bloom = bytearray(bits // 8)
+    for record in records:
+        for position in _bit_positions(record[:KEY_SIZE], bits, hashes):
+            bloom[position >> 3] |= 1 << (position & 7)
+
+    feed_table = "\n".join(names).encode("utf-8")
+    return b"".join([
+        HEADER.pack(MAGIC, len(records), bits, hashes, len(names), len(feed_table)),
+        feed_table,
+        bytes(bloom),
+        b"".join(records)
+    ])
+
+class _Keys:
+    """Read-only sequence over the record keys in the buffer, for bisect"""
+
+    def __init__(self, buffer, offset: int, count: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        position = self.offset + index * RECORD.size
+        return self.buffer[position:position + KEY_SIZE]
+
+class IOCDatabase:
+    """
+    Memory-mapped Bloom filter plus sorted records for exact confirmation
+
+    Args:
+        buffer: Database contents as built by build_database (bytes or mmap)
+        path: File the buffer was mapped from, for reporting
+    """
+
+    def __init__(self, buffer, path: Optional[str] = None):
+        magic, count, bits, hashes, feed_count, feed_bytes = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not an IOC database: {path or 'buffer'}")
+        self.buffer = buffer
+        self.path = path
+        self.count = count
+        self.bits = bits
+        self.hashes = hashes
+        offset = HEADER.size
+        self.feeds = buffer[offset:offset + feed_bytes].decode("utf-8").split("\n") if feed_count else []
+        self._bloom_offset = offset + feed_bytes
+        self._records_offset = self._bloom_offset + bits // 8
+        self._keys = _Keys(buffer, self._records_offset, count)
+        self.bloom_rejections = 0
+        self.false_positives = 0
+
+    @classmethod
+    def open(cls, path: str) -> "IOCDatabase":
+        """
+        Memory-map a database file built by build_database
+        """
+        with open(path, "rb") as handle:
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+
+    def might_contain(self, key: bytes) -> bool:
+        """Bloom filter test: False means the key is certainly not listed"""
+        buffer, offset = self.buffer, self._bloom_offset
+        for position in _bit_positions(key, self.bits, self.hashes):
+            if not buffer[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def feeds_for(self, key: bytes) -> List[str]:
+        """
+        The feeds listing a key (empty if none)
+        """
+        if not self.might_contain(key):
+            self.bloom_rejections += 1
+            return []
+        index = bisect.bisect_left(self._keys, key)
+        feeds = []
+        while index < self.count and self._keys[index] == key:
+            _, feed_id = RECORD.unpack_from(self.buffer, self._records_offset + index * RECORD.size)
+            feeds.append(self.feeds[feed_id])
+            index += 1
+        if not feeds:
+            self.false_positives += 1
+        return feeds
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report entry counts, memory footprint and the filter's expected false positive rate
+        """
+        keys = max(self.count, 1)
+        return {
+            "path": self.path,
+            "feeds": self.feeds,
+            "records": self.count,
+            "bloom_bytes": self.bits // 8,
+            "records_bytes": self.count * RECORD.size,
+            "file_bytes": len(self.buffer),
+            "bloom_bits_per_entry": round(self.bits / keys, 2),
+            "bloom_hashes": self.hashes,
+            "expected_false_positive_rate": (1 - math.exp(-self.hashes * keys / self.bits)) ** self.hashes,
+            "bloom_rejections": self.bloom_rejections,
+            "false_positives": self.false_positives
+        }
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+class IOCReputationService:
+    """
+    Checks hashes and domains against the offline IOC database
+
+    A domain is also reported when one of its parent domains is listed, so a
+    blocklisted evil.example flags cdn.evil.example too.
+
+    Args:
+        database: Opened database (defaults to the file at IOC_DATABASE, if it exists)
+    """
+
+    def __init__(self, database: IOCDatabase = None):
+        path = os.getenv("IOC_DATABASE", "data/iocs.iocdb")
+        if database is None and os.path.exists(path):
+            database = IOCDatabase.open(path)
+            logger.info(f"Loaded IOC database {path} with {database.count} records")
+        self.database = database
+
+    @property
+    def loaded(self) -> bool:
+        return self.database is not None
+
+    def check(self, ioc: str) -> Dict[str, Any]:
+        """
+        Look up one IOC
+
+        Args:
+            ioc: MD5/SHA1/SHA256 hash or domain (defanged domains are accepted)
+
+        Returns:
+            {"ioc", "type", "normalized", "verdict", "feeds", "matched"}: the verdict is
+            "malicious" if any feed lists the IOC (or a parent domain, named by
+            "matched"), otherwise "unknown"
+
+        Raises:
+            ValueError: If the value is neither a hash nor a domain
+        """
+        ioc_type, normalized = normalize_ioc(ioc)
+        candidates = [normalized]
+        if ioc_type == "domain":
+            labels = normalized.split(".")
+            candidates += [".".join(labels[i:]) for i in range(1, len(labels) - 1)]
+
+        feeds, matched = [], None
+        if self.database is not None:
+            for candidate in candidates:
+                feeds = self.database.feeds_for(ioc_key(ioc_type, candidate))
+                if feeds:
+                    matched = candidate
+                    break
+        return {
+            "ioc": ioc,
+            "type": ioc_type,
+            "normalized": normalized,
+            "verdict": "malicious" if feeds else "unknown",
+            "feeds": feeds,
+            "matched": matched
+        }
+
+    def check_many(self, iocs: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Look up many IOCs; invalid ones get an "error" instead of a verdict
+        """
+        results = []
+        for ioc in iocs:
+            try:
+                results.append(self.check(ioc))
+            except (ValueError, AttributeError):
+                results.append({"ioc": ioc, "error": "Not an MD5/SHA1/SHA256 hash or domain"})
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report the database's size and lookup counters
+        """
+        return self.database.get_stats() if self.database is not None else {"path": None, "records": 0}
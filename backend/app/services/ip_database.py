@@ -0,0 +1,291 @@
+"""
+Offline IP geolocation/ASN database for air-gapped deployments
+
+CSV range dumps (start_ip, end_ip, country, asn, org) are compiled into a
+compact binary index: per address family, sorted fixed-width arrays of range
+starts, range ends and record ids, followed by a deduplicated record table and
+string table. The file is memory-mapped and searched in place, so opening it
+is instant and its pages are shared by every worker process.
+
+File layout (integers little-endian, addresses big-endian so byte order matches numeric order):
+    header          HEADER: magic, IPv4 range count, IPv6 range count, record count, string count
+    IPv4 ranges     starts (4 bytes each), ends (4 bytes each), record ids (uint32 each)
+    IPv6 ranges     starts (16 bytes each), ends (16 bytes each), record ids (uint32 each)
+    records         (country, asn, org) string ids, 3 x uint32 each
+    strings         (string count + 1) uint32 offsets into the UTF-8 blob that follows
+"""
+import io
+import csv
+import mmap
+import bisect
+import struct
+import logging
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IPRDB\x00\x01\x00"
+HEADER = struct.Struct("<8sIIII")
+CSV_COLUMNS = ("start_ip", "end_ip", "country", "asn", "org")
+
+IPAddress = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+def _normalize_asn(value: str) -> str:
+    value = (value or "").strip().upper()
+    if value.startswith("AS"):
+        value = value[2:]
+    return f"AS{value}" if value.isdigit() and int(value) > 0 else ""
+
+def read_csv_ranges(source: Union[str, io.TextIOBase]) -> List[Tuple[IPAddress, IPAddress, str, str, str]]:
+    """
+    Read a CSV range dump
+
+    The columns are start_ip, end_ip, country, asn, org; a header row is
+    optional. ASNs may be given as "15169" or "AS15169". Rows whose addresses
+    don't parse or whose start and end are of different families are skipped.
+
+    Args:
+        source: Path to the CSV file, or an open text file
+
+    Returns:
+        (start, end, country, asn, org) tuples in file order
+    """
+    handle = open(source, newline="", encoding="utf-8") if isinstance(source, str) else source
+    ranges = []
+    skipped = 0
+    try:
+        for row in csv.reader(handle):
+            if not row or row[0].strip().startswith("#") or row[0].strip() == "start_ip":
+                continue
+            row = (row + [""] * len(CSV_COLUMNS))[:len(CSV_COLUMNS)]
+            try:
+                start, end = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+            except ValueError:
+                skipped += 1
+                continue
+            if start.version != end.version or start > end:
+                skipped += 1
+                continue
+            ranges.append((start, end, row[2].strip().upper(), _normalize_asn(row[3]), row[4].strip()))
+    finally:
+        if handle is not source:
+            handle.close()
+    if skipped:
+        logger.warning(f"Skipped {skipped} malformed rows in IP range dump")
+    return ranges
+
+def build_database(ranges: Iterable[Tuple[IPAddress, IPAddress, str, str, str]]) -> bytes:
+    """
+    Compile ranges into the binary index format
+
+    Ranges are sorted by start address. A range overlapping the one before it
+    is dropped, and touching ranges with the same record are merged.
+
+    Args:
+        ranges: (start, end, country, asn, org) tuples, e.g. from read_csv_ranges
+
+    Returns:
+        The database file contents
+    """
+    strings: Dict[str, int] = {}
+    records: Dict[Tuple[int, int, int], int] = {}
+
+    def string_id(value: str) -> int:
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    families = {4: [], 6: []}
+    for start, end, country, asn, org in ranges:
+        key = (string_id(country), string_id(asn), string_id(org))
+        if key not in records:
+            records[key] = len(records)
+        families[start.version].append((int(start), int(end), records[key]))
+
+    sections = []
+    overlaps = 0
+    for version, width in ((4, 4), (6, 16)):
+        merged = []
+        for start, end, record in sorted(families[version]):
+            if merged and start <= merged[-1][1]:
+                overlaps += 1
+                continue
+            if merged and start == merged[-1][1] + 1 and record == merged[-1][2]:
+                merged[-1][1] = end
+                continue
+            merged.append([start, end, record])
+        sections.append((
+            len(merged),
+            b"".join(start.to_bytes(width, "big") for start, _, _ in merged)
+            + b"".join(end.to_bytes(width, "big") for _, end, _ in merged)
+            + struct.pack(f"<{len(merged)}I", *(record for _, _, record in merged))
+        ))
+    if overlaps:
+        logger.warning(f"Dropped {overlaps} overlapping ranges while building the IP database")
+
+    blob = [value.encode("utf-8") for value in strings]
+    offsets = [0]
+    for value in blob:
+        offsets.append(offsets[-1] + len(value))
+
+    return b"".join([
+        HEADER.pack(MAGIC, sections[0][0], sections[1][0], len(records), len(strings)),
+        sections[0][1],
+        sections[1][1],
+        struct.pack(f"<{3 * len(records)}I", *(string for key in records for string in key)),
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        b"".join(blob)
+    ])
+
+class _Keys:
+    """Read-only sequence over fixed-width big-endian addresses in the buffer, for bisect"""
+
+    def __init__(self, buffer, offset: int, count: int, width: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+        self.width = width
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        position = self.offset + index * self.width
+        return self.buffer[position:position + self.width]
+
+class IPRangeDatabase:
+    """
+    Memory-mapped range index answering country and ASN lookups offline
+
+    Lookups binary-search the sorted range starts of the address's family
+    directly in the buffer (normally a read-only memory map), so they take a
+    few microseconds and the index costs no Python objects per range.
+
+    Args:
+        buffer: Database contents as built by build_database (bytes or mmap)
+        path: File the buffer was mapped from, for reporting
+    """
+
+    def __init__(self, buffer, path: Optional[str] = None):
+        magic, v4_count, v6_count, record_count, string_count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not an IP range database: {path or 'buffer'}")
+        self.buffer = buffer
+        self.path = path
+        self.record_count = record_count
+        self.string_count = string_count
+
+        offset = HEADER.size
+        self._families = {}
+        for version, count, width in ((4, v4_count, 4), (6, v6_count, 16)):
+            starts = _Keys(buffer, offset, count, width)
+            ends = _Keys(buffer, offset + count * width, count, width)
+            self._families[version] = (starts, ends, offset + 2 * count * width)
+            offset += count * (2 * width + 4)
+        self._records_offset = offset
+        self._strings_offset = offset + 12 * record_count
+        self._blob_offset = self._strings_offset + 4 * (string_count + 1)
+
+    @classmethod
+    def open(cls, path: str) -> "IPRangeDatabase":
+        """
+        Memory-map a database file built by build_database
+        """
+        with open(path, "rb") as handle:
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, path)
+
+    @classmethod
+    def from_csv(cls, *sources: Union[str, io.TextIOBase]) -> "IPRangeDatabase":
+        """
+        Build a database in memory from CSV range dumps
+        """
+        ranges = []
+        for source in sources:
+            ranges += read_csv_ranges(source)
+        return cls(build_database(ranges))
+
+    def _string(self, index: int) -> str:
+        start, end = struct.unpack_from("<II", self.buffer, self._strings_offset + 4 * index)
+        return self.buffer[self._blob_offset + start:self._blob_offset + end].decode("utf-8")
+
+    def lookup(self, ip: Union[str, IPAddress]) -> Optional[Dict[str, str]]:
+        """
+        Find the range containing an address
+
+        Args:
+            ip: IPv4 or IPv6 address (IPv4-mapped IPv6 addresses are looked up as IPv4)
+
+        Returns:
+            {"start", "end", "country", "asn", "org"}, or None if no range covers the address
+
+        Raises:
+            ValueError: If ip is not an IP address
+        """
+        address = ipaddress.ip_address(ip) if isinstance(ip, str) else ip
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        width = 4 if address.version == 4 else 16
+        starts, ends, records_offset = self._families[address.version]
+        key = int(address).to_bytes(width, "big")
+
+        index = bisect.bisect_right(starts, key) - 1
+        if index < 0 or ends[index] < key:
+            return None
+        record, = struct.unpack_from("<I", self.buffer, records_offset + 4 * index)
+        country, asn, org = struct.unpack_from("<III", self.buffer, self._records_offset + 12 * record)
+        factory = ipaddress.IPv4Address if address.version == 4 else ipaddress.IPv6Address
+        return {
+            "start": str(factory(starts[index])),
+            "end": str(factory(ends[index])),
+            "country": self._string(country),
+            "asn": self._string(asn),
+            "org": self._string(org)
+        }
+
+    def endpoint_data(self, ip: str, endpoint: str) -> Optional[Dict[str, Any]]:
+        """
+        Answer a lookup in the shape of the IPinfo endpoint
+
+        Args:
+            ip: IP address
+            endpoint: basic, geo or asn
+
+        Returns:
+            The endpoint's data, {"ip", "bogon": True} for private and reserved
+            addresses outside the database (as IPinfo answers), or None if the
+            address isn't covered
+        """
+        match = self.lookup(ip)
+        if match is None:
+            address = ipaddress.ip_address(ip)
+            if not address.is_global:
+                return {"ip": ip, "bogon": True}
+            return None
+
+        org = " ".join(part for part in (match["asn"], match["org"]) if part)
+        if endpoint == "geo":
+            return {"ip": ip, "country": match["country"]}
+        if endpoint == "asn":
+            return {"ip": ip, "asn": match["asn"], "name": match["org"], "org": org}
+        data = {"ip": ip, "country": match["country"]}
+        if org:
+            data["org"] = org
+        return data
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report the database's size
+        """
+        return {
+            "path": self.path,
+            "ipv4_ranges": len(self._families[4][0]),
+            "ipv6_ranges": len(self._families[6][0]),
+            "records": self.record_count,
+            "bytes": len(self.buffer)
+        }
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
@@ -0,0 +1,198 @@
+"""
+Enrichment cache for IPinfo lookups
+"""
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fields of a basic record that make up the geo endpoint's answer
+GEO_FIELDS = ("ip", "city", "region", "country", "loc", "postal", "timezone")
+
+def derive_from_basic(basic: Dict[str, Any], endpoint: str) -> Optional[Dict[str, Any]]:
+    """
+    Answer a geo or asn lookup from a basic record, which carries a superset of their fields
+
+    Args:
+        basic: Data returned by the basic endpoint
+        endpoint: "geo" or "asn"
+
+    Returns:
+        The derived data, or None if the basic record lacks the fields needed
+    """
+    if endpoint == "geo":
+        if not all(basic.get(field) for field in ("city", "region", "country")):
+            return None
+        return {field: basic[field] for field in GEO_FIELDS if field in basic}
+    if endpoint == "asn":
+        # e.g. "AS15169 Google LLC"
+        org = basic.get("org") or ""
+        asn, _, name = org.partition(" ")
+        if not (asn.startswith("AS") and name):
+            return None
+        return {"ip": basic.get("ip"), "asn": asn, "name": name, "org": org}
+    return None
+
+class IPInfoCache:
+    """
+    LRU of IPinfo lookup results keyed by (ip, endpoint), with per-endpoint TTLs
+
+    Successful results live for their endpoint's TTL and can then be served
+    stale for stale_ttl more seconds while the caller refreshes them in the
+    background. Failures are cached for the short negative_ttl so a broken
+    upstream isn't hammered, but never replace a result that is still
+    servable. A cached basic record also answers geo and asn lookups for the
+    same IP.
+
+    Args:
+        max_entries: Most results kept before the least recently used is evicted (0 disables the cache)
+        ttls: Endpoint -> seconds a successful result stays fresh
+        negative_ttl: Seconds a failed lookup stays cached
+        stale_ttl: Seconds an expired result may still be served while it is refreshed
+        clock: Monotonic time source, replaceable in tests
+    """
+
+    def __init__(self, max_entries: int = None, ttls: Dict[str, float] = None,
+                 negative_ttl: float = None, stale_ttl: float = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("IPINFO_CACHE_MAX_ENTRIES", "10000"))
+        self.ttls = ttls or {
+            "basic": float(os.getenv("IPINFO_CACHE_TTL_BASIC", "3600")),
+            "geo": float(os.getenv("IPINFO_CACHE_TTL_GEO", "3600")),
+            "asn": float(os.getenv("IPINFO_CACHE_TTL_ASN", "86400"))
+        }
+        self.negative_ttl = negative_ttl if negative_ttl is not None else float(os.getenv("IPINFO_CACHE_NEGATIVE_TTL", "30"))
+        self.stale_ttl = stale_ttl if stale_ttl is not None else float(os.getenv("IPINFO_CACHE_STALE_TTL", "300"))
+        self.clock = clock
+        # (ip, endpoint) -> [result, fresh until, servable until]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.derived_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, ip: Optional[str], endpoint: str) -> Tuple[Optional[Dict[str, Any]], str, str]:
+        """
+        Find a cached result
+
+        Args:
+            ip: IP address, or None for the caller's own IP
+            endpoint: IPinfo endpoint
+
+        Returns:
+            (result, status, source endpoint): status is "fresh", "stale" or "miss";
+            the source endpoint is the one to refresh when the result is stale
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._live_entry((ip, endpoint), now)
+            if entry is not None:
+                result, fresh_until, _ = entry
+                stale = now >= fresh_until
+                if stale:
+                    self.stale_hits += 1
+                elif result["success"]:
+                    self.hits += 1
+                else:
+                    self.negative_hits += 1
+                return copy.deepcopy(result), "stale" if stale else "fresh", endpoint
+
+            if endpoint in ("geo", "asn"):
+                basic = self._live_entry((ip, "basic"), now)
+                if basic is not None and basic[0]["success"]:
+                    data = derive_from_basic(basic[0]["data"], endpoint)
+                    if data is not None:
+                        self.derived_hits += 1
+                        stale = now >= basic[1]
+                        if stale:
+                            self.stale_hits += 1
+                        else:
+                            self.hits += 1
+                        result = {
+                            "success": True,
+                            "data": data,
+                            "endpoint": endpoint,
+                            "message": f"IP information retrieved successfully from {endpoint} endpoint"
+                        }
+                        return result, "stale" if stale else "fresh", "basic"
+
+            self.misses += 1
+            return None, "miss", endpoint
+
+    def store(self, ip: Optional[str], endpoint: str, result: Dict[str, Any]) -> None:
+        """
+        Cache a lookup result
+
+        Args:
+            ip: IP address, or None for the caller's own IP
+            endpoint: IPinfo endpoint
+            result: The result returned by IPInfoService
+        """
+        if not self.enabled:
+            return
+        now = self.clock()
+        key = (ip, endpoint)
+        with self._lock:
+            if not result["success"]:
+                current = self._live_entry(key, now)
+                if current is not None and current[0]["success"]:
+                    # Keep serving the last good answer rather than the failure
+                    return
+                ttl = self.negative_ttl
+                servable_until = now + ttl
+            else:
+                ttl = self.ttls.get(endpoint, self.ttls["basic"])
+                servable_until = now + ttl + self.stale_ttl
+            self._entries[key] = [copy.deepcopy(result), now + ttl, servable_until]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _live_entry(self, key: Tuple, now: float) -> Optional[list]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now >= entry[2]:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def clear(self) -> None:
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report hit/miss/eviction counters and the cache size
+        """
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "derived_hits": self.derived_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else None
+            }
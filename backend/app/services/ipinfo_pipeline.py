@@ -0,0 +1,254 @@
+"""
+The IPinfo plugin workflow as a declarative pipeline
+
+Steps, in display order:
+1-3. acknowledge, tool_selection, endpoint_selection (LLM or template)
+4.   execution notice (format) and the IPinfo lookup (HTTP), both after endpoint_selection;
+     the lookups for the most likely endpoints are prefetched when the request arrives
+5-6. api_response and summary (LLM or template) if the lookup succeeded, otherwise an error step (format)
+
+With a threat-intel service, the looked-up address is also matched against
+the local feeds and the verdict is added to the data the reporting steps see.
+"""
+import os
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+from .pipeline import (
+    Pipeline, LLMNode, HTTPNode, FormatNode, PrefetchNode, TemplateNode, ComputeNode, PipelineContext, StepPolicy
+)
+from .ipinfo_service import IPInfoService
+from .threat_intel import ThreatIntelService
+from .ipinfo_step_service import (
+    IPInfoStepService, PLANNING_STEPS, REPORT_STEPS, STEP_SCHEMAS, combined_schema, rank_endpoints
+)
+
+logger = logging.getLogger(__name__)
+
+# (step id, name, role) of the LLM steps
+PLANNING_STEP_INFO = [(1, "acknowledge", "system"), (2, "tool_selection", "system"),
+                      (3, "endpoint_selection", "system")]
+REPORT_STEP_INFO = [(5, "api_response", "system"), (6, "summary", "assistant")]
+
+# Default policy of each step: narration may fall back to templates under load,
+# while the endpoint choice and the report keep the model
+DEFAULT_STEP_POLICIES = {
+    "acknowledge": "auto",
+    "tool_selection": "auto",
+    "endpoint_selection": "llm",
+    "api_response": "llm",
+    "summary": "llm"
+}
+
+def _execution_frame(ctx: PipelineContext) -> Dict[str, Any]:
+    return {
+        "text": "Executing API call to IPinfo service...",
+        "reasoning": "Now that we've selected the appropriate endpoint, we need to execute the API call to retrieve the information",
+        "step": {
+            "id": 4,
+            "name": "execution",
+            "role": "system"
+        }
+    }
+
+def _error_frame(ctx: PipelineContext) -> Dict[str, Any]:
+    result = ctx["ip_info"]
+    text = f"Failed to get IP information from the {result['endpoint']} endpoint: {result['message']}"
+    threat = ctx.get("threat_intel")
+    if threat and threat["verdict"] != "clean":
+        feeds = ", ".join(match["feed"] for match in threat["matches"])
+        text += f"\n\n⚠️ **Threat intel**: {threat['ip']} is {threat['verdict']} ({feeds})"
+    return {
+        "text": text,
+        "reasoning": "The API call to IPinfo failed, so I need to inform the user about the error",
+        "step": {
+            "id": 5,
+            "name": "error",
+            "role": "system"
+        }
+    }
+
+def _lookup_succeeded(ctx: PipelineContext) -> bool:
+    return ctx["ip_info"]["success"]
+
+def build_ipinfo_pipeline(step_service: IPInfoStepService, ipinfo_service: IPInfoService,
+                          generate: Callable[[str, Optional[Dict[str, Any]]], AsyncIterator[str]],
+                          prefetch: int = None, policies: Dict[str, str] = None,
+                          threat_intel: ThreatIntelService = None) -> Pipeline:
+    """
+    Build the IPinfo workflow for the step service's mode
+
+    In combined mode the planning and reporting steps that use the model each
+    come from one generation; in separate mode every step is its own node, so
+    the independent generations run concurrently. Steps whose policy is
+    "template" are rendered without the model.
+
+    Args:
+        step_service: Prompts and parsing for the LLM steps
+        ipinfo_service: Service used for the lookup
+        generate: Function taking a prompt and schema and returning an async iterator of text chunks
+        prefetch: How many of the most likely endpoints to look up speculatively while the
+                  model plans (defaults to IPINFO_PREFETCH, 0 disables prefetching)
+        policies: Step name -> "llm" or "template" (defaults to the model for every step)
+        threat_intel: Optional feed matcher whose verdict is added to the reported data
+
+    Returns:
+        A pipeline taking the inputs "query" and "ip" (None for the caller's own IP)
+    """
+    if prefetch is None:
+        prefetch = int(os.getenv("IPINFO_PREFETCH", "2"))
+    policies = policies or {}
+
+    def endpoint(ctx: PipelineContext) -> str:
+        return ctx["endpoint_selection"]["endpoint"]
+
+    def ip_data(ctx: PipelineContext) -> Dict[str, Any]:
+        data = ctx["ip_info"]["data"]
+        threat = ctx.get("threat_intel")
+        return {**data, "threat_intel": threat} if threat else data
+
+    def match_threats(ctx: PipelineContext) -> Optional[Dict[str, Any]]:
+        # Never fails, so the reporting and error steps that wait on it always run
+        if not threat_intel.loaded:
+            return None
+        data = ctx["ip_info"]["data"] or {}
+        ip = ctx["ip"] or data.get("ip")
+        try:
+            return threat_intel.match(ip) if ip else None
+        except Exception as e:
+            logger.warning(f"Threat-intel match for {ip} failed: {str(e)}")
+            return None
+
+    after_lookup = ["ip_info", "threat_intel"] if threat_intel is not None else ["ip_info"]
+    report_inputs = {"requires": ["query", "endpoint_selection"] + after_lookup, "when": _lookup_succeeded}
+    planning_llm = [step for step in PLANNING_STEP_INFO if policies.get(step[1], "llm") == "llm"]
+    report_llm = [step for step in REPORT_STEP_INFO if policies.get(step[1], "llm") == "llm"]
+
+    step_nodes = [
+        TemplateNode(name, lambda ctx, name=name: step_service.render_template(name, ctx["query"], ctx["ip"]),
+                     step, requires=["query", "ip"])
+        for step in PLANNING_STEP_INFO if step not in planning_llm for name in [step[1]]
+    ] + [
+        TemplateNode(name, lambda ctx, name=name: step_service.render_template(
+                         name, ctx["query"], ctx["ip"], endpoint(ctx), ip_data(ctx)),
+                     step, **report_inputs)
+        for step in REPORT_STEP_INFO if step not in report_llm for name in [step[1]]
+    ]
+
+    if step_service.mode == "combined":
+        planning_names = [name for _, name, _ in planning_llm]
+        report_names = [name for _, name, _ in report_llm]
+        if planning_llm:
+            step_nodes.append(LLMNode(
+                "planning", generate,
+                prompt=lambda ctx: step_service.planning_prompt(ctx["query"], planning_names),
+                parser=lambda ctx: step_service.step_stream(planning_names),
+                steps=planning_llm, schema=combined_schema(planning_names), requires=["query"]))
+        if report_llm:
+            step_nodes.append(LLMNode(
+                "report", generate,
+                prompt=lambda ctx: step_service.report_prompt(ctx["query"], endpoint(ctx), ip_data(ctx), report_names),
+                parser=lambda ctx: step_service.step_stream(report_names, endpoint(ctx), ip_data(ctx)),
+                steps=report_llm, schema=combined_schema(report_names), **report_inputs))
+    else:
+        planning_prompts = {
+            "acknowledge": step_service.acknowledgment_prompt,
+            "tool_selection": step_service.tool_selection_prompt,
+            "endpoint_selection": step_service.endpoint_selection_prompt
+        }
+        report_prompts = {
+            "api_response": step_service.api_response_prompt,
+            "summary": step_service.summary_prompt
+        }
+        step_nodes += [
+            LLMNode(name, generate,
+                    prompt=lambda ctx, build=planning_prompts[name]: build(ctx["query"]),
+                    parser=lambda ctx, name=name: step_service.step_stream([name]),
+                    steps=[step], schema=STEP_SCHEMAS[name], requires=["query"])
+            for step in planning_llm for name in [step[1]]
+        ] + [
+            LLMNode(name, generate,
+                    prompt=lambda ctx, build=report_prompts[name]: build(ctx["query"], endpoint(ctx), ip_data(ctx)),
+                    parser=lambda ctx, name=name: step_service.step_stream([name], endpoint(ctx), ip_data(ctx)),
+                    steps=[step], schema=STEP_SCHEMAS[name], **report_inputs)
+            for step in report_llm for name in [step[1]]
+        ]
+
+    async def lookup(ctx: PipelineContext) -> Dict[str, Any]:
+        return await ipinfo_service.fetch_ip_info(ctx["ip"], endpoint(ctx))
+
+    async def prefetch_lookup(ctx: PipelineContext, candidate: str) -> Dict[str, Any]:
+        return await ipinfo_service.fetch_ip_info(ctx["ip"], candidate)
+
+    # The lookup waits for the prefetch node so it can claim a speculative call
+    # rather than racing it when the endpoint is chosen quickly
+    lookup_requires = ["ip", "endpoint_selection"] + (["ip_info_prefetch"] if prefetch > 0 else [])
+    lookup_nodes = [
+        HTTPNode("lookup", lookup,
+                 prefetch="ip_info_prefetch" if prefetch > 0 else None, key=endpoint,
+                 requires=lookup_requires, provides=["ip_info"])
+    ]
+    if prefetch > 0:
+        # The IP and the likely endpoints are known up front, so the network
+        # round trip can overlap with the planning generation
+        lookup_nodes.append(PrefetchNode(
+            "prefetch", prefetch_lookup,
+            candidates=lambda ctx: rank_endpoints(ctx["query"])[:prefetch],
+            requires=["query", "ip"], provides=["ip_info_prefetch"]))
+
+    if threat_intel is not None:
+        lookup_nodes.append(ComputeNode("threat_intel", match_threats, requires=["ip", "ip_info"]))
+
+    return Pipeline("ipinfo", step_nodes + lookup_nodes + [
+        FormatNode("execution", _execution_frame, requires=["endpoint_selection"]),
+        FormatNode("error", _error_frame, requires=after_lookup,
+                   when=lambda ctx: not _lookup_succeeded(ctx))
+    ], inputs=["query", "ip"])
+
+class IPInfoPipelines:
+    """
+    Picks the IPinfo pipeline for each request from the deployment's step policy
+
+    Pipelines are built once per combination of resolved step policies and
+    reused across requests.
+
+    Args:
+        step_service: Prompts and parsing for the LLM steps
+        ipinfo_service: Service used for the lookup
+        generate: Function taking a prompt and schema and returning an async iterator of text chunks
+        policy: Step policy (defaults to DEFAULT_STEP_POLICIES overridden by IPINFO_STEP_POLICY,
+                with "auto" steps switching to templates at IPINFO_AUTO_TEMPLATE_LOAD)
+        prefetch: Passed to build_ipinfo_pipeline
+        threat_intel: Passed to build_ipinfo_pipeline
+    """
+
+    def __init__(self, step_service: IPInfoStepService, ipinfo_service: IPInfoService,
+                 generate: Callable[[str, Optional[Dict[str, Any]]], AsyncIterator[str]],
+                 policy: StepPolicy = None, prefetch: int = None, threat_intel: ThreatIntelService = None):
+        self.step_service = step_service
+        self.ipinfo_service = ipinfo_service
+        self.generate = generate
+        self.prefetch = prefetch
+        self.threat_intel = threat_intel
+        self.policy = policy or StepPolicy(DEFAULT_STEP_POLICIES, os.getenv("IPINFO_STEP_POLICY"),
+                                           int(os.getenv("IPINFO_AUTO_TEMPLATE_LOAD", "4")))
+        self._pipelines: Dict[Tuple, Pipeline] = {}
+
+    def get(self, load: int = 0) -> Pipeline:
+        """
+        Get the pipeline for a request
+
+        Args:
+            load: Active plus queued generations on the inference backend
+
+        Returns:
+            The pipeline matching the step policies resolved for this load
+        """
+        policies = self.policy.resolve(load)
+        key = tuple(sorted(policies.items()))
+        pipeline = self._pipelines.get(key)
+        if pipeline is None:
+            pipeline = build_ipinfo_pipeline(self.step_service, self.ipinfo_service, self.generate,
+                                             prefetch=self.prefetch, policies=policies,
+                                             threat_intel=self.threat_intel)
+            self._pipelines[key] = pipeline
+        return pipeline
@@ -1,32 +1,165 @@
 """
 IPinfo API Service for the Cybersecurity AI Assistant
 """
-import requests
+import os
+import copy
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import ipaddress
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple
+from .http_client import AsyncHTTPClient
+from .ipinfo_cache import IPInfoCache
+from .ip_database import IPRangeDatabase
 
 logger = logging.getLogger(__name__)
 
+def normalize_ips(values: Iterable[Any]) -> Tuple[List[str], List[Dict[str, Any]], int]:
+    """
+    Validate and dedupe the addresses of a bulk lookup
+
+    Args:
+        values: Raw items, normally IPv4/IPv6 address strings
+
+    Returns:
+        (unique addresses in canonical form and first-seen order,
+         {"ip", "error"} for each invalid item, number of duplicates dropped)
+    """
+    unique: Dict[str, None] = {}
+    invalid = []
+    duplicates = 0
+    for value in values:
+        try:
+            # ip_address() also takes integers, which are never what a caller meant here
+            if not isinstance(value, str):
+                raise TypeError(value)
+            ip = str(ipaddress.ip_address(value.strip()))
+        except (ValueError, TypeError):
+            invalid.append({"ip": value if isinstance(value, str) else repr(value),
+                            "error": "Not a valid IPv4 or IPv6 address"})
+            continue
+        if ip in unique:
+            duplicates += 1
+        else:
+            unique[ip] = None
+    return list(unique), invalid, duplicates
+
 class IPInfoService:
-    """Service for interacting with the IPinfo API"""
-    
-    def __init__(self):
-        self.base_url = "https://ipinfo.io"
+    """
+    Service for interacting with the IPinfo API
+
+    Results are cached per (ip, endpoint). Stale results are served while a
+    background lookup refreshes them, and concurrent lookups of the same
+    uncached key share one upstream request.
+
+    With an offline database, addresses are answered from it instead of the
+    API (country and ASN only). Addresses it doesn't cover, and the caller's
+    own IP, fail unless offline_fallback allows going to the API for them.
+
+    Args:
+        base_url: IPinfo API URL (defaults to IPINFO_BASE_URL)
+        client: Pooled HTTP client for API requests
+        cache: Cache for API results
+        database: Offline database (defaults to the file at IPINFO_DATABASE, if set)
+        offline_fallback: Use the API when the database can't answer (defaults to IPINFO_OFFLINE_FALLBACK)
+    """
+
+    def __init__(self, base_url: str = None, client: AsyncHTTPClient = None, cache: IPInfoCache = None,
+                 database: IPRangeDatabase = None, offline_fallback: bool = None):
+        self.base_url = (base_url or os.getenv("IPINFO_BASE_URL", "https://ipinfo.io")).rstrip("/")
         self.headers = {
             "Accept": "application/json",
         }
-    
-    def get_ip_info(self, ip: Optional[str] = None, endpoint: str = "basic") -> Dict[str, Any]:
+        # Shared keep-alive connections for every lookup made through this service
+        self.client = client or AsyncHTTPClient()
+        self.cache = cache if cache is not None else IPInfoCache()
+        # (ip, endpoint) -> upstream lookup in progress
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+
+        if database is None and os.getenv("IPINFO_DATABASE"):
+            database = IPRangeDatabase.open(os.getenv("IPINFO_DATABASE"))
+            logger.info(f"Answering IP lookups from offline database {database.path}")
+        self.database = database
+        if offline_fallback is None:
+            offline_fallback = os.getenv("IPINFO_OFFLINE_FALLBACK", "false").lower() == "true"
+        self.offline_fallback = offline_fallback
+
+    async def fetch_ip_info(self, ip: Optional[str] = None, endpoint: str = "basic") -> Dict[str, Any]:
         """
         Get information about an IP address
-        
+
         Args:
             ip: Optional IP address to look up. If not provided, returns info about the caller's IP.
             endpoint: The endpoint to use (basic, geo, asn)
-            
+
         Returns:
             Dict containing information about the IP address
         """
+        if self.database is not None:
+            result = self._offline_lookup(ip, endpoint)
+            if result["success"] or not self.offline_fallback:
+                return result
+
+        if not self.cache.enabled:
+            return await self._request(ip, endpoint)
+
+        result, status, source = self.cache.lookup(ip, endpoint)
+        if status == "fresh":
+            return result
+        if status == "stale":
+            # Answer now and refresh in the background
+            self._lookup(ip, source)
+            return result
+        # Shielded so one caller going away doesn't cancel the lookup for the others
+        return copy.deepcopy(await asyncio.shield(self._lookup(ip, endpoint)))
+
+    def _offline_lookup(self, ip: Optional[str], endpoint: str) -> Dict[str, Any]:
+        """
+        Answer a lookup from the offline database
+        """
+        if not ip:
+            message = "The offline IP database can't identify the caller's own IP address"
+        else:
+            try:
+                data = self.database.endpoint_data(ip, endpoint)
+            except ValueError:
+                data, message = None, f"{ip} is not a valid IP address"
+            else:
+                message = f"{ip} is not in the offline IP database"
+            if data is not None:
+                return {
+                    "success": True,
+                    "data": data,
+                    "endpoint": endpoint,
+                    "message": f"IP information retrieved successfully from the offline {endpoint} database"
+                }
+        return {
+            "success": False,
+            "data": None,
+            "endpoint": endpoint,
+            "message": message
+        }
+
+    def _lookup(self, ip: Optional[str], endpoint: str) -> "asyncio.Task":
+        """
+        Start (or join) the upstream lookup for a key and cache its result
+        """
+        key = (ip, endpoint)
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            async def lookup() -> Dict[str, Any]:
+                try:
+                    result = await self._request(ip, endpoint)
+                    self.cache.store(ip, endpoint, result)
+                    return result
+                finally:
+                    self._inflight.pop(key, None)
+            task = self._inflight[key] = asyncio.create_task(lookup())
+        return task
+
+    async def _request(self, ip: Optional[str], endpoint: str) -> Dict[str, Any]:
+        """
+        Look an IP up with the IPinfo API, bypassing the cache
+        """
         try:
             # Map endpoint names to actual paths
             endpoint_paths = {
@@ -34,16 +167,16 @@ class IPInfoService:
                 "geo": "/geo",
                 "asn": "/asn"
             }
-            
+
             # Get the path for the requested endpoint
             path = endpoint_paths.get(endpoint, "/json")
-            
+
             # Construct the URL
             url = f"{self.base_url}/{ip if ip else ''}{path}"
-            
-            # Make the request
-            response = requests.get(url, headers=self.headers, timeout=5)
-            
+
+            # Make the request over the pooled client
+            response = await self.client.get(url, headers=self.headers)
+
             # Check if the request was successful
             if response.status_code == 200:
                 return {
@@ -60,7 +193,7 @@ class IPInfoService:
                     "endpoint": endpoint,
                     "message": f"Error from IPinfo API: {response.status_code}"
                 }
-                
+
         except Exception as e:
             logger.error(f"Exception in IPinfo service: {str(e)}")
             return {
@@ -69,3 +202,83 @@ class IPInfoService:
                 "endpoint": endpoint,
                 "message": f"Error accessing IPinfo API: {str(e)}"
             }
+
+    async def bulk_lookup(self, ips: List[str], endpoint: str = "basic",
+                          concurrency: int = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Look up many IP addresses, yielding each result as soon as it is ready
+
+        At most concurrency lookups are outstanding at once; upstream requests
+        are further bounded by the client's per-host connection and rate limits.
+
+        Args:
+            ips: Addresses to look up (already validated and deduped)
+            endpoint: The endpoint to use for every address (basic, geo, asn)
+            concurrency: Lookups in flight at once (defaults to IPINFO_BULK_CONCURRENCY)
+
+        Yields:
+            The fetch_ip_info result of each address plus its "ip", in completion order
+        """
+        concurrency = concurrency or int(os.getenv("IPINFO_BULK_CONCURRENCY", "20"))
+        pending = iter(ips)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            # Workers share one iterator, so each address is taken exactly once
+            for ip in pending:
+                try:
+                    result = await self.fetch_ip_info(ip, endpoint)
+                except Exception as e:
+                    logger.error(f"Bulk lookup of {ip} failed: {str(e)}")
+                    result = {
+                        "success": False,
+                        "data": None,
+                        "endpoint": endpoint,
+                        "message": f"Error accessing IPinfo API: {str(e)}"
+                    }
+                await results.put({"ip": ip, **result})
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(ips)))]
+        try:
+            for _ in range(len(ips)):
+                yield await results.get()
+        finally:
+            # The client may stop reading midway; don't leave lookups running for it
+            for task in workers:
+                task.cancel()
+
+    def get_ip_info(self, ip: Optional[str] = None, endpoint: str = "basic") -> Dict[str, Any]:
+        """
+        Blocking version of fetch_ip_info for scripts; don't call it from async code
+
+        Args:
+            ip: Optional IP address to look up. If not provided, returns info about the caller's IP.
+            endpoint: The endpoint to use (basic, geo, asn)
+
+        Returns:
+            Dict containing information about the IP address
+        """
+        async def fetch() -> Dict[str, Any]:
+            try:
+                return await self.fetch_ip_info(ip, endpoint)
+            finally:
+                # The pooled connections belong to this short-lived loop
+                await self.client.aclose()
+        return asyncio.run(fetch())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report cache counters and upstream request counts
+        """
+        return {
+            "cache": self.cache.get_stats(),
+            "client": dict(self.client.stats),
+            "inflight": len(self._inflight),
+            "database": self.database.get_stats() if self.database is not None else None
+        }
+
+    async def aclose(self) -> None:
+        """
+        Close the service's pooled connections
+        """
+        await self.client.aclose()
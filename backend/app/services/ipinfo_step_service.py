@@ -0,0 +1,478 @@
+"""
+Prompts and parsing for the IPinfo tool steps streamed by the query router
+"""
+import os
+import re
+import json
+import logging
+from string import Template
+from typing import Dict, Any, Optional, List, Sequence, Tuple
+from .json_stream import IncrementalJSONParser
+
+logger = logging.getLogger(__name__)
+
+# Endpoints the IPinfo plugin can call
+IPINFO_ENDPOINTS = ("basic", "geo", "asn")
+
+# Steps produced before the API call and after it, in the order they are streamed
+PLANNING_STEPS = ("acknowledge", "tool_selection", "endpoint_selection")
+REPORT_STEPS = ("api_response", "summary")
+
+# JSON schemas the steps are generated against with constrained decoding
+STEP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reasoning": {"type": "string"},
+        "choice": {"type": "string"}
+    },
+    "required": ["reasoning", "choice"]
+}
+
+ENDPOINT_STEP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reasoning": {"type": "string"},
+        "choice": {"type": "string"},
+        "endpoint": {"enum": list(IPINFO_ENDPOINTS)}
+    },
+    "required": ["reasoning", "choice", "endpoint"]
+}
+
+STEP_SCHEMAS = {
+    "acknowledge": STEP_SCHEMA,
+    "tool_selection": STEP_SCHEMA,
+    "endpoint_selection": ENDPOINT_STEP_SCHEMA,
+    "api_response": STEP_SCHEMA,
+    "summary": STEP_SCHEMA
+}
+
+def combined_schema(steps: Sequence[str]) -> Dict[str, Any]:
+    """
+    Schema for one generation answering several steps, keyed by step name
+    """
+    return {
+        "type": "object",
+        "properties": {name: STEP_SCHEMAS[name] for name in steps},
+        "required": list(steps)
+    }
+
+PLANNING_SCHEMA = combined_schema(PLANNING_STEPS)
+REPORT_SCHEMA = combined_schema(REPORT_STEPS)
+
+# What each step of a combined generation asks for, with an example answer
+COMBINED_STEP_PROMPTS = {
+    "acknowledge": "A brief acknowledgment to the user about using the IPinfo tool",
+    "tool_selection": "Why the IPinfo tool is appropriate for this query",
+    "endpoint_selection": "Which endpoint is most appropriate, with an extra 'endpoint' field that must be exactly 'basic', 'geo', or 'asn'",
+    "api_response": "The data formatted in a user-friendly way with appropriate emojis and markdown formatting",
+    "summary": "A concise summary and analysis of this IP information, including security implications (lead with the 'threat_intel' verdict if the data has one)"
+}
+
+COMBINED_STEP_EXAMPLES = {
+    "acknowledge": {"reasoning": "The user is asking about IP information, so I should acknowledge that I'll use the IPinfo tool.",
+                    "choice": "I'll help you get information about your IP address using the IPinfo tool."},
+    "tool_selection": {"reasoning": "IPinfo is designed to provide IP information.",
+                       "choice": "I'm selecting the IPinfo tool because it can retrieve detailed information about IP addresses."},
+    "endpoint_selection": {"reasoning": "The user is asking about their location, so the geo endpoint is most appropriate.",
+                           "choice": "Based on your query about location, I'll use the 'geo' endpoint for detailed geolocation data.",
+                           "endpoint": "geo"},
+    "api_response": {"reasoning": "I'm formatting the IP data with emojis and clear labels to make it more readable.",
+                     "choice": "I found the following information about your IP address:\n\n📍 **Location**: Washington, District of Columbia, US\n🌐 **IP Address**: 98.204.101.22\n..."},
+    "summary": {"reasoning": "I'm summarizing the key location and ISP details while adding security context about IP visibility.",
+                "choice": "You're currently connecting from Washington, DC with IP 98.204.101.22. Your internet is provided by Comcast. This information is visible to websites you visit."}
+}
+
+# Used when the model's output for a planning step is missing or malformed
+PLANNING_FALLBACKS = {
+    "acknowledge": {
+        "reasoning": "Processing your IP information request",
+        "choice": "I'll help you get information about your IP address using the IPinfo tool."
+    },
+    "tool_selection": {
+        "reasoning": "IPinfo is the appropriate tool for IP lookup",
+        "choice": "Selecting the IPinfo tool to retrieve IP information."
+    },
+    "endpoint_selection": {
+        "reasoning": "The basic endpoint provides general IP information",
+        "choice": "Using the 'basic' endpoint to get general IP information.",
+        "endpoint": "basic"
+    }
+}
+
+# Query words hinting at the endpoint the model will pick
+ENDPOINT_HINTS = {
+    "geo": re.compile(r"\b(where|locat\w*|city|country|region|geo\w*|coordinates?|timezone|postal)\b", re.IGNORECASE),
+    "asn": re.compile(r"\b(isp|asn|provider|network|org\w*|owner|owns|carrier|hosting)\b", re.IGNORECASE)
+}
+
+ENDPOINT_DESCRIPTIONS = {
+    "basic": "general IP information",
+    "geo": "detailed geolocation data",
+    "asn": "network provider information"
+}
+
+# Templates for steps rendered without the model, compiled once at import
+STEP_TEMPLATES = {
+    "acknowledge": (Template("The user wants information about $target, which the IPinfo tool provides"),
+                    Template("I'll help you get information about $target using the IPinfo tool.")),
+    "tool_selection": (Template("IPinfo is the appropriate tool for IP lookup"),
+                       Template("Selecting the IPinfo tool to retrieve information about $target.")),
+    "endpoint_selection": (Template("The query is best answered with $description"),
+                           Template("Using the '$endpoint' endpoint to get $description."))
+}
+
+def rank_endpoints(query: str) -> List[str]:
+    """
+    Order the IPinfo endpoints from most to least likely to be chosen for a query
+
+    Args:
+        query: The user's query
+
+    Returns:
+        All endpoints, most likely first; 'basic' wins ties since it is the default choice
+    """
+    scores = {endpoint: len(pattern.findall(query)) for endpoint, pattern in ENDPOINT_HINTS.items()}
+    return sorted(IPINFO_ENDPOINTS, key=lambda endpoint: (-scores.get(endpoint, 0), endpoint != "basic"))
+
+class IPInfoStepService:
+    """
+    Builds the LLM prompts behind the IPinfo step frames and parses their output
+
+    In "combined" mode (the default) the three planning steps come from one
+    generation before the API call and the two reporting steps from one
+    generation after it, each answering a single JSON object keyed by step
+    name. "separate" mode keeps one generation per step. Either way each
+    generation is constrained to the matching schema in this module.
+    """
+
+    def __init__(self, mode: str = None):
+        self.mode = mode or os.getenv("IPINFO_STEP_MODE", "combined")
+        if self.mode not in ("combined", "separate"):
+            logger.warning(f"Unknown IPINFO_STEP_MODE '{self.mode}', using combined mode")
+            self.mode = "combined"
+
+    # Combined mode
+
+    def planning_prompt(self, query: str, steps: Sequence[str] = PLANNING_STEPS) -> str:
+        """
+        Prompt for the planning steps (all of them by default) in one generation
+        """
+        return f"""You are a cybersecurity assistant helping a user with their query: '{query}'
+The IPinfo plugin has been selected to help answer this query. It has three endpoints:
+1. 'basic': General IP information including location, hostname, and organization
+2. 'geo': Detailed geolocation data
+3. 'asn': Network provider information
+
+{self._combined_instructions(steps, "why you chose this")}"""
+
+    def report_prompt(self, query: str, endpoint: str, data: Dict[str, Any],
+                      steps: Sequence[str] = REPORT_STEPS) -> str:
+        """
+        Prompt for the reporting steps (both by default) in one generation
+        """
+        return f"""You are a cybersecurity assistant helping with the query: '{query}'
+You've received the following data from the IPinfo {endpoint} endpoint:
+
+```json
+{json.dumps(data, indent=2)}
+```
+
+{self._combined_instructions(steps, "how you approached it")}"""
+
+    def _combined_instructions(self, steps: Sequence[str], reasoning: str) -> str:
+        count = {1: "one field", 2: "two fields", 3: "three fields"}.get(len(steps), f"{len(steps)} fields")
+        fields = "\n".join(f"{i}. '{name}': {COMBINED_STEP_PROMPTS[name]}" for i, name in enumerate(steps, start=1))
+        example = json.dumps({name: COMBINED_STEP_EXAMPLES[name] for name in steps}, ensure_ascii=False)
+        return f"""Respond with a single valid JSON object with {count}, each holding a 'reasoning' ({reasoning}) and a 'choice' (the text to show the user):
+{fields}
+
+Example response format:
+{example}
+"""
+
+    # Separate mode
+
+    def acknowledgment_prompt(self, query: str) -> str:
+        return f"""You are a cybersecurity assistant helping a user with their query: '{query}'
+The IPinfo plugin has been selected to help answer this query.
+
+Provide a brief acknowledgment to the user about using the IPinfo tool.
+Your response must be in valid JSON format with two fields:
+1. 'reasoning': Explain why you're acknowledging the request
+2. 'choice': The actual acknowledgment text to show the user
+
+Example response format:
+{{"reasoning": "The user is asking about IP information, so I should acknowledge that I'll use the IPinfo tool.", "choice": "I'll help you get information about your IP address using the IPinfo tool."}}
+"""
+
+    def tool_selection_prompt(self, query: str) -> str:
+        return f"""You are a cybersecurity assistant helping with the query: '{query}'
+The IPinfo plugin has been selected to retrieve IP information.
+
+Explain why you're selecting the IPinfo tool for this query.
+Your response must be in valid JSON format with two fields:
+1. 'reasoning': Explain why the IPinfo tool is appropriate for this query
+2. 'choice': The actual explanation to show the user
+
+Example response format:
+{{"reasoning": "The user is asking about IP addresses, and IPinfo is designed to provide IP information.", "choice": "I'm selecting the IPinfo tool because it can retrieve detailed information about IP addresses."}}
+"""
+
+    def endpoint_selection_prompt(self, query: str) -> str:
+        return f"""You are a cybersecurity assistant helping with the query: '{query}'
+The IPinfo plugin has multiple endpoints available:
+1. 'basic': General IP information including location, hostname, and organization
+2. 'geo': Detailed geolocation data
+3. 'asn': Network provider information
+
+Decide which endpoint is most appropriate for this query.
+Your response must be in valid JSON format with three fields:
+1. 'reasoning': Explain why you chose this endpoint
+2. 'choice': A brief explanation to show the user
+3. 'endpoint': The endpoint name (must be exactly 'basic', 'geo', or 'asn')
+
+Example response format:
+{{"reasoning": "The user is asking about their location, so the geo endpoint is most appropriate.", "choice": "Based on your query about location, I'll use the 'geo' endpoint for detailed geolocation data.", "endpoint": "geo"}}
+"""
+
+    def api_response_prompt(self, query: str, endpoint: str, data: Dict[str, Any]) -> str:
+        return f"""You are a cybersecurity assistant helping with the query: '{query}'
+You've received the following data from the IPinfo {endpoint} endpoint:
+
+```json
+{json.dumps(data, indent=2)}
+```
+
+Format this data in a user-friendly way with appropriate emojis and formatting.
+Your response must be in valid JSON format with two fields:
+1. 'reasoning': Explain how you're formatting the data to make it user-friendly
+2. 'choice': The formatted data presentation with emojis and markdown formatting
+
+Example response format:
+{{"reasoning": "I'm formatting the IP data with emojis and clear labels to make it more readable and engaging.", "choice": "I found the following information about your IP address:\\n\\n📍 **Location**: Washington, District of Columbia, US\\n🌐 **IP Address**: 98.204.101.22\\n..."}}
+"""
+
+    def summary_prompt(self, query: str, endpoint: str, data: Dict[str, Any]) -> str:
+        return f"""You are a cybersecurity assistant helping with the query: '{query}'
+You've retrieved the following data from the IPinfo {endpoint} endpoint:
+
+```json
+{json.dumps(data, indent=2)}
+```
+
+Provide a concise summary and analysis of this IP information, including security implications.
+If the data has a 'threat_intel' entry, lead with its verdict and the feeds that matched.
+Your response must be in valid JSON format with two fields:
+1. 'reasoning': Explain how you're interpreting the data and what insights you're providing
+2. 'choice': The actual summary and analysis to show the user
+
+Example response format:
+{{"reasoning": "I'm summarizing the key location and ISP details while adding security context about IP visibility.", "choice": "Based on the information I gathered, here's what I can tell you:\\n\\nYou're currently connecting from Washington, DC with IP 98.204.101.22. Your internet is provided by Comcast. This information is visible to websites you visit."}}
+"""
+
+    # Templates
+
+    def render_template(self, name: str, query: str, ip: str = None, endpoint: str = None,
+                        data: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Render a step without the model
+
+        Args:
+            name: Step name
+            query: The user's query
+            ip: IP address being looked up, or None for the caller's own IP
+            endpoint: IPinfo endpoint used, for the reporting steps
+            data: IPinfo API data, for the reporting steps
+
+        Returns:
+            The step JSON, in the same shape the model produces
+        """
+        if name in ("api_response", "summary"):
+            # The reporting fallbacks already format the API data directly
+            return self._validate_step(name, None, endpoint, data, warn=False)
+        target = f"the IP address {ip}" if ip else "your IP address"
+        endpoint = rank_endpoints(query)[0]
+        values = {"target": target, "endpoint": endpoint, "description": ENDPOINT_DESCRIPTIONS[endpoint]}
+        reasoning, choice = STEP_TEMPLATES[name]
+        step = {"reasoning": reasoning.substitute(values), "choice": choice.substitute(values)}
+        if name == "endpoint_selection":
+            step["endpoint"] = endpoint
+        return step
+
+    # Streaming
+
+    def step_stream(self, steps: Sequence[str], endpoint: str = None,
+                    data: Dict[str, Any] = None) -> "StepStream":
+        """
+        Follow a step generation as it streams
+
+        Args:
+            steps: Step names the generation answers, in display order
+            endpoint: IPinfo endpoint used, for the reporting steps' fallbacks
+            data: IPinfo API data, for the reporting steps' fallbacks
+
+        Returns:
+            A StepStream to feed the generated text into
+        """
+        return StepStream(self, steps, keyed=self.mode == "combined", endpoint=endpoint, data=data)
+
+    # Shared
+
+    def _validate_step(self, name: str, step: Any, endpoint: str = None,
+                       data: Dict[str, Any] = None, warn: bool = True) -> Dict[str, Any]:
+        valid = (
+            isinstance(step, dict)
+            and isinstance(step.get("reasoning"), str)
+            and isinstance(step.get("choice"), str)
+        )
+        if name == "endpoint_selection" and valid and step.get("endpoint") not in IPINFO_ENDPOINTS:
+            # Keep the model's explanation but default to basic if the endpoint is invalid
+            step = {**step, "endpoint": "basic"}
+        if valid:
+            return step
+        if warn:
+            logger.warning(f"No valid JSON for the {name} step, using the fallback")
+        if name == "api_response":
+            return {"reasoning": "Formatting the IP data with emojis and clear labels for readability",
+                    "choice": self.format_ip_data(endpoint, data)}
+        if name == "summary":
+            return {"reasoning": "Summarizing the key location and ISP details while adding security context",
+                    "choice": self.summarize_ip_data(endpoint, data)}
+        return dict(PLANNING_FALLBACKS[name])
+
+    def format_ip_data(self, endpoint: str, data: Dict[str, Any]) -> str:
+        """
+        Format IPinfo data for the user without the LLM
+        """
+        formatted_data = "I found the following information about your IP address:\n\n"
+
+        if endpoint == "basic" or endpoint == "geo":
+            formatted_data += f"📍 **Location**: {data.get('city', 'Unknown')}, {data.get('region', 'Unknown')}, {data.get('country', 'Unknown')}\n"
+            formatted_data += f"🌐 **IP Address**: {data.get('ip', 'Unknown')}\n"
+            if 'hostname' in data and data['hostname']:
+                formatted_data += f"🖥️ **Hostname**: {data.get('hostname', 'Unknown')}\n"
+            if 'loc' in data:
+                formatted_data += f"🗺️ **Coordinates**: {data.get('loc', 'Unknown')}\n"
+            if 'timezone' in data:
+                formatted_data += f"⏰ **Timezone**: {data.get('timezone', 'Unknown')}\n"
+            if 'postal' in data:
+                formatted_data += f"📮 **Postal Code**: {data.get('postal', 'Unknown')}\n"
+
+        if endpoint == "basic" or endpoint == "asn":
+            formatted_data += f"🔌 **Network Provider**: {data.get('org', 'Unknown')}\n"
+            if 'asn' in data:
+                formatted_data += f"🌐 **ASN**: {data.get('asn', 'Unknown')}\n"
+
+        threat = data.get("threat_intel")
+        if threat:
+            feeds = ", ".join(f"{match['feed']} ({match['cidr']})" for match in threat["matches"])
+            formatted_data += f"🛡️ **Threat Intel**: {threat['verdict']}{f' - {feeds}' if feeds else ''}\n"
+
+        return formatted_data
+
+    def summarize_ip_data(self, endpoint: str, data: Dict[str, Any]) -> str:
+        """
+        Summarize IPinfo data and its security implications without the LLM
+        """
+        summary = "Based on the information I gathered, here's what I can tell you:\n\n"
+
+        threat = data.get("threat_intel")
+        if threat and threat["verdict"] != "clean":
+            feeds = ", ".join(match["feed"] for match in threat["matches"])
+            summary += f"⚠️ **{threat['ip']} is {threat['verdict']}** in our threat feeds ({feeds}).\n\n"
+
+        if endpoint == "basic" or endpoint == "geo":
+            ip = data.get("ip", "Unknown")
+            city = data.get("city", "Unknown")
+            region = data.get("region", "Unknown")
+            country = data.get("country", "Unknown")
+
+            # Add location insights
+            summary += f"You're currently connecting from **{city}, {region}, {country}** "
+            summary += f"with the IP address **{ip}**. "
+
+            # Add timezone information if available
+            if "timezone" in data:
+                timezone = data.get("timezone", "Unknown")
+                summary += f"Your local timezone is **{timezone}**. "
+
+        if endpoint == "basic" or endpoint == "asn":
+            # Add ISP information
+            org = data.get("org", "Unknown")
+
+            # Extract the ISP name from the ASN format (e.g., "AS7922 Comcast Cable Communications, LLC")
+            if " " in org and org.startswith("AS"):
+                asn_num, isp_name = org.split(" ", 1)
+                summary += f"Your internet connection is provided by **{isp_name}** "
+                summary += f"(ASN: {asn_num}). "
+            else:
+                summary += f"Your internet service provider is **{org}**. "
+
+        # Add a security note
+        summary += "\n\nThis information is what websites can see when you connect to them. "
+        summary += "Using a VPN can help mask this information if privacy is a concern."
+
+        return summary
+
+class StepStream:
+    """
+    Parses a step generation incrementally while the model is still writing it
+
+    feed() and finish() return events for the router to forward:
+
+    - ("delta", name, text): more of the step's 'choice' text
+    - ("step", name, step_json): the step is complete and validated
+
+    Steps are released in display order, and only the step currently being
+    shown streams its choice text. With keyed=True the output is one object
+    keyed by step name (combined mode), otherwise it is a single step object.
+    """
+
+    def __init__(self, service: IPInfoStepService, steps: Sequence[str], keyed: bool = True,
+                 endpoint: str = None, data: Dict[str, Any] = None):
+        self.service = service
+        self.steps = list(steps)
+        self.keyed = keyed
+        self.endpoint = endpoint
+        self.data = data
+        self.completed = {}
+        self._parser = IncrementalJSONParser()
+        self._released = 0
+
+    def feed(self, text: str) -> List[Tuple[str, str, Any]]:
+        events = []
+        for kind, path, value in self._parser.feed(text):
+            if self.keyed:
+                if not path or path[0] not in self.steps:
+                    continue
+                name, path = path[0], path[1:]
+            else:
+                name = self.steps[0]
+            if name in self.completed:
+                continue
+            if kind == "delta" and path == ("choice",) and name == self._current():
+                events.append(("delta", name, value))
+            elif kind == "value" and path == ():
+                self.completed[name] = self.service._validate_step(name, value, self.endpoint, self.data)
+                events.extend(self._release())
+        return events
+
+    def finish(self) -> List[Tuple[str, str, Any]]:
+        """
+        Complete the steps the generation never finished with their fallbacks
+        """
+        for name in self.steps:
+            if name not in self.completed:
+                self.completed[name] = self.service._validate_step(name, None, self.endpoint, self.data)
+        return self._release()
+
+    def _current(self) -> Optional[str]:
+        return self.steps[self._released] if self._released < len(self.steps) else None
+
+    def _release(self) -> List[Tuple[str, str, Any]]:
+        events = []
+        while self._current() in self.completed:
+            name = self._current()
+            events.append(("step", name, self.completed[name]))
+            self._released += 1
+        return events
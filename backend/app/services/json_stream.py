@@ -0,0 +1,186 @@
+"""
+Incremental JSON parsing for model output that is still being generated
+"""
+import json
+from typing import Any, List, Optional, Tuple
+
+# Characters that can continue a number or a true/false/null literal
+_SCALAR_CHARS = set("0123456789+-.eEtruefalsn")
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class IncrementalJSONParser:
+    """
+    Parses one JSON value from text fed in arbitrary chunks
+
+    Each call to feed() returns the events the new text completed:
+
+    - ("delta", path, text): more characters of the string value at path,
+      with escapes already decoded
+    - ("value", path, value): the value at path is complete
+
+    A path is the tuple of object keys and array indices leading to a value;
+    the top-level value has the path (). Text before the first '{' or '[' is
+    skipped, so prose the model writes ahead of its JSON does not matter, and
+    text after the top-level value is ignored.
+    """
+
+    def __init__(self):
+        # Open containers as [path, value, pending key, expecting a key]
+        self._stack = []
+        self._string = None
+        self._string_is_key = False
+        self._escape = None
+        self._scalar = None
+        self._done = False
+        self._result = None
+        self._error = False
+
+    @property
+    def done(self) -> bool:
+        """Whether the top-level value is complete"""
+        return self._done
+
+    @property
+    def result(self) -> Any:
+        """The top-level value once done, otherwise None"""
+        return self._result
+
+    def feed(self, text: str) -> List[Tuple[str, Tuple, Any]]:
+        """
+        Parse the next chunk of text
+
+        Args:
+            text: The next chunk of model output
+
+        Returns:
+            Events completed by this chunk, in order
+        """
+        events = []
+        delta = []
+        for ch in text:
+            if self._done or self._error:
+                break
+            if self._string is not None:
+                decoded = self._string_char(ch, events, delta)
+                if decoded is not None and not self._string_is_key:
+                    delta.append(decoded)
+                continue
+            if self._scalar is not None:
+                if ch in _SCALAR_CHARS:
+                    self._scalar.append(ch)
+                    continue
+                self._finish_scalar(events)
+                if self._done or self._error:
+                    break
+            self._structural(ch, events)
+        if delta and self._string is not None and not self._string_is_key:
+            events.append(("delta", self._value_path(), "".join(delta)))
+        return events
+
+    # Strings
+
+    def _string_char(self, ch: str, events: List, delta: List) -> Optional[str]:
+        if self._escape is not None:
+            if self._escape == "":
+                if ch == "u":
+                    self._escape = "u"
+                    return None
+                self._escape = None
+                return self._append(_ESCAPES.get(ch, ch))
+            self._escape += ch
+            if len(self._escape) < 5:
+                return None
+            code = int(self._escape[1:], 16)
+            self._escape = None
+            # Join a UTF-16 surrogate pair split over two escapes
+            if 0xDC00 <= code <= 0xDFFF and self._string and 0xD800 <= ord(self._string[-1]) <= 0xDBFF:
+                high = ord(self._string.pop())
+                return self._append(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+            if 0xD800 <= code <= 0xDBFF:
+                # Hold a high surrogate back from the deltas until its pair arrives
+                self._string.append(chr(code))
+                return None
+            return self._append(chr(code))
+        if ch == "\\":
+            self._escape = ""
+            return None
+        if ch == '"':
+            value = "".join(self._string)
+            self._string = None
+            if self._string_is_key:
+                self._stack[-1][2] = value
+                self._stack[-1][3] = False
+            else:
+                # Flush what this chunk added before reporting the whole string
+                if delta:
+                    events.append(("delta", self._value_path(), "".join(delta)))
+                    delta.clear()
+                self._complete(value, events)
+            return None
+        return self._append(ch)
+
+    def _append(self, ch: str) -> str:
+        self._string.append(ch)
+        return ch
+
+    # Numbers and literals
+
+    def _finish_scalar(self, events: List) -> None:
+        text = "".join(self._scalar)
+        self._scalar = None
+        try:
+            value = json.loads(text)
+        except ValueError:
+            self._error = True
+            return
+        self._complete(value, events)
+
+    # Structure
+
+    def _structural(self, ch: str, events: List) -> None:
+        if ch in " \t\r\n":
+            return
+        if not self._stack and ch not in "{[":
+            # Still looking for the start of the JSON value
+            return
+        if ch == "{" or ch == "[":
+            path = self._value_path()
+            self._stack.append([path, {} if ch == "{" else [], None, ch == "{"])
+        elif ch == "}" or ch == "]":
+            path, value, _, _ = self._stack.pop()
+            self._complete(value, events, path)
+        elif ch == '"':
+            self._string = []
+            self._string_is_key = isinstance(self._stack[-1][1], dict) and self._stack[-1][3]
+        elif ch == ",":
+            if isinstance(self._stack[-1][1], dict):
+                self._stack[-1][3] = True
+        elif ch == ":":
+            self._stack[-1][3] = False
+        elif ch in _SCALAR_CHARS:
+            self._scalar = [ch]
+        else:
+            self._error = True
+
+    def _value_path(self) -> Tuple:
+        if not self._stack:
+            return ()
+        path, container, key, _ = self._stack[-1]
+        if isinstance(container, dict):
+            return path + (key,)
+        return path + (len(container),)
+
+    def _complete(self, value: Any, events: List, path: Tuple = None) -> None:
+        if path is None:
+            path = self._value_path()
+        events.append(("value", path, value))
+        if not self._stack:
+            self._done = True
+            self._result = value
+            return
+        container = self._stack[-1][1]
+        if isinstance(container, dict):
+            container[self._stack[-1][2]] = value
+        else:
+            container.append(value)
@@ -0,0 +1,178 @@
+"""
+KV cache reuse for the MLX generation engine
+"""
+import os
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+class PrefixCache:
+    """
+    LRU of prefilled KV snapshots keyed by prompt-prefix token IDs
+
+    Every request that starts with the same system prompt and plugin context
+    shares one snapshot. The snapshot is built once and each request gets its
+    own fork, so decoding never mutates the shared state.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv("MLX_PREFIX_CACHE_ENTRIES", "16"))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fork(self, prefix_tokens: Sequence[int], build: Callable[[List[int]], List[Any]]) -> List[Any]:
+        """
+        Get a private copy of the KV state for a prompt prefix
+
+        Args:
+            prefix_tokens: Token IDs of the shared prompt prefix
+            build: Prefills a fresh cache with the given tokens on a miss
+
+        Returns:
+            Per-layer KV cache positioned right after the prefix
+        """
+        key = tuple(prefix_tokens)
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if snapshot is None:
+            snapshot = build(list(key))
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = snapshot
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            logger.info(f"Cached KV prefix of {len(key)} tokens ({len(self._entries)} cached prefixes)")
+
+        return copy.deepcopy(snapshot)
+
+    def clear(self) -> None:
+        """Drop every cached snapshot"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report hit/miss counts and the size of the cached snapshots
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "nbytes": sum(c.nbytes for snapshot in self._entries.values() for c in snapshot)
+            }
+
+class SessionCache:
+    """
+    Byte-budgeted LRU of per-conversation KV state
+
+    After each assistant turn the engine stores the conversation's KV cache
+    together with the tokens it covers. The next turn checks the entry out and
+    only prefills what was appended since. Entries are checked out exclusively,
+    and every invalidation bumps the conversation's epoch so a turn that was
+    already running cannot store state for history that has since changed.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or int(os.getenv("MLX_SESSION_CACHE_BYTES", str(2 * 1024 ** 3)))
+        # conversation_id -> (tokens, cache, nbytes, owner)
+        self._entries = OrderedDict()
+        self._epochs = {}
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def checkout(self, conversation_id: int, owner: Any = None) -> tuple:
+        """
+        Take a conversation's KV state out of the cache
+
+        Args:
+            conversation_id: ID of the conversation
+            owner: Model asking for the state; state stored by another model is a miss
+
+        Returns:
+            Tuple of (epoch, tokens, cache); tokens and cache are None on a miss
+        """
+        with self._lock:
+            epoch = self._epochs.get(conversation_id, 0)
+            entry = self._entries.pop(conversation_id, None)
+            if entry is not None:
+                self._nbytes -= entry[2]
+            if entry is None or entry[3] != owner:
+                self.misses += 1
+                return epoch, None, None
+            self.hits += 1
+            return epoch, entry[0], entry[1]
+
+    def store(self, conversation_id: int, epoch: int, tokens: List[int], cache: List[Any],
+              owner: Any = None) -> None:
+        """
+        Keep a conversation's KV state after an assistant turn
+
+        Args:
+            conversation_id: ID of the conversation
+            epoch: Epoch returned by checkout() when the turn started
+            tokens: Token IDs covered by the cache
+            cache: Per-layer KV cache
+            owner: Model that produced the state
+        """
+        nbytes = sum(c.nbytes for c in cache)
+        with self._lock:
+            if self._epochs.get(conversation_id, 0) != epoch or nbytes > self.max_bytes:
+                return
+            previous = self._entries.pop(conversation_id, None)
+            if previous is not None:
+                self._nbytes -= previous[2]
+            self._entries[conversation_id] = (list(tokens), cache, nbytes, owner)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted[2]
+                self.evictions += 1
+
+    def invalidate(self, conversation_id: int) -> None:
+        """
+        Drop a conversation's KV state because its history changed
+
+        Args:
+            conversation_id: ID of the conversation
+        """
+        with self._lock:
+            self._epochs[conversation_id] = self._epochs.get(conversation_id, 0) + 1
+            entry = self._entries.pop(conversation_id, None)
+            if entry is not None:
+                self._nbytes -= entry[2]
+                self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report hit/miss/eviction counts and bytes held against the budget
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "nbytes": self._nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+# Conversation KV state is shared by every router in the process
+session_cache = SessionCache()
@@ -0,0 +1,283 @@
+"""
+Vectorized analytics over ingested log events
+
+Events are stored column by column (timestamps, interned IP/user/user-agent
+ids, action and status codes) in compact typed arrays as they are parsed,
+and analyzed with NumPy in a handful of passes: bincounts for per-IP totals,
+np.unique over combined (ip, time bucket) keys for request rates and
+failed-login bursts, and histograms over time buckets. The result renders as
+a short table for the model instead of the events themselves.
+
+NumPy is optional; without it LogIngestor simply skips this stage.
+"""
+import math
+import logging
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Action codes stored in the actions column
+ACTIONS = ("request", "login_failed", "invalid_user", "login_accepted", "other")
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+REQUEST, LOGIN_FAILED, INVALID_USER = ACTION_CODES["request"], ACTION_CODES["login_failed"], ACTION_CODES["invalid_user"]
+
+# Histograms have at most this many buckets, widening the bucket for long time ranges
+MAX_HISTOGRAM_BUCKETS = 48
+
+class EventColumns:
+    """
+    Columnar store of log events
+
+    Strings are interned to integer ids (-1 when missing), so an event costs
+    23 bytes however long its user agent is.
+
+    Args:
+        max_events: Events stored before further ones are only counted as dropped
+    """
+
+    def __init__(self, max_events: int = 10_000_000):
+        self.max_events = max_events
+        self.timestamps = array("d")
+        self.ips = array("i")
+        self.users = array("i")
+        self.user_agents = array("i")
+        self.actions = array("b")
+        self.statuses = array("h")
+        self.ip_names: List[str] = []
+        self.user_names: List[str] = []
+        self.agent_names: List[str] = []
+        self._ids = ({}, {}, {})
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def _intern(self, table: int, names: List[str], value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        ids = self._ids[table]
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(names)
+            names.append(value)
+        return index
+
+    def add(self, event) -> None:
+        """
+        Store one LogEvent
+        """
+        if len(self.actions) >= self.max_events:
+            self.dropped += 1
+            return
+        self.timestamps.append(math.nan if event.timestamp is None else event.timestamp)
+        self.ips.append(self._intern(0, self.ip_names, event.ip))
+        self.users.append(self._intern(1, self.user_names, event.user))
+        self.user_agents.append(self._intern(2, self.agent_names, event.user_agent))
+        self.actions.append(ACTION_CODES.get(event.action, ACTION_CODES["other"]))
+        self.statuses.append(event.status)
+
+    @classmethod
+    def from_arrays(cls, ip_names: List[str], agent_names: List[str], user_names: List[str],
+                    **columns: "np.ndarray") -> "EventColumns":
+        """
+        Build a store directly from column arrays (as returned by arrays()) and the interned names
+        """
+        store = cls(max_events=len(columns["actions"]))
+        store.ip_names, store.agent_names, store.user_names = list(ip_names), list(agent_names), list(user_names)
+        store._ids = tuple({name: i for i, name in enumerate(names)}
+                           for names in (store.ip_names, store.user_names, store.agent_names))
+        for name, dtype in (("timestamps", "float64"), ("ips", "int32"), ("users", "int32"),
+                            ("user_agents", "int32"), ("actions", "int8"), ("statuses", "int16")):
+            getattr(store, name).frombytes(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        return store
+
+    def arrays(self) -> Dict[str, "np.ndarray"]:
+        """
+        The columns as NumPy arrays (views of the stored data, no copy)
+        """
+        return {
+            "timestamps": np.frombuffer(self.timestamps, dtype=np.float64),
+            "ips": np.frombuffer(self.ips, dtype=np.int32),
+            "users": np.frombuffer(self.users, dtype=np.int32),
+            "user_agents": np.frombuffer(self.user_agents, dtype=np.int32),
+            "actions": np.frombuffer(self.actions, dtype=np.int8),
+            "statuses": np.frombuffer(self.statuses, dtype=np.int16)
+        }
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+def _top_indices(values: "np.ndarray", n: int) -> "np.ndarray":
+    # Indices of the n largest non-zero values, largest first
+    n = min(n, int(np.count_nonzero(values)))
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-values, n - 1)[:n]
+    return candidates[np.argsort(-values[candidates], kind="stable")]
+
+def _group_counts(groups: "np.ndarray", buckets: "np.ndarray", bucket_count: int):
+    # Events per (group, bucket) pair: (group of each pair, bucket of each pair, count)
+    keys, counts = np.unique(groups.astype(np.int64) * bucket_count + buckets, return_counts=True)
+    return keys // bucket_count, keys % bucket_count, counts
+
+def analyze(columns: EventColumns, top: int = 10, burst_window: int = 60, burst_threshold: int = 10,
+            rare_agent_share: float = 0.001, bucket_seconds: int = 60) -> Dict[str, Any]:
+    """
+    Compute security analytics over the stored events
+
+    Args:
+        columns: Events to analyze
+        top: Rows kept per table
+        burst_window: Window in seconds for failed-login bursts
+        burst_threshold: Failed logins from one IP within a window that make a burst
+        rare_agent_share: User agents seen in at most this share of requests count as rare
+        bucket_seconds: Narrowest histogram bucket (widened to keep at most
+                        MAX_HISTOGRAM_BUCKETS buckets)
+
+    Returns:
+        {"events", "top_talkers", "request_rates", "failed_login_bursts",
+         "rare_user_agents", "histogram"}
+    """
+    data = columns.arrays()
+    ips, actions, statuses, timestamps = data["ips"], data["actions"], data["statuses"], data["timestamps"]
+    ip_count = len(columns.ip_names)
+    has_ip = ips >= 0
+    requests = actions == REQUEST
+    failed = (actions == LOGIN_FAILED) | (actions == INVALID_USER)
+    errors = requests & (statuses >= 400)
+
+    # Per-IP totals
+    events_per_ip = np.bincount(ips[has_ip], minlength=ip_count)
+    requests_per_ip = np.bincount(ips[has_ip & requests], minlength=ip_count)
+    failed_per_ip = np.bincount(ips[has_ip & failed], minlength=ip_count)
+    errors_per_ip = np.bincount(ips[has_ip & errors], minlength=ip_count)
+    top_talkers = [{"ip": columns.ip_names[i], "events": int(events_per_ip[i]), "requests": int(requests_per_ip[i]),
+                    "failed_logins": int(failed_per_ip[i]), "http_errors": int(errors_per_ip[i])}
+                   for i in _top_indices(events_per_ip, top)]
+
+    timed = ~np.isnan(timestamps)
+    start = float(timestamps[timed].min()) if timed.any() else 0.0
+    end = float(timestamps[timed].max()) if timed.any() else 0.0
+    offsets = np.where(timed, timestamps - start, 0)
+
+    # Request rates: requests per active minute and the busiest minute of each IP
+    request_rates = []
+    selected = has_ip & requests & timed
+    if selected.any():
+        minutes = (offsets[selected] // 60).astype(np.int64)
+        groups, _, counts = _group_counts(ips[selected], minutes, int(minutes.max()) + 1)
+        first = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        peaks = np.maximum.reduceat(counts, first)
+        active = np.diff(np.r_[first, len(groups)])
+        owners = groups[first]
+        for i in _top_indices(peaks, top):
+            ip = int(owners[i])
+            request_rates.append({"ip": columns.ip_names[ip], "requests": int(requests_per_ip[ip]),
+                                  "active_minutes": int(active[i]), "peak_per_minute": int(peaks[i]),
+                                  "mean_per_minute": round(float(requests_per_ip[ip]) / int(active[i]), 1)})
+
+    # Failed-login bursts: windows in which one IP failed burst_threshold times or more
+    bursts = []
+    selected = has_ip & failed & timed
+    if selected.any():
+        windows = (offsets[selected] // burst_window).astype(np.int64)
+        groups, window_ids, counts = _group_counts(ips[selected], windows, int(windows.max()) + 1)
+        hits = counts >= burst_threshold
+        for i in _top_indices(np.where(hits, counts, 0), top):
+            bursts.append({"ip": columns.ip_names[int(groups[i])], "start": _iso(start + int(window_ids[i]) * burst_window),
+                           "failures": int(counts[i]), "window_seconds": burst_window})
+
+    # Rare user agents, with how many distinct IPs sent each
+    rare_agents = []
+    agents = data["user_agents"]
+    with_agent = requests & (agents >= 0)
+    if with_agent.any():
+        agent_counts = np.bincount(agents[with_agent], minlength=len(columns.agent_names))
+        limit = max(1, int(rare_agent_share * int(with_agent.sum())))
+        rare = (agent_counts > 0) & (agent_counts <= limit)
+        if rare.any():
+            rare_rows = with_agent & has_ip & rare[np.maximum(agents, 0)]
+            pairs, _, _ = _group_counts(agents[rare_rows], ips[rare_rows], ip_count)
+            ips_per_agent = np.bincount(pairs, minlength=len(columns.agent_names))
+            # Rarest first, ties broken by the number of IPs sending it
+            order = np.lexsort((-ips_per_agent[rare], agent_counts[rare]))
+            for agent in np.flatnonzero(rare)[order][:top]:
+                rare_agents.append({"user_agent": columns.agent_names[agent], "requests": int(agent_counts[agent]),
+                                    "ips": int(ips_per_agent[agent])})
+
+    # Events, failed logins and HTTP errors per time bucket
+    histogram = None
+    if timed.any():
+        span = end - start
+        width = bucket_seconds * max(1, math.ceil(span / (bucket_seconds * MAX_HISTOGRAM_BUCKETS)))
+        bucket_count = int(span // width) + 1
+        buckets = (offsets // width).astype(np.int64)
+        histogram = {
+            "start": _iso(start),
+            "bucket_seconds": width,
+            "events": np.bincount(buckets[timed], minlength=bucket_count).tolist(),
+            "failed_logins": np.bincount(buckets[timed & failed], minlength=bucket_count).tolist(),
+            "http_errors": np.bincount(buckets[timed & errors], minlength=bucket_count).tolist()
+        }
+
+    return {
+        "events": len(columns),
+        "dropped_events": columns.dropped,
+        "top_talkers": top_talkers,
+        "request_rates": request_rates,
+        "failed_login_bursts": bursts,
+        "rare_user_agents": rare_agents,
+        "histogram": histogram
+    }
+
+def _histogram_cells(histogram: Dict[str, Any]) -> List[str]:
+    # One "events/failed/errors" cell per bucket, with runs of empty buckets collapsed
+    cells, empty = [], 0
+    for cell in zip(histogram["events"], histogram["failed_logins"], histogram["http_errors"]):
+        if not cell[0]:
+            empty += 1
+            continue
+        if empty:
+            cells.append(f"[{empty} empty]" if empty > 1 else "0/0/0")
+            empty = 0
+        cells.append("/".join(map(str, cell)))
+    return cells
+
+def summary_table(analytics: Dict[str, Any], talkers: bool = True) -> str:
+    """
+    Render analyze() output as compact pipe-separated tables for a prompt
+
+    Args:
+        analytics: analyze() output
+        talkers: Include the top talkers (left out when the caller lists busy IPs itself)
+    """
+    lines = []
+    if talkers and analytics["top_talkers"]:
+        lines += ["Top talkers (ip | events | requests | failed logins | HTTP errors):"]
+        lines += [f"{row['ip']} | {row['events']} | {row['requests']} | {row['failed_logins']} | {row['http_errors']}"
+                  for row in analytics["top_talkers"]]
+    if analytics["request_rates"]:
+        lines += ["", "Highest request rates (ip | requests | active minutes | mean/min | peak/min):"]
+        lines += [f"{row['ip']} | {row['requests']} | {row['active_minutes']} | {row['mean_per_minute']} | {row['peak_per_minute']}"
+                  for row in analytics["request_rates"]]
+    if analytics["failed_login_bursts"]:
+        lines += ["", "Failed-login bursts (ip | window start | failures in window):"]
+        lines += [f"{row['ip']} | {row['start']} | {row['failures']} in {row['window_seconds']}s"
+                  for row in analytics["failed_login_bursts"]]
+    if analytics["rare_user_agents"]:
+        lines += ["", "Rare user agents (agent | requests | IPs):"]
+        lines += [f"{row['user_agent'][:80]} | {row['requests']} | {row['ips']}" for row in analytics["rare_user_agents"]]
+    histogram = analytics["histogram"]
+    if histogram and len(histogram["events"]) > 1:
+        lines += ["", f"Activity per {histogram['bucket_seconds']}s from {histogram['start']} (events/failed logins/HTTP errors):",
+                  " ".join(_histogram_cells(histogram))]
+    if analytics["dropped_events"]:
+        lines += ["", f"Only the first {analytics['events']} events were analyzed ({analytics['dropped_events']} more were not)."]
+    return "\n".join(lines).strip("\n")
@@ -0,0 +1,565 @@
+"""
+Streaming ingestion of syslog and web server access logs
+
+Log files are read as a stream of byte chunks (an upload, or a memory-mapped
+file on disk) and parsed line by line into events; only aggregates are kept,
+so memory stays bounded however large the input is. Recognized formats:
+
+    syslog   RFC 3164 ("May  1 12:30:45 host sshd[123]: ...") and ISO-timestamped
+             RFC 5424-style lines; sshd/PAM authentication messages become login events
+    access   The common/combined log format written by nginx and Apache
+
+Gzip-compressed input is detected and decompressed on the fly. The
+aggregates (top talkers, failed logins per IP and user, HTTP status mix and
+so on) are what goes into the LLM prompt, never the raw lines. With NumPy
+installed, events are also kept in compact columns for the vectorized
+analytics of log_analytics (request rates, failed-login bursts, rare user
+agents, activity histograms).
+"""
+import re
+import mmap
+import zlib
+import time
+import logging
+import ipaddress
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from .ioc_extractor import IOCExtractor, IP_TYPES
+from .log_analytics import EventColumns, analyze, np, summary_table
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMATS = ("auto", "syslog", "access")
+
+# Longest line kept; longer ones are truncated rather than buffered without bound
+MAX_LINE_BYTES = 65536
+# Bytes read from a file per chunk
+READ_CHUNK_BYTES = 1 << 20
+GZIP_MAGIC = b"\x1f\x8b"
+
+_SYSLOG = re.compile(
+    r"^(?:<\d{1,3}>(?:1 )?)?"
+    r"(?P<ts>[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d|\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)?) "
+    r"(?P<host>\S+) (?P<program>[^\s\[:]+)(?:\[(?P<pid>\d+)\])?: (?P<message>.*)$"
+)
+_ACCESS = re.compile(
+    r'^(?P<ip>[0-9a-fA-F.:]+) \S+ (?P<user>\S+) \[(?P<ts>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<path>\S+)(?: [^"]*)?" (?P<status>\d{3}) (?P<bytes>\d+|-)'
+    r'(?: "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)")?'
+)
+# sshd and PAM messages, most common first
+_AUTH_MESSAGES = [
+    ("login_failed", re.compile(r"^Failed \S+ for (?:invalid user )?(?P<user>\S*) from (?P<ip>\S+)")),
+    ("login_accepted", re.compile(r"^Accepted \S+ for (?P<user>\S+) from (?P<ip>\S+)")),
+    ("invalid_user", re.compile(r"^Invalid user (?P<user>\S*) from (?P<ip>\S+)")),
+    ("login_failed", re.compile(r"authentication failure;.*\brhost=(?P<ip>\S+)(?:\s+user=(?P<user>\S+))?")),
+]
+
+class LogTooLarge(ValueError):
+    """Raised when log data passes the ingestor's size limit"""
+
+class LogEvent(NamedTuple):
+    """One parsed log line"""
+    source: str                 # "syslog" or "access"
+    timestamp: Optional[float]  # Unix time, None if unparseable
+    ip: Optional[str]           # Client or remote address
+    user: Optional[str]
+    action: str                 # request, login_failed, login_accepted, invalid_user or other
+    status: int                 # HTTP status (0 for syslog)
+    path: Optional[str]
+    user_agent: Optional[str]
+    program: Optional[str]      # Syslog program (None for access logs)
+    bytes: int
+
+class _TopCounter:
+    """
+    Counter that keeps memory bounded by dropping its smallest counts
+
+    Once it holds twice its capacity it is cut back to the capacity most
+    common keys, so counts of rare keys are approximate but the heavy
+    hitters an analyst cares about stay exact or nearly so.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.pruned = False
+
+    def add(self, key: str, count: int = 1) -> None:
+        counts = self.counts
+        counts[key] = counts.get(key, 0) + count
+        if len(counts) > 2 * self.capacity:
+            self.counts = dict(self.most_common(self.capacity))
+            self.pruned = True
+
+    def get(self, key: str) -> int:
+        return self.counts.get(key, 0)
+
+    def most_common(self, n: int) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+class _Timestamps:
+    """Parse log timestamps, caching by text since many lines share the same second"""
+
+    # RFC 3164 times further ahead than this are taken to be from last year
+    FUTURE_SLACK = 86400
+
+    def __init__(self, now: float = None):
+        self.now = now or time.time()
+        self.year = datetime.fromtimestamp(self.now, timezone.utc).year
+        self._cache: Dict[str, Optional[float]] = {}
+
+    def parse(self, text: str, source: str) -> Optional[float]:
+        value = self._cache.get(text, False)
+        if value is not False:
+            return value
+        try:
+            if source == "access":
+                value = datetime.strptime(text, "%d/%b/%Y:%H:%M:%S %z").timestamp()
+            elif text[0].isdigit():
+                value = datetime.fromisoformat(text.replace("Z", "+00:00").replace(" ", "T", 1))
+                value = (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+            else:
+                # RFC 3164 timestamps have no year or zone: assume this year, UTC, unless
+                # that puts them in the future (December logs read in January)
+                value = datetime.strptime(f"{self.year} {text}", "%Y %b %d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+                if value > self.now + self.FUTURE_SLACK:
+                    value = datetime.strptime(f"{self.year - 1} {text}", "%Y %b %d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            value = None
+        if len(self._cache) > 100000:
+            self._cache.clear()
+        self._cache[text] = value
+        return value
+
+def _clean_ip(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    try:
+        return str(ipaddress.ip_address(text.strip("[]")))
+    except ValueError:
+        return None
+
+class LogParser:
+    """
+    Turn log lines into LogEvents
+
+    Args:
+        log_format: "syslog", "access" or "auto" to recognize each line's format
+    """
+
+    def __init__(self, log_format: str = "auto"):
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format {log_format!r}, expected one of {', '.join(LOG_FORMATS)}")
+        self.log_format = log_format
+        self.timestamps = _Timestamps()
+
+    def parse(self, line: str) -> Optional[LogEvent]:
+        """
+        Parse one line (without its newline); None if it is in no known format
+        """
+        if self.log_format != "syslog":
+            match = _ACCESS.match(line)
+            if match:
+                size = match.group("bytes")
+                user = match.group("user")
+                return LogEvent("access", self.timestamps.parse(match.group("ts"), "access"),
+                                _clean_ip(match.group("ip")), None if user == "-" else user, "request",
+                                int(match.group("status")), match.group("path"), match.group("user_agent"),
+                                None, 0 if size == "-" else int(size))
+        if self.log_format != "access":
+            match = _SYSLOG.match(line)
+            if match:
+                message = match.group("message")
+                action, ip, user = "other", None, None
+                for name, pattern in _AUTH_MESSAGES:
+                    auth = pattern.search(message)
+                    if auth:
+                        action, ip, user = name, _clean_ip(auth.group("ip")), auth.group("user") or None
+                        break
+                return LogEvent("syslog", self.timestamps.parse(match.group("ts"), "syslog"), ip, user, action,
+                                0, None, None, match.group("program"), 0)
+        return None
+
+class LogAggregator:
+    """
+    Bounded-memory aggregates over a stream of LogEvents
+
+    Args:
+        max_keys: Distinct IPs, users, paths and user agents tracked per counter
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.events = 0
+        self.sources = {"syslog": 0, "access": 0}
+        self.actions: Dict[str, int] = {}
+        self.statuses: Dict[str, int] = {}
+        self.first_seen: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.ip_events = _TopCounter(max_keys)
+        self.ip_failed_logins = _TopCounter(max_keys)
+        self.ip_http_errors = _TopCounter(max_keys)
+        self.user_failed_logins = _TopCounter(max_keys)
+        self.user_accepted_logins = _TopCounter(max_keys)
+        self.paths = _TopCounter(max_keys)
+        self.user_agents = _TopCounter(max_keys)
+        self.programs = _TopCounter(max_keys)
+
+    def add(self, event: LogEvent) -> None:
+        """
+        Count one event
+        """
+        self.events += 1
+        self.sources[event.source] += 1
+        self.actions[event.action] = self.actions.get(event.action, 0) + 1
+        if event.timestamp is not None:
+            if self.first_seen is None or event.timestamp < self.first_seen:
+                self.first_seen = event.timestamp
+            if self.last_seen is None or event.timestamp > self.last_seen:
+                self.last_seen = event.timestamp
+        if event.ip:
+            self.ip_events.add(event.ip)
+        if event.action in ("login_failed", "invalid_user"):
+            if event.ip:
+                self.ip_failed_logins.add(event.ip)
+            if event.user:
+                self.user_failed_logins.add(event.user)
+        elif event.action == "login_accepted" and event.user:
+            self.user_accepted_logins.add(event.user)
+        if event.source == "access":
+            status_class = f"{event.status // 100}xx"
+            self.statuses[status_class] = self.statuses.get(status_class, 0) + 1
+            if event.status >= 400 and event.ip:
+                self.ip_http_errors.add(event.ip)
+            self.paths.add(event.path.split("?", 1)[0])
+            if event.user_agent:
+                self.user_agents.add(event.user_agent)
+        elif event.program:
+            self.programs.add(event.program)
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Compact aggregates for reports and prompts
+
+        Args:
+            top: Entries kept in each top-N list
+
+        Returns:
+            Event counts by source and action, the time range, the busiest and the
+            most failing IPs, users with failed logins, HTTP status classes, paths,
+            user agents and syslog programs; "approximate" is set once any counter
+            had to drop rare keys
+        """
+        def iso(timestamp: Optional[float]) -> Optional[str]:
+            return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+
+        def ip_row(ip: str) -> Dict[str, Any]:
+            return {"ip": ip, "events": self.ip_events.get(ip), "failed_logins": self.ip_failed_logins.get(ip),
+                    "http_errors": self.ip_http_errors.get(ip)}
+
+        counters = (self.ip_events, self.ip_failed_logins, self.ip_http_errors, self.user_failed_logins,
+                    self.user_accepted_logins, self.paths, self.user_agents, self.programs)
+        return {
+            "events": self.events,
+            "sources": dict(self.sources),
+            "actions": dict(self.actions),
+            "time_range": {"start": iso(self.first_seen), "end": iso(self.last_seen)},
+            "distinct_ips": len(self.ip_events),
+            "top_ips": [ip_row(ip) for ip, _ in self.ip_events.most_common(top)],
+            "top_failed_login_ips": [ip_row(ip) for ip, _ in self.ip_failed_logins.most_common(top)],
+            "top_failed_login_users": [{"user": user, "failed_logins": count,
+                                        "accepted_logins": self.user_accepted_logins.get(user)}
+                                       for user, count in self.user_failed_logins.most_common(top)],
+            "accepted_login_users": [{"user": user, "accepted_logins": count}
+                                     for user, count in self.user_accepted_logins.most_common(top)],
+            "http_statuses": dict(sorted(self.statuses.items())),
+            "top_paths": [{"path": path, "requests": count} for path, count in self.paths.most_common(top)],
+            "top_user_agents": [{"user_agent": agent, "requests": count} for agent, count in self.user_agents.most_common(top)],
+            "top_programs": [{"program": program, "lines": count} for program, count in self.programs.most_common(top)],
+            "approximate": any(counter.pruned for counter in counters)
+        }
+
+class LogIngestor:
+    """
+    Incremental parser and aggregator for log data arriving in byte chunks
+
+    Chunks may split lines (and UTF-8 characters) anywhere; only complete
+    lines are parsed. IP addresses mentioned anywhere in syslog messages are
+    counted too, not just those of recognized login events.
+
+    Args:
+        log_format: "syslog", "access" or "auto"
+        max_keys: Distinct keys tracked per aggregate counter
+        analytics: Keep events in columns for the vectorized analytics (needs NumPy)
+        max_events: Events kept for the analytics (23 bytes each)
+        max_bytes: Most bytes of log data accepted after decompression (None for no limit)
+    """
+
+    def __init__(self, log_format: str = "auto", max_keys: int = 100000, analytics: bool = True,
+                 max_events: int = 10_000_000, max_bytes: int = None):
+        self.parser = LogParser(log_format)
+        self.aggregator = LogAggregator(max_keys)
+        self.columns = EventColumns(max_events) if analytics and np is not None else None
+        self.mentioned_ips = IOCExtractor(types=IP_TYPES, max_offsets=0)
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self.decompressed_bytes = 0
+        self.lines = 0
+        self.unparsed = 0
+        self.truncated = 0
+        self._pending = b""
+        self._decompressor = None
+        self._elapsed = 0.0
+
+    def feed(self, data: bytes) -> None:
+        """
+        Add more raw (possibly gzip-compressed) input
+
+        Compressed input is inflated READ_CHUNK_BYTES at a time and each slice is
+        parsed before the next, so a small, highly compressed chunk can't expand
+        into memory all at once.
+
+        Raises:
+            LogTooLarge: The (decompressed) input passed max_bytes
+        """
+        start = time.perf_counter()
+        if not self.bytes_read and data[:2] == GZIP_MAGIC:
+            self._decompressor = zlib.decompressobj(wbits=31)
+        self.bytes_read += len(data)
+        try:
+            if self._decompressor is None:
+                self._consume(data)
+                return
+            while data:
+                if self._decompressor.eof:
+                    # Concatenated gzip members, as written by gzip >> file; anything
+                    # else after the end of the stream is padding
+                    if not GZIP_MAGIC.startswith(data[:2]):
+                        break
+                    self._decompressor = zlib.decompressobj(wbits=31)
+                self._consume(self._decompressor.decompress(data, READ_CHUNK_BYTES))
+                data = self._decompressor.unused_data if self._decompressor.eof else self._decompressor.unconsumed_tail
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def _consume(self, data: bytes) -> None:
+        """Parse the complete lines of newly arrived (decompressed) data"""
+        self.decompressed_bytes += len(data)
+        if self.max_bytes is not None and self.decompressed_bytes > self.max_bytes:
+            raise LogTooLarge(f"Log data is limited to {self.max_bytes} bytes after decompression")
+        data = self._pending + data
+        cut = data.rfind(b"\n") + 1
+        self._pending = data[cut:]
+        if len(self._pending) > MAX_LINE_BYTES:
+            # A "line" this long is binary junk or a runaway message; keep its start only
+            self._pending = self._pending[:MAX_LINE_BYTES]
+            self.truncated += 1
+        if cut:
+            self._parse(data[:cut].decode("utf-8", errors="replace"))
+
+    def finish(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Parse whatever input is left and return the aggregates
+
+        Args:
+            top: Entries kept in each top-N list
+
+        Returns:
+            LogAggregator.summary plus input statistics, the IPs mentioned in
+            syslog messages and "analytics" (log_analytics.analyze output, None
+            without NumPy)
+        """
+        if self._pending:
+            self._parse(self._pending.decode("utf-8", errors="replace") + "\n")
+            self._pending = b""
+        return self.summary(top)
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        """
+        The aggregates so far, see finish
+        """
+        mentioned = sorted(self.mentioned_ips.finish(), key=lambda ioc: ioc["count"], reverse=True)
+        return {
+            "input": {
+                "bytes": self.bytes_read,
+                "decompressed_bytes": self.decompressed_bytes,
+                "lines": self.lines,
+                "unparsed_lines": self.unparsed,
+                "truncated_lines": self.truncated,
+                "compressed": self._decompressor is not None,
+                "parse_time": round(self._elapsed, 3),
+                "lines_per_second": round(self.lines / self._elapsed) if self._elapsed else None
+            },
+            **self.aggregator.summary(top),
+            "mentioned_ips": [{"ip": ioc["value"], "mentions": ioc["count"]} for ioc in mentioned[:top]],
+            "analytics": analyze(self.columns, top) if self.columns is not None and len(self.columns) else None
+        }
+
+    def _parse(self, text: str) -> None:
+        parse, add = self.parser.parse, self.aggregator.add
+        columns = self.columns
+        messages = []
+        for line in text.split("\n")[:-1]:
+            if not line or line.isspace():
+                continue
+            self.lines += 1
+            event = parse(line.rstrip("\r"))
+            if event is None:
+                self.unparsed += 1
+                continue
+            add(event)
+            if columns is not None:
+                columns.add(event)
+            if event.source == "syslog" and event.action == "other":
+                messages.append(line)
+        if messages:
+            self.mentioned_ips.feed("\n".join(messages) + "\n")
+
+def read_file_chunks(path: str, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    Read a file in chunks through a memory map, so the OS pages it in and out as needed
+
+    Args:
+        path: File to read
+        chunk_size: Bytes per chunk
+
+    Yields:
+        Consecutive chunks of the file
+    """
+    with open(path, "rb") as handle:
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            return
+        with mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(mapped), chunk_size):
+                    yield bytes(view[offset:offset + chunk_size])
+            finally:
+                view.release()
+
+def ingest_file(path: str, log_format: str = "auto", top: int = 10) -> Dict[str, Any]:
+    """
+    Parse and aggregate a log file from disk
+
+    Args:
+        path: Log file, optionally gzip-compressed
+        log_format: "syslog", "access" or "auto"
+        top: Entries kept in each top-N list
+
+    Returns:
+        See LogIngestor.finish
+    """
+    ingestor = LogIngestor(log_format)
+    for chunk in read_file_chunks(path):
+        ingestor.feed(chunk)
+    return ingestor.finish(top)
+
+async def enrich_ips(summary: Dict[str, Any], ipinfo_service, threat_intel=None, limit: int = 20) -> Dict[str, Dict[str, Any]]:
+    """
+    Look up the most interesting IPs of a summary: those with failed logins first, then the busiest
+
+    Args:
+        summary: LogIngestor.finish output
+        ipinfo_service: IPInfoService used for the (concurrent) lookups
+        threat_intel: Optional ThreatIntelService for feed verdicts
+        limit: Most addresses looked up
+
+    Returns:
+        ip -> {"country", "org", "threat"} (fields missing when unknown)
+    """
+    candidates = [row["ip"] for row in summary["top_failed_login_ips"] + summary["top_ips"]]
+    candidates += [row["ip"] for row in summary["mentioned_ips"]]
+    return await lookup_ips(list(dict.fromkeys(candidates))[:limit], ipinfo_service, threat_intel)
+
+async def lookup_ips(ips: List[str], ipinfo_service, threat_intel=None) -> Dict[str, Dict[str, Any]]:
+    """
+    Look up IPinfo details and threat-feed verdicts for a list of addresses
+
+    Args:
+        ips: Addresses to look up
+        ipinfo_service: IPInfoService used for the (concurrent) lookups
+        threat_intel: Optional ThreatIntelService for feed verdicts
+
+    Returns:
+        ip -> {"country", "org", "threat", "bogon"} (fields missing when unknown)
+    """
+    enrichment = {ip: {} for ip in ips}
+    async for result in ipinfo_service.bulk_lookup(ips, "basic"):
+        data = result["data"] or {}
+        if data.get("bogon"):
+            enrichment[result["ip"]]["bogon"] = True
+        for key in ("country", "org"):
+            if data.get(key):
+                enrichment[result["ip"]][key] = data[key]
+    if threat_intel is not None and threat_intel.loaded:
+        for ip in ips:
+            threat = threat_intel.match(ip)
+            if threat["verdict"] != "clean":
+                enrichment[ip]["threat"] = f"{threat['verdict']} ({', '.join(match['feed'] for match in threat['matches'])})"
+    return enrichment
+
+def summary_prompt(summary: Dict[str, Any], enrichment: Dict[str, Dict[str, Any]] = None, question: str = None) -> str:
+    """
+    Render aggregates as a compact prompt asking the model what looks suspicious
+
+    Args:
+        summary: LogIngestor.finish output
+        enrichment: Optional enrich_ips output
+        question: The analyst's question (defaults to asking what is suspicious)
+
+    Returns:
+        The prompt text
+    """
+    enrichment = enrichment or {}
+
+    def ip_line(row: Dict[str, Any]) -> str:
+        details = enrichment.get(row["ip"], {})
+        context = ", ".join(str(details[key]) for key in ("country", "org", "threat") if details.get(key))
+        if details.get("bogon"):
+            context = "private/reserved"
+        return (f"{row['ip']} | {row['events']} | {row['failed_logins']} | {row['http_errors']}"
+                + (f" | {context}" if context else ""))
+
+    lines = [
+        f"Log summary: {summary['events']} events from {summary['input']['lines']} lines "
+        f"({summary['sources']['syslog']} syslog, {summary['sources']['access']} web access, "
+        f"{summary['input']['unparsed_lines']} unrecognized)",
+        f"Time range: {summary['time_range']['start']} to {summary['time_range']['end']}",
+        f"Actions: {', '.join(f'{action}={count}' for action, count in sorted(summary['actions'].items()))}",
+        f"Distinct IPs: {summary['distinct_ips']}"
+    ]
+    if summary["top_failed_login_ips"]:
+        lines += ["", "IPs with the most failed logins (ip | events | failed logins | HTTP errors | context):"]
+        lines += [ip_line(row) for row in summary["top_failed_login_ips"]]
+    if summary["top_ips"]:
+        lines += ["", "Busiest IPs (ip | events | failed logins | HTTP errors | context):"]
+        lines += [ip_line(row) for row in summary["top_ips"]]
+    if summary["top_failed_login_users"]:
+        lines += ["", "Users with failed logins (user | failed | accepted):"]
+        lines += [f"{row['user']} | {row['failed_logins']} | {row['accepted_logins']}" for row in summary["top_failed_login_users"]]
+    if summary["accepted_login_users"]:
+        lines += ["", "Successful logins: " + ", ".join(f"{row['user']} ({row['accepted_logins']})"
+                                                          for row in summary["accepted_login_users"])]
+    if summary["http_statuses"]:
+        lines += ["", "HTTP status classes: " + ", ".join(f"{status}={count}" for status, count in summary["http_statuses"].items())]
+        lines += ["Top paths: " + ", ".join(f"{row['path']} ({row['requests']})" for row in summary["top_paths"])]
+        lines += ["Top user agents: " + "; ".join(f"{row['user_agent'][:80]} ({row['requests']})" for row in summary["top_user_agents"])]
+    if summary["mentioned_ips"]:
+        lines += ["", "Other IPs mentioned in syslog messages: " + ", ".join(f"{row['ip']} ({row['mentions']})"
+                                                                            for row in summary["mentioned_ips"])]
+    if summary.get("analytics"):
+        lines += ["", summary_table(summary["analytics"], talkers=False)]
+    if summary["approximate"]:
+        lines += ["", "Counts of rare entries are approximate (the logs had too many distinct values to track exactly)."]
+
+    question = question or "What looks suspicious in these logs?"
+    return (f"{question}\n\nYou are given aggregates computed from the logs, not the raw lines.\n\n"
+            + "\n".join(lines)
+            + "\n\nPoint out brute-force attempts, compromised accounts, scanning and other anomalies, "
+              "citing the IPs and users involved, and suggest next steps.")
@@ -0,0 +1,222 @@
+"""
+Process-wide registry of loaded models shared by every AI service
+"""
+import os
+import json
+import time
+import logging
+import threading
+from enum import Enum
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Model status tracking
+class ModelStatus(Enum):
+    NOT_LOADED = "not_loaded"
+    LOADING = "loading"
+    WARMING_UP = "warming_up"
+    READY = "ready"
+    ERROR = "error"
+
+class ModelHandle:
+    """A loaded model, its tokenizer and generation scheduler, shared by reference"""
+
+    def __init__(self, model: Any, tokenizer: Any, scheduler: Any = None, nbytes: int = 0):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.scheduler = scheduler
+        self.nbytes = nbytes
+        self.key = None
+        self.refcount = 0
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
+    def close(self) -> None:
+        """Stop the handle's scheduler and drop the model references"""
+        if self.scheduler is not None:
+            self.scheduler.close()
+        self.model = None
+        self.tokenizer = None
+        self.scheduler = None
+
+class ModelRegistry:
+    """
+    Owns every loaded model in the process
+
+    Models are keyed by repo, quantization and config, so services asking for
+    the same model share one copy. Services borrow a handle for the duration of
+    a request; handles nobody is borrowing are unloaded least-recently-used
+    first whenever a new model would exceed the memory budget.
+    """
+
+    def __init__(self, memory_budget: int = None):
+        self.memory_budget = memory_budget or int(float(os.getenv("MLX_MODEL_MEMORY_BUDGET_GB", "16")) * 1024 ** 3)
+        self._handles = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        # Per-key locks so concurrent first requests trigger a single load
+        self._loading = {}
+        # Sizes of models loaded before, used to make room ahead of a reload
+        self._known_sizes = {}
+
+    @staticmethod
+    def make_key(repo: str, quantization: Optional[str] = None,
+                 config: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[str], str]:
+        """
+        Build the registry key for a model
+
+        Args:
+            repo: Model repository or local path
+            quantization: Optional quantization applied at load time (e.g. "4bit")
+            config: Optional model config overrides
+
+        Returns:
+            Hashable key identifying the loaded model
+        """
+        return (repo, quantization, json.dumps(config or {}, sort_keys=True))
+
+    def _evict(self, needed: int) -> None:
+        """Unload idle models, oldest first, until `needed` more bytes fit; caller holds the lock"""
+        for key in list(self._handles):
+            if self._nbytes + needed <= self.memory_budget:
+                break
+            handle = self._handles[key]
+            if handle.refcount > 0:
+                continue
+            logger.info(f"Unloading model {key[0]} to stay within the memory budget")
+            del self._handles[key]
+            self._nbytes -= handle.nbytes
+            handle.close()
+
+    def acquire(self, repo: str, loader: Callable[[str, Optional[str], Dict[str, Any]], ModelHandle],
+                quantization: Optional[str] = None, config: Optional[Dict[str, Any]] = None) -> ModelHandle:
+        """
+        Get a shared handle for a model, loading it if needed
+
+        Every acquire() must be paired with a release().
+
+        Args:
+            repo: Model repository or local path
+            loader: Called as loader(repo, quantization, config) to load a missing model
+            quantization: Optional quantization applied at load time
+            config: Optional model config overrides
+
+        Returns:
+            The shared ModelHandle
+        """
+        key = self.make_key(repo, quantization, config)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                handle.refcount += 1
+                handle.last_used = time.time()
+                self._handles.move_to_end(key)
+                return handle
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Another request may have finished loading while we waited
+            with self._lock:
+                handle = self._handles.get(key)
+                if handle is not None:
+                    handle.refcount += 1
+                    handle.last_used = time.time()
+                    self._handles.move_to_end(key)
+                    return handle
+                self._evict(self._known_sizes.get(key, 0))
+
+            handle = loader(repo, quantization, config or {})
+            handle.key = key
+
+            with self._lock:
+                self._known_sizes[key] = handle.nbytes
+                self._evict(handle.nbytes)
+                if self._nbytes + handle.nbytes > self.memory_budget:
+                    handle.close()
+                    raise RuntimeError(
+                        f"Model {repo} needs {handle.nbytes / 1024 ** 3:.2f} GB but only "
+                        f"{(self.memory_budget - self._nbytes) / 1024 ** 3:.2f} GB of the model memory budget is free"
+                    )
+                handle.refcount = 1
+                self._handles[key] = handle
+                self._nbytes += handle.nbytes
+                self._loading.pop(key, None)
+                logger.info(f"Registered model {repo} ({handle.nbytes / 1024 ** 3:.2f} GB, "
+                            f"{self._nbytes / 1024 ** 3:.2f}/{self.memory_budget / 1024 ** 3:.2f} GB in use)")
+            return handle
+
+    def release(self, handle: ModelHandle) -> None:
+        """
+        Return a handle obtained from acquire()
+        """
+        with self._lock:
+            handle.refcount = max(0, handle.refcount - 1)
+            handle.last_used = time.time()
+
+    @contextmanager
+    def borrow(self, repo: str, loader: Callable[[str, Optional[str], Dict[str, Any]], ModelHandle],
+               quantization: Optional[str] = None, config: Optional[Dict[str, Any]] = None) -> Iterator[ModelHandle]:
+        """
+        Borrow a model handle for the duration of a with-block
+        """
+        handle = self.acquire(repo, loader, quantization, config)
+        try:
+            yield handle
+        finally:
+            self.release(handle)
+
+    def peek(self, repo: str, quantization: Optional[str] = None,
+             config: Optional[Dict[str, Any]] = None) -> Optional[ModelHandle]:
+        """
+        Get a model's handle without loading or borrowing it
+
+        Returns:
+            The handle, or None if the model is not loaded
+        """
+        with self._lock:
+            return self._handles.get(self.make_key(repo, quantization, config))
+
+    def unload(self, repo: str, quantization: Optional[str] = None,
+               config: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Unload a model that nobody is borrowing
+
+        Returns:
+            True if the model was unloaded
+        """
+        key = self.make_key(repo, quantization, config)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None or handle.refcount > 0:
+                return False
+            del self._handles[key]
+            self._nbytes -= handle.nbytes
+        handle.close()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report loaded models and memory use against the budget
+        """
+        with self._lock:
+            return {
+                "memory_budget": self.memory_budget,
+                "memory_used": self._nbytes,
+                "models": [
+                    {
+                        "repo": key[0],
+                        "quantization": key[1],
+                        "config": json.loads(key[2]),
+                        "nbytes": handle.nbytes,
+                        "borrowers": handle.refcount,
+                        "last_used": handle.last_used
+                    }
+                    for key, handle in self._handles.items()
+                ]
+            }
+
+# Loaded models are shared by every service in the process
+model_registry = ModelRegistry()
@@ -0,0 +1,620 @@
+"""
+Streaming flow summaries of classic pcap and pcapng packet captures
+
+Captures are read as a stream of byte chunks (an upload, or a memory-mapped
+file on disk) and parsed in place through memoryview slices: packet data is
+never copied, only the addresses that key a flow. Packets are aggregated into
+unidirectional 5-tuple flows (source, destination, protocol and ports; ICMP
+type and code stand in for the ports) whose counters live in parallel arrays.
+The table is cut back to its heaviest flows whenever it outgrows its capacity,
+so memory stays bounded for captures of any size.
+
+Recognized link types: Ethernet (with 802.1Q/802.1ad tags), raw IP, Linux
+cooked capture (v1 and v2) and BSD loopback. The top flows, top talkers and
+anomalies (port scans, host sweeps, large transfers, long-lived flows) are
+what goes into the LLM prompt, never the packets.
+"""
+import mmap
+import time
+import socket
+import struct
+import logging
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from .log_ingest import lookup_ips
+
+logger = logging.getLogger(__name__)
+
+# Bytes of a memory-mapped capture handed to the parser at a time
+READ_CHUNK_BYTES = 1 << 24
+# Largest block or record accepted; anything bigger means a corrupt or hostile file
+MAX_BLOCK_BYTES = 1 << 24
+
+# Classic pcap magic -> (byte order, timestamp fraction unit)
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6), b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9), b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+# pcapng section header block type (the same in both byte orders) and byte-order magics
+PCAPNG_SECTION = 0x0A0D0D0A
+PCAPNG_BYTE_ORDERS = {b"\x4d\x3c\x2b\x1a": "<", b"\x1a\x2b\x3c\x4d": ">"}
+_INTERFACE_BLOCK, _SIMPLE_PACKET_BLOCK, _ENHANCED_PACKET_BLOCK = 1, 3, 6
+_OPTION_TSRESOL = 9
+
+# Link-layer header types (LINKTYPE_* values)
+LINKTYPE_NULL, LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LOOP = 0, 1, 101, 108
+LINKTYPE_LINUX_SLL, LINKTYPE_IPV4, LINKTYPE_IPV6, LINKTYPE_LINUX_SLL2 = 113, 228, 229, 276
+_RAW_LINKTYPES = (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6, 12, 14)
+_ETHERTYPE_IPV4, _ETHERTYPE_IPV6 = 0x0800, 0x86DD
+_VLAN_ETHERTYPES = (0x8100, 0x88A8)
+# BSD loopback address families carrying IPv6 (Linux/BSD, FreeBSD, macOS)
+_LOOPBACK_IPV6 = (10, 24, 28, 30)
+
+PROTOCOLS = {1: "icmp", 6: "tcp", 17: "udp", 58: "icmpv6"}
+TCP_SYN, TCP_ACK = 0x02, 0x10
+# IPv6 extension headers skipped on the way to the transport header
+_IPV6_EXTENSIONS = (0, 43, 60)
+_IPV6_FRAGMENT = 44
+
+# Anomaly thresholds: distinct ports or hosts probed by one source with
+# unanswered SYNs, bytes of one flow, and seconds a flow stays open
+SCAN_MIN_PORTS = 20
+SWEEP_MIN_HOSTS = 20
+LARGE_FLOW_BYTES = 100 * 2**20
+LONG_FLOW_SECONDS = 3600
+# A TCP flow of this many packets or fewer that never got past SYN is a probe
+PROBE_MAX_PACKETS = 3
+# Distinct ports/hosts remembered per probing source
+PROBE_SET_CAPACITY = 4096
+
+def format_ip(address: bytes) -> str:
+    """Text form of a packed IPv4 or IPv6 address"""
+    return socket.inet_ntop(socket.AF_INET if len(address) == 4 else socket.AF_INET6, address)
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
+
+class FlowTable:
+    """
+    Packet, byte, time and TCP-flag counters per 5-tuple flow in parallel arrays
+
+    Once it holds twice its capacity it is cut back to the capacity flows with
+    the most bytes, like the counters of log_ingest; totals still include the
+    dropped flows. Before a small flow is dropped, its probe (an unanswered
+    TCP SYN) is remembered per source so scans survive the pruning.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.rows: Dict[Tuple[bytes, bytes, int, int, int], int] = {}
+        self.keys: List[Tuple[bytes, bytes, int, int, int]] = []
+        self.packets = array("Q")
+        self.bytes = array("Q")
+        self.first = array("d")
+        self.last = array("d")
+        self.flags = array("B")
+        self.dropped = 0
+        # source -> (ports probed, hosts probed)
+        self.probes: Dict[bytes, Tuple[Set[int], Set[bytes]]] = {}
+
+    @property
+    def pruned(self) -> bool:
+        return self.dropped > 0
+
+    def add(self, key: Tuple[bytes, bytes, int, int, int], size: int, timestamp: float, flags: int) -> None:
+        row = self.rows.get(key)
+        if row is None:
+            if len(self.keys) >= 2 * self.capacity:
+                self._prune()
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+            self.packets.append(1)
+            self.bytes.append(size)
+            self.first.append(timestamp)
+            self.last.append(timestamp)
+            self.flags.append(flags)
+            return
+        self.packets[row] += 1
+        self.bytes[row] += size
+        if timestamp > self.last[row]:
+            self.last[row] = timestamp
+        elif timestamp < self.first[row]:
+            self.first[row] = timestamp
+        self.flags[row] |= flags
+
+    def collect_probes(self, rows: Iterable[int]) -> None:
+        """
+        Remember the probes among some rows by source
+        """
+        probes, keys, flags, packets = self.probes, self.keys, self.flags, self.packets
+        for row in rows:
+            src, dst, protocol, _, dport = keys[row]
+            if protocol != 6 or flags[row] & (TCP_SYN | TCP_ACK) != TCP_SYN or packets[row] > PROBE_MAX_PACKETS:
+                continue
+            ports, hosts = probes.get(src) or probes.setdefault(src, (set(), set()))
+            if len(ports) < PROBE_SET_CAPACITY:
+                ports.add(dport)
+            if len(hosts) < PROBE_SET_CAPACITY:
+                hosts.add(dst)
+        if len(probes) > 2 * self.capacity:
+            busiest = sorted(probes.items(), key=lambda item: len(item[1][0]) + len(item[1][1]), reverse=True)
+            self.probes = dict(busiest[:self.capacity])
+
+    def _prune(self) -> None:
+        ranked = sorted(range(len(self.keys)), key=self.bytes.__getitem__, reverse=True)
+        self.collect_probes(ranked[self.capacity:])
+        # Keep the survivors in first-seen order
+        keep = sorted(ranked[:self.capacity])
+        self.dropped += len(self.keys) - len(keep)
+        self.keys = [self.keys[row] for row in keep]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        for name in ("packets", "bytes", "first", "last", "flags"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[row] for row in keep]))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+class FlowSummarizer:
+    """
+    Stream a pcap or pcapng capture into flow aggregates
+
+    Feed it the capture as byte chunks split anywhere (bytes, bytearrays or
+    memoryviews, which are parsed without copying), then call finish().
+
+    Args:
+        max_flows: Flows tracked exactly; beyond twice this the smallest are dropped
+    """
+
+    def __init__(self, max_flows: int = 200000):
+        self.flows = FlowTable(max_flows)
+        self.format = None
+        self.link_types: Set[int] = set()
+        self.bytes_read = 0
+        self.packets = 0
+        self.wire_bytes = 0
+        self.non_ip_packets = 0
+        self.unsupported_packets = 0
+        self.protocol_packets = array("Q", bytes(8 * 256))
+        self.start_time = None
+        self.end_time = None
+        self._pending = bytearray()
+        self._elapsed = 0.0
+        # Classic pcap state
+        self._record = None
+        self._linktype = None
+        self._fraction = 1e-6
+        # pcapng state: byte order of the current section and its interfaces
+        self._endian = "<"
+        self._interfaces: List[Tuple[int, float]] = []
+
+    def feed(self, data) -> None:
+        """
+        Parse more of the capture
+
+        Raises:
+            ValueError: If the data is not a pcap/pcapng capture or is corrupt
+        """
+        start = time.perf_counter()
+        view = memoryview(data).cast("B")
+        self.bytes_read += len(view)
+        if self._pending:
+            view = self._complete_pending(view)
+        if len(view):
+            consumed = self._parse(view)
+            if consumed < len(view):
+                self._pending = bytearray(view[consumed:])
+        self._elapsed += time.perf_counter() - start
+
+    def _complete_pending(self, view: memoryview) -> memoryview:
+        """
+        Finish the block split across chunks, copying only that block
+        """
+        pending = self._pending
+        while True:
+            needed = self._next_block_size(pending)
+            if len(pending) >= needed:
+                break
+            take = needed - len(pending)
+            pending += view[:take]
+            view = view[take:]
+            if len(pending) < needed:
+                return view
+        with memoryview(pending) as block:
+            self._parse(block)
+        self._pending = bytearray()
+        return view
+
+    def _next_block_size(self, data) -> int:
+        """
+        Bytes of the next block or record at the start of data, or the bytes needed to tell
+        """
+        if self.format is None:
+            if len(data) < 12:
+                return 12
+            if bytes(data[:4]) in PCAP_MAGICS:
+                return 24
+            return self._block_length(data, 0)
+        if self.format == "pcap":
+            if len(data) < 16:
+                return 16
+            return 16 + self._record.unpack_from(data)[2]
+        if len(data) < 12:
+            return 12
+        return self._block_length(data, 0)
+
+    def _block_length(self, data, offset: int) -> int:
+        endian = self._endian
+        if struct.unpack_from("<I", data, offset)[0] == PCAPNG_SECTION:
+            endian = PCAPNG_BYTE_ORDERS.get(bytes(data[offset + 8:offset + 12]))
+            if endian is None:
+                raise ValueError("Not a pcap or pcapng capture" if self.format is None
+                                 else "Corrupt pcapng section header")
+        elif self.format is None:
+            raise ValueError("Not a pcap or pcapng capture")
+        length = struct.unpack_from(endian + "I", data, offset + 4)[0]
+        if length < 12 or length % 4 or length > MAX_BLOCK_BYTES:
+            raise ValueError(f"Corrupt pcapng block of {length} bytes")
+        return length
+
+    def _parse(self, view: memoryview) -> int:
+        """
+        Parse the complete blocks or records at the start of view and return the bytes consumed
+        """
+        offset = 0
+        if self.format is None:
+            if len(view) < 12:
+                return 0
+            magic = bytes(view[:4])
+            if magic in PCAP_MAGICS:
+                if len(view) < 24:
+                    return 0
+                endian, self._fraction = PCAP_MAGICS[magic]
+                self._record = struct.Struct(endian + "IIII")
+                # The upper bits of the link type field carry FCS information
+                self._linktype = struct.unpack_from(endian + "I", view, 20)[0] & 0xFFFF
+                self.link_types.add(self._linktype)
+                self.format = "pcap"
+                offset = 24
+            else:
+                self._block_length(view, 0)
+                self.format = "pcapng"
+        if self.format == "pcap":
+            return self._parse_pcap(view, offset)
+        return self._parse_pcapng(view, offset)
+
+    def _parse_pcap(self, view: memoryview, offset: int) -> int:
+        unpack, packet = self._record.unpack_from, self._packet
+        linktype, fraction = self._linktype, self._fraction
+        end = len(view)
+        while end - offset >= 16:
+            seconds, fractions, captured, wire_length = unpack(view, offset)
+            if captured > MAX_BLOCK_BYTES:
+                raise ValueError(f"Corrupt pcap record of {captured} bytes")
+            stop = offset + 16 + captured
+            if stop > end:
+                break
+            packet(view[offset + 16:stop], seconds + fractions * fraction, wire_length, linktype)
+            offset = stop
+        return offset
+
+    def _parse_pcapng(self, view: memoryview, offset: int) -> int:
+        packet = self._packet
+        end = len(view)
+        while end - offset >= 12:
+            length = self._block_length(view, offset)
+            if offset + length > end:
+                break
+            endian = self._endian
+            block_type = struct.unpack_from(endian + "I", view, offset)[0]
+            if block_type == _ENHANCED_PACKET_BLOCK:
+                interface, high, low, captured, wire_length = struct.unpack_from(endian + "IIIII", view, offset + 8)
+                linktype, resolution = self._interface(interface)
+                captured = min(captured, length - 32)
+                packet(view[offset + 28:offset + 28 + captured], ((high << 32) | low) * resolution,
+                       wire_length, linktype)
+            elif block_type == _SIMPLE_PACKET_BLOCK:
+                # No timestamp: the packet is counted at the time of the one before
+                wire_length = struct.unpack_from(endian + "I", view, offset + 8)[0]
+                linktype, _ = self._interface(0)
+                packet(view[offset + 12:offset + 12 + min(wire_length, length - 16)],
+                       self.end_time or 0.0, wire_length, linktype)
+            elif block_type == PCAPNG_SECTION:
+                # A new section may switch byte order and starts with no interfaces
+                self._endian = PCAPNG_BYTE_ORDERS[bytes(view[offset + 8:offset + 12])]
+                self._interfaces = []
+            elif block_type == _INTERFACE_BLOCK:
+                linktype = struct.unpack_from(endian + "H", view, offset + 8)[0]
+                self._interfaces.append((linktype, self._timestamp_resolution(view, offset + 16, offset + length - 4)))
+                self.link_types.add(linktype)
+            offset += length
+        return offset
+
+    def _interface(self, interface: int) -> Tuple[int, float]:
+        try:
+            return self._interfaces[interface]
+        except IndexError:
+            raise ValueError(f"Packet block refers to undeclared interface {interface}")
+
+    def _timestamp_resolution(self, view: memoryview, offset: int, end: int) -> float:
+        """
+        Seconds per timestamp unit from an interface description's options (default microseconds)
+        """
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(self._endian + "HH", view, offset)
+            if code == 0:
+                break
+            if code == _OPTION_TSRESOL and length >= 1:
+                value = view[offset + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+            offset += 4 + (length + 3) // 4 * 4
+        return 1e-6
+
+    def _packet(self, data: memoryview, timestamp: float, wire_length: int, linktype: int) -> None:
+        """
+        Decode the network and transport headers of a frame and count it in its flow
+        """
+        self.packets += 1
+        self.wire_bytes += wire_length
+        if self.start_time is None or timestamp < self.start_time:
+            self.start_time = timestamp
+        if self.end_time is None or timestamp > self.end_time:
+            self.end_time = timestamp
+        size = len(data)
+
+        # Link layer
+        if linktype == LINKTYPE_ETHERNET:
+            if size < 14:
+                self.unsupported_packets += 1
+                return
+            ethertype = data[12] << 8 | data[13]
+            offset = 14
+            while ethertype in _VLAN_ETHERTYPES and size >= offset + 4:
+                ethertype = data[offset + 2] << 8 | data[offset + 3]
+                offset += 4
+        elif linktype in _RAW_LINKTYPES:
+            offset = 0
+            ethertype = _ETHERTYPE_IPV4 if size and data[0] >> 4 == 4 else _ETHERTYPE_IPV6
+        elif linktype == LINKTYPE_LINUX_SLL and size >= 16:
+            ethertype, offset = data[14] << 8 | data[15], 16
+        elif linktype == LINKTYPE_LINUX_SLL2 and size >= 20:
+            ethertype, offset = data[0] << 8 | data[1], 20
+        elif linktype in (LINKTYPE_NULL, LINKTYPE_LOOP) and size >= 4:
+            # The address family is in host byte order for NULL, network order for LOOP
+            family = data[0] or data[3]
+            ethertype = _ETHERTYPE_IPV4 if family == 2 else _ETHERTYPE_IPV6 if family in _LOOPBACK_IPV6 else 0
+            offset = 4
+        else:
+            self.unsupported_packets += 1
+            return
+
+        # Network layer
+        if ethertype == _ETHERTYPE_IPV4:
+            if size < offset + 20:
+                self.unsupported_packets += 1
+                return
+            protocol = data[offset + 9]
+            src, dst = bytes(data[offset + 12:offset + 16]), bytes(data[offset + 16:offset + 20])
+            # Only the first fragment carries the transport header
+            fragment = (data[offset + 6] & 0x1F) << 8 | data[offset + 7]
+            transport = -1 if fragment else offset + (data[offset] & 0x0F) * 4
+        elif ethertype == _ETHERTYPE_IPV6:
+            if size < offset + 40:
+                self.unsupported_packets += 1
+                return
+            protocol = data[offset + 6]
+            src, dst = bytes(data[offset + 8:offset + 24]), bytes(data[offset + 24:offset + 40])
+            transport = offset + 40
+            while protocol in _IPV6_EXTENSIONS and size >= transport + 8:
+                protocol, transport = data[transport], transport + (data[transport + 1] + 1) * 8
+            if protocol == _IPV6_FRAGMENT and size >= transport + 8:
+                fragment = (data[transport + 2] << 8 | data[transport + 3]) >> 3
+                protocol, transport = data[transport], -1 if fragment else transport + 8
+        else:
+            self.non_ip_packets += 1
+            return
+        self.protocol_packets[protocol] += 1
+
+        # Transport layer
+        sport = dport = flags = 0
+        if transport >= 0:
+            if (protocol == 6 or protocol == 17) and size >= transport + 4:
+                sport = data[transport] << 8 | data[transport + 1]
+                dport = data[transport + 2] << 8 | data[transport + 3]
+                if protocol == 6 and size >= transport + 14:
+                    flags = data[transport + 13]
+            elif (protocol == 1 or protocol == 58) and size >= transport + 2:
+                sport, dport = data[transport], data[transport + 1]
+        self.flows.add((src, dst, protocol, sport, dport), wire_length, timestamp, flags)
+
+    def finish(self, top: int = 10) -> Dict[str, Any]:
+        """
+        Return the flow aggregates of everything fed so far
+
+        Args:
+            top: Entries kept in each top-N list
+
+        Returns:
+            Input statistics, the capture's time span, packets per protocol,
+            the top flows by bytes, the top talkers, anomalies and the
+            addresses worth enriching ("ips")
+        """
+        flows = self.flows
+        flows.collect_probes(range(len(flows)))
+        names: Dict[bytes, str] = {}
+
+        def name(address: bytes) -> str:
+            text = names.get(address)
+            if text is None:
+                text = names[address] = format_ip(address)
+            return text
+
+        def flow_row(row: int) -> Dict[str, Any]:
+            src, dst, protocol, sport, dport = flows.keys[row]
+            return {
+                "src": name(src), "dst": name(dst), "protocol": PROTOCOLS.get(protocol, str(protocol)),
+                "sport": sport, "dport": dport, "packets": flows.packets[row], "bytes": flows.bytes[row],
+                "duration": round(flows.last[row] - flows.first[row], 3), "start": _iso(flows.first[row])
+            }
+
+        ranked = sorted(range(len(flows)), key=flows.bytes.__getitem__, reverse=True)
+
+        # Per-source totals over the tracked flows
+        talkers: Dict[bytes, List[Any]] = {}
+        for row, (src, dst, _, _, _) in enumerate(flows.keys):
+            talker = talkers.get(src)
+            if talker is None:
+                talker = talkers[src] = [0, 0, 0, set()]
+            talker[0] += flows.bytes[row]
+            talker[1] += flows.packets[row]
+            talker[2] += 1
+            talker[3].add(dst)
+        top_talkers = [{"ip": name(src), "bytes": totals[0], "packets": totals[1], "flows": totals[2], "peers": len(totals[3])}
+                       for src, totals in sorted(talkers.items(), key=lambda item: item[1][0], reverse=True)[:top]]
+
+        anomalies = []
+        for src, (ports, hosts) in sorted(self.flows.probes.items(), key=lambda item: len(item[1][0]), reverse=True):
+            if len(ports) >= SCAN_MIN_PORTS:
+                anomalies.append({"type": "port_scan", "src": name(src), "ports": len(ports), "hosts": len(hosts)})
+            elif len(hosts) >= SWEEP_MIN_HOSTS:
+                anomalies.append({"type": "host_sweep", "src": name(src), "ports": len(ports), "hosts": len(hosts)})
+        for row in ranked:
+            if flows.bytes[row] < LARGE_FLOW_BYTES:
+                break
+            anomalies.append({"type": "large_transfer", **flow_row(row)})
+        long_lived = [row for row in range(len(flows)) if flows.last[row] - flows.first[row] >= LONG_FLOW_SECONDS]
+        long_lived.sort(key=lambda row: flows.last[row] - flows.first[row], reverse=True)
+        anomalies += [{"type": "long_lived", **flow_row(row)} for row in long_lived[:top]]
+
+        top_flows = [flow_row(row) for row in ranked[:top]]
+        # Scanners, then the busiest sources and the peers of the heaviest flows
+        ips = [anomaly["src"] for anomaly in anomalies] + [anomaly["dst"] for anomaly in anomalies if "dst" in anomaly]
+        ips += [talker["ip"] for talker in top_talkers] + [flow["dst"] for flow in top_flows]
+        duration = (self.end_time - self.start_time) if self.packets else 0.0
+        return {
+            "input": {
+                "format": self.format,
+                "bytes": self.bytes_read,
+                "packets": self.packets,
+                "link_types": sorted(self.link_types),
+                "non_ip_packets": self.non_ip_packets,
+                "unsupported_packets": self.unsupported_packets,
+                "truncated": bool(self._pending),
+                "parse_time": round(self._elapsed, 3),
+                "packets_per_second": round(self.packets / self._elapsed) if self._elapsed else None
+            },
+            "capture": {"start": _iso(self.start_time), "end": _iso(self.end_time), "duration": round(duration, 3),
+                        "wire_bytes": self.wire_bytes},
+            "protocols": {PROTOCOLS.get(number, str(number)): count
+                          for number, count in enumerate(self.protocol_packets) if count},
+            "flows": len(flows) + flows.dropped,
+            "approximate": flows.pruned,
+            "top_flows": top_flows,
+            "top_talkers": top_talkers,
+            "anomalies": anomalies,
+            "ips": list(dict.fromkeys(ips))
+        }
+
+def summarize_capture(path: str, top: int = 10, max_flows: int = 200000) -> Dict[str, Any]:
+    """
+    Summarize a capture file on disk
+
+    The file is memory-mapped and parsed in place, so the OS pages it in and
+    out as needed and captures of several GB need bounded memory.
+
+    Args:
+        path: pcap or pcapng file
+        top: Entries kept in each top-N list
+        max_flows: Flows tracked exactly
+
+    Returns:
+        FlowSummarizer.finish output
+    """
+    summarizer = FlowSummarizer(max_flows)
+    with open(path, "rb") as handle:
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            return summarizer.finish(top)
+        with mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(view), READ_CHUNK_BYTES):
+                    summarizer.feed(view[offset:offset + READ_CHUNK_BYTES])
+                    # Parsed pages are not needed again; drop them from the resident set
+                    if hasattr(mmap, "MADV_DONTNEED"):
+                        mapped.madvise(mmap.MADV_DONTNEED, offset, min(READ_CHUNK_BYTES, len(view) - offset))
+            finally:
+                view.release()
+    return summarizer.finish(top)
+
+async def enrich_flows(summary: Dict[str, Any], ipinfo_service, threat_intel=None, limit: int = 20) -> Dict[str, Dict[str, Any]]:
+    """
+    Look up the addresses of a summary's anomalies, top talkers and top flows
+
+    Args:
+        summary: FlowSummarizer.finish output
+        ipinfo_service: IPInfoService used for the (concurrent) lookups
+        threat_intel: Optional ThreatIntelService for feed verdicts
+        limit: Most addresses looked up
+
+    Returns:
+        ip -> {"country", "org", "threat", "bogon"} (fields missing when unknown)
+    """
+    return await lookup_ips(summary["ips"][:limit], ipinfo_service, threat_intel)
+
+def summary_prompt(summary: Dict[str, Any], enrichment: Dict[str, Dict[str, Any]] = None, question: str = None) -> str:
+    """
+    Render flow aggregates as a compact prompt asking the model what looks suspicious
+
+    Args:
+        summary: FlowSummarizer.finish output
+        enrichment: Optional enrich_flows output
+        question: The analyst's question (defaults to asking what is suspicious)
+
+    Returns:
+        The prompt text
+    """
+    enrichment = enrichment or {}
+
+    def context(ip: str) -> str:
+        details = enrichment.get(ip, {})
+        if details.get("bogon"):
+            return "private/reserved"
+        return ", ".join(str(details[key]) for key in ("country", "org", "threat") if details.get(key)) or "-"
+
+    def flow_line(flow: Dict[str, Any]) -> str:
+        return (f"{flow['src']}:{flow['sport']} -> {flow['dst']}:{flow['dport']} {flow['protocol']} | {flow['packets']} | "
+                f"{flow['bytes']} | {flow['duration']}s | {context(flow['dst'])}")
+
+    stats, capture = summary["input"], summary["capture"]
+    lines = [question or "What looks suspicious in this packet capture?", "",
+             "You are given flow aggregates computed from the capture, not the packets.", "",
+             f"Capture: {stats['packets']} packets, {capture['wire_bytes']} bytes over {capture['duration']}s "
+             f"({capture['start']} to {capture['end']}), {summary['flows']} flows",
+             "Protocols (packets): " + ", ".join(f"{name}={count}" for name, count in sorted(summary["protocols"].items()))]
+    if summary["anomalies"]:
+        lines += ["", "Anomalies:"]
+        for anomaly in summary["anomalies"]:
+            if anomaly["type"] in ("port_scan", "host_sweep"):
+                # Probe sets stop growing at their capacity
+                ports, hosts = (f"{count}+" if count >= PROBE_SET_CAPACITY else str(count)
+                                for count in (anomaly["ports"], anomaly["hosts"]))
+                lines.append(f"- {anomaly['type']}: {anomaly['src']} ({context(anomaly['src'])}) sent unanswered SYNs "
+                             f"to {ports} ports on {hosts} hosts")
+            else:
+                lines.append(f"- {anomaly['type']}: " + flow_line(anomaly))
+    if summary["top_flows"]:
+        lines += ["", "Top flows by bytes (flow | packets | bytes | duration | destination context):"]
+        lines += [flow_line(flow) for flow in summary["top_flows"]]
+    if summary["top_talkers"]:
+        lines += ["", "Top talkers (ip | bytes | packets | flows | peers | context):"]
+        lines += [f"{talker['ip']} | {talker['bytes']} | {talker['packets']} | {talker['flows']} | {talker['peers']} | "
+                  f"{context(talker['ip'])}" for talker in summary["top_talkers"]]
+    if summary["approximate"]:
+        lines += ["", "The capture had too many flows to track exactly; counts of small flows are approximate."]
+    lines += ["", "Point out scanning, exfiltration, beaconing, connections to suspicious hosts and other anomalies, "
+                  "citing the addresses involved, and suggest next steps."]
+    return "\n".join(lines)
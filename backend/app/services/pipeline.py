@@ -0,0 +1,508 @@
+"""
+Dependency-aware pipeline engine for multi-step plugin workflows
+
+A pipeline is a DAG of nodes connected through named values: each node
+requires some values and provides others. A node starts as soon as every
+value it requires is available, so independent nodes run concurrently, and
+frames emitted by nodes are streamed in the order they are produced.
+"""
+import time
+import asyncio
+import inspect
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marks a value whose producing node failed or was skipped
+_MISSING = object()
+
+# Marks the end of the frame queue
+_DONE = object()
+
+def step_frame(step_json: Dict[str, Any], step_id: int, name: str, role: str) -> Dict[str, Any]:
+    """
+    Build the frame for one finished tool step, with the step's reasoning and choice
+    """
+    frame = {
+        "text": step_json["choice"],
+        "reasoning": step_json["reasoning"]
+    }
+    # The endpoint selection step also tells the client which endpoint was chosen
+    if "endpoint" in step_json:
+        frame["endpoint"] = step_json["endpoint"]
+    frame["step"] = {
+        "id": step_id,
+        "name": name,
+        "role": role
+    }
+    return frame
+
+def delta_frame(text: str, step_id: int, name: str, role: str) -> Dict[str, Any]:
+    """
+    Build the frame carrying more of a tool step's choice text while it is generated
+    """
+    return {
+        "delta": text,
+        "step": {
+            "id": step_id,
+            "name": name,
+            "role": role
+        }
+    }
+
+class PipelineError(ValueError):
+    """Raised when a pipeline's nodes don't form a valid DAG"""
+
+class PipelineContext:
+    """
+    Values produced so far in one pipeline run, plus the frame queue nodes emit to
+    """
+
+    def __init__(self, inputs: Dict[str, Any], keys: Iterable[str]):
+        loop = asyncio.get_running_loop()
+        self._futures = {key: loop.create_future() for key in keys}
+        self._frames: asyncio.Queue = asyncio.Queue()
+        self._cleanups = []
+        self._notes = {}
+        for key, value in inputs.items():
+            self.set(key, value)
+
+    def __getitem__(self, key: str) -> Any:
+        future = self._futures[key]
+        if not future.done() or future.result() is _MISSING:
+            raise KeyError(key)
+        return future.result()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Publish a value, waking the nodes waiting for it
+        """
+        future = self._futures.setdefault(key, asyncio.get_running_loop().create_future())
+        if not future.done():
+            future.set_result(value)
+
+    def emit(self, frame: Dict[str, Any]) -> None:
+        """
+        Stream a frame to the client
+        """
+        self._frames.put_nowait(frame)
+
+    def annotate(self, node_name: str, **info: Any) -> None:
+        """
+        Add details to a node's entry in the timings frame
+        """
+        self._notes.setdefault(node_name, {}).update(info)
+
+    def on_close(self, callback: Callable[[], None]) -> None:
+        """
+        Register a callback to run when the pipeline run ends, however it ends
+        """
+        self._cleanups.append(callback)
+
+    async def wait(self, keys: Sequence[str]) -> bool:
+        """
+        Wait for values to be published
+
+        Returns:
+            True if all of them were produced, False if any producer failed or was skipped
+        """
+        values = await asyncio.gather(*(self._futures[key] for key in keys))
+        return all(value is not _MISSING for value in values)
+
+    def _abandon(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.set(key, _MISSING)
+
+class Node:
+    """
+    One step of a pipeline
+
+    Subclasses implement run(), which may emit frames and publish values with
+    ctx.set(). Whatever run() returns is published under the node's only
+    provided value if it hasn't published it itself.
+
+    Args:
+        name: Unique node name, used in timings and logs
+        requires: Values that must be available before the node starts
+        provides: Values the node publishes (defaults to its name)
+        when: Optional predicate on the context; the node is skipped if it returns False
+    """
+
+    kind = "node"
+
+    def __init__(self, name: str, requires: Sequence[str] = (), provides: Sequence[str] = None,
+                 when: Callable[[PipelineContext], bool] = None):
+        self.name = name
+        self.requires = tuple(requires)
+        self.provides = tuple(provides) if provides is not None else (name,)
+        self.when = when
+
+    async def run(self, ctx: PipelineContext) -> Any:
+        raise NotImplementedError
+
+class LLMNode(Node):
+    """
+    Runs a streamed generation whose output holds one or more tool steps
+
+    The parser follows the generated text and returns ("delta", step, text)
+    events for partial step text and ("step", step, step_json) events for
+    finished steps; each finished step is emitted as a frame and published
+    under its name.
+
+    Args:
+        generate: Function taking a prompt and schema and returning an async iterator of text chunks
+        prompt: Function building the prompt from the context
+        parser: Function returning a fresh parser (with feed() and finish()) for each run
+        steps: (step id, name, role) of each step the generation answers
+        schema: Optional JSON schema the generation is constrained to
+    """
+
+    kind = "llm"
+
+    def __init__(self, name: str, generate: Callable[[str, Optional[Dict[str, Any]]], AsyncIterator[str]],
+                 prompt: Callable[[PipelineContext], str], parser: Callable[[PipelineContext], Any],
+                 steps: Sequence[Tuple[int, str, str]], schema: Dict[str, Any] = None, **kwargs):
+        kwargs.setdefault("provides", [step_name for _, step_name, _ in steps])
+        super().__init__(name, **kwargs)
+        self.generate = generate
+        self.prompt = prompt
+        self.parser = parser
+        self.schema = schema
+        self.steps = {step_name: (step_id, role) for step_id, step_name, role in steps}
+
+    async def run(self, ctx: PipelineContext) -> Any:
+        parser = self.parser(ctx)
+        try:
+            async for chunk in self.generate(self.prompt(ctx), self.schema):
+                self._handle(ctx, parser.feed(chunk))
+        except Exception as e:
+            # Whatever the model didn't finish falls back below
+            logger.error(f"Generation for pipeline node '{self.name}' failed: {str(e)}")
+        self._handle(ctx, parser.finish())
+
+    def _handle(self, ctx: PipelineContext, events: Iterable[Tuple[str, str, Any]]) -> None:
+        for kind, step_name, value in events:
+            step_id, role = self.steps[step_name]
+            if kind == "delta":
+                ctx.emit(delta_frame(value, step_id, step_name, role))
+            else:
+                ctx.emit(step_frame(value, step_id, step_name, role))
+                ctx.set(step_name, value)
+
+class HTTPNode(Node):
+    """
+    Runs a call to an external service, typically an HTTP request
+
+    Args:
+        call: Function taking the context and returning the node's value; coroutine
+              functions are awaited, blocking functions run on a worker thread
+        prefetch: Optional name of a Prefetch value that may already hold the result
+        key: Function taking the context and returning the argument to look up in the prefetch
+    """
+
+    kind = "http"
+
+    def __init__(self, name: str, call: Callable[[PipelineContext], Any], prefetch: str = None,
+                 key: Callable[[PipelineContext], Any] = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.call = call
+        self.prefetch = prefetch
+        self.key = key
+
+    async def run(self, ctx: PipelineContext) -> Any:
+        prefetch = ctx.get(self.prefetch) if self.prefetch else None
+        if prefetch is not None:
+            task = prefetch.take(self.key(ctx))
+            ctx.annotate(self.name, prefetched=task is not None)
+            if task is not None:
+                return await task
+        return await _call(self.call, ctx)
+
+async def _call(func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Await a coroutine function, or run a blocking function on a worker thread
+    """
+    if inspect.iscoroutinefunction(func):
+        return await func(*args)
+    return await asyncio.to_thread(func, *args)
+
+class Prefetch:
+    """
+    Speculative calls started before their argument is known, keyed by argument
+    """
+
+    def __init__(self, tasks: Dict[Any, "asyncio.Task"]):
+        self.tasks = tasks
+
+    def take(self, arg: Any) -> Optional["asyncio.Task"]:
+        """
+        Claim the call for arg and discard the rest
+
+        Returns:
+            The task for arg, or None if it wasn't prefetched
+        """
+        task = self.tasks.pop(arg, None)
+        self.discard()
+        return task
+
+    def discard(self) -> None:
+        """
+        Cancel the unclaimed calls (calls already running finish and are ignored)
+        """
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks = {}
+
+class PrefetchNode(Node):
+    """
+    Starts a call for each likely argument in the background, without waiting for them
+
+    Its value is a Prefetch that an HTTPNode claims once the real argument is
+    known; unclaimed calls are discarded when the pipeline run ends.
+
+    Args:
+        call: Function taking the context and an argument (coroutine function or blocking)
+        candidates: Function taking the context and returning the arguments to prefetch
+    """
+
+    kind = "http"
+
+    def __init__(self, name: str, call: Callable[[PipelineContext, Any], Any],
+                 candidates: Callable[[PipelineContext], Sequence[Any]], **kwargs):
+        super().__init__(name, **kwargs)
+        self.call = call
+        self.candidates = candidates
+
+    async def run(self, ctx: PipelineContext) -> Prefetch:
+        args = list(self.candidates(ctx))
+        ctx.annotate(self.name, candidates=args)
+        prefetch = Prefetch({arg: asyncio.create_task(_call(self.call, ctx, arg)) for arg in args})
+        ctx.on_close(prefetch.discard)
+        return prefetch
+
+class FormatNode(Node):
+    """
+    Builds a frame (or any value) from values already in the context
+
+    Args:
+        build: Function taking the context and returning a frame dict, or None to emit nothing
+    """
+
+    kind = "format"
+
+    def __init__(self, name: str, build: Callable[[PipelineContext], Optional[Dict[str, Any]]], **kwargs):
+        super().__init__(name, **kwargs)
+        self.build = build
+
+    async def run(self, ctx: PipelineContext) -> Any:
+        frame = self.build(ctx)
+        if frame is not None:
+            ctx.emit(frame)
+        return frame
+
+class ComputeNode(Node):
+    """
+    Derives a value from the context without emitting a frame, for quick in-process work
+
+    Args:
+        compute: Function taking the context and returning the value
+    """
+
+    kind = "compute"
+
+    def __init__(self, name: str, compute: Callable[[PipelineContext], Any], **kwargs):
+        super().__init__(name, **kwargs)
+        self.compute = compute
+
+    async def run(self, ctx: PipelineContext) -> Any:
+        return self.compute(ctx)
+
+class TemplateNode(Node):
+    """
+    Renders a tool step without the model, emitting it like an LLM step
+
+    Args:
+        render: Function taking the context and returning the step JSON
+        step: (step id, name, role) of the step; the step JSON is published under its name
+    """
+
+    kind = "template"
+
+    def __init__(self, name: str, render: Callable[[PipelineContext], Dict[str, Any]],
+                 step: Tuple[int, str, str], **kwargs):
+        kwargs.setdefault("provides", [step[1]])
+        super().__init__(name, **kwargs)
+        self.render = render
+        self.step = step
+
+    async def run(self, ctx: PipelineContext) -> Any:
+        step_id, step_name, role = self.step
+        step_json = self.render(ctx)
+        ctx.emit(step_frame(step_json, step_id, step_name, role))
+        ctx.set(step_name, step_json)
+        return step_json
+
+# How a step can be produced: by the model, from a template, or decided per request from load
+STEP_POLICIES = ("llm", "template", "auto")
+
+class StepPolicy:
+    """
+    Per-step choice between generating a step with the model and rendering it from a template
+
+    "auto" steps use the model while the inference backend is quiet and switch
+    to their template once the number of active and queued generations reaches
+    the threshold, trading narration quality for latency under load.
+
+    Args:
+        defaults: Step name -> policy for every step that has a template
+        spec: Overrides as "step=policy,step=policy" (e.g. from an environment variable)
+        auto_threshold: Inference load at which "auto" steps use their template
+    """
+
+    def __init__(self, defaults: Dict[str, str], spec: str = None, auto_threshold: int = 4):
+        self.auto_threshold = auto_threshold
+        self.policies = dict(defaults)
+        for entry in (spec or "").split(","):
+            if not entry.strip():
+                continue
+            step, _, policy = entry.partition("=")
+            step, policy = step.strip(), policy.strip()
+            if step not in self.policies or policy not in STEP_POLICIES:
+                logger.warning(f"Ignoring step policy '{entry.strip()}'")
+                continue
+            self.policies[step] = policy
+
+    def resolve(self, load: int = 0) -> Dict[str, str]:
+        """
+        Decide every step's policy for one request
+
+        Args:
+            load: Active plus queued generations on the inference backend
+
+        Returns:
+            Step name -> "llm" or "template"
+        """
+        busy = load >= self.auto_threshold
+        return {step: ("template" if busy else "llm") if policy == "auto" else policy
+                for step, policy in self.policies.items()}
+
+class Pipeline:
+    """
+    A validated DAG of nodes
+
+    Args:
+        name: Pipeline name, reported with the timings
+        nodes: The nodes, in any order
+        inputs: Values supplied by the caller when the pipeline is run
+    """
+
+    def __init__(self, name: str, nodes: Sequence[Node], inputs: Sequence[str] = ()):
+        self.name = name
+        self.nodes = list(nodes)
+        self.inputs = tuple(inputs)
+        self._validate()
+
+    def _validate(self) -> None:
+        producers = {key: None for key in self.inputs}
+        names = set()
+        for node in self.nodes:
+            if node.name in names:
+                raise PipelineError(f"Duplicate node name '{node.name}'")
+            names.add(node.name)
+            for key in node.provides:
+                if key in producers:
+                    raise PipelineError(f"Value '{key}' is provided more than once")
+                producers[key] = node
+        for node in self.nodes:
+            for key in node.requires:
+                if key not in producers:
+                    raise PipelineError(f"Node '{node.name}' requires '{key}', which nothing provides")
+
+        # Depth-first search for cycles
+        state = {}
+        def visit(node: Node) -> None:
+            if state.get(node.name) == "done":
+                return
+            if state.get(node.name) == "visiting":
+                raise PipelineError(f"Pipeline '{self.name}' has a cycle through '{node.name}'")
+            state[node.name] = "visiting"
+            for key in node.requires:
+                if producers[key] is not None:
+                    visit(producers[key])
+            state[node.name] = "done"
+        for node in self.nodes:
+            visit(node)
+
+    async def run(self, inputs: Dict[str, Any] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the pipeline, yielding frames as nodes emit them
+
+        The last frame reports per-node timings:
+        {"pipeline": {"name", "total_time", "nodes": [{"name", "kind", "status", "start", "duration"}]}}
+
+        Args:
+            inputs: Values for the pipeline's declared inputs
+
+        Yields:
+            Frame dicts, ready to be serialized
+        """
+        inputs = inputs or {}
+        missing = [key for key in self.inputs if key not in inputs]
+        if missing:
+            raise PipelineError(f"Missing pipeline inputs: {', '.join(missing)}")
+
+        keys = list(self.inputs) + [key for node in self.nodes for key in node.provides]
+        ctx = PipelineContext(inputs, keys)
+        start = time.perf_counter()
+        timings = {}
+
+        async def run_node(node: Node) -> None:
+            timing = timings[node.name] = {"name": node.name, "kind": node.kind, "status": "pending"}
+            if not await ctx.wait(node.requires) or (node.when and not node.when(ctx)):
+                timing["status"] = "skipped"
+                ctx._abandon(node.provides)
+                return
+            started = time.perf_counter()
+            timing["start"] = started - start
+            try:
+                value = await node.run(ctx)
+                if len(node.provides) == 1:
+                    ctx.set(node.provides[0], value)
+                timing["status"] = "ok"
+            except Exception as e:
+                logger.error(f"Pipeline node '{node.name}' failed: {str(e)}")
+                timing["status"] = "error"
+                timing["error"] = str(e)
+            finally:
+                timing["duration"] = time.perf_counter() - started
+                # Anything the node didn't publish is unavailable to its dependents
+                ctx._abandon(node.provides)
+
+        tasks = [asyncio.create_task(run_node(node)) for node in self.nodes]
+        all_done = asyncio.gather(*tasks)
+        all_done.add_done_callback(lambda _: ctx.emit(_DONE))
+        try:
+            while True:
+                frame = await ctx._frames.get()
+                if frame is _DONE:
+                    break
+                yield frame
+        finally:
+            for task in tasks:
+                task.cancel()
+            for callback in ctx._cleanups:
+                callback()
+
+        total_time = time.perf_counter() - start
+        nodes = [{**timings[node.name], **ctx._notes.get(node.name, {})} for node in self.nodes]
+        logger.info(f"Pipeline '{self.name}' finished in {total_time:.2f}s: " +
+                    ", ".join(f"{t['name']}={t['status']}" + (f" {t['duration']:.2f}s" if "duration" in t else "")
+                              for t in nodes))
+        yield {"pipeline": {"name": self.name, "total_time": total_time, "nodes": nodes}}
@@ -0,0 +1,85 @@
+"""
+Split long text into chunks that fit a token budget, on semantic boundaries
+
+Text is split on the coarsest boundary that works: paragraphs (blank lines)
+first, then lines, sentences and words, and only as a last resort in the
+middle of a word. The resulting pieces are packed greedily back into chunks
+of at most the budget, so each chunk is a run of consecutive paragraphs or
+log lines rather than an arbitrary slice.
+"""
+from typing import Callable, Iterator, List, Tuple
+
+# Boundaries to split on, from the most to the least meaningful
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for tokenizers we can't run locally (about 4 characters per token)
+    """
+    return (len(text) + 3) // 4
+
+def _pieces(text: str, max_tokens: int, count_tokens: Callable[[str], int],
+            level: int = 0) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (piece, tokens) pairs that each fit max_tokens, in order
+    """
+    if level == len(SEPARATORS):
+        # No boundary left: cut at the character offset the token density suggests
+        tokens = count_tokens(text)
+        width = max(1, len(text) * max_tokens // max(tokens, 1))
+        for start in range(0, len(text), width):
+            piece = text[start:start + width]
+            yield piece, count_tokens(piece)
+        return
+    separator = SEPARATORS[level]
+    parts = text.split(separator)
+    for index, part in enumerate(parts):
+        # Keep the separator with the piece it ends so chunks join back losslessly
+        if index < len(parts) - 1:
+            part += separator
+        if not part:
+            continue
+        tokens = count_tokens(part)
+        if tokens <= max_tokens:
+            yield part, tokens
+        else:
+            yield from _pieces(part, max_tokens, count_tokens, level + 1)
+
+def pack(pieces: Iterator[Tuple[str, int]], max_tokens: int) -> List[str]:
+    """
+    Join consecutive (piece, tokens) pairs into chunks of at most max_tokens
+
+    Args:
+        pieces: Text pieces in order, each with its token count
+        max_tokens: Token budget of a chunk
+
+    Returns:
+        The chunks, in order
+    """
+    chunks, current, current_tokens = [], [], 0
+    for piece, tokens in pieces:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def split_semantic(text: str, max_tokens: int,
+                   count_tokens: Callable[[str], int] = estimate_tokens) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens on the coarsest boundaries possible
+
+    Args:
+        text: Text to split
+        max_tokens: Token budget of a chunk
+        count_tokens: Token counter of the model the chunks are for
+
+    Returns:
+        Chunks that concatenate back to the original text
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    return pack(_pieces(text, max_tokens, count_tokens), max_tokens)
@@ -0,0 +1,315 @@
+"""
+Threat-intel matching of IP addresses against local CIDR feeds
+
+Each file in the feeds directory is one feed: Tor exits, known C2 ranges,
+internal allow-lists and so on. Lines hold an IP or CIDR, optionally followed
+by a comma and a label; blank lines and # comments are ignored, except for
+header directives:
+
+    # kind: allow          (feeds are block-lists unless they say otherwise)
+    # description: Tor exit nodes
+    185.220.101.0/24,tor-exit
+    2001:db8:dead::/48
+
+All feeds are compiled into one compressed radix (Patricia) trie per address
+family, so a lookup walks at most one node per distinct prefix length on the
+path and reports the most specific match in every feed.
+"""
+import os
+import time
+import logging
+import threading
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FEED_KINDS = ("block", "allow")
+
+class _TrieNode:
+    __slots__ = ("prefix", "length", "values", "children")
+
+    def __init__(self, prefix: int, length: int, values: list = None):
+        self.prefix = prefix
+        self.length = length
+        self.values = values
+        self.children = [None, None]
+
+class CIDRTrie:
+    """
+    Compressed binary radix trie of network prefixes
+
+    Nodes exist only where prefixes end or branch, so hundreds of thousands
+    of CIDRs cost one node each plus the branch points between them.
+
+    Args:
+        width: Address width in bits (32 for IPv4, 128 for IPv6)
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self.root = _TrieNode(0, 0)
+        self.size = 0
+
+    def _bit(self, value: int, position: int) -> int:
+        return (value >> (self.width - 1 - position)) & 1
+
+    def _mask(self, value: int, length: int) -> int:
+        return value >> (self.width - length) << (self.width - length) if length else 0
+
+    def insert(self, prefix: int, length: int, value: Any) -> None:
+        """
+        Add a value under a prefix (several values may share one prefix)
+
+        Args:
+            prefix: Network address as an integer
+            length: Prefix length in bits
+            value: Value reported when an address falls under the prefix
+        """
+        prefix = self._mask(prefix, length)
+        self.size += 1
+        node = self.root
+        while True:
+            if node.length == length:
+                if node.values is None:
+                    node.values = []
+                node.values.append(value)
+                return
+            bit = self._bit(prefix, node.length)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _TrieNode(prefix, length, [value])
+                return
+
+            shortest = min(length, child.length)
+            differing = (prefix ^ child.prefix) >> (self.width - shortest) if shortest else 0
+            common = shortest - differing.bit_length()
+            if common == child.length:
+                node = child
+                continue
+
+            # The new prefix and the child diverge (or one contains the other) at bit common
+            branch = _TrieNode(self._mask(prefix, common), common)
+            node.children[bit] = branch
+            branch.children[self._bit(child.prefix, common)] = child
+            if common == length:
+                branch.values = [value]
+            else:
+                branch.children[self._bit(prefix, common)] = _TrieNode(prefix, length, [value])
+            return
+
+    def match(self, address: int) -> List[Any]:
+        """
+        Find every prefix containing an address
+
+        Args:
+            address: Address as an integer
+
+        Returns:
+            The values of all matching prefixes, least specific first
+        """
+        matches = []
+        node = self.root
+        while node is not None:
+            if node.length and (address ^ node.prefix) >> (self.width - node.length):
+                break
+            if node.values:
+                matches.extend(node.values)
+            if node.length == self.width:
+                break
+            node = node.children[self._bit(address, node.length)]
+        return matches
+
+    def longest_match(self, address: int) -> Optional[Any]:
+        """
+        The value of the most specific prefix containing an address, if any
+        """
+        matches = self.match(address)
+        return matches[-1] if matches else None
+
+def read_feed(path: str) -> Tuple[Dict[str, str], List[Tuple[ipaddress._BaseNetwork, str]]]:
+    """
+    Read one feed file
+
+    Args:
+        path: Path to the feed
+
+    Returns:
+        (header directives, [(network, label)]); unparseable lines are skipped
+    """
+    header = {"kind": "block", "description": ""}
+    entries = []
+    skipped = 0
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                key, separator, value = line[1:].partition(":")
+                if separator and key.strip().lower() in header:
+                    header[key.strip().lower()] = value.strip()
+                continue
+            cidr, _, label = line.partition(",")
+            try:
+                entries.append((ipaddress.ip_network(cidr.strip(), strict=False), label.strip()))
+            except ValueError:
+                skipped += 1
+    if header["kind"] not in FEED_KINDS:
+        logger.warning(f"Unknown kind {header['kind']!r} in threat feed {path}, treating it as a block-list")
+        header["kind"] = "block"
+    if skipped:
+        logger.warning(f"Skipped {skipped} unparseable lines in threat feed {path}")
+    return header, entries
+
+class _FeedSet:
+    """Immutable compiled feeds; replaced wholesale on reload so lookups never see a partial update"""
+
+    def __init__(self, feeds: Dict[str, Dict[str, Any]], signature: Tuple):
+        self.feeds = {}
+        self.tries = {4: CIDRTrie(32), 6: CIDRTrie(128)}
+        self.signature = signature
+        self.loaded_at = time.time()
+        for name, (path, header, entries) in feeds.items():
+            for network, label in entries:
+                self.tries[network.version].insert(int(network.network_address), network.prefixlen,
+                                                   (name, str(network), label))
+            self.feeds[name] = {"path": path, "kind": header["kind"],
+                                "description": header["description"], "entries": len(entries)}
+
+class ThreatIntelService:
+    """
+    Matches IP addresses against the CIDR feeds in a directory
+
+    The feeds are reloaded when a file is added, changed or removed. Changes
+    are noticed at most every reload_interval seconds during lookups and the
+    new trie is built on a background thread; lookups keep using the previous
+    one until it is swapped in.
+
+    Args:
+        feeds_dir: Directory of feed files (defaults to THREAT_FEEDS_DIR)
+        reload_interval: Seconds between checks for changed feeds (defaults to
+                         THREAT_FEEDS_RELOAD_INTERVAL, 0 disables hot reload)
+    """
+
+    def __init__(self, feeds_dir: str = None, reload_interval: float = None):
+        self.feeds_dir = feeds_dir or os.getenv("THREAT_FEEDS_DIR", "data/threat_feeds")
+        self.reload_interval = reload_interval if reload_interval is not None else float(os.getenv("THREAT_FEEDS_RELOAD_INTERVAL", "30"))
+        self._feeds = _FeedSet({}, ())
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._checked_at = time.monotonic()
+        self.reload()
+
+    def _signature(self) -> Tuple:
+        try:
+            files = [entry for entry in os.scandir(self.feeds_dir) if entry.is_file() and not entry.name.startswith(".")]
+        except FileNotFoundError:
+            return ()
+        return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in files))
+
+    def reload(self) -> Dict[str, Any]:
+        """
+        Rebuild the trie from the feeds directory now
+
+        Returns:
+            The feed statistics after the reload
+        """
+        signature = self._signature()
+        feeds = {}
+        for name, _, _ in signature:
+            path = os.path.join(self.feeds_dir, name)
+            try:
+                header, entries = read_feed(path)
+            except OSError as e:
+                logger.error(f"Could not read threat feed {path}: {str(e)}")
+                continue
+            feeds[os.path.splitext(name)[0]] = (path, header, entries)
+        start = time.perf_counter()
+        self._feeds = _FeedSet(feeds, signature)
+        logger.info(f"Loaded {len(feeds)} threat feeds with {self._feeds.tries[4].size + self._feeds.tries[6].size} "
+                    f"prefixes in {time.perf_counter() - start:.2f}s")
+        return self.get_stats()
+
+    def _maybe_reload(self) -> None:
+        if self.reload_interval <= 0 or time.monotonic() - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._checked_at = time.monotonic()
+            if self._signature() == self._feeds.signature:
+                return
+            self._reloading = True
+
+        def reload() -> None:
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Reloading threat feeds failed: {str(e)}")
+            finally:
+                self._reloading = False
+        threading.Thread(target=reload, name="threat-feed-reload", daemon=True).start()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether any feed is loaded"""
+        return bool(self._feeds.feeds)
+
+    def match(self, ip: str) -> Dict[str, Any]:
+        """
+        Check an IP address against every feed
+
+        Args:
+            ip: IPv4 or IPv6 address
+
+        Returns:
+            {"ip", "verdict", "matches"}: the verdict is "allowlisted" if an allow-list
+            covers the address, "blocklisted" if only block-lists do, otherwise
+            "clean"; matches hold the most specific {"feed", "kind", "cidr", "label"}
+            of each feed that covers it
+
+        Raises:
+            ValueError: If ip is not an IP address
+        """
+        self._maybe_reload()
+        feeds = self._feeds
+        address = ipaddress.ip_address(ip.strip())
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+
+        # Later (more specific) matches replace earlier ones from the same feed
+        best = {}
+        for feed, cidr, label in feeds.tries[address.version].match(int(address)):
+            best[feed] = {"feed": feed, "kind": feeds.feeds[feed]["kind"], "cidr": cidr, "label": label}
+        matches = list(best.values())
+
+        kinds = {match["kind"] for match in matches}
+        verdict = "allowlisted" if "allow" in kinds else "blocklisted" if kinds else "clean"
+        return {"ip": str(address), "verdict": verdict, "matches": matches}
+
+    def match_many(self, ips: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Check many addresses; invalid ones get an "error" instead of a verdict
+        """
+        results = []
+        for ip in ips:
+            try:
+                results.append(self.match(ip))
+            except (ValueError, AttributeError):
+                results.append({"ip": ip, "error": "Not a valid IPv4 or IPv6 address"})
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Report the loaded feeds and prefix counts
+        """
+        feeds = self._feeds
+        return {
+            "feeds_dir": self.feeds_dir,
+            "feeds": feeds.feeds,
+            "ipv4_prefixes": feeds.tries[4].size,
+            "ipv6_prefixes": feeds.tries[6].size,
+            "loaded_at": feeds.loaded_at,
+            "reloading": self._reloading
+        }
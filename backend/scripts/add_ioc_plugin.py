@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Script to add the IOCReputation plugin to the database
+"""
+import sys
+import os
+import json
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database.database import SessionLocal, init_db
+from app.models.plugin_model import Plugin
+
+def add_ioc_plugin():
+    """Add the IOCReputation plugin to the database"""
+    # Create a database session
+    db = SessionLocal()
+    
+    try:
+        # Check if the plugin already exists
+        existing_plugin = db.query(Plugin).filter(Plugin.name == "IOCReputation").first()
+        if existing_plugin:
+            print("IOCReputation plugin already exists with ID:", existing_plugin.id)
+            return
+        
+        # Define the global parameters for the IOC reputation lookups
+        parameters = [
+            {
+                "name": "iocs",
+                "description": "MD5/SHA1/SHA256 file hashes or domains to check",
+                "required": True,
+                "type": "array"
+            }
+        ]
+        
+        # Define the endpoints
+        endpoints = [
+            {
+                "name": "check",
+                "description": "Check file hashes and domains against offline malware and phishing blocklists",
+                "path": "/check",
+                "method": "POST",
+                "parameters": []
+            },
+            {
+                "name": "stats",
+                "description": "Report the loaded blocklists and their memory use",
+                "path": "/stats",
+                "method": "GET",
+                "parameters": []
+            }
+        ]
+        
+        # Create the plugin
+        ioc_plugin = Plugin(
+            name="IOCReputation",
+            description="Check the reputation of file hashes (md5, sha1, sha256) and domains against offline malware blocklists.",
+            api_endpoint="/api/ioc",
+            api_key_required=False,
+            parameters=json.dumps(parameters),
+            endpoints=json.dumps(endpoints)
+        )
+        
+        # Add to the database
+        db.add(ioc_plugin)
+        db.commit()
+        db.refresh(ioc_plugin)
+        
+        print(f"IOCReputation plugin added successfully with ID: {ioc_plugin.id}")
+    
+    except Exception as e:
+        print(f"Error adding IOCReputation plugin: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    # Initialize the database if needed
+    init_db()
+    
+    # Add the IOCReputation plugin
+    add_ioc_plugin()
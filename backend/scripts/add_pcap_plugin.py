@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Script to add the PCAPFlows plugin to the database
+"""
+import sys
+import os
+import json
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database.database import SessionLocal, init_db
+from app.models.plugin_model import Plugin
+
+def add_pcap_plugin():
+    """Add the PCAPFlows plugin to the database"""
+    # Create a database session
+    db = SessionLocal()
+    
+    try:
+        # Check if the plugin already exists
+        existing_plugin = db.query(Plugin).filter(Plugin.name == "PCAPFlows").first()
+        if existing_plugin:
+            print("PCAPFlows plugin already exists with ID:", existing_plugin.id)
+            return
+        
+        # Define the global parameters for the flow summaries
+        parameters = [
+            {
+                "name": "file",
+                "description": "Name of a pcap/pcapng capture in the capture directory (or upload the capture as the body)",
+                "required": False,
+                "type": "string"
+            },
+            {
+                "name": "top",
+                "description": "Number of flows and talkers to report",
+                "required": False,
+                "type": "integer"
+            }
+        ]
+        
+        # Define the endpoints
+        endpoints = [
+            {
+                "name": "flows",
+                "description": "Summarize a packet capture as 5-tuple flows, flag scans and large or long-lived flows, and enrich the addresses involved",
+                "path": "/flows",
+                "method": "POST",
+                "parameters": []
+            },
+            {
+                "name": "captures",
+                "description": "List the captures available by name",
+                "path": "/captures",
+                "method": "GET",
+                "parameters": []
+            }
+        ]
+        
+        # Create the plugin
+        pcap_plugin = Plugin(
+            name="PCAPFlows",
+            description="Summarize pcap and pcapng packet captures as network flows, flagging port scans, host sweeps and large transfers.",
+            api_endpoint="/api/pcap",
+            api_key_required=False,
+            parameters=json.dumps(parameters),
+            endpoints=json.dumps(endpoints)
+        )
+        
+        # Add to the database
+        db.add(pcap_plugin)
+        db.commit()
+        db.refresh(pcap_plugin)
+        
+        print(f"PCAPFlows plugin added successfully with ID: {pcap_plugin.id}")
+    
+    except Exception as e:
+        print(f"Error adding PCAPFlows plugin: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    # Initialize the database if needed
+    init_db()
+    
+    # Add the PCAPFlows plugin
+    add_pcap_plugin()
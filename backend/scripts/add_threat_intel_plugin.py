@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Script to add the ThreatIntel plugin to the database
+"""
+import sys
+import os
+import json
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database.database import SessionLocal, init_db
+from app.models.plugin_model import Plugin
+
+def add_threat_intel_plugin():
+    """Add the ThreatIntel plugin to the database"""
+    # Create a database session
+    db = SessionLocal()
+    
+    try:
+        # Check if the plugin already exists
+        existing_plugin = db.query(Plugin).filter(Plugin.name == "ThreatIntel").first()
+        if existing_plugin:
+            print("ThreatIntel plugin already exists with ID:", existing_plugin.id)
+            return
+        
+        # Define the global parameters for the threat-intel matcher
+        parameters = [
+            {
+                "name": "ips",
+                "description": "IP addresses to check against the local threat feeds",
+                "required": True,
+                "type": "array"
+            }
+        ]
+        
+        # Define the endpoints
+        endpoints = [
+            {
+                "name": "match",
+                "description": "Check IP addresses against Tor exit, C2 and allow-list CIDR feeds",
+                "path": "/match",
+                "method": "POST",
+                "parameters": []
+            },
+            {
+                "name": "stats",
+                "description": "List the loaded threat feeds and their sizes",
+                "path": "/stats",
+                "method": "GET",
+                "parameters": []
+            }
+        ]
+        
+        # Create the plugin
+        threat_intel_plugin = Plugin(
+            name="ThreatIntel",
+            description="Check whether an IP address appears in threat feeds such as Tor exits, known C2 ranges and internal allow-lists.",
+            api_endpoint="/api/threatintel",
+            api_key_required=False,
+            parameters=json.dumps(parameters),
+            endpoints=json.dumps(endpoints)
+        )
+        
+        # Add to the database
+        db.add(threat_intel_plugin)
+        db.commit()
+        db.refresh(threat_intel_plugin)
+        
+        print(f"ThreatIntel plugin added successfully with ID: {threat_intel_plugin.id}")
+    
+    except Exception as e:
+        print(f"Error adding ThreatIntel plugin: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    # Initialize the database if needed
+    init_db()
+    
+    # Add the ThreatIntel plugin
+    add_threat_intel_plugin()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark the IOC reputation database: build size, memory footprint and lookup latency
+
+Generates a synthetic feed of SHA256 hashes and domains, builds the database
+file, then times bulk lookups of listed and unlisted IOCs.
+
+Usage:
+    python scripts/benchmark_ioc_reputation.py --entries 1000000
+    python scripts/benchmark_ioc_reputation.py --entries 10000000 --fpr 0.001
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import resource
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.ioc_reputation import IOCDatabase, IOCReputationService, build_database, ioc_key
+
+def synthetic_iocs(count: int, seed: int):
+    for i in range(count):
+        if i % 4 == 3:
+            yield "domain", f"host{seed}-{i}.example-{i % 977}.net"
+        else:
+            yield "sha256", hashlib.sha256(f"{seed}:{i}".encode()).hexdigest()
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IOC reputation database")
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--fpr", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.iocdb")
+        start = time.perf_counter()
+        data = build_database({"synthetic": (ioc_key(*ioc) for ioc in synthetic_iocs(args.entries, 1))}, args.fpr)
+        with open(path, "wb") as handle:
+            handle.write(data)
+        del data
+        print(f"Built {args.entries} entries in {time.perf_counter() - start:.1f}s "
+              f"(peak RSS {peak_rss_mib():.0f} MiB while building)")
+
+        service = IOCReputationService(IOCDatabase.open(path))
+        stats = service.get_stats()
+        print(f"File {stats['file_bytes'] / 2**20:.1f} MiB: Bloom filter {stats['bloom_bytes'] / 2**20:.1f} MiB "
+              f"({stats['bloom_bits_per_entry']} bits/entry, {stats['bloom_hashes']} hashes, "
+              f"expected FPR {stats['expected_false_positive_rate']:.4f}), records {stats['records_bytes'] / 2**20:.1f} MiB")
+
+        rng = random.Random(0)
+        listed = [value for _, value in synthetic_iocs(args.entries, 1)]
+        listed = [listed[rng.randrange(len(listed))] for _ in range(args.lookups // 2)]
+        unlisted = [value for _, value in synthetic_iocs(args.lookups // 2, 2)]
+        for name, iocs in (("listed", listed), ("unlisted", unlisted)):
+            start = time.perf_counter()
+            results = service.check_many(iocs)
+            elapsed = time.perf_counter() - start
+            hits = sum(result["verdict"] == "malicious" for result in results)
+            print(f"{name:>9}: {elapsed / len(iocs) * 1e6:.1f} us/lookup, {hits}/{len(iocs)} reported malicious")
+
+        stats = service.get_stats()
+        print(f"Bloom filter rejected {stats['bloom_rejections']} lookups, {stats['false_positives']} false positives")
+        service.database.close()
+
+if __name__ == "__main__":
+    main()
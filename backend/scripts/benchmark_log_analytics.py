@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Benchmark the vectorized log analytics at tens of millions of events
+
+Generates synthetic event columns (web requests from a long tail of clients,
+a few scanners and SSH brute-forcers, rare user agents), then times
+log_analytics.analyze on one core. Also times storing parsed events one by
+one, the cost the ingestion path adds per line.
+
+Usage:
+    python scripts/benchmark_log_analytics.py --events 10000000
+    python scripts/benchmark_log_analytics.py --events 20000000 --ips 1000000
+"""
+import sys
+import time
+import argparse
+import resource
+from pathlib import Path
+
+import numpy as np
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.log_analytics import ACTION_CODES, EventColumns, analyze, summary_table
+from app.services.log_ingest import LogEvent
+
+def synthetic_columns(events: int, ips: int, agents: int, seed: int = 0) -> EventColumns:
+    rng = np.random.default_rng(seed)
+    start = 1714566600.0
+    # Zipf-like client popularity, so there are clear top talkers and a long tail
+    ip_ids = (rng.pareto(1.2, events) * ips / 50).astype(np.int64) % ips
+    actions = rng.choice([ACTION_CODES["request"], ACTION_CODES["login_failed"], ACTION_CODES["login_accepted"],
+                          ACTION_CODES["other"]], size=events, p=[0.8, 0.12, 0.03, 0.05]).astype(np.int8)
+    statuses = np.where(actions == ACTION_CODES["request"],
+                        rng.choice([200, 301, 404, 500], size=events, p=[0.85, 0.05, 0.08, 0.02]), 0)
+    agent_ids = np.where(actions == ACTION_CODES["request"],
+                         (rng.pareto(1.5, events) * 3).astype(np.int64) % agents, -1)
+    return EventColumns.from_arrays(
+        [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ips)],
+        [f"agent-{i}" for i in range(agents)],
+        ["root", "admin", "deploy"],
+        timestamps=start + np.sort(rng.random(events)) * 86400,
+        ips=ip_ids,
+        users=np.where(actions == ACTION_CODES["request"], -1, rng.integers(0, 3, events)),
+        user_agents=agent_ids,
+        actions=actions,
+        statuses=statuses
+    )
+
+def peak_rss_mib() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (2**20 if sys.platform == "darwin" else 2**10)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized log analytics")
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--ips", type=int, default=200_000)
+    parser.add_argument("--agents", type=int, default=5000)
+    parser.add_argument("--store-events", type=int, default=1_000_000, help="Events stored one by one")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    columns = synthetic_columns(args.events, args.ips, args.agents)
+    print(f"Generated {args.events} events ({args.ips} IPs, {args.agents} user agents) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    analytics = analyze(columns)
+    elapsed = time.perf_counter() - start
+    print(f"analyze: {elapsed:.2f}s, {args.events / elapsed / 1e6:.1f}M events/s (peak RSS {peak_rss_mib():.0f} MiB)")
+    table = summary_table(analytics)
+    print(f"Summary table: {len(table)} characters, {len(table.splitlines())} lines")
+
+    event = LogEvent("access", 1714566600.0, "203.0.113.9", None, "request", 200, "/", "Mozilla/5.0", None, 512)
+    store = EventColumns(args.store_events)
+    start = time.perf_counter()
+    for _ in range(args.store_events):
+        store.add(event)
+    elapsed = time.perf_counter() - start
+    print(f"EventColumns.add: {elapsed / args.store_events * 1e6:.2f} us/event")
+
+if __name__ == "__main__":
+    main()
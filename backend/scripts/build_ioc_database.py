@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Compile IOC blocklists into the offline database used by the IOC reputation plugin
+
+Each feed file lists one MD5/SHA1/SHA256 hash or domain per line (# comments
+allowed); the feed is named after the file.
+
+Usage:
+    python scripts/build_ioc_database.py feeds/malware_hashes.txt feeds/phishing_domains.txt -o data/iocs.iocdb
+    IOC_DATABASE=data/iocs.iocdb uvicorn app.main:app
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.ioc_reputation import IOCDatabase, build_database, read_feed
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline IOC reputation database")
+    parser.add_argument("feeds", nargs="+", help="Feed files, one IOC per line")
+    parser.add_argument("-o", "--output", required=True, help="Database file to write")
+    parser.add_argument("--fpr", type=float, default=0.01, help="Bloom filter false positive rate")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    feeds = {os.path.splitext(os.path.basename(path))[0]: read_feed(path) for path in args.feeds}
+    data = build_database(feeds, args.fpr)
+
+    # Write to a temporary file first so running servers never map a half-written database
+    temporary = f"{args.output}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(data)
+    os.replace(temporary, args.output)
+
+    database = IOCDatabase.open(args.output)
+    stats = database.get_stats()
+    database.close()
+    print(f"Wrote {args.output}: {stats['records']} records from {len(feeds)} feeds, "
+          f"{stats['bloom_bytes'] / 2**20:.1f} MiB Bloom filter + {stats['records_bytes'] / 2**20:.1f} MiB records "
+          f"in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
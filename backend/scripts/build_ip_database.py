@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""
+Compile CSV IP range dumps into the offline IP database used by IPInfoService
+
+Each CSV has the columns start_ip, end_ip, country, asn, org (header optional).
+
+Usage:
+    python scripts/build_ip_database.py ranges-v4.csv ranges-v6.csv -o data/ip_ranges.ipdb
+    IPINFO_DATABASE=data/ip_ranges.ipdb uvicorn app.main:app
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.ip_database import IPRangeDatabase, build_database, read_csv_ranges
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline IP range database")
+    parser.add_argument("csv", nargs="+", help="CSV range dumps")
+    parser.add_argument("-o", "--output", required=True, help="Database file to write")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ranges = []
+    for path in args.csv:
+        ranges += read_csv_ranges(path)
+    data = build_database(ranges)
+
+    # Write to a temporary file first so running servers never map a half-written database
+    temporary = f"{args.output}.tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(data)
+    os.replace(temporary, args.output)
+
+    database = IPRangeDatabase.open(args.output)
+    stats = database.get_stats()
+    database.close()
+    print(f"Wrote {args.output}: {stats['ipv4_ranges']} IPv4 and {stats['ipv6_ranges']} IPv6 ranges, "
+          f"{stats['records']} records, {stats['bytes']} bytes from {len(ranges)} rows "
+          f"in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
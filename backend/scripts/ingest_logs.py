@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Parse log files from disk and print the aggregates /api/ingest/logs would summarize
+
+Files are memory-mapped and parsed chunk by chunk, so multi-GB logs need
+bounded memory. Gzip-compressed files are decompressed on the fly.
+
+Usage:
+    python scripts/ingest_logs.py /var/log/auth.log /var/log/nginx/access.log.gz
+    python scripts/ingest_logs.py auth.log --format syslog --prompt
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.log_ingest import LOG_FORMATS, LogIngestor, read_file_chunks, summary_prompt
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate syslog and access log files")
+    parser.add_argument("logs", nargs="+", help="Log files (optionally gzip-compressed)")
+    parser.add_argument("--format", choices=LOG_FORMATS, default="auto")
+    parser.add_argument("--top", type=int, default=10, help="Entries per top-N list")
+    parser.add_argument("--prompt", action="store_true", help="Print the LLM prompt instead of the aggregates")
+    args = parser.parse_args()
+
+    # One ingestor per file, since compression is detected from a file's first bytes
+    start = time.perf_counter()
+    for path in args.logs:
+        ingestor = LogIngestor(args.format)
+        for chunk in read_file_chunks(path):
+            ingestor.feed(chunk)
+        aggregates = ingestor.finish(args.top)
+        print(f"== {path}")
+        print(summary_prompt(aggregates) if args.prompt else json.dumps(aggregates, indent=2))
+        stats = aggregates["input"]
+        print(f"{stats['lines']} lines, {stats['bytes'] / 1e6:.1f} MB in {stats['parse_time']:.2f}s "
+              f"({stats['lines_per_second']} lines/s)", file=sys.stderr)
+    print(f"Done in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Local IPinfo-compatible stub server for testing and benchmarking IP lookups offline
+
+Implements GET /json, /geo, /asn and /<ip>/json, /<ip>/geo, /<ip>/asn over
+HTTP/1.1 keep-alive connections. Responses are synthesized deterministically
+from the IP address, after a configurable delay.
+
+Usage:
+    python scripts/ipinfo_stub_server.py --port 8081 --delay 0.05
+    IPINFO_BASE_URL=http://127.0.0.1:8081 uvicorn app.main:app
+"""
+import sys
+import json
+import time
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# Address reported for requests without an IP
+CALLER_IP = "203.0.113.7"
+
+CITIES = [
+    ("Mountain View", "California", "US", "37.4056,-122.0775", "94043", "America/Los_Angeles"),
+    ("Washington", "District of Columbia", "US", "38.8951,-77.0364", "20001", "America/New_York"),
+    ("Frankfurt am Main", "Hesse", "DE", "50.1155,8.6842", "60313", "Europe/Berlin"),
+    ("Singapore", "Singapore", "SG", "1.2897,103.8501", "018989", "Asia/Singapore")
+]
+
+ORGS = [
+    ("AS15169", "Google LLC", "google.com"),
+    ("AS7922", "Comcast Cable Communications, LLC", "comcast.net"),
+    ("AS16509", "Amazon.com, Inc.", "amazon.com"),
+    ("AS13335", "Cloudflare, Inc.", "cloudflare.com")
+]
+
+def ip_record(ip: str) -> Dict[str, Any]:
+    """
+    Deterministic basic-endpoint record for an IP address
+    """
+    seed = zlib.crc32(ip.encode())
+    city, region, country, loc, postal, timezone = CITIES[seed % len(CITIES)]
+    asn, name, domain = ORGS[(seed // len(CITIES)) % len(ORGS)]
+    return {
+        "ip": ip,
+        "hostname": f"host-{seed % 1000}.{domain}",
+        "city": city,
+        "region": region,
+        "country": country,
+        "loc": loc,
+        "org": f"{asn} {name}",
+        "postal": postal,
+        "timezone": timezone
+    }
+
+def endpoint_record(ip: str, endpoint: str) -> Dict[str, Any]:
+    """
+    Record for the geo or asn endpoint: a subset of the basic record
+    """
+    record = ip_record(ip)
+    if endpoint == "geo":
+        return {key: record[key] for key in ("ip", "city", "region", "country", "loc", "postal", "timezone")}
+    if endpoint == "asn":
+        asn, name = record["org"].split(" ", 1)
+        return {"ip": ip, "asn": asn, "name": name, "org": record["org"]}
+    return record
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Handles one keep-alive connection to the stub server"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.stub._record_connection()
+
+    def log_message(self, format, *args):
+        # Keep test and benchmark output quiet
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub._record_request(self.path)
+        time.sleep(stub.delay)
+
+        failure = stub._next_failure()
+        if failure is not None:
+            self._send_json(failure, {"error": "stub failure"}, {"Retry-After": "0"})
+            return
+
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        endpoints = {"json": "basic", "geo": "geo", "asn": "asn"}
+        if len(parts) == 1 and parts[0] in endpoints:
+            ip, endpoint = CALLER_IP, endpoints[parts[0]]
+        elif len(parts) == 2 and parts[1] in endpoints:
+            ip, endpoint = parts[0], endpoints[parts[1]]
+        else:
+            self._send_json(404, {"error": {"title": "Wrong path"}})
+            return
+        self._send_json(200, endpoint_record(ip, endpoint))
+
+class IPInfoStubServer:
+    """
+    IPinfo-compatible server running in a background thread
+
+    Records every request path plus the number of TCP connections opened, so
+    tests can check what the client sent and that it reused connections. The
+    first fail_first requests are answered with fail_status.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0,
+                 fail_first: int = 0, fail_status: int = 503):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests: List[str] = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _record_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def _record_request(self, path: str) -> None:
+        with self._lock:
+            self.requests.append(path)
+
+    def _next_failure(self) -> Optional[int]:
+        with self._lock:
+            if self.fail_first > 0:
+                self.fail_first -= 1
+                return self.fail_status
+        return None
+
+    def start(self) -> "IPInfoStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ipinfo-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local IPinfo-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.05, help="Seconds before each response")
+    args = parser.parse_args()
+
+    server = IPInfoStubServer(args.host, args.port, args.delay)
+    print(f"IPinfo stub server listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Local Ollama-compatible stub server for testing and benchmarking the Ollama backend offline
+
+Implements /api/tags, /api/ps, /api/generate and /api/chat with streamed NDJSON
+responses over HTTP/1.1 keep-alive connections. Replies are canned text emitted
+one word per chunk with a configurable per-token delay.
+
+Usage:
+    python scripts/ollama_stub_server.py --port 11434 --token-delay 0.02
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_REPLY = "Phishing, ransomware and credential stuffing are the most common threats. Enable MFA and keep systems patched."
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Handles one keep-alive connection to the stub server"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.stub._record_connection()
+
+    def log_message(self, format, *args):
+        # Keep test and benchmark output quiet
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub._record_request(self.path, None)
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": name, "size": 0} for name in stub.models]})
+        elif self.path == "/api/ps":
+            self._send_json(200, {"models": [{"name": name, "expires_at": str(expires)}
+                                             for name, expires in stub.loaded.items()]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        stub = self.server.stub
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        stub._record_request(self.path, payload)
+
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json(404, {"error": "not found"})
+            return
+        model = payload.get("model")
+        if model not in stub.models and f"{model}:latest" not in stub.models:
+            self._send_json(404, {"error": f"model '{model}' not found"})
+            return
+        stub.loaded[model] = payload.get("keep_alive", "5m")
+
+        chat = self.path == "/api/chat"
+        # An empty prompt (or message list) just loads the model
+        if not (payload.get("messages") if chat else payload.get("prompt")):
+            self._send_json(200, self._frame(model, chat, "", done=True))
+            return
+
+        words = stub.reply_for(payload).split(" ")
+        num_predict = payload.get("options", {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            words = words[:num_predict]
+
+        if payload.get("stream", True) is False:
+            time.sleep(stub.token_delay * len(words))
+            self._send_json(200, self._frame(model, chat, " ".join(words), done=True, eval_count=len(words)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            start = time.time()
+            for i, word in enumerate(words):
+                time.sleep(stub.token_delay)
+                self._write_chunk(self._frame(model, chat, word if i == 0 else " " + word))
+            self._write_chunk(self._frame(model, chat, "", done=True, eval_count=len(words),
+                                          eval_duration=int((time.time() - start) * 1e9)))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream
+            self.close_connection = True
+
+    @staticmethod
+    def _frame(model: str, chat: bool, text: str, done: bool = False, **stats) -> Dict[str, Any]:
+        frame = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+        if chat:
+            frame["message"] = {"role": "assistant", "content": text}
+        else:
+            frame["response"] = text
+        frame.update(stats)
+        return frame
+
+class OllamaStubServer:
+    """
+    Ollama-compatible server running in a background thread
+
+    Records every request path and JSON payload plus the number of TCP
+    connections opened, so tests can check what the backend sent and that it
+    reused connections.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, models: Optional[List[str]] = None,
+                 reply: str = DEFAULT_REPLY, token_delay: float = 0.0):
+        self.models = models or ["llama2"]
+        self.reply = reply
+        self.token_delay = token_delay
+        self.loaded = {}
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_for(self, payload: Dict[str, Any]) -> str:
+        """Text to stream back for a request; override for request-dependent replies"""
+        return self.reply
+
+    def _record_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def _record_request(self, path: str, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            self.requests.append((path, payload))
+
+    def start(self) -> "OllamaStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Ollama-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", action="append", dest="models", help="Model name to advertise (repeatable)")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Text every completion streams back")
+    args = parser.parse_args()
+
+    server = OllamaStubServer(args.host, args.port, args.models, args.reply, args.token_delay)
+    print(f"Ollama stub server listening on {server.url} (models: {', '.join(server.models)})")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
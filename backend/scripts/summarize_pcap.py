@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""
+Summarize packet captures from disk as the flows /api/pcap/flows would send to the model
+
+Captures are memory-mapped and parsed in place, so multi-GB files need bounded
+memory. Both classic pcap and pcapng files are recognized.
+
+Usage:
+    python scripts/summarize_pcap.py capture.pcapng
+    python scripts/summarize_pcap.py capture.pcap --top 20 --prompt
+"""
+import sys
+import json
+import time
+import argparse
+import resource
+from pathlib import Path
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.services.pcap_flows import summarize_capture, summary_prompt
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize pcap/pcapng captures as flows")
+    parser.add_argument("captures", nargs="+", help="pcap or pcapng files")
+    parser.add_argument("--top", type=int, default=10, help="Entries per top-N list")
+    parser.add_argument("--max-flows", type=int, default=200000, help="Flows tracked exactly")
+    parser.add_argument("--prompt", action="store_true", help="Print the LLM prompt instead of the aggregates")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for path in args.captures:
+        aggregates = summarize_capture(path, args.top, args.max_flows)
+        print(f"== {path}")
+        print(summary_prompt(aggregates) if args.prompt else json.dumps(aggregates, indent=2))
+        stats = aggregates["input"]
+        print(f"{stats['packets']} packets, {stats['bytes'] / 1e6:.1f} MB in {stats['parse_time']:.2f}s "
+              f"({stats['packets_per_second']} packets/s)", file=sys.stderr)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Done in {time.perf_counter() - start:.2f}s (peak RSS {peak:.0f} MiB)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
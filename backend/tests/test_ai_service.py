@@ -3,6 +3,7 @@ import os
 from unittest.mock import patch, MagicMock
 import sys
 import json
+import asyncio
 from dotenv import load_dotenv
 
 # Add the parent directory to sys.path to import app modules
@@ -11,74 +12,80 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Load environment variables
 load_dotenv()
 
-# Mock the requests module before importing AIService
-mock_response = MagicMock()
-mock_response.status_code = 200
-mock_response.json.return_value = {"models": [{"name": "llama2"}]}
-
-with patch('requests.get', return_value=mock_response), \
-     patch('requests.post', return_value=mock_response):
-    from app.services.ai_service import AIService
-    from app.models.plugin_model import Plugin
+from app.services.ai_service import AIService
+from app.services.model_registry import ModelStatus, model_registry
+from app.models.plugin_model import Plugin
+from scripts.ollama_stub_server import OllamaStubServer
 
 class TestAIService(unittest.TestCase):
-    """Test cases for the AI Service"""
+    """Test cases for the AI Service running on the Ollama backend"""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Start a local Ollama-compatible server"""
+        cls.server = OllamaStubServer(models=["llama2"]).start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the local server"""
+        cls.server.stop()
     
     def setUp(self):
         """Set up test fixtures"""
-        # Create patch for requests.get
-        self.get_patcher = patch('requests.get')
-        self.mock_get = self.get_patcher.start()
-        self.mock_get.return_value.status_code = 200
-        self.mock_get.return_value.json.return_value = {"models": [{"name": "llama2"}]}
-        
-        # Create patch for requests.post
-        self.post_patcher = patch('requests.post')
-        self.mock_post = self.post_patcher.start()
-        self.mock_post.return_value.status_code = 200
-        
-        # Initialize the service with mocks
+        self.server.requests.clear()
+        self.server.reply = "This is a mocked response about cybersecurity."
+        
+        # Point the service at the stub server
+        self.env_patcher = patch.dict(os.environ, {
+            "AI_BACKEND": "ollama",
+            "OLLAMA_HOST": self.server.url,
+            "OLLAMA_MODEL": "llama2",
+            "MLX_QUANTIZATION": "",
+            "MLX_MODEL_CONFIG": "{}"
+        })
+        self.env_patcher.start()
+        
+        # Initialize the service
         self.ai_service = AIService()
     
     def tearDown(self):
         """Clean up after tests"""
-        self.get_patcher.stop()
-        self.post_patcher.stop()
+        model_registry.unload(self.ai_service.model_repo, self.ai_service.quantization, self.ai_service.model_config)
+        self.env_patcher.stop()
+    
+    def chat_payloads(self):
+        return [payload for path, payload in self.server.requests if path == "/api/chat"]
     
     def test_init(self):
         """Test initialization of AIService"""
-        self.assertEqual(self.ai_service.ollama_host, os.getenv("OLLAMA_HOST", "http://localhost:11434"))
-        self.assertEqual(self.ai_service.model, os.getenv("OLLAMA_MODEL", "llama2"))
+        self.assertEqual(self.ai_service.backend.name, "ollama")
+        self.assertEqual(self.ai_service.backend.ollama_host, self.server.url)
+        self.assertEqual(self.ai_service.model_repo, "llama2")
         
-        # Verify that requests.get was called to check available models
-        self.mock_get.assert_called_once_with(f"{self.ai_service.ollama_host}/api/tags")
+        # The model is loaded lazily: available models are checked, then the model is pinned
+        self.ai_service._load_model()
+        paths = [path for path, _ in self.server.requests]
+        self.assertEqual(paths, ["/api/tags", "/api/generate"])
+        self.assertEqual(self.server.requests[1][1]["keep_alive"], -1)
+        self.assertEqual(self.ai_service.model, "llama2")
     
     def test_process_query(self):
-        """Test process_query with mocked Ollama API"""
-        # Set up the mock response for the Ollama API
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "message": {
-                "role": "assistant",
-                "content": "This is a mocked response about cybersecurity."
-            }
-        }
-        self.mock_post.return_value = mock_response
-        
+        """Test process_query against the Ollama chat API"""
         query = "What is a common cybersecurity threat?"
         result = self.ai_service.process_query(query=query)
         
-        # Check that we got the expected mocked response
+        # Check that we got the streamed response back in full
         self.assertEqual(result["response"], "This is a mocked response about cybersecurity.")
         self.assertIsNone(result["plugin_used"])
+        self.assertEqual(result["metadata"]["backend"], "ollama")
+        self.assertEqual(result["metadata"]["tokens_generated"], 7)
         
-        # Verify that requests.post was called with the correct arguments
-        self.mock_post.assert_called_once()
-        call_args, call_kwargs = self.mock_post.call_args
-        self.assertEqual(call_args[0], f"{self.ai_service.ollama_host}/api/chat")
-        payload = call_kwargs["json"]
-        self.assertEqual(payload["model"], self.ai_service.model)
+        # Verify that /api/chat was called with the correct payload
+        payloads = self.chat_payloads()
+        self.assertEqual(len(payloads), 1)
+        payload = payloads[0]
+        self.assertEqual(payload["model"], self.ai_service.model_repo)
+        self.assertTrue(payload["stream"])
         self.assertEqual(len(payload["messages"]), 2)  # System message and user message
         self.assertEqual(payload["messages"][1]["content"], query)
     
@@ -96,16 +103,7 @@ class TestAIService(unittest.TestCase):
         mock_db = MagicMock()
         mock_db.query.return_value.filter.return_value.first.return_value = mock_plugin
         
-        # Set up the mock response for the Ollama API
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "message": {
-                "role": "assistant",
-                "content": "Response with plugin context."
-            }
-        }
-        self.mock_post.return_value = mock_response
+        self.server.reply = "Response with plugin context."
         
         query = "Scan my system for vulnerabilities"
         result = self.ai_service.process_query(query=query, plugin_id=1, db=mock_db)
@@ -114,14 +112,8 @@ class TestAIService(unittest.TestCase):
         self.assertEqual(result["response"], "Response with plugin context.")
         self.assertEqual(result["plugin_used"], "Vulnerability Scanner")
         
-        # Verify that requests.post was called with the correct arguments
-        self.mock_post.assert_called_once()
-        call_args, call_kwargs = self.mock_post.call_args
-        self.assertEqual(call_args[0], f"{self.ai_service.ollama_host}/api/chat")
-        
         # Check that the plugin context was included in the system prompt
-        payload = call_kwargs["json"]
-        system_content = payload["messages"][0]["content"]
+        system_content = self.chat_payloads()[0]["messages"][0]["content"]
         self.assertIn("Vulnerability Scanner", system_content)
         self.assertIn("Scans for vulnerabilities in systems", system_content)
     
@@ -140,16 +132,7 @@ class TestAIService(unittest.TestCase):
         
         plugins = [plugin1, plugin2]
         
-        # Set up the mock response for the Ollama API
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "message": {
-                "role": "assistant",
-                "content": '[{"id": 1, "relevance_score": 8}, {"id": 2, "relevance_score": 3}]'
-            }
-        }
-        self.mock_post.return_value = mock_response
+        self.server.reply = '[{"id": 1, "relevance_score": 8}, {"id": 2, "relevance_score": 3}]'
         
         query = "How do I scan for vulnerabilities?"
         recommendations = self.ai_service.get_plugin_recommendations(query=query, plugins=plugins)
@@ -160,17 +143,158 @@ class TestAIService(unittest.TestCase):
         self.assertEqual(recommendations[0]["name"], "Vulnerability Scanner")
         self.assertEqual(recommendations[0]["relevance_score"], 8)
         
-        # Verify that requests.post was called with the correct arguments
-        self.mock_post.assert_called_once()
-        call_args, call_kwargs = self.mock_post.call_args
-        self.assertEqual(call_args[0], f"{self.ai_service.ollama_host}/api/chat")
-        
         # Check that the request payload was properly formatted
-        payload = call_kwargs["json"]
-        self.assertEqual(payload["model"], self.ai_service.model)
+        payload = self.chat_payloads()[0]
+        self.assertEqual(payload["model"], self.ai_service.model_repo)
+        self.assertEqual(payload["options"]["temperature"], 0.3)
+        self.assertEqual(payload["format"]["type"], "array")  # Constrained to the recommendation schema
         self.assertEqual(len(payload["messages"]), 2)  # System message and user message
         self.assertIn("cybersecurity tool recommendation system", payload["messages"][0]["content"])
         self.assertIn("Vulnerability Scanner", payload["messages"][1]["content"])
+    
+    def test_stream_response_reuses_connections(self):
+        """Test that streamed chats share pooled keep-alive connections"""
+        connections = self.server.connections
+        messages = [{"role": "user", "content": "hi"}]
+        for _ in range(3):
+            chunks = list(self.ai_service.stream_response(messages))
+            self.assertGreater(len(chunks), 1)
+            self.assertEqual("".join(chunks), self.server.reply)
+        
+        # The model check, load and three chats all go over one connection
+        self.assertEqual(self.server.connections - connections, 1)
+        self.assertEqual(self.ai_service.get_generation_stats()["completed_requests"], 3)
+    
+    def test_generate_streams_completion(self):
+        """Test plain completions through /api/generate"""
+        backend = self.ai_service.backend
+        with self.ai_service._borrow() as handle:
+            request = backend.submit_prompt(handle, "Define phishing.", max_tokens=3, temperature=0.0)
+            self.assertEqual(request.result(timeout=5), "This is a")
+        path, payload = self.server.requests[-1]
+        self.assertEqual(path, "/api/generate")
+        self.assertEqual(payload["prompt"], "Define phishing.")
+        self.assertEqual(payload["options"]["num_predict"], 3)
+    
+    def test_history_is_trimmed_to_budget(self):
+        """Test that long conversation history is cut to the context budget before it is sent"""
+        self.ai_service.context_budget = 300
+        history = []
+        for turn in range(30):
+            history.append({"role": "user", "content": f"Question {turn} about lateral movement " + "detail " * 40})
+            history.append({"role": "assistant", "content": f"Answer {turn} " + "detail " * 40})
+        result = self.ai_service.process_query_with_history("And the next step?", history, conversation_id=3)
+        
+        context = result["metadata"]["context"]
+        self.assertGreater(context["messages_dropped"], 50)
+        self.assertGreater(context["tokens_saved"], 3000)
+        messages = self.chat_payloads()[-1]["messages"]
+        self.assertEqual(len(messages), context["messages_kept"] + 2)
+        self.assertIn("Earlier in this conversation", messages[0]["content"])
+        self.assertEqual(messages[-1], {"role": "user", "content": "And the next step?"})
+        self.assertEqual(self.ai_service.get_generation_stats()["context"]["trimmed_requests"], 1)
+    
+    def test_summarize_long_input(self):
+        """Test map-reduce summarization of an input longer than the context window"""
+        self.ai_service.context_tokens = 1500
+        self.ai_service.summary_chunk_tokens = 200
+        self.ai_service.max_batch_size = 4
+        report = "Summarize this incident.\n\n" + "\n\n".join(
+            f"Host web-{i} contacted 203.0.113.{i} at 12:{i:02d} and downloaded stage2.bin. " * 8 for i in range(20))
+        self.assertFalse(self.ai_service.exceeds_context("What is phishing?"))
+        self.assertTrue(self.ai_service.exceeds_context(report))
+        
+        events = list(self.ai_service.summarize_long_input(report, "You are an analyst."))
+        split = events[0]
+        self.assertEqual(split["stage"], "split")
+        maps = [event for event in events if event.get("stage") == "map"]
+        self.assertEqual([event["done"] for event in maps], list(range(1, split["chunks"] + 1)))
+        self.assertEqual("".join(event["text"] for event in events if "text" in event), self.server.reply)
+        
+        # One generation per chunk and per merge, then the merged summary answers the request
+        merges = [event for event in events if event.get("stage") == "reduce"]
+        payloads = self.chat_payloads()
+        self.assertEqual(len(payloads), split["chunks"] + len(merges) + 1)
+        chunk_payloads = [payload for payload in payloads if payload["messages"][1]["content"].startswith("Summarize part")]
+        self.assertEqual(len(chunk_payloads), split["chunks"])
+        self.assertTrue(any("203.0.113.0 " in payload["messages"][1]["content"] for payload in chunk_payloads))
+        self.assertEqual(chunk_payloads[0]["options"]["num_predict"], self.ai_service.summary_max_tokens)
+        self.assertEqual(payloads[-1]["messages"][0]["content"], "You are an analyst.")
+        self.assertIn("Summarize this incident.", payloads[-1]["messages"][1]["content"])
+    
+    def test_summaries_merge_hierarchically(self):
+        """Test that summaries too long for one prompt are merged level by level"""
+        self.ai_service.summary_chunk_tokens = 40
+        self.server.reply = "Short summary."
+        report = "\n".join(f"line {i} " + "x" * 120 for i in range(12))
+        events = list(self.ai_service.summarize_long_input(report))
+        self.assertEqual(events[0]["chunks"], 12)
+        merges = [event for event in events if event.get("stage") == "reduce"]
+        self.assertEqual([(event["level"], event["done"], event["total"]) for event in merges], [(1, 1, 2), (1, 2, 2)])
+        self.assertIn("Short summary.\n\nShort summary.", self.chat_payloads()[-1]["messages"][1]["content"])
+
+class TestModelStatus(unittest.TestCase):
+    """Test cases for warm-up and the model status behind /ready, on the mock backend"""
+    
+    def setUp(self):
+        """Set up a mock-backed service with an instant model load"""
+        self.env_patcher = patch.dict(os.environ, {
+            "AI_BACKEND": "mock",
+            "MLX_MODEL_REPO": "mock/status-test",
+            "MLX_QUANTIZATION": "",
+            "MLX_MODEL_CONFIG": "{}"
+        })
+        self.env_patcher.start()
+        self.ai_service = AIService()
+        self.ai_service.backend.load_delay = 0
+    
+    def tearDown(self):
+        """Clean up after tests"""
+        model_registry.unload(self.ai_service.model_repo, self.ai_service.quantization, self.ai_service.model_config)
+        self.env_patcher.stop()
+    
+    def ready(self):
+        """Run the /ready handler against this service and return its status code and body"""
+        from fastapi import HTTPException
+        import app.main
+        with patch.object(app.main, "ai_service", self.ai_service):
+            try:
+                return 200, asyncio.run(app.main.readiness_check())
+            except HTTPException as e:
+                return e.status_code, e.detail
+    
+    def test_warm_up_reports_ready(self):
+        """Test that a successful warm-up loads the model and reports ready"""
+        self.assertEqual(self.ai_service.get_model_status()["status"], ModelStatus.NOT_LOADED.value)
+        self.assertEqual(self.ready()[0], 503)
+        self.ai_service.warm_up()
+        self.assertEqual(self.ai_service.get_model_status()["status"], ModelStatus.READY.value)
+        self.assertEqual(self.ready(), (200, {"status": "ready", "model": self.ai_service.get_model_status()}))
+        
+        # Unloading the model from the registry takes the service out of rotation
+        model_registry.unload(self.ai_service.model_repo, self.ai_service.quantization, self.ai_service.model_config)
+        self.assertEqual(self.ai_service.get_model_status()["status"], ModelStatus.NOT_LOADED.value)
+        self.assertEqual(self.ready()[0], 503)
+    
+    def test_failed_warm_up_stays_an_error(self):
+        """Test that a warm-up generation failure is not masked by the loaded model"""
+        with patch.object(self.ai_service.backend, "submit", side_effect=RuntimeError("kernel compile failed")):
+            self.ai_service.warm_up()
+        self.assertIsNotNone(self.ai_service._peek())
+        status_code, detail = self.ready()
+        self.assertEqual(status_code, 503)
+        self.assertEqual(detail["status"], ModelStatus.ERROR.value)
+        self.assertIn("kernel compile failed", detail["message"])
+        
+        # Only a later successful warm-up clears the error
+        self.ai_service.warm_up()
+        self.assertEqual(self.ready()[0], 200)
+    
+    def test_on_demand_load_reports_ready(self):
+        """Test that a model loaded by a request without warm-up is reported ready"""
+        self.ai_service._load_model()
+        self.assertEqual(self.ai_service.get_model_status(),
+                         {"status": ModelStatus.READY.value, "message": "Model was loaded on demand"})
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import json
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.constrained_decoding import JSONLogitsProcessor, JSONSchemaMatcher, TokenTexts
+from app.services.ipinfo_step_service import ENDPOINT_STEP_SCHEMA
+from app.services.ai_service import recommendation_schema
+
+class FakeTokenizer:
+    """Word-piece tokenizer over a fixed vocabulary"""
+
+    def __init__(self, vocab):
+        self.vocab = {piece: i for i, piece in enumerate(vocab)}
+        self.pieces = list(vocab)
+
+    def encode(self, text, add_special_tokens=True):
+        return [self.vocab[text]]
+
+    def decode(self, tokens):
+        return "".join(self.pieces[t] for t in tokens)
+
+class TestJSONSchemaMatcher(unittest.TestCase):
+    """Test cases for the JSON schema matcher"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.matcher = JSONSchemaMatcher(ENDPOINT_STEP_SCHEMA)
+
+    def feed(self, text):
+        return self.matcher.advance(self.matcher.initial_state(), text)
+
+    def test_valid_document_completes_when_object_closes(self):
+        """Test that a matching object is accepted and complete exactly at its closing brace"""
+        text = '{"reasoning": "Location \\"query\\"", "choice": "Using geo \\u00e9", "endpoint": "geo"}'
+        self.assertFalse(self.matcher.is_complete(self.feed(text[:-1])))
+        self.assertTrue(self.matcher.is_complete(self.feed(text)))
+        self.assertIsNone(self.feed(text + " "))
+
+    def test_rejects_text_outside_the_schema(self):
+        """Test that prose, wrong keys and values outside an enum are rejected"""
+        self.assertIsNone(self.feed("Sure"))
+        self.assertIsNone(self.feed('{"choice"'))
+        self.assertIsNone(self.feed('{"reasoning": "a", "choice": "b", "endpoint": "whois'))
+        self.assertIsNone(self.feed('{"reasoning": "line\nbreak'))
+
+    def test_array_limits_and_numbers(self):
+        """Test item limits and number termination in arrays"""
+        matcher = JSONSchemaMatcher(recommendation_schema(2))
+        state = matcher.advance(matcher.initial_state(), '[{"id": 2, "relevance_score": 10}, {"id":1,"relevance_score":0}]')
+        self.assertTrue(matcher.is_complete(state))
+        self.assertIsNone(matcher.advance(matcher.initial_state(), '[{"id": 3'))
+        self.assertIsNone(matcher.advance(matcher.initial_state(), '[{"id": 1, "relevance_score": 11'))
+        self.assertIsNone(matcher.advance(matcher.initial_state(),
+                                          '[{"id":1,"relevance_score":1},{"id":2,"relevance_score":1},'))
+
+class TestJSONLogitsProcessor(unittest.TestCase):
+    """Test cases for the constrained decoding logits processor"""
+
+    def test_greedy_decoding_follows_schema_and_stops(self):
+        """Test that masking forces a model that prefers prose into the schema and then EOS"""
+        pieces = ["a", "<eos>", "Sure", " here", '{"', "reasoning", '":', ' "', "IP", " lookup",
+                  '",', "choice", "endpoint", "geo", "asn", '"}', "}", '"', " ", "\n"]
+        tokenizer = FakeTokenizer(pieces)
+        processor = JSONLogitsProcessor(JSONSchemaMatcher(ENDPOINT_STEP_SCHEMA), TokenTexts(tokenizer), [1])
+        # The "model" ranks tokens the same way every step: EOS, closing quotes and prose first
+        ranked = [1, 10, 15, 2, 3, 19, 18] + [t for t in range(4, 18) if t not in (10, 15)]
+
+        output = []
+        for _ in range(40):
+            token = processor.allowed_tokens(ranked)[0]
+            if token == 1:
+                break
+            output.append(pieces[token])
+            processor._advance(token)
+
+        text = "".join(output)
+        self.assertEqual(json.loads(text)["endpoint"], "geo")
+        self.assertTrue(processor.matcher.is_complete(processor.state))
+
+if __name__ == "__main__":
+    unittest.main()
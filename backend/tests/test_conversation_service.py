@@ -0,0 +1,111 @@
+import unittest
+import os
+import sys
+import threading
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.conversation_service import ConversationService, MESSAGE_OVERHEAD_TOKENS
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+def history(turns: int, words: int = 20) -> list:
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"question {turn} " + "word " * words})
+        messages.append({"role": "assistant", "content": f"answer {turn} " + "word " * words})
+    return messages
+
+class TestConversationService(unittest.TestCase):
+    """Test cases for the token-budgeted context builder"""
+
+    def test_short_history_is_kept(self):
+        """Test that a history within the budget is passed through with the query appended"""
+        service = ConversationService(policy="drop")
+        messages, stats = service.build_context("system", history(2), "new question", count_words, budget=1000)
+        self.assertEqual([message["role"] for message in messages], ["system", "user", "assistant", "user", "assistant", "user"])
+        self.assertEqual(messages[-1]["content"], "new question")
+        self.assertEqual((stats["messages_dropped"], stats["tokens_saved"], stats["policy"]), (0, 0, None))
+
+    def test_drop_keeps_recent_turns_within_budget(self):
+        """Test that older turns are dropped down to the low watermark, starting at a user message"""
+        service = ConversationService(policy="drop", low_watermark=0.5)
+        turns = history(20) + [{"role": "user", "content": "new question"}]
+        messages, stats = service.build_context("system", turns, "new question", count_words, budget=400)
+        self.assertLessEqual(stats["tokens"], 400)
+        self.assertEqual(messages[1]["role"], "user")
+        self.assertEqual(messages[-1], {"role": "user", "content": "new question"})
+        self.assertEqual(sum(message["content"] == "new question" for message in messages), 1)
+        self.assertEqual(messages[-2]["content"].split()[:2], ["answer", "19"])
+        self.assertEqual(stats["messages_dropped"] + stats["messages_kept"], 40)
+        self.assertEqual(stats["tokens_saved"], stats["messages_dropped"] * (22 + MESSAGE_OVERHEAD_TOKENS))
+        self.assertEqual(service.get_stats()["tokens_saved"], stats["tokens_saved"])
+
+    def test_window_start_is_stable_between_turns(self):
+        """Test that the kept window only moves when the history overflows again"""
+        service = ConversationService(policy="drop", low_watermark=0.5)
+        starts = []
+        for turns in range(12, 30):
+            messages, stats = service.build_context("system", history(turns), "next", count_words,
+                                                    budget=400, conversation_id=7)
+            starts.append(messages[1]["content"])
+            self.assertLessEqual(stats["tokens"], 400)
+        # Each cut is followed by turns that extend the same prefix
+        self.assertLess(len(set(starts)), len(starts) // 2)
+
+    def test_window_resets_when_history_fits(self):
+        """Test that a remembered window start is ignored once the whole history fits, and can be forgotten"""
+        service = ConversationService(policy="drop", low_watermark=0.5)
+        _, stats = service.build_context("system", history(40), "next", count_words, budget=400, conversation_id=3)
+        self.assertGreater(stats["messages_dropped"], 60)
+        # A new conversation reusing the ID with a history that fits keeps every message
+        _, stats = service.build_context("system", history(10, words=1), "next", count_words,
+                                         budget=1000, conversation_id=3)
+        self.assertEqual(stats["messages_dropped"], 0)
+
+        # After forget() a cut starts from the oldest message rather than the old window
+        _, stale = service.build_context("system", history(20), "next", count_words, budget=400, conversation_id=3)
+        service.forget(3)
+        _, stats = service.build_context("system", history(20), "next", count_words, budget=600, conversation_id=3)
+        self.assertLess(stats["messages_dropped"], stale["messages_dropped"])
+
+    def test_concurrent_builds_keep_counts(self):
+        """Test that concurrent callers don't corrupt the caches or lose stats"""
+        service = ConversationService(policy="drop")
+        errors = []
+        def build(worker):
+            try:
+                for turn in range(50):
+                    turns = [{"role": "user", "content": f"worker {worker} turn {turn} {i}"} for i in range(20)]
+                    service.build_context("system", turns, "next", count_words, budget=100,
+                                          conversation_id=worker * 1000 + turn)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=build, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(service.get_stats()["requests"], 400)
+
+    def test_compress_digests_dropped_turns(self):
+        """Test that dropped turns are summarized by their first lines in the system prompt"""
+        service = ConversationService(policy="compress")
+        turns = [{"role": "user", "content": "Is 203.0.113.9 part of a botnet?\n" + "detail " * 200},
+                 {"role": "assistant", "content": "It is listed as a Mirai C2 server. " + "detail " * 200}] + history(3)
+        messages, stats = service.build_context("You are an analyst.", turns, "What ports does it use?",
+                                                count_words, budget=400)
+        self.assertEqual(stats["policy"], "compress")
+        self.assertEqual(stats["messages_dropped"], 2)
+        system = messages[0]["content"]
+        self.assertTrue(system.startswith("You are an analyst.\n\nEarlier in this conversation (2 messages not shown):"))
+        self.assertIn("- user: Is 203.0.113.9 part of a botnet? detail", system)
+        self.assertIn("- assistant: It is listed as a Mirai C2 server.", system)
+        self.assertLessEqual(stats["tokens"], 400)
+        self.assertGreater(stats["tokens_saved"], 300)
+
+if __name__ == "__main__":
+    unittest.main()
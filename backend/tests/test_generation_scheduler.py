@@ -0,0 +1,92 @@
+import unittest
+import os
+import sys
+import time
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.inference_backends import GenerationScheduler, _MockBatchEngine
+
+class FastMockEngine(_MockBatchEngine):
+    """Mock engine with a short decode step to keep tests quick"""
+    step_delay = 0.01
+
+class FailingAdmitEngine(FastMockEngine):
+    """Mock engine that can't prepare prompts containing 'poison'"""
+
+    def admit(self, requests):
+        if any("poison" in request.prompt for request in requests):
+            raise ValueError("could not tokenize prompt")
+        super().admit(requests)
+
+class TestGenerationScheduler(unittest.TestCase):
+    """Test cases for the continuous-batching Generation Scheduler"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.scheduler = GenerationScheduler(FastMockEngine(), max_batch_size=4)
+
+    def test_result_returns_full_text(self):
+        """Test that a request returns the whole completion"""
+        request = self.scheduler.submit("system: be helpful\nuser: hi", max_tokens=100, temperature=0.7)
+        text = request.result(timeout=5)
+        self.assertTrue(text.startswith("Hello!"))
+        self.assertIsNotNone(request.time_to_first_token)
+        self.assertEqual(request.num_tokens, len(text.split()))
+
+    def test_streaming_matches_result(self):
+        """Test that iterating a request yields the same text as result()"""
+        request = self.scheduler.submit("user: hello", max_tokens=100, temperature=0.7)
+        streamed = "".join(request)
+        self.assertEqual(streamed, request.result(timeout=5))
+
+    def test_max_tokens_limits_generation(self):
+        """Test that requests retire after max_tokens decode steps"""
+        request = self.scheduler.submit("user: what is ransomware", max_tokens=3, temperature=0.7)
+        request.result(timeout=5)
+        self.assertEqual(request.num_tokens, 3)
+
+    def test_concurrent_requests_share_decode_steps(self):
+        """Test that concurrent requests are decoded in one batch rather than in sequence"""
+        requests = [
+            self.scheduler.submit("user: hi", max_tokens=10, temperature=0.7)
+            for _ in range(4)
+        ]
+        start = time.time()
+        for request in requests:
+            request.result(timeout=5)
+        elapsed = time.time() - start
+
+        # Four 10-token requests batched together take ~10 steps, not ~40
+        self.assertLess(elapsed, 0.3)
+        stats = self.scheduler.get_stats()
+        self.assertEqual(stats["completed_requests"], 4)
+        self.assertEqual(stats["generated_tokens"], 40)
+        self.assertGreater(stats["tokens_per_second"], 0)
+
+    def test_cancelled_request_is_retired(self):
+        """Test that a cancelled stream stops producing tokens"""
+        request = self.scheduler.submit("user: what is ransomware", max_tokens=100, temperature=0.7)
+        chunks = iter(request)
+        next(chunks)
+        request.cancel()
+        remaining = list(chunks)
+        self.assertLess(len(remaining), 10)
+
+    def test_admit_failure_fails_the_request(self):
+        """Test that a request the engine can't admit fails instead of hanging, and others keep decoding"""
+        scheduler = GenerationScheduler(FailingAdmitEngine(), max_batch_size=4)
+        running = scheduler.submit("user: what is ransomware", max_tokens=100, temperature=0.7)
+        next(iter(running))
+        request = scheduler.submit("user: poison", max_tokens=10, temperature=0.7)
+        retired = []
+        request.add_done_callback(lambda: retired.append(True))
+        with self.assertRaisesRegex(RuntimeError, "could not tokenize prompt"):
+            request.result(timeout=3)
+        self.assertEqual(retired, [True])
+        self.assertTrue(running.result(timeout=5))
+        self.assertEqual(scheduler.get_stats()["active_requests"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
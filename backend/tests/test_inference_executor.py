@@ -0,0 +1,117 @@
+import unittest
+import os
+import sys
+import time
+import asyncio
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.inference_executor import InferenceExecutor
+from app.services.inference_backends import GenerationScheduler, _MockBatchEngine
+
+def slow_tokens(count, delay):
+    """Blocking token generator standing in for model generation"""
+    for i in range(count):
+        time.sleep(delay)
+        yield f"token{i}"
+
+def failing_tokens():
+    """Blocking generator that fails part way through"""
+    yield "first"
+    raise RuntimeError("generation failed")
+
+class TestInferenceExecutor(unittest.TestCase):
+    """Test cases for the Inference Executor"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.executor = InferenceExecutor(max_workers=4)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.executor.shutdown(wait=True)
+
+    def test_run(self):
+        """Test that blocking calls return their result"""
+        result = asyncio.run(self.executor.run(lambda a, b=0: a + b, 2, b=3))
+        self.assertEqual(result, 5)
+
+    def test_stream_yields_all_items(self):
+        """Test that streamed items arrive in order"""
+        async def collect():
+            return [item async for item in self.executor.stream(slow_tokens, 5, 0)]
+
+        self.assertEqual(asyncio.run(collect()), [f"token{i}" for i in range(5)])
+
+    def test_stream_propagates_errors(self):
+        """Test that worker exceptions surface in the consumer"""
+        async def collect():
+            items = []
+            async for item in self.executor.stream(failing_tokens):
+                items.append(item)
+            return items
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(collect())
+
+    def test_streams_do_not_block_event_loop(self):
+        """Test that concurrent streams interleave and the loop stays responsive"""
+        async def consume():
+            return [item async for item in self.executor.stream(slow_tokens, 5, 0.05)]
+
+        async def heartbeat():
+            # Stands in for /health: should tick freely while generation runs
+            ticks = 0
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            return ticks
+
+        async def main():
+            start = time.time()
+            results = await asyncio.gather(consume(), consume(), consume(), heartbeat())
+            return results, time.time() - start
+
+        results, elapsed = asyncio.run(main())
+        self.assertEqual(results[3], 10)
+        for tokens in results[:3]:
+            self.assertEqual(len(tokens), 5)
+        # Three 0.25s streams running concurrently, not back to back
+        self.assertLess(elapsed, 0.6)
+
+    def test_request_streams_hold_no_worker(self):
+        """Test that a full batch of streams starts together even with a single worker"""
+        executor = InferenceExecutor(max_workers=1)
+        scheduler = GenerationScheduler(_MockBatchEngine(), max_batch_size=8)
+        retired = []
+
+        def submit():
+            request = scheduler.submit("user: hi", max_tokens=20, temperature=0.0)
+            request.add_done_callback(lambda: retired.append(request))
+            return request
+
+        async def first_token_time(start):
+            async for _ in executor.stream_request(submit):
+                return time.time() - start
+
+        async def main():
+            start = time.time()
+            return await asyncio.gather(*[first_token_time(start) for _ in range(8)])
+
+        try:
+            first_tokens = asyncio.run(main())
+            # All eight join the first decode steps instead of waiting for a worker
+            self.assertLess(max(first_tokens), 0.3)
+            # Consumers that stopped early cancelled their requests
+            deadline = time.time() + 2
+            while len(retired) < 8 and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(retired), 8)
+            self.assertTrue(all(request.cancelled for request in retired))
+        finally:
+            scheduler.close()
+            executor.shutdown(wait=True)
+
+if __name__ == "__main__":
+    unittest.main()
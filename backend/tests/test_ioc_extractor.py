@@ -0,0 +1,78 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ioc_extractor import IOCExtractor, extract_iocs, first_ip, group_iocs, refang
+
+SAMPLE = """May  1 12:30:45 bastion sshd[2211]: Failed password for root from 185.220.101.7 port 22 ssh2
+Beacon to hxxps://evil[.]example/gate?id=1). Mail from bad.guy[@]phish[.]co.uk
+Dropped 44d88612fea8a8f36de82e1278abb02f, callback 1.1.1[.]1 and (2001:db8::1), block 10.0.0.0/8
+Loaded app.py and config.json from version 1.2.3.4.5; retry src=185.220.101.7, done
+"""
+
+class TestIOCExtractor(unittest.TestCase):
+    """Test cases for the IOC extractor"""
+
+    def setUp(self):
+        """Extract from the sample text"""
+        self.iocs = extract_iocs(SAMPLE)
+        self.by_value = {(ioc["type"], ioc["value"]): ioc for ioc in self.iocs}
+
+    def test_types_and_defanged_forms(self):
+        """Test that every type is found and defanged forms are refanged"""
+        self.assertEqual(group_iocs(self.iocs), {
+            "ipv4": ["185.220.101.7", "1.1.1.1"],
+            "url": ["https://evil.example/gate?id=1"],
+            "domain": ["evil.example"],
+            "email": ["bad.guy@phish.co.uk"],
+            "md5": ["44d88612fea8a8f36de82e1278abb02f"],
+            "ipv6": ["2001:db8::1"],
+            "cidr": ["10.0.0.0/8"]
+        })
+        self.assertTrue(self.by_value[("email", "bad.guy@phish.co.uk")]["defanged"])
+        self.assertTrue(self.by_value[("ipv4", "1.1.1.1")]["defanged"])
+        self.assertFalse(self.by_value[("ipv4", "185.220.101.7")]["defanged"])
+        self.assertEqual(refang("hxxp://a[.]b(.)c[at]d"), "http://a.b.c@d")
+
+    def test_offsets_point_into_original_text(self):
+        """Test that offsets cover the indicator as written, defanged or not"""
+        spans = {(ioc["type"], ioc["value"]): [SAMPLE[start:end] for start, end in ioc["offsets"]] for ioc in self.iocs}
+        self.assertEqual(spans[("ipv4", "1.1.1.1")], ["1.1.1[.]1"])
+        self.assertEqual(spans[("url", "https://evil.example/gate?id=1")], ["hxxps://evil[.]example/gate?id=1"])
+        self.assertEqual(spans[("ipv6", "2001:db8::1")], ["2001:db8::1"])
+        self.assertEqual(spans[("email", "bad.guy@phish.co.uk")], ["bad.guy[@]phish[.]co.uk"])
+
+    def test_dedupe_counts_and_order(self):
+        """Test that repeats merge into one entry with every offset, in order of first appearance"""
+        repeated = self.by_value[("ipv4", "185.220.101.7")]
+        self.assertEqual(repeated["count"], 2)
+        self.assertEqual([SAMPLE[start:end] for start, end in repeated["offsets"]], ["185.220.101.7"] * 2)
+        self.assertEqual(first_ip(self.iocs), "185.220.101.7")
+
+        capped = extract_iocs("8.8.8.8\n" * 10, max_offsets=3)
+        self.assertEqual((capped[0]["count"], len(capped[0]["offsets"])), (10, 3))
+
+    def test_false_positives(self):
+        """Test that file names, versions and timestamps are not reported"""
+        values = {ioc["value"] for ioc in self.iocs}
+        for value in ("app.py", "config.json", "1.2.3.4", "2.3.4.5", "12:30:45"):
+            self.assertNotIn(value, values)
+
+    def test_chunk_boundaries(self):
+        """Test that feeding the text in small pieces gives the same results as one call"""
+        for size in (1, 7, 64):
+            extractor = IOCExtractor()
+            for start in range(0, len(SAMPLE), size):
+                extractor.feed(SAMPLE[start:start + size])
+            self.assertEqual(extractor.finish(), self.iocs)
+
+    def test_type_filter(self):
+        """Test restricting extraction to some types"""
+        iocs = extract_iocs(SAMPLE, types=("ipv4", "ipv6"))
+        self.assertEqual([ioc["value"] for ioc in iocs], ["185.220.101.7", "1.1.1.1", "2001:db8::1"])
+
+if __name__ == "__main__":
+    unittest.main()
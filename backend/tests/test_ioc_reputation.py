@@ -0,0 +1,79 @@
+import unittest
+import io
+import os
+import sys
+import hashlib
+import tempfile
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ioc_reputation import (
+    IOCDatabase, IOCReputationService, bloom_parameters, build_database, ioc_key, normalize_ioc, read_feed
+)
+
+MALWARE_HASHES = "\n".join([
+    "# sample malware feed",
+    "44D88612FEA8A8F36DE82E1278ABB02F",
+    "3395856ce81f2b7382dee72602f798b642f14140",
+    "275a021bbfb6489e54d471899f7db9d1663fc695ec2fe2a2c4538aabf651fd0f",
+    "not-a-hash!"
+])
+PHISHING_DOMAINS = "evil.example\nlogin-micros0ft[.]com\n"
+
+class TestIOCReputation(unittest.TestCase):
+    """Test cases for the offline IOC reputation database"""
+
+    def setUp(self):
+        """Build a database with a hash feed and a domain feed"""
+        data = build_database({
+            "malware": read_feed(io.StringIO(MALWARE_HASHES)),
+            "phishing": read_feed(io.StringIO(PHISHING_DOMAINS + "44d88612fea8a8f36de82e1278abb02f\n"))
+        })
+        self.service = IOCReputationService(IOCDatabase(data))
+
+    def test_normalize_ioc(self):
+        """Test hash and domain classification with refanging"""
+        self.assertEqual(normalize_ioc(" 44D88612FEA8A8F36DE82E1278ABB02F "), ("md5", "44d88612fea8a8f36de82e1278abb02f"))
+        self.assertEqual(normalize_ioc("Evil[.]Example."), ("domain", "evil.example"))
+        with self.assertRaises(ValueError):
+            normalize_ioc("just words")
+
+    def test_check(self):
+        """Test listed hashes and domains, parent-domain matches and unlisted IOCs"""
+        md5 = self.service.check("44d88612fea8a8f36de82e1278abb02f")
+        self.assertEqual((md5["type"], md5["verdict"], md5["feeds"]), ("md5", "malicious", ["malware", "phishing"]))
+
+        sha256 = self.service.check("275A021BBFB6489E54D471899F7DB9D1663FC695EC2FE2A2C4538AABF651FD0F")
+        self.assertEqual(sha256["feeds"], ["malware"])
+
+        subdomain = self.service.check("cdn.evil[.]example")
+        self.assertEqual((subdomain["verdict"], subdomain["matched"]), ("malicious", "evil.example"))
+        self.assertEqual(self.service.check("login-micros0ft.com")["feeds"], ["phishing"])
+
+        self.assertEqual(self.service.check("example.org")["verdict"], "unknown")
+        self.assertEqual(self.service.check_many(["???"]), [{"ioc": "???", "error": "Not an MD5/SHA1/SHA256 hash or domain"}])
+
+    def test_bloom_filter_rejects_most_unlisted_iocs(self):
+        """Test that the Bloom filter meets its false positive rate and never misses a listed IOC"""
+        keys = [ioc_key("sha256", hashlib.sha256(str(i).encode()).hexdigest()) for i in range(20000)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "iocs.iocdb")
+            with open(path, "wb") as handle:
+                handle.write(build_database({"feed": keys}, false_positive_rate=0.01))
+            database = IOCDatabase.open(path)
+            try:
+                self.assertTrue(all(database.might_contain(key) for key in keys))
+                unlisted = [ioc_key("sha256", hashlib.sha256(f"x{i}".encode()).hexdigest()) for i in range(20000)]
+                passed = sum(database.might_contain(key) for key in unlisted)
+                self.assertLess(passed / len(unlisted), 0.02)
+                self.assertEqual(sum(bool(database.feeds_for(key)) for key in unlisted), 0)
+
+                stats = database.get_stats()
+                self.assertEqual(stats["records"], 20000)
+                self.assertEqual(stats["bloom_bytes"], bloom_parameters(20000, 0.01)[0] // 8)
+            finally:
+                database.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import io
+import os
+import sys
+import time
+import random
+import tempfile
+import ipaddress
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ip_database import IPRangeDatabase, build_database, read_csv_ranges
+from app.services.ipinfo_service import IPInfoService
+
+RANGES_CSV = """start_ip,end_ip,country,asn,org
+8.8.8.0,8.8.8.255,US,15169,Google LLC
+1.1.1.0,1.1.1.255,AU,AS13335,"Cloudflare, Inc."
+1.0.0.0,1.0.0.255,AU,13335,"Cloudflare, Inc."
+1.0.1.0,1.0.1.255,AU,13335,"Cloudflare, Inc."
+81.2.69.0,81.2.69.127,GB,0,
+2001:4860::,2001:4860:ffff:ffff:ffff:ffff:ffff:ffff,US,15169,Google LLC
+not-an-ip,1.2.3.4,US,1,Broken
+"""
+
+class TestIPRangeDatabase(unittest.TestCase):
+    """Test cases for the offline IP range database"""
+
+    def setUp(self):
+        """Build the database from the sample ranges"""
+        self.database = IPRangeDatabase.from_csv(io.StringIO(RANGES_CSV))
+
+    def test_lookup(self):
+        """Test IPv4, IPv6 and IPv4-mapped lookups, including range edges and gaps"""
+        google = self.database.lookup("8.8.8.8")
+        self.assertEqual((google["country"], google["asn"], google["org"]), ("US", "AS15169", "Google LLC"))
+        self.assertEqual(self.database.lookup("8.8.8.255")["start"], "8.8.8.0")
+        self.assertIsNone(self.database.lookup("8.8.9.0"))
+        self.assertIsNone(self.database.lookup("0.0.0.1"))
+        self.assertEqual(self.database.lookup("2001:4860:4860::8888")["asn"], "AS15169")
+        self.assertEqual(self.database.lookup("::ffff:1.1.1.1")["org"], "Cloudflare, Inc.")
+        self.assertEqual(self.database.lookup("81.2.69.5")["asn"], "")
+
+    def test_ranges_and_records_are_compacted(self):
+        """Test that touching ranges with one record merge and records are shared"""
+        cloudflare = self.database.lookup("1.0.1.5")
+        self.assertEqual((cloudflare["start"], cloudflare["end"]), ("1.0.0.0", "1.0.1.255"))
+
+        stats = self.database.get_stats()
+        self.assertEqual((stats["ipv4_ranges"], stats["ipv6_ranges"], stats["records"]), (4, 1, 3))
+
+    def test_endpoint_shapes(self):
+        """Test that results match the basic, geo and asn endpoint shapes"""
+        self.assertEqual(self.database.endpoint_data("8.8.8.8", "basic"),
+                         {"ip": "8.8.8.8", "country": "US", "org": "AS15169 Google LLC"})
+        self.assertEqual(self.database.endpoint_data("8.8.8.8", "geo"), {"ip": "8.8.8.8", "country": "US"})
+        self.assertEqual(self.database.endpoint_data("8.8.8.8", "asn"),
+                         {"ip": "8.8.8.8", "asn": "AS15169", "name": "Google LLC", "org": "AS15169 Google LLC"})
+        self.assertEqual(self.database.endpoint_data("10.1.2.3", "basic"), {"ip": "10.1.2.3", "bogon": True})
+        self.assertIsNone(self.database.endpoint_data("9.9.9.9", "basic"))
+
+    def test_memory_mapped_file(self):
+        """Test that a built file is memory-mapped and answers the same lookups quickly"""
+        rng = random.Random(7)
+        starts = sorted(rng.sample(range(1 << 24, 1 << 32, 256), 20000))
+        ranges = [(ipaddress.IPv4Address(start), ipaddress.IPv4Address(start + 127), "US", f"AS{i % 500 + 1}", f"Org {i % 500}")
+                  for i, start in enumerate(starts)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ranges.ipdb")
+            with open(path, "wb") as handle:
+                handle.write(build_database(ranges))
+            database = IPRangeDatabase.open(path)
+            try:
+                probes = [str(ipaddress.IPv4Address(start + 5)) for start in starts[:2000]]
+                begin = time.perf_counter()
+                matches = [database.lookup(ip) for ip in probes]
+                per_lookup = (time.perf_counter() - begin) / len(probes)
+
+                self.assertTrue(all(match is not None for match in matches))
+                self.assertEqual(matches[10]["asn"], "AS11")
+                # Generous bound so slow CI machines pass; typically a few microseconds
+                self.assertLess(per_lookup, 0.001)
+            finally:
+                database.close()
+
+    def test_service_uses_offline_database(self):
+        """Test that IPInfoService answers from the database without the API"""
+        service = IPInfoService(base_url="http://127.0.0.1:9", database=self.database)
+
+        result = service.get_ip_info("1.1.1.1", "asn")
+        self.assertTrue(result["success"])
+        self.assertEqual(result["data"]["asn"], "AS13335")
+
+        missing = service.get_ip_info("9.9.9.9")
+        self.assertFalse(missing["success"])
+        self.assertEqual(missing["message"], "9.9.9.9 is not in the offline IP database")
+        self.assertEqual(service.client.stats["requests"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,313 @@
+import unittest
+import os
+import sys
+import time
+import asyncio
+import threading
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.http_client import AsyncHTTPClient
+from app.services.ipinfo_service import IPInfoService, normalize_ips
+from app.services.ipinfo_cache import IPInfoCache
+from scripts.ipinfo_stub_server import IPInfoStubServer, ip_record
+
+class TestIPInfoService(unittest.TestCase):
+    """Test cases for IPInfoService against a local IPinfo-compatible server"""
+
+    def setUp(self):
+        """Start a fresh stub server for each test"""
+        self.server = IPInfoStubServer().start()
+
+    def tearDown(self):
+        """Stop the stub server"""
+        self.server.stop()
+
+    def make_service(self, cache=None, **client_args):
+        client_args.setdefault("backoff", 0.01)
+        return IPInfoService(base_url=self.server.url, client=AsyncHTTPClient(**client_args),
+                             cache=cache or IPInfoCache(max_entries=0))
+
+    def test_lookup_reuses_pooled_connections(self):
+        """Test that sequential lookups share one keep-alive connection"""
+        service = self.make_service()
+
+        async def lookups():
+            return [await service.fetch_ip_info("8.8.8.8", endpoint) for endpoint in ("basic", "geo", "asn", "basic")]
+        results = asyncio.run(lookups())
+
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertEqual(results[0]["data"], ip_record("8.8.8.8"))
+        self.assertEqual(results[2]["data"]["asn"], ip_record("8.8.8.8")["org"].split(" ")[0])
+        self.assertEqual(self.server.requests, ["/8.8.8.8/json", "/8.8.8.8/geo", "/8.8.8.8/asn", "/8.8.8.8/json"])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_transient_failures_are_retried(self):
+        """Test that 5xx responses are retried until one succeeds"""
+        self.server.fail_first = 2
+        service = self.make_service(retries=2)
+        result = service.get_ip_info("1.1.1.1")
+
+        self.assertTrue(result["success"])
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(service.client.stats["retries"], 2)
+
+    def test_loop_bound_client_is_closed(self):
+        """Test that blocking lookups close their pool and a rebind closes the old loop's client"""
+        service = self.make_service()
+        for _ in range(3):
+            self.assertTrue(service.get_ip_info("1.1.1.1")["success"])
+            self.assertIsNone(service.client._client)
+
+        class PooledClient:
+            closed = False
+            async def aclose(self):
+                self.closed = True
+        old_loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=old_loop.run_forever)
+        thread.start()
+        try:
+            pooled = service.client._client = PooledClient()
+            service.client._loop = old_loop
+            asyncio.run(service.fetch_ip_info("1.1.1.2"))
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0), old_loop).result(timeout=2)
+            self.assertTrue(pooled.closed)
+        finally:
+            old_loop.call_soon_threadsafe(old_loop.stop)
+            thread.join()
+            old_loop.close()
+
+    def test_retries_run_out(self):
+        """Test that the failure is reported once every attempt has failed"""
+        self.server.fail_first = 5
+        result = self.make_service(retries=1).get_ip_info("1.1.1.1")
+
+        self.assertFalse(result["success"])
+        self.assertEqual(result["message"], "Error from IPinfo API: 503")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_per_host_connection_limit(self):
+        """Test that concurrent lookups beyond the per-host limit wait for a free connection"""
+        self.server.delay = 0.1
+        service = self.make_service(max_connections_per_host=2)
+
+        async def lookups():
+            return await asyncio.gather(*(service.fetch_ip_info(f"10.0.0.{i}") for i in range(6)))
+        start = time.perf_counter()
+        results = asyncio.run(lookups())
+
+        self.assertTrue(all(result["success"] for result in results))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+        self.assertLessEqual(self.server.connections, 2)
+
+    def test_per_host_rate_limit(self):
+        """Test that requests to one host are spaced to the rate limit after the burst"""
+        service = self.make_service(rate_limit_per_host=20, rate_burst=2)
+
+        async def lookups():
+            return await asyncio.gather(*(service.fetch_ip_info(f"10.0.1.{i}") for i in range(6)))
+        start = time.perf_counter()
+        results = asyncio.run(lookups())
+
+        self.assertTrue(all(result["success"] for result in results))
+        # Two go out at once, the other four 50ms apart
+        self.assertGreaterEqual(time.perf_counter() - start, 0.18)
+
+class TestBulkLookup(unittest.TestCase):
+    """Test cases for bulk IP lookups"""
+
+    def setUp(self):
+        self.server = IPInfoStubServer(delay=0.05).start()
+        self.service = IPInfoService(base_url=self.server.url, client=AsyncHTTPClient(backoff=0.01),
+                                     cache=IPInfoCache(max_entries=0))
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_normalize_ips(self):
+        """Test that addresses are validated, canonicalized and deduped"""
+        ips, invalid, duplicates = normalize_ips(
+            ["8.8.8.8", " 8.8.8.8", "2001:DB8::1", "2001:db8:0::1", "999.1.1.1", "not-an-ip", 1, None])
+
+        self.assertEqual(ips, ["8.8.8.8", "2001:db8::1"])
+        self.assertEqual(duplicates, 2)
+        self.assertEqual([item["ip"] for item in invalid], ["999.1.1.1", "not-an-ip", "1", "None"])
+
+    def test_results_stream_in_completion_order(self):
+        """Test that every address is looked up once with bounded concurrency"""
+        ips = [f"10.1.0.{i}" for i in range(12)]
+
+        async def collect():
+            return [result async for result in self.service.bulk_lookup(ips, "geo", concurrency=4)]
+        start = time.perf_counter()
+        results = asyncio.run(collect())
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(sorted(result["ip"] for result in results), sorted(ips))
+        self.assertTrue(all(result["success"] and result["endpoint"] == "geo" for result in results))
+        self.assertEqual(sorted(self.server.requests), sorted(f"/{ip}/geo" for ip in ips))
+        # 12 lookups, 4 at a time, 50ms each
+        self.assertGreaterEqual(elapsed, 0.15)
+        self.assertLess(elapsed, 0.6)
+
+    def test_partial_failures_are_reported_per_item(self):
+        """Test that a failed lookup doesn't stop the others"""
+        self.server.fail_first = 1
+        self.service.client.retries = 0
+
+        async def collect():
+            return [result async for result in self.service.bulk_lookup(["1.1.1.1", "1.0.0.1", "9.9.9.9"], concurrency=1)]
+        results = asyncio.run(collect())
+
+        self.assertEqual([result["success"] for result in results], [False, True, True])
+        self.assertEqual(results[0]["ip"], "1.1.1.1")
+        self.assertEqual(results[0]["message"], "Error from IPinfo API: 503")
+
+    def test_uploads_stop_at_the_limit(self):
+        """Test that oversized uploads are rejected with 413 without reading the rest"""
+        from fastapi import HTTPException
+        from app.api.ipinfo_router import _read_ndjson, _read_text
+
+        class Upload:
+            """Streams chunks like a Request body and counts how many were read"""
+            def __init__(self, chunks):
+                self.chunks, self.read = chunks, 0
+            async def stream(self):
+                for chunk in self.chunks:
+                    self.read += 1
+                    yield chunk
+
+        lines = Upload([f"10.0.{i}.{j}\n".encode() for i in range(100) for j in range(10)])
+        with self.assertRaises(HTTPException) as raised:
+            asyncio.run(_read_ndjson(lines, max_ips=50))
+        self.assertEqual(raised.exception.status_code, 413)
+        self.assertEqual(lines.read, 51)
+
+        # Lines split across chunks are joined; a body without newlines is cut off
+        split = Upload([b"10.0.0.1\n10.0.", b"0.2", b"\n{\"ip\": \"10.0.0.3\"}"])
+        self.assertEqual(asyncio.run(_read_ndjson(split, max_ips=50)), ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+        endless = Upload([b"1" * 1024] * 1000)
+        with self.assertRaises(HTTPException) as raised:
+            asyncio.run(_read_ndjson(endless, max_ips=50))
+        self.assertEqual(raised.exception.status_code, 413)
+        self.assertLess(endless.read, 10)
+        endless = Upload([b"x" * 65536] * 1000)
+        with self.assertRaises(HTTPException):
+            asyncio.run(_read_text(endless, max_ips=50))
+        self.assertLess(endless.read, 100)
+
+        # A log repeating the same addresses stays within the limit however long it is
+        log = Upload([b"Failed password from 192.0.2.1 and 192.0.2.2\n"] * 200)
+        self.assertEqual(len(asyncio.run(_read_text(log, max_ips=2))), 400)
+        scan = Upload([f"scan from 198.51.{i}.7\n".encode() for i in range(100)])
+        with self.assertRaises(HTTPException):
+            asyncio.run(_read_text(scan, max_ips=10))
+        self.assertLess(scan.read, 100)
+
+class FakeClock:
+    """Monotonic clock the tests move forward by hand"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestIPInfoCache(unittest.TestCase):
+    """Test cases for the lookup cache inside IPInfoService"""
+
+    def setUp(self):
+        """Start a fresh stub server and a cache on a fake clock"""
+        self.server = IPInfoStubServer().start()
+        self.clock = FakeClock()
+        self.cache = IPInfoCache(max_entries=100, ttls={"basic": 60, "geo": 60, "asn": 600},
+                                 negative_ttl=5, stale_ttl=30, clock=self.clock)
+        self.service = IPInfoService(base_url=self.server.url, cache=self.cache,
+                                     client=AsyncHTTPClient(retries=0))
+
+    def tearDown(self):
+        """Stop the stub server"""
+        self.server.stop()
+
+    def test_basic_record_answers_geo_and_asn(self):
+        """Test that one basic fetch serves later basic, geo and asn lookups"""
+        async def lookups():
+            return [await self.service.fetch_ip_info("8.8.8.8", endpoint) for endpoint in ("basic", "geo", "asn", "basic")]
+        basic, geo, asn, again = asyncio.run(lookups())
+
+        self.assertEqual(self.server.requests, ["/8.8.8.8/json"])
+        self.assertEqual(again, basic)
+        self.assertEqual(geo["data"]["city"], basic["data"]["city"])
+        self.assertNotIn("org", geo["data"])
+        self.assertEqual(asn["data"]["org"], basic["data"]["org"])
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["hits"], stats["derived_hits"], stats["misses"]), (3, 2, 1))
+
+    def test_concurrent_misses_share_one_request(self):
+        """Test that simultaneous lookups of an uncached key make one upstream call"""
+        self.server.delay = 0.05
+        async def lookups():
+            return await asyncio.gather(*(self.service.fetch_ip_info("1.1.1.1") for _ in range(5)))
+        results = asyncio.run(lookups())
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_stale_results_are_served_while_revalidating(self):
+        """Test that an expired result is returned at once and refreshed in the background"""
+        async def scenario():
+            await self.service.fetch_ip_info("9.9.9.9")
+            self.clock.now += 70
+            stale = await self.service.fetch_ip_info("9.9.9.9", "geo")
+            requests_when_answered = len(self.server.requests)
+            # Let the background refresh finish
+            while self.service._inflight:
+                await asyncio.sleep(0.01)
+            fresh = await self.service.fetch_ip_info("9.9.9.9")
+            return stale, requests_when_answered, fresh
+        stale, requests_when_answered, fresh = asyncio.run(scenario())
+
+        self.assertTrue(stale["success"])
+        self.assertEqual(requests_when_answered, 1)
+        self.assertEqual(self.server.requests, ["/9.9.9.9/json", "/9.9.9.9/json"])
+        self.assertEqual(self.cache.get_stats()["stale_hits"], 1)
+        self.assertTrue(fresh["success"])
+
+        # Past the stale window the entry is gone
+        self.clock.now += 200
+        self.assertEqual(self.cache.lookup("9.9.9.9", "basic")[1], "miss")
+
+    def test_failures_are_cached_briefly(self):
+        """Test negative caching and that failures never replace a good stale answer"""
+        self.server.fail_first = 1
+        first = self.service.get_ip_info("4.4.4.4")
+        cached = self.service.get_ip_info("4.4.4.4")
+        self.assertFalse(first["success"])
+        self.assertFalse(cached["success"])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.cache.get_stats()["negative_hits"], 1)
+
+        self.clock.now += 6
+        self.assertTrue(self.service.get_ip_info("4.4.4.4")["success"])
+
+        # A failed refresh keeps the last good result
+        self.clock.now += 70
+        self.cache.store("4.4.4.4", "basic", first)
+        self.assertEqual(self.cache.lookup("4.4.4.4", "basic")[0]["success"], True)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted at the size limit"""
+        cache = IPInfoCache(max_entries=2, clock=self.clock)
+        result = {"success": True, "data": {"ip": "x"}, "endpoint": "basic", "message": ""}
+        cache.store("a", "basic", result)
+        cache.store("b", "basic", result)
+        cache.lookup("a", "basic")
+        cache.store("c", "basic", result)
+
+        self.assertEqual(cache.lookup("b", "basic")[1], "miss")
+        self.assertEqual(cache.lookup("a", "basic")[1], "fresh")
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
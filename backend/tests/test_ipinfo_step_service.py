@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import json
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ipinfo_step_service import IPInfoStepService, PLANNING_STEPS, REPORT_STEPS
+
+class TestIPInfoStepService(unittest.TestCase):
+    """Test cases for the IPinfo tool step prompts and parsing"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.service = IPInfoStepService(mode="combined")
+        self.data = {"ip": "8.8.8.8", "city": "Mountain View", "region": "California",
+                     "country": "US", "org": "AS15169 Google LLC"}
+
+    def run_stream(self, steps, output, endpoint=None, data=None, chunk=7):
+        """Feed output to a StepStream in small chunks and collect its events"""
+        stream = self.service.step_stream(steps, endpoint, data)
+        events = []
+        for start in range(0, len(output), chunk):
+            events += stream.feed(output[start:start + chunk])
+        return events + stream.finish()
+
+    def test_stream_splits_combined_output(self):
+        """Test that one combined generation yields all three planning steps, skipping prose around it"""
+        output = "Here you go:\n" + json.dumps({
+            "acknowledge": {"reasoning": "r1", "choice": "c1"},
+            "tool_selection": {"reasoning": "r2", "choice": "c2"},
+            "endpoint_selection": {"reasoning": "r3", "choice": "c3", "endpoint": "geo"}
+        }) + "\nHope that helps."
+        events = self.run_stream(PLANNING_STEPS, output)
+        steps = {name: value for kind, name, value in events if kind == "step"}
+        self.assertEqual([name for kind, name, _ in events if kind == "step"], list(PLANNING_STEPS))
+        self.assertEqual(steps["acknowledge"]["choice"], "c1")
+        self.assertEqual(steps["tool_selection"]["reasoning"], "r2")
+        self.assertEqual(steps["endpoint_selection"]["endpoint"], "geo")
+        deltas = "".join(value for kind, name, value in events if kind == "delta" and name == "acknowledge")
+        self.assertEqual(deltas, "c1")
+
+    def test_stream_falls_back_per_step(self):
+        """Test that a malformed step or endpoint is replaced without losing the others"""
+        output = json.dumps({
+            "acknowledge": {"reasoning": "r1", "choice": "c1"},
+            "tool_selection": "not an object",
+            "endpoint_selection": {"reasoning": "r3", "choice": "c3", "endpoint": "whois"}
+        })
+        steps = {name: value for kind, name, value in self.run_stream(PLANNING_STEPS, output) if kind == "step"}
+        self.assertEqual(steps["acknowledge"]["choice"], "c1")
+        self.assertEqual(steps["tool_selection"]["choice"], "Selecting the IPinfo tool to retrieve IP information.")
+        self.assertEqual(steps["endpoint_selection"]["choice"], "c3")
+        self.assertEqual(steps["endpoint_selection"]["endpoint"], "basic")
+
+    def test_stream_fallback_uses_api_data(self):
+        """Test that malformed report output falls back to formatting the API data directly"""
+        events = self.run_stream(REPORT_STEPS, "I could not produce JSON {oops", "basic", self.data)
+        self.assertEqual([kind for kind, _, _ in events], ["step", "step"])
+        steps = {name: value for _, name, value in events}
+        self.assertIn("Mountain View", steps["api_response"]["choice"])
+        self.assertIn("**Google LLC**", steps["summary"]["choice"])
+        self.assertIn("(ASN: AS15169)", steps["summary"]["choice"])
+
+    def test_separate_mode_stream(self):
+        """Test that a single-step generation is parsed without step-name keys"""
+        service = IPInfoStepService(mode="separate")
+        stream = service.step_stream(["summary"], "basic", self.data)
+        events = stream.feed('{"reasoning": "r", "choice": "All good"}') + stream.finish()
+        self.assertEqual(events[-1], ("step", "summary", {"reasoning": "r", "choice": "All good"}))
+
+    def test_render_template(self):
+        """Test that templated steps match the shape of model output"""
+        step = self.service.render_template("endpoint_selection", "where is 8.8.8.8 located?", "8.8.8.8")
+        self.assertEqual(step["endpoint"], "geo")
+        self.assertEqual(step["choice"], "Using the 'geo' endpoint to get detailed geolocation data.")
+        step = self.service.render_template("acknowledge", "what is my ip")
+        self.assertIn("your IP address", step["choice"])
+        step = self.service.render_template("summary", "what is my ip", None, "basic", self.data)
+        self.assertIn("Mountain View", step["choice"])
+
+if __name__ == "__main__":
+    unittest.main()
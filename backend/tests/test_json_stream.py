@@ -0,0 +1,66 @@
+import unittest
+import os
+import sys
+import json
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.json_stream import IncrementalJSONParser
+from app.services.ipinfo_step_service import IPInfoStepService, PLANNING_STEPS
+
+def feed_in_chunks(target, text, size):
+    """Feed text in fixed-size chunks and collect the events"""
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(target.feed(text[i:i + size]))
+    return events
+
+class TestIncrementalJSONParser(unittest.TestCase):
+    """Test cases for parsing JSON while it is still being generated"""
+
+    def test_result_matches_json_loads(self):
+        """Test that chunked parsing rebuilds the same value as json.loads"""
+        value = {"a": [1, -2.5e3, True, None, {"b": "x\ny \"q\" é \U0001F512"}], "c": False, "d": []}
+        text = "Sure: " + json.dumps(value) + " trailing prose"
+        for size in (1, 3, 7, len(text)):
+            parser = IncrementalJSONParser()
+            feed_in_chunks(parser, text, size)
+            self.assertTrue(parser.done)
+            self.assertEqual(parser.result, value)
+
+    def test_string_deltas_arrive_before_the_value(self):
+        """Test that a string is reported piece by piece before it is complete"""
+        parser = IncrementalJSONParser()
+        events = feed_in_chunks(parser, '{"step": {"choice": "Hello\\u0021 wor' + 'ld"}}', 4)
+        deltas = [text for kind, path, text in events if kind == "delta" and path == ("step", "choice")]
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual("".join(deltas), "Hello! world")
+        first_value = next(i for i, event in enumerate(events) if event[0] == "value")
+        self.assertEqual(events[first_value], ("value", ("step", "choice"), "Hello! world"))
+        self.assertTrue(all(kind == "delta" for kind, _, _ in events[:first_value]))
+
+class TestStepStream(unittest.TestCase):
+    """Test cases for following a combined step generation"""
+
+    def test_steps_are_released_as_they_complete(self):
+        """Test that each step is reported once its object closes, with fallbacks at the end"""
+        stream = IPInfoStepService(mode="combined").step_stream(PLANNING_STEPS)
+        partial = json.dumps({
+            "acknowledge": {"reasoning": "r1", "choice": "On it."},
+            "tool_selection": {"reasoning": "r2", "choice": "IPinfo"}
+        })[:-1]
+        events = feed_in_chunks(stream, partial, 5)
+
+        self.assertEqual("".join(v for kind, name, v in events if kind == "delta" and name == "acknowledge"), "On it.")
+        steps = [(name, value) for kind, name, value in events if kind == "step"]
+        self.assertEqual(steps, [("acknowledge", {"reasoning": "r1", "choice": "On it."}),
+                                 ("tool_selection", {"reasoning": "r2", "choice": "IPinfo"})])
+
+        # The generation stopped before endpoint_selection, so it falls back
+        final = stream.finish()
+        self.assertEqual([name for _, name, _ in final], ["endpoint_selection"])
+        self.assertEqual(final[0][2]["endpoint"], "basic")
+
+if __name__ == "__main__":
+    unittest.main()
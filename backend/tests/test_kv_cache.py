@@ -0,0 +1,149 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.kv_cache import PrefixCache, SessionCache
+from app.services.inference_backends import MockBackend
+
+class FakeLayerCache:
+    """Stands in for one layer of an mlx_lm KV cache"""
+
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+
+    @property
+    def nbytes(self):
+        return len(self.tokens) * 4
+
+class TestPrefixCache(unittest.TestCase):
+    """Test cases for the shared prompt-prefix KV cache"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.builds = []
+        self.cache = PrefixCache(max_entries=2)
+
+    def build(self, tokens):
+        self.builds.append(tokens)
+        return [FakeLayerCache(tokens), FakeLayerCache(tokens)]
+
+    def test_prefix_is_built_once(self):
+        """Test that the same prefix is only prefilled once"""
+        self.cache.fork([1, 2, 3], self.build)
+        self.cache.fork([1, 2, 3], self.build)
+        self.assertEqual(len(self.builds), 1)
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["nbytes"], 24)
+
+    def test_forks_are_independent(self):
+        """Test that mutating a fork leaves the snapshot untouched"""
+        fork = self.cache.fork([1, 2, 3], self.build)
+        fork[0].tokens.append(4)
+        self.assertEqual(self.cache.fork([1, 2, 3], self.build)[0].tokens, [1, 2, 3])
+
+    def test_least_recently_used_prefix_is_evicted(self):
+        """Test that the cache keeps at most max_entries snapshots"""
+        self.cache.fork([1], self.build)
+        self.cache.fork([2], self.build)
+        self.cache.fork([1], self.build)
+        self.cache.fork([3], self.build)
+        self.cache.fork([1], self.build)
+        self.cache.fork([2], self.build)
+        self.assertEqual(self.builds, [[1], [2], [3], [2]])
+
+class TestSessionCache(unittest.TestCase):
+    """Test cases for the per-conversation KV session cache"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        # Each two-layer entry of n tokens takes 8n bytes
+        self.cache = SessionCache(max_bytes=100)
+
+    def make_cache(self, tokens):
+        return [FakeLayerCache(tokens), FakeLayerCache(tokens)]
+
+    def test_checkout_returns_stored_state(self):
+        """Test that a stored turn is handed to the next turn exactly once"""
+        epoch, tokens, cache = self.cache.checkout(1)
+        self.assertIsNone(cache)
+        self.cache.store(1, epoch, [1, 2, 3], self.make_cache([1, 2, 3]))
+
+        _, tokens, cache = self.cache.checkout(1)
+        self.assertEqual(tokens, [1, 2, 3])
+        self.assertIsNotNone(cache)
+        self.assertIsNone(self.cache.checkout(1)[2])
+        self.assertEqual(self.cache.get_stats()["nbytes"], 0)
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        """Test that conversations are evicted once the byte budget is exceeded"""
+        for conversation_id in (1, 2, 3):
+            epoch, _, _ = self.cache.checkout(conversation_id)
+            self.cache.store(conversation_id, epoch, [0] * 5, self.make_cache([0] * 5))
+
+        stats = self.cache.get_stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertLessEqual(stats["nbytes"], 100)
+        self.assertIsNone(self.cache.checkout(1)[2])
+        self.assertIsNotNone(self.cache.checkout(3)[2])
+
+    def test_invalidate_drops_state_and_rejects_running_turns(self):
+        """Test that a history change discards cached and in-flight state"""
+        epoch, _, _ = self.cache.checkout(1)
+        self.cache.store(1, epoch, [1, 2], self.make_cache([1, 2]))
+
+        running_epoch, _, _ = self.cache.checkout(1)
+        self.cache.invalidate(1)
+        self.cache.store(1, running_epoch, [1, 2, 3], self.make_cache([1, 2, 3]))
+        self.assertIsNone(self.cache.checkout(1)[2])
+
+class MistralTokenizer:
+    """Character-level tokenizer whose template inlines the system message into the last [INST]"""
+
+    def apply_chat_template(self, messages, add_generation_prompt=False):
+        system = messages[0]["content"] + "\n\n" if messages[0]["role"] == "system" else ""
+        turns = [m for m in messages if m["role"] != "system"]
+        text = "<s>"
+        for index, message in enumerate(turns):
+            if message["role"] == "user":
+                inline = system if index == len(turns) - 1 else ""
+                text += f"[INST] {inline}{message['content']} [/INST]"
+            else:
+                text += f"{message['content']}</s>"
+        return [ord(c) for c in text]
+
+class TestSystemPrefix(unittest.TestCase):
+    """Test cases for finding the templated prompt prefix shared across queries"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.backend = MockBackend(max_batch_size=4)
+        self.system = {"role": "system", "content": "You are a security analyst. Plugin context: ..."}
+
+    def test_inlined_system_message(self):
+        """Test that a system message inlined into the last [INST] still yields a useful prefix"""
+        tokenizer = MistralTokenizer()
+        prefix = self.backend._system_prefix(tokenizer, [self.system, {"role": "user", "content": "What is ransomware?"}])
+        self.assertEqual("".join(map(chr, prefix)), "<s>[INST] " + self.system["content"] + "\n")
+        for query in ("What is ransomware?", "Is 1.2.3.4 malicious?"):
+            prompt = tokenizer.apply_chat_template([self.system, {"role": "user", "content": query}],
+                                                   add_generation_prompt=True)
+            self.assertEqual(prompt[:len(prefix)], prefix)
+
+    def test_trivial_prefix_is_skipped(self):
+        """Test that templates which put the system message last get no prefix"""
+        tokenizer = type("SystemLastTokenizer", (), {
+            "apply_chat_template": lambda self, messages, add_generation_prompt=False:
+                "".join(m["content"] for m in reversed(messages))
+        })()
+        with self.assertLogs("app.services.inference_backends", level="WARNING"):
+            self.assertIsNone(self.backend._system_prefix(tokenizer, [self.system, {"role": "user", "content": "hi"}]))
+        self.assertIsNone(self.backend._system_prefix(tokenizer, [{"role": "user", "content": "hi"}]))
+
+if __name__ == "__main__":
+    unittest.main()
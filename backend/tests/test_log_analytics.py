@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import random
+from collections import Counter
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.log_analytics import EventColumns, analyze, summary_table
+from app.services.log_ingest import LogEvent, LogIngestor
+
+START = 1714566600.0
+
+def request(ip: str, offset: float, status: int = 200, agent: str = "Mozilla/5.0") -> LogEvent:
+    return LogEvent("access", START + offset, ip, None, "request", status, "/", agent, None, 100)
+
+def failed_login(ip: str, offset: float, user: str = "root") -> LogEvent:
+    return LogEvent("syslog", START + offset, ip, user, "login_failed", 0, None, None, "sshd", 0)
+
+class TestLogAnalytics(unittest.TestCase):
+    """Test cases for the vectorized log analytics"""
+
+    def setUp(self):
+        """Store a scanner, a brute-forcer and background traffic"""
+        self.columns = EventColumns()
+        events = [request(f"198.51.100.{i % 20}", i * 30.0) for i in range(200)]
+        events += [request("203.0.113.5", 600 + i * 0.5, status=404, agent="sqlmap/1.7") for i in range(40)]
+        events += [failed_login("192.0.2.66", 1200 + i) for i in range(25)]
+        events += [failed_login("192.0.2.77", i * 120.0) for i in range(5)]
+        for event in sorted(events, key=lambda event: event.timestamp):
+            self.columns.add(event)
+        self.analytics = analyze(self.columns, top=3, burst_threshold=10)
+
+    def test_top_talkers_and_rates(self):
+        """Test per-IP totals and the busiest minute per IP"""
+        self.assertEqual(self.analytics["top_talkers"][0],
+                         {"ip": "203.0.113.5", "events": 40, "requests": 40, "failed_logins": 0, "http_errors": 40})
+        self.assertEqual(self.analytics["request_rates"][0],
+                         {"ip": "203.0.113.5", "requests": 40, "active_minutes": 1, "peak_per_minute": 40, "mean_per_minute": 40.0})
+
+    def test_bursts_and_rare_agents(self):
+        """Test that only the fast brute-forcer is a burst and sqlmap is a rare agent"""
+        bursts = self.analytics["failed_login_bursts"]
+        self.assertEqual([(burst["ip"], burst["failures"]) for burst in bursts], [("192.0.2.66", 25)])
+        self.assertEqual(bursts[0]["start"], "2024-05-01T12:50:00+00:00")
+
+        rare = analyze(self.columns, rare_agent_share=0.2)["rare_user_agents"]
+        self.assertEqual(rare, [{"user_agent": "sqlmap/1.7", "requests": 40, "ips": 1}])
+
+    def test_histogram_and_table(self):
+        """Test the time histogram and that the table is compact"""
+        histogram = self.analytics["histogram"]
+        self.assertEqual(histogram["bucket_seconds"], 180)
+        self.assertEqual(sum(histogram["events"]), len(self.columns))
+        self.assertEqual(sum(histogram["failed_logins"]), 30)
+        table = summary_table(self.analytics)
+        self.assertIn("192.0.2.66 | 2024-05-01T12:50:00+00:00 | 25 in 60s", table)
+        self.assertLess(len(table), 2000)
+
+    def test_matches_plain_counting(self):
+        """Test the vectorized per-IP counts against a plain Counter on random events"""
+        rng = random.Random(3)
+        columns = EventColumns()
+        events = [rng.choice([request(f"10.0.0.{rng.randint(1, 30)}", rng.random() * 3600, rng.choice([200, 404])),
+                              failed_login(f"10.0.0.{rng.randint(1, 30)}", rng.random() * 3600)]) for _ in range(5000)]
+        for event in events:
+            columns.add(event)
+        expected = Counter(event.ip for event in events)
+        talkers = analyze(columns, top=30)["top_talkers"]
+        self.assertEqual({row["ip"]: row["events"] for row in talkers}, dict(expected))
+        self.assertEqual([row["events"] for row in talkers], sorted(expected.values(), reverse=True))
+
+    def test_ingestor_runs_analytics(self):
+        """Test that ingestion keeps columns and reports the analytics"""
+        ingestor = LogIngestor()
+        ingestor.feed(b"".join(f"May  1 12:30:{i:02d} bastion sshd[1]: Failed password for root from 192.0.2.66 port 22 ssh2\n".encode()
+                               for i in range(12)))
+        analytics = ingestor.finish()["analytics"]
+        self.assertEqual(analytics["failed_login_bursts"][0]["failures"], 12)
+        self.assertIsNone(LogIngestor(analytics=False).finish()["analytics"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import io
+import os
+import sys
+import gzip
+import asyncio
+import tempfile
+from datetime import datetime, timezone
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.log_ingest import (READ_CHUNK_BYTES, LogIngestor, LogParser, LogTooLarge, _Timestamps,
+                                     enrich_ips, ingest_file, summary_prompt)
+from app.services.ip_database import IPRangeDatabase
+from app.services.ipinfo_service import IPInfoService
+
+AUTH_LOG = """May  1 12:30:45 bastion sshd[101]: Failed password for invalid user admin from 203.0.113.9 port 4242 ssh2
+May  1 12:30:46 bastion sshd[102]: Failed password for root from 203.0.113.9 port 4243 ssh2
+May  1 12:30:47 bastion sshd[103]: Invalid user oracle from 203.0.113.9 port 4244
+May  1 12:31:02 bastion sshd[104]: Accepted publickey for deploy from 8.8.8.8 port 50000 ssh2
+May  1 12:31:05 bastion kernel: [UFW BLOCK] IN=eth0 SRC=198.51.100.7 DST=10.0.0.5
+2024-05-01T12:31:09.120Z bastion sudo[105]: pam_unix(sudo:auth): authentication failure; logname= uid=0 euid=0 tty=/dev/pts/0 ruser= rhost=203.0.113.9  user=deploy
+this line is not a log line
+"""
+ACCESS_LOG = """8.8.8.8 - - [01/May/2024:12:30:45 +0000] "GET /index.html?id=1 HTTP/1.1" 200 5123 "-" "Mozilla/5.0"
+203.0.113.9 - - [01/May/2024:12:30:46 +0000] "GET /wp-login.php HTTP/1.1" 404 162 "-" "sqlmap/1.7"
+203.0.113.9 - bob [01/May/2024:12:30:47 +0000] "POST /wp-login.php HTTP/1.1" 500 - "-" "sqlmap/1.7"
+"""
+
+class TestLogIngest(unittest.TestCase):
+    """Test cases for log parsing and aggregation"""
+
+    def ingest(self, data: bytes, chunk: int = 17) -> dict:
+        ingestor = LogIngestor()
+        for start in range(0, len(data), chunk):
+            ingestor.feed(data[start:start + chunk])
+        return ingestor.finish()
+
+    def test_parse_lines(self):
+        """Test syslog login events and combined-format access lines"""
+        parser = LogParser()
+        failed = parser.parse(AUTH_LOG.splitlines()[0])
+        self.assertEqual((failed.source, failed.action, failed.ip, failed.user, failed.program),
+                         ("syslog", "login_failed", "203.0.113.9", "admin", "sshd"))
+        pam = parser.parse(AUTH_LOG.splitlines()[5])
+        self.assertEqual((pam.action, pam.ip, pam.user), ("login_failed", "203.0.113.9", "deploy"))
+        request = parser.parse(ACCESS_LOG.splitlines()[2])
+        self.assertEqual((request.source, request.ip, request.user, request.status, request.path, request.bytes),
+                         ("access", "203.0.113.9", "bob", 500, "/wp-login.php", 0))
+        self.assertEqual(request.timestamp, 1714566647.0)
+        self.assertIsNone(parser.parse("this line is not a log line"))
+        self.assertIsNone(LogParser("syslog").parse(ACCESS_LOG.splitlines()[0]))
+
+    def test_syslog_year_rollover(self):
+        """Test that RFC 3164 timestamps never land in the future across New Year"""
+        january = datetime(2027, 1, 5, 9, 0, tzinfo=timezone.utc).timestamp()
+        timestamps = _Timestamps(now=january)
+        self.assertEqual(timestamps.parse("Dec 31 23:59:59", "syslog"),
+                         datetime(2026, 12, 31, 23, 59, 59, tzinfo=timezone.utc).timestamp())
+        self.assertEqual(timestamps.parse("Jan  5 12:00:00", "syslog"),
+                         datetime(2027, 1, 5, 12, 0, tzinfo=timezone.utc).timestamp())
+
+    def test_aggregates(self):
+        """Test the aggregates of a mixed upload split at arbitrary byte boundaries"""
+        aggregates = self.ingest((AUTH_LOG + ACCESS_LOG).encode())
+        self.assertEqual((aggregates["input"]["lines"], aggregates["input"]["unparsed_lines"]), (10, 1))
+        self.assertEqual(aggregates["sources"], {"syslog": 6, "access": 3})
+        self.assertEqual(aggregates["top_failed_login_ips"][0],
+                         {"ip": "203.0.113.9", "events": 6, "failed_logins": 4, "http_errors": 2})
+        self.assertEqual([row["user"] for row in aggregates["top_failed_login_users"]], ["admin", "root", "oracle", "deploy"])
+        self.assertEqual(aggregates["accepted_login_users"], [{"user": "deploy", "accepted_logins": 1}])
+        self.assertEqual(aggregates["http_statuses"], {"2xx": 1, "4xx": 1, "5xx": 1})
+        self.assertEqual(aggregates["top_paths"][0], {"path": "/wp-login.php", "requests": 2})
+        self.assertEqual([row["ip"] for row in aggregates["mentioned_ips"]], ["198.51.100.7", "10.0.0.5"])
+        self.assertFalse(aggregates["approximate"])
+
+    def test_gzip_and_memory_mapped_file(self):
+        """Test that compressed files are detected and read from disk in chunks"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "auth.log.gz")
+            with gzip.open(path, "wb") as handle:
+                handle.write(AUTH_LOG.encode())
+            aggregates = ingest_file(path)
+        self.assertTrue(aggregates["input"]["compressed"])
+        self.assertEqual(aggregates["actions"]["login_failed"], 3)
+
+    def test_gzip_is_inflated_in_bounded_slices(self):
+        """Test that a highly compressed chunk is parsed slice by slice and the decompressed size is capped"""
+        data = ("x" * 99 + "\n").encode() * 40000
+        compressed = gzip.compress(data)
+        ingestor = LogIngestor()
+        slices = []
+        consume = ingestor._consume
+        ingestor._consume = lambda chunk: (slices.append(len(chunk)), consume(chunk))
+        # Concatenated gzip members are read as one stream
+        ingestor.feed(compressed + gzip.compress(data[:1000]))
+        self.assertLessEqual(max(slices), READ_CHUNK_BYTES)
+        self.assertEqual(ingestor.finish()["input"]["lines"], 40010)
+
+        with self.assertRaises(LogTooLarge):
+            LogIngestor(max_bytes=len(data) // 2).feed(compressed)
+
+    def test_memory_stays_bounded(self):
+        """Test that counters drop rare keys once they exceed their capacity"""
+        ingestor = LogIngestor(max_keys=100)
+        lines = "".join(f"May  1 12:30:45 bastion sshd[1]: Failed password for user{i} from 10.0.{i // 250}.{i % 250} port 22 ssh2\n"
+                        for i in range(1000))
+        lines += "May  1 12:30:45 bastion sshd[1]: Failed password for root from 203.0.113.9 port 22 ssh2\n" * 50
+        ingestor.feed(lines.encode())
+        aggregates = ingestor.finish()
+        self.assertLessEqual(aggregates["distinct_ips"], 200)
+        self.assertTrue(aggregates["approximate"])
+        self.assertEqual(aggregates["top_failed_login_ips"][0]["ip"], "203.0.113.9")
+        self.assertEqual(aggregates["top_failed_login_ips"][0]["failed_logins"], 50)
+
+    def test_prompt_holds_aggregates_and_enrichment(self):
+        """Test that the prompt carries aggregates and enrichment but no raw lines"""
+        aggregates = self.ingest((AUTH_LOG + ACCESS_LOG).encode())
+        database = IPRangeDatabase.from_csv(io.StringIO("8.8.8.0,8.8.8.255,US,15169,Google LLC\n"))
+        service = IPInfoService(base_url="http://127.0.0.1:9", database=database)
+        enrichment = asyncio.run(enrich_ips(aggregates, service))
+        self.assertEqual(enrichment["8.8.8.8"], {"country": "US", "org": "AS15169 Google LLC"})
+        self.assertEqual(enrichment["10.0.0.5"], {"bogon": True})
+
+        prompt = summary_prompt(aggregates, enrichment)
+        self.assertIn("203.0.113.9 | 6 | 4 | 2", prompt)
+        self.assertIn("8.8.8.8 | 2 | 0 | 0 | US, AS15169 Google LLC", prompt)
+        self.assertIn("Highest request rates", prompt)
+        self.assertNotIn("Failed password", prompt)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import os
+import sys
+import time
+import threading
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.model_registry import ModelHandle, ModelRegistry
+
+class TestModelRegistry(unittest.TestCase):
+    """Test cases for the process-wide Model Registry"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.registry = ModelRegistry(memory_budget=100)
+        self.loads = []
+
+    def loader(self, size):
+        def load(repo, quantization, config):
+            self.loads.append(repo)
+            time.sleep(0.05)
+            return ModelHandle(model=f"model:{repo}", tokenizer=f"tokenizer:{repo}", nbytes=size)
+        return load
+
+    def test_same_model_is_shared(self):
+        """Test that two services asking for one model get the same handle"""
+        with self.registry.borrow("repo-a", self.loader(40)) as first:
+            with self.registry.borrow("repo-a", self.loader(40)) as second:
+                self.assertIs(first, second)
+                self.assertEqual(first.refcount, 2)
+        self.assertEqual(self.loads, ["repo-a"])
+        self.assertEqual(first.refcount, 0)
+
+    def test_concurrent_first_requests_load_once(self):
+        """Test that concurrent requests for an unloaded model trigger a single load"""
+        handles = []
+
+        def borrow():
+            handle = self.registry.acquire("repo-a", self.loader(40))
+            handles.append(handle)
+            self.registry.release(handle)
+
+        threads = [threading.Thread(target=borrow) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.loads, ["repo-a"])
+        self.assertTrue(all(handle is handles[0] for handle in handles))
+
+    def test_key_includes_quantization_and_config(self):
+        """Test that different quantization or config load separate models"""
+        self.registry.release(self.registry.acquire("repo-a", self.loader(10)))
+        self.registry.release(self.registry.acquire("repo-a", self.loader(10), quantization="4bit"))
+        self.registry.release(self.registry.acquire("repo-a", self.loader(10), config={"rope_theta": 1}))
+        self.assertEqual(len(self.loads), 3)
+        self.assertEqual(len(self.registry.get_stats()["models"]), 3)
+
+    def test_idle_models_are_unloaded_least_recently_used(self):
+        """Test that loading past the budget unloads the least recently used idle model"""
+        self.registry.release(self.registry.acquire("repo-a", self.loader(40)))
+        self.registry.release(self.registry.acquire("repo-b", self.loader(40)))
+        self.registry.release(self.registry.acquire("repo-a", self.loader(40)))
+        self.registry.release(self.registry.acquire("repo-c", self.loader(40)))
+
+        self.assertIsNotNone(self.registry.peek("repo-a"))
+        self.assertIsNone(self.registry.peek("repo-b"))
+        self.assertIsNotNone(self.registry.peek("repo-c"))
+        self.assertEqual(self.registry.get_stats()["memory_used"], 80)
+
+    def test_borrowed_models_are_not_unloaded(self):
+        """Test that the budget is enforced without unloading models in use"""
+        handle = self.registry.acquire("repo-a", self.loader(60))
+        with self.assertRaises(RuntimeError):
+            self.registry.acquire("repo-b", self.loader(60))
+        self.assertIsNotNone(self.registry.peek("repo-a"))
+        self.registry.release(handle)
+        self.assertFalse(self.registry.unload("repo-b"))
+        self.assertTrue(self.registry.unload("repo-a"))
+
+if __name__ == "__main__":
+    unittest.main()
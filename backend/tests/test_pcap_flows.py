@@ -0,0 +1,106 @@
+import unittest
+import os
+import sys
+import socket
+import struct
+import tempfile
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pcap_flows import FlowSummarizer, summarize_capture, summary_prompt
+
+def ipv4_tcp(src: str, dst: str, sport: int, dport: int, flags: int, payload: bytes = b"", vlan: bool = False) -> bytes:
+    """An Ethernet frame carrying a TCP segment over IPv4"""
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 5 << 4, flags, 65535, 0, 0) + payload
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    tag = b"\x81\x00\x00\x07" if vlan else b""
+    return b"\x00" * 12 + tag + b"\x08\x00" + ip + tcp
+
+def ipv6_udp(src: str, dst: str, sport: int, dport: int, payload: bytes = b"") -> bytes:
+    """A raw IPv6 packet carrying a UDP datagram"""
+    udp = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+    return (struct.pack("!IHBB", 6 << 28, len(udp), 17, 64) + socket.inet_pton(socket.AF_INET6, src) +
+            socket.inet_pton(socket.AF_INET6, dst) + udp)
+
+def pcap(packets, endian: str = "<") -> bytes:
+    """A classic pcap capture of (timestamp, frame) pairs on Ethernet"""
+    data = struct.pack(endian + "IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+    for timestamp, frame in packets:
+        data += struct.pack(endian + "IIII", int(timestamp), round(timestamp % 1 * 1e6), len(frame), len(frame)) + frame
+    return data
+
+def pcapng(packets, linktype: int = 101) -> bytes:
+    """A pcapng capture with nanosecond timestamps on one interface"""
+    def block(block_type: int, body: bytes) -> bytes:
+        body += b"\x00" * (-len(body) % 4)
+        return struct.pack("<II", block_type, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+    data = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    data += block(1, struct.pack("<HHI", linktype, 0, 65535) + struct.pack("<HHB3x", 9, 1, 9) + b"\x00" * 4)
+    for timestamp, frame in packets:
+        units = int(timestamp * 1e9)
+        data += block(6, struct.pack("<IIIII", 0, units >> 32, units & 0xFFFFFFFF, len(frame), len(frame)) + frame)
+    return data
+
+START = 1714566600.0
+
+class TestPcapFlows(unittest.TestCase):
+    """Test cases for the packet-capture flow summarizer"""
+
+    def summarize(self, data: bytes, chunk: int = 37, **kwargs) -> dict:
+        summarizer = FlowSummarizer(**kwargs)
+        for start in range(0, len(data), chunk):
+            summarizer.feed(data[start:start + chunk])
+        return summarizer.finish()
+
+    def test_classic_pcap_flows(self):
+        """Test 5-tuple flows from a big-endian pcap split at arbitrary byte boundaries"""
+        packets = [(START + i, ipv4_tcp("10.0.0.5", "93.184.216.34", 51000, 443, 0x18, b"x" * 100, vlan=i % 2 == 0))
+                   for i in range(10)]
+        packets.append((START + 3.5, ipv4_tcp("93.184.216.34", "10.0.0.5", 443, 51000, 0x10)))
+        summary = self.summarize(pcap(packets, ">"))
+        self.assertEqual((summary["input"]["format"], summary["input"]["packets"], summary["flows"]), ("pcap", 11, 2))
+        self.assertEqual(summary["top_flows"][0], {
+            "src": "10.0.0.5", "dst": "93.184.216.34", "protocol": "tcp", "sport": 51000, "dport": 443,
+            "packets": 10, "bytes": 10 * 154 + 5 * 4, "duration": 9.0, "start": "2024-05-01T12:30:00+00:00"})
+        self.assertEqual(summary["capture"]["duration"], 9.0)
+        self.assertFalse(summary["input"]["truncated"])
+
+    def test_pcapng_ipv6(self):
+        """Test pcapng blocks, the nanosecond timestamp option and IPv6 over raw IP"""
+        packets = [(START + i / 4, ipv6_udp("2001:db8::1", "2001:4860:4860::8888", 5353, 53, b"q" * 30)) for i in range(8)]
+        summary = self.summarize(pcapng(packets), chunk=29)
+        self.assertEqual((summary["input"]["format"], summary["input"]["link_types"]), ("pcapng", [101]))
+        flow = summary["top_flows"][0]
+        self.assertEqual((flow["src"], flow["dst"], flow["protocol"], flow["dport"], flow["packets"], flow["duration"]),
+                         ("2001:db8::1", "2001:4860:4860::8888", "udp", 53, 8, 1.75))
+        self.assertEqual(summary["protocols"], {"udp": 8})
+
+    def test_scan_survives_pruning(self):
+        """Test that a port scan is flagged even after its probe flows are dropped from the table"""
+        packets = [(START + i, ipv4_tcp("198.51.100.66", "10.0.0.9", 40000, port, 0x02)) for i, port in enumerate(range(1, 101))]
+        packets += [(START + 200 + i, ipv4_tcp("10.0.0.5", "93.184.216.34", 52000 + i, 443, 0x18, b"x" * 500)) for i in range(50)]
+        summary = self.summarize(pcap(packets), chunk=4096, max_flows=20)
+        self.assertTrue(summary["approximate"])
+        self.assertEqual(summary["anomalies"][0], {"type": "port_scan", "src": "198.51.100.66", "ports": 100, "hosts": 1})
+        self.assertEqual(summary["ips"][0], "198.51.100.66")
+        prompt = summary_prompt(summary, {"198.51.100.66": {"country": "NL", "threat": "malicious (tor_exits)"}})
+        self.assertIn("port_scan: 198.51.100.66 (NL, malicious (tor_exits)) sent unanswered SYNs to 100 ports on 1 hosts", prompt)
+        self.assertNotIn("xxxx", prompt)
+
+    def test_memory_mapped_file_and_errors(self):
+        """Test summarizing from disk, truncated captures and files that are not captures"""
+        data = pcap([(START, ipv4_tcp("10.0.0.5", "10.0.0.6", 1234, 22, 0x02))] * 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "capture.pcap")
+            with open(path, "wb") as handle:
+                handle.write(data[:-10])
+            summary = summarize_capture(path)
+        self.assertEqual(summary["input"]["packets"], 2)
+        self.assertTrue(summary["input"]["truncated"])
+        with self.assertRaises(ValueError):
+            FlowSummarizer().feed(b"May  1 12:30:45 bastion sshd[1]: hello\n")
+
+if __name__ == "__main__":
+    unittest.main()
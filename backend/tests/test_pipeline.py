@@ -0,0 +1,209 @@
+import unittest
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.pipeline import Pipeline, PipelineError, HTTPNode, FormatNode, StepPolicy
+from app.services.ipinfo_step_service import IPInfoStepService
+from app.services.ipinfo_pipeline import build_ipinfo_pipeline, rank_endpoints, IPInfoPipelines, DEFAULT_STEP_POLICIES
+from app.services.threat_intel import ThreatIntelService
+
+def collect(pipeline, inputs):
+    """Run a pipeline to completion and return its frames"""
+    async def run():
+        return [frame async for frame in pipeline.run(inputs)]
+    return asyncio.run(run())
+
+class FakeIPInfoService:
+    """Stands in for IPInfoService without network access"""
+
+    def __init__(self, success=True, delay=0.0):
+        self.success = success
+        self.delay = delay
+        self.calls = []
+
+    async def fetch_ip_info(self, ip=None, endpoint="basic"):
+        self.calls.append((ip, endpoint))
+        await asyncio.sleep(self.delay)
+        if not self.success:
+            return {"success": False, "data": None, "endpoint": endpoint, "message": "unreachable"}
+        return {"success": True, "data": {"ip": ip, "city": "Mountain View", "org": "AS15169 Google LLC"},
+                "endpoint": endpoint, "message": "ok"}
+
+class TestPipeline(unittest.TestCase):
+    """Test cases for the DAG pipeline engine"""
+
+    def test_independent_nodes_run_concurrently(self):
+        """Test that nodes without dependencies between them overlap"""
+        def slow(ctx):
+            time.sleep(0.2)
+            return ctx["x"]
+        pipeline = Pipeline("test", [
+            HTTPNode("a", slow, requires=["x"]),
+            HTTPNode("b", slow, requires=["x"]),
+            FormatNode("join", lambda ctx: {"text": ctx["a"] + ctx["b"]}, requires=["a", "b"])
+        ], inputs=["x"])
+
+        start = time.perf_counter()
+        frames = collect(pipeline, {"x": 2})
+        self.assertLess(time.perf_counter() - start, 0.35)
+
+        self.assertEqual(frames[0], {"text": 4})
+        timings = {node["name"]: node for node in frames[-1]["pipeline"]["nodes"]}
+        self.assertEqual({t["status"] for t in timings.values()}, {"ok"})
+        self.assertGreaterEqual(timings["join"]["start"], timings["a"]["duration"])
+
+    def test_skipped_and_failed_nodes_skip_dependents(self):
+        """Test that a false condition or an error skips the nodes that need its value"""
+        def fail(ctx):
+            raise RuntimeError("boom")
+        pipeline = Pipeline("test", [
+            HTTPNode("broken", fail),
+            FormatNode("after_broken", lambda ctx: {"text": "no"}, requires=["broken"]),
+            FormatNode("never", lambda ctx: {"text": "no"}, when=lambda ctx: False),
+            FormatNode("after_never", lambda ctx: {"text": "no"}, requires=["never"]),
+            FormatNode("fine", lambda ctx: {"text": "yes"})
+        ])
+        frames = collect(pipeline, {})
+        self.assertEqual(frames[:-1], [{"text": "yes"}])
+        status = {node["name"]: node["status"] for node in frames[-1]["pipeline"]["nodes"]}
+        self.assertEqual(status, {"broken": "error", "after_broken": "skipped", "never": "skipped",
+                                  "after_never": "skipped", "fine": "ok"})
+
+    def test_invalid_graphs_are_rejected(self):
+        """Test that cycles and unknown requirements fail at construction"""
+        with self.assertRaises(PipelineError):
+            Pipeline("cycle", [FormatNode("a", lambda ctx: None, requires=["b"]),
+                               FormatNode("b", lambda ctx: None, requires=["a"])])
+        with self.assertRaises(PipelineError):
+            Pipeline("unknown", [FormatNode("a", lambda ctx: None, requires=["missing"])])
+
+    def test_step_policy_resolution(self):
+        """Test that overrides apply and auto steps switch to templates under load"""
+        policy = StepPolicy({"a": "auto", "b": "llm", "c": "auto"}, "b=template, c=llm, d=llm, a=fast",
+                            auto_threshold=2)
+        self.assertEqual(policy.resolve(load=0), {"a": "llm", "b": "template", "c": "llm"})
+        self.assertEqual(policy.resolve(load=2), {"a": "template", "b": "template", "c": "llm"})
+
+class TestIPInfoPipeline(unittest.TestCase):
+    """Test cases for the IPinfo workflow built on the pipeline engine"""
+
+    def setUp(self):
+        """Set up a fake generation that answers each prompt with its schema's steps"""
+        self.schemas = []
+        def generate(prompt, schema):
+            self.schemas.append(schema)
+            async def chunks():
+                properties = schema["properties"]
+                if "reasoning" in properties:
+                    reply = {"reasoning": "r", "choice": "c", "endpoint": "geo"}
+                else:
+                    reply = {name: {"reasoning": f"r-{name}", "choice": f"c-{name}", "endpoint": "geo"}
+                             for name in properties}
+                text = json.dumps(reply)
+                for i in range(0, len(text), 8):
+                    await asyncio.sleep(0)
+                    yield text[i:i + 8]
+            return chunks()
+        self.generate = generate
+
+    def test_rank_endpoints(self):
+        """Test that query wording decides the most likely endpoint"""
+        self.assertEqual(rank_endpoints("what is my ip")[0], "basic")
+        self.assertEqual(rank_endpoints("where is 8.8.8.8 located?")[0], "geo")
+        self.assertEqual(rank_endpoints("which ISP owns 1.1.1.1")[0], "asn")
+
+    def test_prefetched_lookup_is_reused(self):
+        """Test that the lookup claims the prefetched result for the chosen endpoint"""
+        lookup = FakeIPInfoService(delay=0.2)
+        pipeline = build_ipinfo_pipeline(IPInfoStepService(mode="combined"), lookup, self.generate, prefetch=2)
+        frames = collect(pipeline, {"query": "where is 8.8.8.8", "ip": "8.8.8.8"})
+
+        # geo was prefetched alongside basic, and not requested again after the model chose it
+        self.assertEqual(sorted(lookup.calls), [("8.8.8.8", "basic"), ("8.8.8.8", "geo")])
+        timings = {node["name"]: node for node in frames[-1]["pipeline"]["nodes"]}
+        self.assertEqual(timings["prefetch"]["candidates"], ["geo", "basic"])
+        self.assertTrue(timings["lookup"]["prefetched"])
+        # The lookup never starts before the prefetch it claims from
+        lookup_node = next(node for node in pipeline.nodes if node.name == "lookup")
+        self.assertIn("ip_info_prefetch", lookup_node.requires)
+        self.assertGreaterEqual(timings["lookup"]["start"], timings["prefetch"]["start"])
+
+    def test_prefetch_miss_falls_back_to_a_fresh_lookup(self):
+        """Test that a mispredicted endpoint is looked up after the model chooses it"""
+        lookup = FakeIPInfoService()
+        pipeline = build_ipinfo_pipeline(IPInfoStepService(mode="combined"), lookup, self.generate, prefetch=1)
+        frames = collect(pipeline, {"query": "what is my ip", "ip": None})
+
+        self.assertEqual(sorted(lookup.calls), [(None, "basic"), (None, "geo")])
+        timings = {node["name"]: node for node in frames[-1]["pipeline"]["nodes"]}
+        self.assertFalse(timings["lookup"]["prefetched"])
+
+    def test_combined_workflow_frames(self):
+        """Test that every step is streamed once, in order, with the API call in between"""
+        lookup = FakeIPInfoService()
+        pipeline = build_ipinfo_pipeline(IPInfoStepService(mode="combined"), lookup, self.generate, prefetch=0)
+        frames = collect(pipeline, {"query": "where is 8.8.8.8", "ip": "8.8.8.8"})
+
+        steps = [frame["step"]["name"] for frame in frames if "text" in frame]
+        self.assertEqual(steps, ["acknowledge", "tool_selection", "endpoint_selection",
+                                 "execution", "api_response", "summary"])
+        self.assertEqual(lookup.calls, [("8.8.8.8", "geo")])
+        self.assertTrue(any("delta" in frame for frame in frames))
+        self.assertEqual(frames[-1]["pipeline"]["name"], "ipinfo")
+
+    def test_template_steps_skip_the_model(self):
+        """Test that template steps are rendered directly and left out of the generation"""
+        pipelines = IPInfoPipelines(IPInfoStepService(mode="combined"), FakeIPInfoService(), self.generate,
+                                    policy=StepPolicy(DEFAULT_STEP_POLICIES, auto_threshold=1), prefetch=0)
+        self.assertIs(pipelines.get(load=3), pipelines.get(load=5))
+        frames = collect(pipelines.get(load=3), {"query": "where is 8.8.8.8", "ip": "8.8.8.8"})
+
+        steps = {frame["step"]["name"]: frame for frame in frames if "text" in frame}
+        self.assertEqual(steps["acknowledge"]["text"],
+                         "I'll help you get information about the IP address 8.8.8.8 using the IPinfo tool.")
+        self.assertNotIn("delta", [key for frame in frames if frame.get("step", {}).get("id") == 1 for key in frame])
+        # Only the model-backed steps were generated
+        self.assertEqual([sorted(schema["properties"]) for schema in self.schemas],
+                         [["endpoint_selection"], ["api_response", "summary"]])
+        kinds = {node["name"]: node["kind"] for node in frames[-1]["pipeline"]["nodes"]}
+        self.assertEqual(kinds["tool_selection"], "template")
+
+    def test_failed_lookup_reports_error(self):
+        """Test that a failed lookup skips the report steps and emits the error step"""
+        pipeline = build_ipinfo_pipeline(IPInfoStepService(mode="separate"),
+                                         FakeIPInfoService(success=False), self.generate)
+        frames = collect(pipeline, {"query": "what is my ip", "ip": None})
+
+        steps = {frame["step"]["name"]: frame for frame in frames if "text" in frame}
+        self.assertEqual(set(steps), {"acknowledge", "tool_selection", "endpoint_selection", "execution", "error"})
+        self.assertEqual(steps["error"]["step"]["id"], 5)
+        self.assertIn("unreachable", steps["error"]["text"])
+
+    def test_threat_verdict_reaches_report_steps(self):
+        """Test that a threat-feed match is added to the data the report steps format"""
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "c2.txt"), "w") as handle:
+                handle.write("8.8.8.0/24,known-c2\n")
+            threat_intel = ThreatIntelService(directory, reload_interval=0)
+            prompts = []
+            generate = self.generate
+            pipeline = build_ipinfo_pipeline(IPInfoStepService(mode="combined"), FakeIPInfoService(),
+                                             lambda prompt, schema: prompts.append(prompt) or generate(prompt, schema),
+                                             prefetch=0, policies={"summary": "template"}, threat_intel=threat_intel)
+            frames = collect(pipeline, {"query": "is 8.8.8.8 safe", "ip": "8.8.8.8"})
+
+        steps = {frame["step"]["name"]: frame for frame in frames if "text" in frame}
+        self.assertIn("**8.8.8.8 is blocklisted** in our threat feeds (c2)", steps["summary"]["text"])
+        self.assertIn('"verdict": "blocklisted"', prompts[-1])
+        kinds = {node["name"]: node["kind"] for node in frames[-1]["pipeline"]["nodes"]}
+        self.assertEqual(kinds["threat_intel"], "compute")
+
+if __name__ == "__main__":
+    unittest.main()
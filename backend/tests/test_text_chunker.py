@@ -0,0 +1,39 @@
+import unittest
+import os
+import sys
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.text_chunker import estimate_tokens, split_semantic
+
+class TestTextChunker(unittest.TestCase):
+    """Test cases for splitting long text on semantic boundaries"""
+
+    def test_short_text_is_one_chunk(self):
+        """Test that text within the budget is left alone"""
+        self.assertEqual(split_semantic("Is 203.0.113.9 malicious?", 100), ["Is 203.0.113.9 malicious?"])
+
+    def test_splits_on_paragraphs_first(self):
+        """Test that chunks end at paragraph breaks and join back losslessly"""
+        paragraphs = [f"Paragraph {i}. " + "word " * 30 for i in range(10)]
+        text = "\n\n".join(paragraphs)
+        chunks = split_semantic(text, 100)
+        self.assertEqual("".join(chunks), text)
+        self.assertTrue(all(estimate_tokens(chunk) <= 100 for chunk in chunks))
+        self.assertTrue(all(chunk.endswith("\n\n") for chunk in chunks[:-1]))
+
+    def test_falls_back_to_lines_words_and_characters(self):
+        """Test oversized paragraphs, lines and words"""
+        log = "\n".join(f"May  1 12:30:{i:02d} sshd[1]: Failed password for root" for i in range(40))
+        chunks = split_semantic(log, 50)
+        self.assertEqual("".join(chunks), log)
+        self.assertTrue(all(chunk.endswith("\n") for chunk in chunks[:-1]))
+
+        blob = "A" * 1000
+        chunks = split_semantic(blob, 64, count_tokens=len)
+        self.assertEqual("".join(chunks), blob)
+        self.assertTrue(all(len(chunk) <= 64 for chunk in chunks))
+
+if __name__ == "__main__":
+    unittest.main()
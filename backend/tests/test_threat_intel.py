@@ -0,0 +1,96 @@
+import unittest
+import os
+import sys
+import time
+import random
+import tempfile
+import ipaddress
+
+# Add the parent directory to sys.path to import app modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.threat_intel import CIDRTrie, ThreatIntelService
+
+def write_feed(directory, name, text):
+    with open(os.path.join(directory, name), "w") as handle:
+        handle.write(text)
+
+class TestCIDRTrie(unittest.TestCase):
+    """Test cases for the compressed radix trie"""
+
+    def test_matches_agree_with_brute_force(self):
+        """Test that every containing prefix is found, least specific first"""
+        rng = random.Random(11)
+        trie = CIDRTrie(32)
+        networks = []
+        for i in range(3000):
+            length = rng.randint(0, 32)
+            network = ipaddress.ip_network((rng.getrandbits(32), length), strict=False)
+            networks.append(network)
+            trie.insert(int(network.network_address), length, i)
+
+        for _ in range(500):
+            network = rng.choice(networks)
+            address = ipaddress.IPv4Address(int(network.network_address) | rng.getrandbits(32 - network.prefixlen))
+            expected = sorted(i for i, candidate in enumerate(networks) if address in candidate)
+            found = trie.match(int(address))
+            self.assertEqual(sorted(found), expected)
+            self.assertEqual([networks[i].prefixlen for i in found], sorted(networks[i].prefixlen for i in found))
+
+    def test_longest_match(self):
+        """Test longest-prefix match over nested IPv6 prefixes"""
+        trie = CIDRTrie(128)
+        for cidr in ("2001:db8::/32", "2001:db8:1::/48", "2001:db8:1:2::/64"):
+            network = ipaddress.ip_network(cidr)
+            trie.insert(int(network.network_address), network.prefixlen, cidr)
+
+        self.assertEqual(trie.longest_match(int(ipaddress.ip_address("2001:db8:1:2::5"))), "2001:db8:1:2::/64")
+        self.assertEqual(trie.longest_match(int(ipaddress.ip_address("2001:db8:1:3::5"))), "2001:db8:1::/48")
+        self.assertIsNone(trie.longest_match(int(ipaddress.ip_address("2001:db9::1"))))
+
+class TestThreatIntelService(unittest.TestCase):
+    """Test cases for matching addresses against feed files"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        write_feed(self.directory.name, "tor_exits.txt",
+                   "# description: Tor exit nodes\n185.220.101.0/24,tor-exit\n185.220.101.7\n")
+        write_feed(self.directory.name, "c2.txt", "45.0.0.0/8\n2001:db8:dead::/48,cobalt-strike\nnot-a-cidr\n")
+        write_feed(self.directory.name, "internal.txt", "# kind: allow\n10.0.0.0/8\n")
+        self.service = ThreatIntelService(self.directory.name, reload_interval=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_verdicts(self):
+        """Test block, allow and clean verdicts with the most specific match per feed"""
+        tor = self.service.match("185.220.101.7")
+        self.assertEqual(tor["verdict"], "blocklisted")
+        self.assertEqual(tor["matches"], [{"feed": "tor_exits", "kind": "block", "cidr": "185.220.101.7/32", "label": ""}])
+
+        self.assertEqual(self.service.match("2001:db8:dead:1::1")["matches"][0]["label"], "cobalt-strike")
+        self.assertEqual(self.service.match("::ffff:45.1.2.3")["verdict"], "blocklisted")
+        self.assertEqual(self.service.match("10.1.2.3")["verdict"], "allowlisted")
+        self.assertEqual(self.service.match("8.8.8.8"), {"ip": "8.8.8.8", "verdict": "clean", "matches": []})
+
+        results = self.service.match_many(["45.1.1.1", "bogus"])
+        self.assertEqual(results[1], {"ip": "bogus", "error": "Not a valid IPv4 or IPv6 address"})
+        self.assertEqual(self.service.get_stats()["feeds"]["c2"]["entries"], 2)
+
+    def test_feeds_hot_reload(self):
+        """Test that a changed feed is picked up in the background without blocking lookups"""
+        self.service.reload_interval = 0.01
+        write_feed(self.directory.name, "c2.txt", "8.8.8.0/24,new-c2\n")
+        time.sleep(0.02)
+
+        # The first lookup after the interval still answers from the old feeds
+        self.assertEqual(self.service.match("8.8.8.8")["verdict"], "clean")
+        deadline = time.time() + 5
+        while self.service.match("8.8.8.8")["verdict"] == "clean" and time.time() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.service.match("8.8.8.8")["matches"][0]["label"], "new-c2")
+        self.assertEqual(self.service.match("45.1.2.3")["verdict"], "clean")
+
+if __name__ == "__main__":
+    unittest.main()
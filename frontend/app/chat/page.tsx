@@ -80,18 +80,46 @@ export default function ChatPage() {
       const reader = response.body.getReader();
       let fullResponse = "";
       let autoSelectedPlugin: string | null = null;
+      // Message id of each step whose text is streaming in, by step id
+      const streamingSteps: { [id: number]: string } = {};
+      const decoder = new TextDecoder();
+      let buffered = "";
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
-        const chunk = new TextDecoder().decode(value);
+        // A read can end partway through a line, so keep the remainder for the next one
+        buffered += decoder.decode(value, { stream: true });
+        const parts = buffered.split('\n');
+        buffered = parts.pop() || "";
 
         // Process each line (could be multiple chunks in one read)
-        const lines = chunk.split('\n').filter(line => line.trim());
+        const lines = parts.filter(line => line.trim());
 
         for (const line of lines) {
           try {
             const data = JSON.parse(line);
-            if (data.text) {
+            if (data.delta && data.step) {
+              // More of a step's text while the model is still writing it
+              const stepId = data.step.id;
+              const messageId = streamingSteps[stepId];
+              if (messageId) {
+                setMessages(prev => prev.map(m => m.id === messageId ? { ...m, content: m.content + data.delta } : m));
+              } else {
+                const stepMessage: Message = {
+                  id: `step-${Date.now()}-${stepId}`,
+                  content: data.delta,
+                  role: (data.step.role || 'system') as 'user' | 'assistant' | 'system',
+                  stepInfo: {
+                    id: stepId,
+                    name: data.step.name
+                  },
+                  timestamp: new Date()
+                };
+                streamingSteps[stepId] = stepMessage.id;
+                setProcessingSteps(prev => ({ ...prev, [stepId]: true }));
+                setMessages(prev => [...prev, stepMessage]);
+              }
+            } else if (data.text) {
               // Check if this is a step message
               if (data.step) {
                 // Add a new message for this step
@@ -99,19 +127,24 @@ export default function ChatPage() {
                 const stepName = data.step.name;
                 const role = data.step.role || 'system';
 
-                // Only add the step message if we haven't processed this step ID before
-                if (!processingSteps[stepId]) {
-                  setProcessingSteps(prev => ({ ...prev, [stepId]: true }));
+                // Format the content to include reasoning if available
+                let content = data.text;
+                if (data.reasoning) {
+                  // Add the reasoning in a collapsible details element
+                  content = `${data.text}\n\n<details>
+                  <summary>**Why this decision was made**</summary>
+                  ${data.reasoning}
+                  </details>`;
+                }
 
-                  // Format the content to include reasoning if available
-                  let content = data.text;
-                  if (data.reasoning) {
-                    // Add the reasoning in a collapsible details element
-                    content = `${data.text}\n\n<details>
-                    <summary>**Why this decision was made**</summary>
-                    ${data.reasoning}
-                    </details>`;
-                  }
+                if (streamingSteps[stepId]) {
+                  // The step finished streaming: replace its partial text with the final step
+                  const messageId = streamingSteps[stepId];
+                  delete streamingSteps[stepId];
+                  setMessages(prev => prev.map(m => m.id === messageId ? { ...m, content: content } : m));
+                } else if (!processingSteps[stepId]) {
+                  // Only add the step message if we haven't processed this step ID before
+                  setProcessingSteps(prev => ({ ...prev, [stepId]: true }));
 
                   const stepMessage: Message = {
                     id: `step-${Date.now()}-${stepId}`,